@@ -1,10 +1,9 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import time
 
-from dfin.app.utils import setup_yahoo, add_sidebar_selector
+from dfin.app.utils import setup_yahoo, add_sidebar_selector, add_cache_metrics
 
 
 st.set_page_config(
@@ -17,13 +16,16 @@ setup_yahoo()
 add_sidebar_selector()
 
 
+# The histories of every symbol are fetched concurrently, and shared across sessions.
+histories = st.session_state['yf_client'].histories(st.session_state['selected_symbols'], '1y')
+add_cache_metrics()
+
 if 'animation_shown' in st.session_state and st.session_state['animation_shown']:
 
     for symbol in st.session_state['selected_symbols']:
 
         st.write(f'## {symbol}')
-        ticker = yf.Ticker(symbol, session=st.session_state['yf_session'])
-        underlying_history_1y = ticker.history('1y')
+        underlying_history_1y = histories[symbol]
 
         days = len(underlying_history_1y)
         line_chart = st.line_chart(underlying_history_1y[['High', 'Low']])
@@ -41,8 +43,7 @@ else:
     for symbol in st.session_state['selected_symbols']:
 
         st.write(f'## {symbol}')
-        ticker = yf.Ticker(symbol, session=st.session_state['yf_session'])
-        underlying_history_1y = ticker.history('1y')
+        underlying_history_1y = histories[symbol]
         progress_bar.progress(0, text='')
 
         days = len(underlying_history_1y)
@@ -1,9 +1,9 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 
-from dfin.app.utils import setup_yahoo, add_sidebar_selector
+from dfin.app.utils import setup_yahoo, add_sidebar_selector, add_cache_metrics, get_derived
+from dfin.options.chain import OptionChain
 
 
 st.set_page_config(
@@ -16,57 +16,69 @@ setup_yahoo()
 add_sidebar_selector()
 
 
-tabs = st.tabs(st.session_state['selected_symbols'])
+def volatility_smile(option_chains):
+    """Implied volatilities of the calls and puts traded within the last 30 days."""
+
+    frames = {}
+    for expiration, option_chain in option_chains.items():
+        legs = []
+        for frame in (option_chain.calls, option_chain.puts):
+            frame = frame.dropna()
+            frame = frame[frame['lastTradeDate'] > date_filter]
+            frame = frame[(frame[['impliedVolatility', 'strike']] != 0).all(axis=1)]
+            legs.append(frame)
+        frames[expiration] = tuple(legs)
+    return OptionChain.from_frames(frames)
+
+
+client = st.session_state['yf_client']
+symbols = st.session_state['selected_symbols']
+tabs = st.tabs(symbols)
 date_filter = pd.Timestamp.utcnow().floor('D') + pd.offsets.Day(-30)
 
-for symbol, tab in zip(st.session_state['selected_symbols'], tabs):
+# The expirations of every symbol, and then every selected chain, are fetched concurrently.
+options = client.options(symbols)
+
+def update_selected_expirations(symbol):
+    st.session_state[f'{symbol}_default_options'] = sorted(st.session_state[f'{symbol}_selected_options'])
+
+for symbol, tab in zip(symbols, tabs):
 
     with tab:
 
         st.write(f'## {symbol}')
-        ticker = yf.Ticker(symbol, session=st.session_state['yf_session'])
-        # print(ticker.options)
 
         if f'{symbol}_default_options' not in st.session_state:
-            num_options = len(ticker.options)
-            st.session_state[f'{symbol}_default_options'] = ticker.options[max(0,int(num_options/2)-2):min(int(num_options/2)+3,num_options)]
-
-        def update_selected_expirations(symbol):
-            st.session_state[f'{symbol}_default_options'] = sorted(st.session_state[f'{symbol}_selected_options'])
+            num_options = len(options[symbol])
+            st.session_state[f'{symbol}_default_options'] = options[symbol][max(0,int(num_options/2)-2):min(int(num_options/2)+3,num_options)]
 
         st.multiselect(
             'Select option expirations to display:',
-            ticker.options,
+            options[symbol],
             st.session_state[f'{symbol}_default_options'],
             key=f'{symbol}_selected_options',
             on_change=update_selected_expirations,
             args=(symbol,)
         )
 
-        for expiration in st.session_state[f'{symbol}_selected_options']:
+option_chains = client.option_chains({symbol: st.session_state[f'{symbol}_selected_options'] for symbol in symbols})
+
+for symbol, tab in zip(symbols, tabs):
+
+    with tab:
+
+        # Derived tables are cached, and shared across sessions, as well.
+        key = ('smile_table', symbol, tuple(option_chains[symbol]), date_filter)
+        sources = [('chain', symbol, expiration) for expiration in option_chains[symbol]]
+        chain = get_derived(key, sources, lambda: volatility_smile(option_chains[symbol]))
+
+        for expiration in chain.labels:
 
             st.write(f'### {expiration}')
 
-            calls = ticker.option_chain(expiration).calls.dropna()
-            calls = calls[calls['lastTradeDate'] > date_filter]
-            calls = calls[['impliedVolatility', 'strike']]
-            calls = calls[(calls != 0).all(axis=1)]
-            calls = calls.add_suffix('Call')
-
-            puts = ticker.option_chain(expiration).puts.dropna()
-            puts = puts[puts['lastTradeDate'] > date_filter]
-            puts = puts[['impliedVolatility', 'strike']]
-            puts = puts[(puts != 0).all(axis=1)]
-            puts = puts.add_suffix('Put')
-
-            # st.write(f'#### Outer Join:')
-            merged = pd.merge(calls, puts, left_on='strikeCall', right_on='strikePut', how='outer')
-            merged['strikeCall'] = merged['strikeCall'].fillna(merged['strikePut'])
-            merged = merged.drop(['strikePut'], axis=1).rename(columns={'strikeCall': 'strike'}).sort_values(by=['strike']).reset_index(drop=True)
+            merged = chain.expiry(expiration).to_frame(['impliedVolatility']).drop(columns='expiration')
             st.line_chart(merged, x='strike', y=['impliedVolatilityCall', 'impliedVolatilityPut'])
             st.dataframe(merged, use_container_width=True)
 
-            # st.write(f'#### Calls:')
-            # st.dataframe(ticker.option_chain(expiration).calls)
-            # st.write(f'#### Puts:')
-            # st.dataframe(ticker.option_chain(expiration).puts)
+
+add_cache_metrics()
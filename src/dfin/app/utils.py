@@ -1,3 +1,5 @@
+import threading
+
 import streamlit as st
 
 
@@ -5,24 +7,65 @@ import streamlit as st
 # Setup Yahoo Finance API.
 # ==============================
 
-def setup_yahoo():
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The Yahoo! Finance client shared by every session of the app server, created on first use.
+
+    Modules are imported once per server process, while pages are re-run per session, so the client lives here.
+    Its cache holds the fetched expirations, chains and histories, and the tables the pages derive from them.
+    """
+
+    with _shared_lock:
+
+        if 'client' not in _shared:
 
-    if 'yf_session' not in st.session_state:
+            from requests import Session
+            from requests_cache import CacheMixin, SQLiteCache
+            from requests_ratelimiter import LimiterMixin, MemoryQueueBucket
+            from pyrate_limiter import Duration, RequestRate, Limiter
+            from dfin.data.cache import TTLCache
+            from dfin.data.fetch import YahooClient
+            class CachedLimiterSession(CacheMixin, LimiterMixin, Session):
+                pass
 
-        from requests import Session
-        from requests_cache import CacheMixin, SQLiteCache
-        from requests_ratelimiter import LimiterMixin, MemoryQueueBucket
-        from pyrate_limiter import Duration, RequestRate, Limiter
-        class CachedLimiterSession(CacheMixin, LimiterMixin, Session):
-            pass
+            session = CachedLimiterSession(
+                limiter = Limiter(RequestRate(2, Duration.SECOND*5)),  # max 2 requests per 5 seconds
+                bucket_class = MemoryQueueBucket,
+                backend = SQLiteCache("yfinance.cache"),
+            )
 
-        session = CachedLimiterSession(
-            limiter = Limiter(RequestRate(2, Duration.SECOND*5)),  # max 2 requests per 5 seconds
-            bucket_class = MemoryQueueBucket,
-            backend = SQLiteCache("yfinance.cache"),
-        )
+            # Fetches chains and histories concurrently; the limiter of the session still applies across threads.
+            cache = TTLCache(maxsize=1024, ttl=15*60, max_bytes=512*2**20)
+            _shared['client'] = YahooClient(session, cache=cache)
 
-        st.session_state['yf_session'] = session
+        return _shared['client']
+
+
+def get_derived(key:tuple, sources:list, loader):
+    """
+    A table derived from cached raw entries, e.g. a chain from the fetched ("chain", symbol, expiration) entries,
+    computed with `loader()` and cached in the shared cache.
+
+    The table expires with the first of its sources, so it is never older than the time to live of the raw data,
+    rather than up to twice as old when it was derived just before the sources expired.
+    """
+
+    cache = get_client().cache
+    ttl = min((cache.remaining(source) or 0. for source in sources), default=cache.ttl)
+    return cache.get_or_set(key, loader, ttl=ttl)
+
+
+def setup_yahoo():
+
+    if 'yf_client' not in st.session_state:
+
+        client = get_client()
+        st.session_state['yf_session'] = client.session
+        st.session_state['yf_client'] = client
 
 
 # ==============================
@@ -66,3 +109,25 @@ def add_sidebar_selector():
         key='new_symbol',
         on_change=add_symbol,
     )
+
+
+# ==============================
+# Cache metrics.
+# ==============================
+
+def add_cache_metrics():
+
+    cache = get_client().cache
+
+    def refresh_selected():
+        symbols = set(st.session_state['selected_symbols'])
+        cache.invalidate(lambda key: key[1] in symbols)
+
+    stats = cache.stats()
+    st.sidebar.metric('Cache hit rate', 'n/a' if stats.hits + stats.misses == 0 else f'{stats.hit_rate:.0%}')
+    st.sidebar.caption(
+        f'{stats.hits} hits, {stats.misses} misses, {stats.expired} expired, {stats.evictions} evicted. '
+        f'{stats.entries} entries, {stats.bytes/2**20:.1f} MiB shared by all sessions.'
+    )
+    st.sidebar.button('Refresh selected symbols', on_click=refresh_selected)
+    st.sidebar.button('Clear cache', on_click=cache.clear)
@@ -0,0 +1,251 @@
+"""Benchmark suite for the pricers and implied volatility solvers.
+
+Times every backend over a range of batch sizes and dtypes, and emits JSON that can be diffed between releases.
+Run it with `dfin bench`.
+"""
+
+import json
+import platform
+import timeit
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from dfin.optimize import gradient_descent, lbfgs, secant, newton, halley
+from dfin.optimize import batched_gradient_descent, batched_secant, batched_newton, batched_halley, bracketed_newton
+from dfin.options import bs_compiled, bs_numpy, bs_torch, bs_vanilla, iv_rational, iv_scipy, iv_torch
+
+
+DEFAULT_SIZES = [1, 100, 10000, 1000000]
+DEFAULT_DTYPES = ['float32', 'float64']
+
+SCALAR_SOLVERS = {
+    'gradient_descent': gradient_descent,
+    'lbfgs': lbfgs,
+    'secant': secant,
+    'newton': newton,
+    'halley': halley,
+}
+BATCHED_SOLVERS = {
+    'batched_gradient_descent': batched_gradient_descent,
+    'batched_secant': batched_secant,
+    'batched_newton': batched_newton,
+    'batched_halley': batched_halley,
+    'bracketed_newton': bracketed_newton,
+}
+
+
+def make_chain(size:int, seed:int=0) -> Dict[str, np.ndarray]:
+    """
+    Generates a reproducible synthetic option chain.
+
+    Parameters
+    ----------
+    size : int
+        Number of contracts
+    seed : int
+        Seed of the random generator. Default: 0.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        Float64 arrays of "S", "K", "r", "t", "sigma" and the matching call "price".
+    """
+
+    rng = np.random.default_rng(seed)
+    chain = {
+        'S': np.full(size, 100.0),
+        'K': rng.uniform(80, 120, size),
+        'r': np.full(size, 0.05),
+        't': rng.uniform(0.25, 2.0, size),
+        'sigma': rng.uniform(0.1, 0.5, size),
+    }
+    chain['price'] = bs_numpy.call_price(chain['S'], chain['K'], chain['r'], chain['t'], chain['sigma'])
+    return chain
+
+
+def _time(func:Callable, repeat:int) -> float:
+    """Best wall time of `repeat` runs, after one warm-up run."""
+
+    func()
+    return min(timeit.Timer(func).repeat(repeat=repeat, number=1))
+
+
+def _cases(chain:Dict[str, np.ndarray], dtype:str, max_loop_size:int, compiled:bool=False):
+    """Yields (name, backend, autograd, callable) for every benchmark case of one chain."""
+
+    size = len(chain['S'])
+    np_dtype = getattr(np, dtype)
+    torch_dtype = getattr(torch, dtype)
+    S, K, r, t, sigma, price = (torch.tensor(chain[k], dtype=torch_dtype) for k in ('S', 'K', 'r', 't', 'sigma', 'price'))
+    arrays = [chain[k] for k in ('S', 'K', 'r', 't', 'sigma')]
+    sigma0 = torch.tensor(0.5, dtype=torch_dtype)
+
+    # Pure Python backends loop over the contracts in float64 only.
+    if dtype == 'float64' and size <= max_loop_size:
+        rows = list(zip(*(a.tolist() for a in arrays + [chain['price']])))
+        yield 'call_price', 'bs_vanilla', False, lambda: [bs_vanilla.call_price(*row[:5]) for row in rows]
+        yield 'call_implied_volatility', 'iv_scipy', False, lambda: [iv_scipy.call_implied_volatility(*row[:4], row[5]) for row in rows]
+        yield 'call_implied_volatility', 'iv_rational', False, lambda: [iv_rational.call_implied_volatility(*row[:4], row[5]) for row in rows]
+
+    yield 'call_price', 'bs_numpy', False, lambda: bs_numpy.call_price(*arrays, dtype=np_dtype)
+    yield 'call_implied_volatility', 'bs_numpy', False, lambda: bs_numpy.call_implied_volatility(*arrays[:4], chain['price'], dtype=np_dtype)
+
+    def torch_price():
+        with torch.no_grad():
+            bs_torch.call_price(S, K, r, t, sigma)
+
+    def torch_price_autograd():
+        inputs = [x.clone().requires_grad_(True) for x in (S, K, r, t, sigma)]
+        bs_torch.call_price(*inputs).sum().backward()
+
+    yield 'call_price', 'bs_torch', False, torch_price
+    yield 'call_price', 'bs_torch', True, torch_price_autograd
+    yield 'call_put_price', 'bs_torch', False, lambda: bs_torch.call_put_price(S, K, r, t, sigma)
+    yield 'greeks', 'bs_torch', False, lambda: bs_torch.greeks(S, K, r, t, sigma)
+    yield 'greeks', 'bs_torch', True, lambda: bs_torch.greeks(S, K, r, t, sigma, method='autograd')
+
+    # The scalar solvers stop on a scalar test, so they only take one contract.
+    if size == 1:
+        for name, optim in SCALAR_SOLVERS.items():
+            yield name, 'iv_torch', True, lambda optim=optim: iv_torch.call_implied_volatility(S, K, r, t, price, sigma0, optim)
+    for name, optim in BATCHED_SOLVERS.items():
+        autograd = name != 'batched_secant'
+        yield name, 'iv_torch', autograd, lambda optim=optim: iv_torch.call_implied_volatility(S, K, r, t, price, sigma0, optim)
+    for method in ('newton', 'halley'):
+        yield f'analytic_{method}', 'iv_torch', False, lambda method=method: iv_torch.call_implied_volatility_analytic(S, K, r, t, price, sigma0, method)
+
+    # The warm-up run of `_time` pays for compiling, so only the compiled kernels are timed.
+    if compiled:
+        for backend in ('eager', 'script', 'compile'):
+            yield 'call_price', f'bs_compiled:{backend}', False, lambda backend=backend: bs_compiled.call_price(S, K, r, t, sigma, backend=backend)
+            yield 'call_implied_volatility', f'bs_compiled:{backend}', False, lambda backend=backend: bs_compiled.call_implied_volatility(S, K, r, t, price, sigma0, backend=backend)
+
+
+def run_benchmarks(sizes:Sequence[int]=DEFAULT_SIZES, dtypes:Sequence[str]=DEFAULT_DTYPES, repeat:int=5, max_loop_size:int=10000, filter:Optional[str]=None, verbose:bool=False, compiled:bool=False) -> Dict:
+    """
+    Times every pricer and solver over the given batch sizes and dtypes.
+
+    Parameters
+    ----------
+    sizes : Sequence[int]
+        Batch sizes to time. Default: 1 to 1e6.
+    dtypes : Sequence[str]
+        Any of "float32" and "float64". Default: both.
+    repeat : int
+        Number of timed runs per case. The best one is reported. Default: 5.
+    max_loop_size : int
+        Largest batch the pure Python backends loop over. Default: 10000.
+    filter : str, optional
+        Only run cases whose name or backend contains this substring.
+    verbose : bool
+        Print each result as it comes in.
+    compiled : bool
+        Also time the kernels of `bs_compiled` with every backend. Compiling takes a while. Default: False.
+
+    Returns
+    -------
+    Dict
+        JSON-serializable report with the environment under "meta" and one record per case under "results".
+    """
+
+    results = []
+    for size in sizes:
+        chain = make_chain(size)
+        for dtype in dtypes:
+            for name, backend, autograd, func in _cases(chain, dtype, max_loop_size, compiled):
+                if filter is not None and filter not in name and filter not in backend:
+                    continue
+                seconds = _time(func, repeat)
+                results.append({
+                    'name': name,
+                    'backend': backend,
+                    'size': size,
+                    'dtype': dtype,
+                    'autograd': autograd,
+                    'seconds': seconds,
+                    'seconds_per_element': seconds / size,
+                })
+                if verbose:
+                    print(f'{backend:>20s}.{name:<25s} size={size:<8d} {dtype:<8s} autograd={autograd!s:<5s} {seconds*1000:10.4f} ms')
+
+    try:
+        from dfin._version import version
+    except ImportError:
+        version = None
+
+    return {
+        'meta': {
+            'dfin': version,
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'torch_threads': torch.get_num_threads(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'results': results,
+    }
+
+
+def _case_key(record:Dict) -> tuple:
+    return (record['name'], record['backend'], record['size'], record['dtype'], record['autograd'])
+
+
+def compare(baseline:Dict, current:Dict, threshold:float=1.2) -> List[Dict]:
+    """
+    Finds the cases that got slower between two benchmark reports.
+
+    Parameters
+    ----------
+    baseline : Dict
+        Report of the reference release
+    current : Dict
+        Report of the candidate release
+    threshold : float
+        Ratio of current to baseline time above which a case counts as a regression. Default: 1.2.
+
+    Returns
+    -------
+    List[Dict]
+        The regressed cases, with their baseline and current times and the ratio, slowest first.
+    """
+
+    reference = {_case_key(record): record['seconds'] for record in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        before = reference.get(_case_key(record))
+        if before is None or before <= 0:
+            continue
+        ratio = record['seconds'] / before
+        if ratio > threshold:
+            regressions.append(dict(record, baseline_seconds=before, ratio=ratio))
+    return sorted(regressions, key=lambda record: -record['ratio'])
+
+
+def main(args) -> int:
+    """Runs `dfin bench` from parsed command-line arguments. Returns the exit code."""
+
+    import pathlib
+
+    # The parser leaves the defaults to this module, so that parsing does not import torch.
+    report = run_benchmarks(args.sizes or DEFAULT_SIZES, args.dtypes or DEFAULT_DTYPES, args.repeat, args.max_loop_size, args.filter, verbose=True, compiled=args.compiled)
+
+    output = pathlib.Path(args.bench_output) if args.bench_output else pathlib.Path(args.output_path) / 'bench.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'Benchmark results written to {output.as_posix()}')
+
+    if args.compare:
+        baseline = json.loads(pathlib.Path(args.compare).read_text())
+        regressions = compare(baseline, report, args.threshold)
+        for record in regressions:
+            print(f'REGRESSION {record["backend"]}.{record["name"]} size={record["size"]} {record["dtype"]} autograd={record["autograd"]}: '
+                  f'{record["baseline_seconds"]*1000:.4f} ms -> {record["seconds"]*1000:.4f} ms ({record["ratio"]:.2f}x)')
+        if regressions:
+            return 1
+        print(f'No regressions above {args.threshold:.2f}x against {args.compare}')
+    return 0
@@ -0,0 +1,230 @@
+"""Thread-safe, memory-bounded cache with per-entry expiry.
+
+Meant for data that is expensive to fetch or derive and shared by every session of the app:
+parsed option chains, price histories and implied volatility tables.
+Entries expire after a time to live, and the least recently used ones are evicted beyond a number of entries or of bytes.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+_MISSING = object()
+
+
+class CacheStats(NamedTuple):
+    """Counters of a `TTLCache`.
+
+    Attributes
+    ----------
+    hits : int
+        Lookups served from the cache.
+    misses : int
+        Lookups not in the cache, including expired entries.
+    expired : int
+        Entries dropped because their time to live ran out.
+    evictions : int
+        Entries dropped to stay within `maxsize` or `max_bytes`.
+    entries : int
+        Entries currently held.
+    bytes : int
+        Estimated size of the entries currently held.
+    """
+    hits: int
+    misses: int
+    expired: int
+    evictions: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups served from the cache. NaN before the first lookup."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else float('nan')
+
+
+def sizeof(value:Any) -> int:
+    """
+    Estimates the memory held by a cached value.
+
+    DataFrames and Series count their deep memory usage, arrays and tensors their buffers,
+    and tuples, lists, dicts and objects with a `__dict__` (e.g. the chains of yfinance or an `OptionChain`) the sum of their parts.
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, 'element_size') and hasattr(value, 'nelement'):
+        return int(value.element_size() * value.nelement())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(x) for x in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(x) for x in value.values())
+    if hasattr(value, '__slots__'):
+        return sys.getsizeof(value) + sum(sizeof(getattr(value, name)) for name in value.__slots__ if hasattr(value, name))
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sizeof(vars(value))
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    Least recently used cache whose entries expire after a time to live.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries. Default: 1024.
+    ttl : float
+        Default time to live of an entry, in seconds. Default: 300.
+    max_bytes : int, optional
+        Maximum estimated size of all entries, see `sizeof`. Unbounded if not given. Default: 256 MiB.
+    clock : Callable
+        Monotonic clock in seconds. Default: `time.monotonic`.
+    """
+
+    def __init__(self, maxsize:int=1024, ttl:float=300., max_bytes:Optional[int]=256*2**20, clock:Callable[[], float]=time.monotonic):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.bytes = 0
+        # Key to (value, expiry time, size), in order of use.
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key:Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > self.clock()
+
+    def _drop(self, key:Hashable):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key:Hashable, default:Any=None) -> Any:
+        """Looks up a key, counting the hit or miss. Returns `default` on a miss."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= self.clock():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key:Hashable, value:Any, ttl:Optional[float]=None):
+        """
+        Stores a value, evicting the least recently used entries beyond the bounds.
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry, e.g. ("chain", symbol, expiration).
+        value : Any
+            Value to store.
+        ttl : float, optional
+            Time to live in seconds. Default: the `ttl` of the cache.
+        """
+
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Would evict everything else and still not fit.
+                return
+            self._entries[key] = (value, self.clock() + (self.ttl if ttl is None else ttl), size)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def remaining(self, key:Hashable) -> Optional[float]:
+        """Seconds until an entry expires, or None if it is missing or expired. Counts neither a hit nor a miss."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            left = None if entry is None else entry[1] - self.clock()
+            return left if left is not None and left > 0 else None
+
+    def get_or_set(self, key:Hashable, loader:Callable[[], Any], ttl:Optional[float]=None) -> Any:
+        """
+        Looks up a key, computing and storing its value with `loader()` on a miss.
+
+        Concurrent misses of the same key may each call the loader; use `dfin.data.fetch.Fetcher` to deduplicate slow requests.
+        """
+
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, match:Union[Hashable, Callable[[Hashable], bool]]) -> int:
+        """
+        Drops entries explicitly.
+
+        Parameters
+        ----------
+        match : Hashable or Callable
+            A key, or a predicate selecting the keys to drop, e.g. `lambda key: key[1] == 'AAPL'`.
+
+        Returns
+        -------
+        int
+            Number of entries dropped.
+        """
+
+        with self._lock:
+            if callable(match):
+                keys = [key for key in self._entries if match(key)]
+            else:
+                keys = [match] if match in self._entries else []
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        """Drops every entry and resets the counters."""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.expired = self.evictions = self.bytes = 0
+
+    def stats(self) -> CacheStats:
+        """Snapshot of the counters."""
+
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.expired, self.evictions, len(self._entries), self.bytes)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    cache = TTLCache(maxsize=2, ttl=60.)
+    history = cache.get_or_set(('history', 'AAPL', '1y'), lambda: pd.DataFrame({'Close': np.arange(252.)}))
+    history = cache.get_or_set(('history', 'AAPL', '1y'), lambda: pd.DataFrame({'Close': np.arange(252.)}))
+    print(cache.stats())
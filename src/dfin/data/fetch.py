@@ -0,0 +1,265 @@
+"""Concurrent market data fetching.
+
+`Fetcher` runs requests on a thread pool, behind an optional rate limiter, and merges concurrent requests for the same key
+into a single one. `YahooClient` uses it to fetch every option chain once, with all symbols and expirations in flight at once,
+instead of one request after the other in the app pages.
+Threads suit the blocking `requests` sessions of yfinance, including the rate limited, cached session of `app.utils.setup_yahoo`,
+whose limiter is thread-safe.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Mapping, Optional, Sequence, Tuple
+
+from dfin.data.cache import TTLCache
+
+
+_MISSING = object()
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket, allowing bursts of up to `rate` requests and `rate` requests per `period` on average.
+
+    Parameters
+    ----------
+    rate : int
+        Requests per period.
+    period : float
+        Length of the period in seconds. Default: 1.
+    """
+
+    def __init__(self, rate:int, period:float=1.):
+
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a request is allowed. Returns the time waited, in seconds."""
+
+        waited = 0.
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) * self.period / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class Fetcher:
+    """
+    Thread pool for blocking requests that deduplicates requests in flight.
+
+    A request submitted under the key of a request that has not finished yet gets the future of the latter,
+    so it is only sent once. Finished requests are forgotten; caching their results is up to the caller.
+
+    Parameters
+    ----------
+    max_workers : int
+        Maximum number of requests in flight. Default: 8.
+    limiter : RateLimiter, optional
+        Rate limit applied to every request, in addition to any limit of the session used by the requests.
+
+    Attributes
+    ----------
+    requests : int
+        Number of requests sent.
+    deduplicated : int
+        Number of requests served by a request already in flight.
+    """
+
+    def __init__(self, max_workers:int=8, limiter:Optional[RateLimiter]=None):
+
+        self.limiter = limiter
+        self.requests = 0
+        self.deduplicated = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dfin-fetch')
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, func:Callable, args:tuple, kwargs:dict):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return func(*args, **kwargs)
+
+    def _done(self, key:Hashable, future:Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def submit(self, key:Hashable, func:Callable, *args, **kwargs) -> Future:
+        """
+        Runs `func(*args, **kwargs)` on the pool, unless a request with the same key is in flight.
+
+        Parameters
+        ----------
+        key : Hashable
+            Identity of the request, e.g. ("chain", symbol, expiration).
+        func : Callable
+            Blocking function sending the request.
+
+        Returns
+        -------
+        Future
+            Future of the result, shared by every caller of the same key while in flight.
+        """
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            future = self._pool.submit(self._run, func, args, kwargs)
+            self._in_flight[key] = future
+            self.requests += 1
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def gather(self, requests:Mapping[Hashable, Tuple[Callable, tuple]], on_result:Optional[Callable[[Hashable, Any], None]]=None) -> Dict[Hashable, Any]:
+        """
+        Submits a batch of requests at once and waits for all of them.
+
+        Parameters
+        ----------
+        requests : Mapping[Hashable, Tuple[Callable, tuple]]
+            Function and positional arguments by key.
+        on_result : Callable, optional
+            Called with the key and result of every request that succeeds, even when others fail, e.g. to cache them.
+
+        Returns
+        -------
+        Dict[Hashable, Any]
+            Results by key. The first failure is raised once every request has finished.
+        """
+
+        futures = {key: self.submit(key, func, *args) for key, (func, args) in requests.items()}
+        results, error = {}, None
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if on_result is not None:
+                on_result(key, results[key])
+        if error is not None:
+            raise error
+        return results
+
+    def close(self):
+        """Waits for the requests in flight and shuts the pool down."""
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> 'Fetcher':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class YahooClient:
+    """
+    Concurrent access to the option chains and price histories of yfinance.
+
+    Parameters
+    ----------
+    session : requests.Session, optional
+        Session shared by every `yf.Ticker`, e.g. the one of `app.utils.setup_yahoo`.
+    fetcher : Fetcher, optional
+        Thread pool to fetch with. Default: a new one with 8 workers.
+    cache : TTLCache, optional
+        Cache of the fetched expirations, chains and histories, keyed by ("options", symbol),
+        ("chain", symbol, expiration) and ("history", symbol, period). Nothing is cached if not given.
+    """
+
+    def __init__(self, session=None, fetcher:Optional[Fetcher]=None, cache:Optional[TTLCache]=None):
+
+        self.session = session
+        self.fetcher = fetcher or Fetcher()
+        self.cache = cache
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    def ticker(self, symbol:str):
+        """The `yf.Ticker` of a symbol, created once."""
+
+        with self._lock:
+            if symbol not in self._tickers:
+                import yfinance as yf
+                self._tickers[symbol] = yf.Ticker(symbol, session=self.session)
+            return self._tickers[symbol]
+
+    def _options(self, symbol:str) -> Tuple[str, ...]:
+        return tuple(self.ticker(symbol).options)
+
+    def _option_chain(self, symbol:str, expiration:str):
+        return self.ticker(symbol).option_chain(expiration)
+
+    def _history(self, symbol:str, period:str):
+        return self.ticker(symbol).history(period)
+
+    def _gather(self, requests:Mapping[Hashable, Tuple[Callable, tuple]]) -> Dict[Hashable, Any]:
+        """Serves what it can from the cache, and fetches the rest concurrently."""
+
+        if self.cache is None:
+            return self.fetcher.gather(requests)
+        results, missing = {}, {}
+        for key, request in requests.items():
+            value = self.cache.get(key, _MISSING)
+            if value is _MISSING:
+                missing[key] = request
+            else:
+                results[key] = value
+        # Successes are cached as they come, so that a failed request does not throw away the rest of the batch.
+        results.update(self.fetcher.gather(missing, on_result=self.cache.set))
+        return results
+
+    def options(self, symbols:Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+        """Expiration dates of every symbol, fetched concurrently."""
+
+        return {key[1]: value for key, value in self._gather({('options', symbol): (self._options, (symbol,)) for symbol in symbols}).items()}
+
+    def option_chains(self, expirations:Mapping[str, Sequence[str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches the chain of every expiration of every symbol once, all concurrently.
+
+        Parameters
+        ----------
+        expirations : Mapping[str, Sequence[str]]
+            Expiration dates by symbol.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            The yfinance chain, with its `calls` and `puts`, by symbol and expiration.
+        """
+
+        requests = {('chain', symbol, expiration): (self._option_chain, (symbol, expiration)) for symbol, dates in expirations.items() for expiration in dates}
+        chains = {symbol: {} for symbol in expirations}
+        for (_, symbol, expiration), chain in self._gather(requests).items():
+            chains[symbol][expiration] = chain
+        return chains
+
+    def histories(self, symbols:Iterable[str], period:str='1y') -> Dict[str, Any]:
+        """Price history of every symbol, fetched concurrently."""
+
+        return {key[1]: value for key, value in self._gather({('history', symbol, period): (self._history, (symbol, period)) for symbol in symbols}).items()}
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    client = YahooClient()
+    expirations = {symbol: dates[:3] for symbol, dates in client.options(['AAPL', 'MSFT']).items()}
+    tic = time.perf_counter()
+    chains = client.option_chains(expirations)
+    print(f'Fetched {sum(len(x) for x in chains.values())} chains in {time.perf_counter() - tic:.2f} s.')
@@ -0,0 +1,283 @@
+"""Streaming implied volatility and Greeks over option chain files larger than memory.
+
+Files are read chunk by chunk, normalized to the `calls`/`puts` schema of yfinance used by the app pages,
+solved with the batched solvers, and appended to a Parquet file, so memory stays bounded by the chunk size.
+Run it with `dfin stream`.
+"""
+
+import pathlib
+import time
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import torch
+
+from dfin.optimize import bracketed_newton
+from dfin.options import bs_torch, iv_torch
+from dfin.options.bridge import to_tensor
+
+
+# Alternative spellings of the schema columns found in vendor files, compared case-insensitively.
+ALIASES = {
+    'contractSymbol': ['contract', 'symbol', 'optionSymbol', 'option_symbol'],
+    'kind': ['type', 'optionType', 'option_type', 'putCall', 'put_call', 'cp_flag', 'right'],
+    'quoteDate': ['quote_date', 'date', 'tradeDate', 'trade_date', 'timestamp', 'lastTradeDate'],
+    'expiration': ['expiry', 'expiration_date', 'expirationDate', 'exdate', 'maturity'],
+    'underlyingPrice': ['underlying_price', 'underlyingLast', 'underlying_last', 'spot', 'S'],
+    'strike': ['strike_price', 'strikePrice', 'K'],
+    'lastPrice': ['last', 'last_price', 'close'],
+    'bid': ['bid_price', 'best_bid'],
+    'ask': ['ask_price', 'best_offer', 'offer'],
+    'volume': ['vol', 'trade_volume'],
+    'openInterest': ['open_interest', 'oi'],
+    'impliedVolatility': ['iv', 'implied_volatility', 'impl_volatility'],
+    'rate': ['r', 'riskFreeRate', 'risk_free_rate'],
+    't': ['timeToExpiry', 'time_to_expiry', 'tau'],
+}
+
+# Output schema: the yfinance columns, plus the inputs and results of the solve.
+COLUMNS = {
+    'contractSymbol': 'string',
+    'kind': 'string',
+    'quoteDate': 'datetime64[ns]',
+    'expiration': 'datetime64[ns]',
+    'underlyingPrice': 'float64',
+    'strike': 'float64',
+    'lastPrice': 'float64',
+    'bid': 'float64',
+    'ask': 'float64',
+    'volume': 'float64',
+    'openInterest': 'float64',
+    'inTheMoney': 'bool',
+    'rate': 'float64',
+    't': 'float64',
+    'price': 'float64',
+    'impliedVolatility': 'float64',
+    'converged': 'bool',
+    'delta': 'float64',
+    'gamma': 'float64',
+    'vega': 'float64',
+    'theta': 'float64',
+    'rho': 'float64',
+}
+
+_KINDS = {'c': 'call', 'call': 'call', 'calls': 'call', 'p': 'put', 'put': 'put', 'puts': 'put'}
+
+
+def read_chunks(paths:Union[str, pathlib.Path, Sequence[Union[str, pathlib.Path]]], chunksize:int=100000, columns:Optional[Sequence[str]]=None) -> Iterator[pd.DataFrame]:
+    """
+    Reads CSV and Parquet files lazily, one chunk of rows at a time.
+
+    Parameters
+    ----------
+    paths : str or Sequence[str]
+        Files to read, in order. The format follows the suffix: ".parquet"/".pq" or anything else as CSV.
+    chunksize : int
+        Maximum number of rows per chunk. Default: 100000.
+    columns : Sequence[str], optional
+        Only read these columns.
+
+    Yields
+    ------
+    pd.DataFrame
+        The next chunk of rows.
+    """
+
+    if isinstance(paths, (str, pathlib.Path)):
+        paths = [paths]
+    for path in paths:
+        path = pathlib.Path(path)
+        if path.suffix.lower() in ('.parquet', '.pq'):
+            import pyarrow.parquet as pq
+            with pq.ParquetFile(path) as parquet:
+                for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+                    yield batch.to_pandas()
+        else:
+            with pd.read_csv(path, chunksize=chunksize, usecols=columns) as reader:
+                yield from reader
+
+
+def normalize(frame:pd.DataFrame, kind:Optional[str]=None, aliases:Optional[Dict[str, Iterable[str]]]=None) -> pd.DataFrame:
+    """
+    Renames and converts the columns of a chain to the schema of `COLUMNS`.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Option chain with any of the spellings in `ALIASES`.
+    kind : str, optional
+        "call" or "put" for files without a column telling them apart, e.g. the `calls` of a yfinance chain.
+    aliases : Dict[str, Iterable[str]], optional
+        Further spellings, merged into `ALIASES`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Chain with the schema columns that could be found or derived.
+        Time to expiry "t" is derived, in years, from "quoteDate" and "expiration" unless given.
+    """
+
+    lookup = {}
+    for column, spellings in ALIASES.items():
+        for spelling in list(spellings) + list((aliases or {}).get(column, [])) + [column]:
+            lookup[spelling.lower()] = column
+    renames = {}
+    for name in frame.columns:
+        column = lookup.get(str(name).lower())
+        # The first match wins, e.g. "quote_date" over "lastTradeDate".
+        if column is not None and column not in renames.values() and (name == column or column not in frame.columns):
+            renames[name] = column
+    frame = frame[list(renames)].rename(columns=renames)
+
+    if kind is not None:
+        frame['kind'] = kind
+    if 'kind' in frame:
+        frame['kind'] = frame['kind'].astype(str).str.strip().str.lower().map(_KINDS)
+    for column in ('quoteDate', 'expiration'):
+        if column in frame:
+            frame[column] = pd.to_datetime(frame[column], utc=True).dt.tz_localize(None)
+    if 't' not in frame and 'quoteDate' in frame and 'expiration' in frame:
+        frame['t'] = (frame['expiration'] - frame['quoteDate']).dt.total_seconds() / (365 * 24 * 3600)
+    if 'inTheMoney' not in frame and {'kind', 'underlyingPrice', 'strike'} <= set(frame):
+        call = frame['kind'] == 'call'
+        frame['inTheMoney'] = np.where(call, frame['underlyingPrice'] > frame['strike'], frame['underlyingPrice'] < frame['strike'])
+    return frame
+
+
+def process_chunk(frame:pd.DataFrame, r:float=0.05, price:str='mid', atol:float=1e-8, max_iter:int=100) -> pd.DataFrame:
+    """
+    Solves the implied volatility and Greeks of every row of a normalized chain.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Chain normalized by `normalize`, with at least "kind", "underlyingPrice", "strike", "t" and a price.
+    r : float
+        Risk-free interest rate, unless the chain has a "rate" column. Default: 0.05.
+    price : str
+        "mid" for the midpoint of bid and ask, falling back to "lastPrice" where either is missing,
+        or the name of the price column to use. Default: "mid".
+    atol : float
+        The tolerance of the solver on the price. Default: 1e-8.
+    max_iter : int
+        The maximum number of iterations of the solver. Default: 100.
+
+    Returns
+    -------
+    pd.DataFrame
+        The chain with the columns of `COLUMNS`, in that order. Missing inputs are null.
+        Implied volatility and Greeks are NaN where the price violates the no-arbitrage bounds.
+    """
+
+    frame = frame.copy()
+    if 'rate' not in frame:
+        frame['rate'] = r
+    if price == 'mid':
+        mid = (frame['bid'] + frame['ask']) / 2 if {'bid', 'ask'} <= set(frame) else np.nan
+        valid = (frame['bid'] > 0) & (frame['ask'] > 0) if {'bid', 'ask'} <= set(frame) else False
+        fallback = frame['lastPrice'] if 'lastPrice' in frame else np.nan
+        frame['price'] = np.where(valid, mid, fallback)
+    else:
+        frame['price'] = frame[price]
+
+    S, K, rate, t, target = (to_tensor(frame[column]) for column in ('underlyingPrice', 'strike', 'rate', 't', 'price'))
+    sigma = torch.full_like(S, float('nan'))
+    converged = torch.zeros(S.shape, dtype=torch.bool)
+    greeks = {name: torch.full_like(S, float('nan')) for name in ('delta', 'gamma', 'vega', 'theta', 'rho')}
+    kinds = frame['kind'].to_numpy()
+
+    for kind, solver in (('call', iv_torch.call_implied_volatility), ('put', iv_torch.put_implied_volatility)):
+        mask = torch.from_numpy(kinds == kind)
+        if not torch.any(mask):
+            continue
+        inputs = [x[mask] for x in (S, K, rate, t, target)]
+        result = solver(*inputs, torch.tensor(0.5, dtype=torch.float64), bracketed_newton, atol, max_iter)
+        sigma[mask] = result.x
+        converged[mask] = result.converged
+        values = bs_torch.greeks(*inputs[:4], result.x, kind=kind)
+        for name in greeks:
+            greeks[name][mask] = getattr(values, name)
+
+    frame['impliedVolatility'] = sigma.numpy()
+    frame['converged'] = converged.numpy()
+    for name, values in greeks.items():
+        frame[name] = values.numpy()
+
+    for column, dtype in COLUMNS.items():
+        if column not in frame:
+            frame[column] = pd.Series(pd.NA if dtype in ('string', 'bool') else np.nan, index=frame.index)
+        if dtype == 'bool':
+            frame[column] = frame[column].astype('boolean')
+        else:
+            frame[column] = frame[column].astype(dtype)
+    return frame[list(COLUMNS)]
+
+
+def stream(paths:Union[str, Sequence[str]], output:Optional[str]=None, chunksize:int=100000, kind:Optional[str]=None, r:float=0.05, price:str='mid', atol:float=1e-8, max_iter:int=100, verbose:bool=False) -> Iterator[pd.DataFrame]:
+    """
+    Reads, normalizes and solves option chain files chunk by chunk, optionally appending the results to a Parquet file.
+
+    Nothing happens until the generator is consumed. Only one chunk is held in memory at a time.
+
+    Parameters
+    ----------
+    paths : str or Sequence[str]
+        CSV and Parquet files to read, in order.
+    output : str, optional
+        Parquet file to stream the results into. Overwritten if it exists.
+    chunksize : int
+        Maximum number of rows per chunk. Default: 100000.
+    kind : str, optional
+        "call" or "put" for files without a column telling them apart.
+    r : float
+        Risk-free interest rate, unless the files have a rate column. Default: 0.05.
+    price : str
+        "mid" or the name of the price column to use. Default: "mid".
+    atol : float
+        The tolerance of the solver on the price. Default: 1e-8.
+    max_iter : int
+        The maximum number of iterations of the solver. Default: 100.
+    verbose : bool
+        Print progress after every chunk.
+
+    Yields
+    ------
+    pd.DataFrame
+        Every solved chunk, as returned by `process_chunk`.
+    """
+
+    writer = None
+    rows = 0
+    tic = time.perf_counter()
+    try:
+        for i, chunk in enumerate(read_chunks(paths, chunksize)):
+            chunk = process_chunk(normalize(chunk, kind), r, price, atol, max_iter)
+            if output is not None:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    pathlib.Path(output).parent.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+            if verbose:
+                print(f'Chunk {i}: {len(chunk)} rows, {rows} in total after {time.perf_counter() - tic:.2f} s')
+            yield chunk
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main(args) -> int:
+    """Runs `dfin stream` from parsed command-line arguments. Returns the exit code."""
+
+    output = args.stream_output if args.stream_output else (pathlib.Path(args.output_path) / 'stream.parquet').as_posix()
+    rows = 0
+    failed = 0
+    for chunk in stream(args.inputs, output, args.chunksize, args.kind, args.rate, args.price, verbose=True):
+        rows += len(chunk)
+        failed += int((~chunk['converged'].fillna(False)).sum())
+    print(f'{rows} contracts written to {output}, {failed} without an implied volatility')
+    return 0
@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dfin.data.cache import *
+from dfin.options.chain import OptionChain
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_misses_and_expiry():
+    clock = Clock()
+    cache = TTLCache(ttl=10., clock=clock)
+    assert np.isnan(cache.stats().hit_rate)
+    assert cache.get('a') is None
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=100.)
+    assert cache.get('a') == 1 and 'a' in cache
+    clock.now = 10.
+    assert cache.get('a', 'gone') == 'gone'
+    assert cache.get('b') == 2
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.expired, stats.entries) == (2, 2, 1, 1)
+    assert stats.hit_rate == 0.5
+
+
+def test_remaining():
+    clock = Clock()
+    cache = TTLCache(ttl=10., clock=clock)
+    cache.set('a', 1)
+    clock.now = 4.
+    assert cache.remaining('a') == 6.
+    assert cache.remaining('b') is None
+    clock.now = 10.
+    assert cache.remaining('a') is None
+    assert cache.stats().hits == cache.stats().misses == 0
+
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = TTLCache(maxsize=2, max_bytes=None)
+    for key in 'abc':
+        cache.set(key, key)
+    assert 'a' not in cache and len(cache) == 2
+
+    array = np.zeros(1000)
+    cache = TTLCache(max_bytes=2 * array.nbytes + 100)
+    cache.set('x', array)
+    cache.set('y', array.copy())
+    cache.get('x')
+    cache.set('z', array.copy())
+    assert 'x' in cache and 'y' not in cache and 'z' in cache
+    assert cache.stats().evictions == 1
+    assert cache.bytes == 2 * array.nbytes
+    # Too large to ever fit.
+    cache.set('huge', np.zeros(10000))
+    assert 'huge' not in cache and len(cache) == 2
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache()
+    for symbol in ('AAPL', 'MSFT'):
+        cache.set(('chain', symbol, '2024-06-21'), 1)
+        cache.set(('history', symbol, '1y'), 2)
+    assert cache.invalidate(('chain', 'AAPL', '2024-06-21')) == 1
+    assert cache.invalidate(lambda key: key[1] == 'MSFT') == 2
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0 and cache.stats().misses == 0
+
+
+def test_get_or_set():
+    cache = TTLCache()
+    calls = []
+    load = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_set('k', load) == 1
+    assert cache.get_or_set('k', load) == 1
+    assert len(calls) == 1
+
+
+def test_sizeof():
+    frame = pd.DataFrame({'strike': np.arange(100.), 'symbol': ['X'] * 100})
+    assert sizeof(frame) >= frame.memory_usage(deep=True).sum()
+    assert sizeof((frame, frame)) >= 2 * sizeof(frame)
+    chain = OptionChain.from_frames({'2024-06-21': (frame[['strike']], None)}, t={'2024-06-21': 0.5})
+    assert sizeof(chain) > chain.strike.nbytes
+
+
+def test_thread_safety():
+    cache = TTLCache(maxsize=50)
+
+    def work(offset):
+        for i in range(1000):
+            cache.set((offset, i % 100), i)
+            cache.get((offset, (i * 7) % 100))
+
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats.entries == 50
+    assert stats.hits + stats.misses == 4000
+
+
+def speed_comparison():
+
+    import timeit
+
+    frame = pd.DataFrame({'strike': np.arange(500.), 'lastPrice': np.ones(500)})
+    cache = TTLCache()
+    cache.set('chain', frame)
+    time_taken = min(timeit.Timer(lambda: cache.get('chain')).repeat(repeat=5, number=10000)) / 10000
+    print(f'A cache hit takes {time_taken*1e6:.2f} us.')
+    time_taken = min(timeit.Timer(lambda: cache.set('chain', frame)).repeat(repeat=5, number=1000)) / 1000
+    print(f'Storing a {len(frame)} row chain takes {time_taken*1e6:.2f} us.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
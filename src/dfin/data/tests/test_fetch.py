@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dfin.data.cache import TTLCache
+from dfin.data.fetch import *
+
+
+LATENCY = 0.1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves a small JSON document per path after a fixed latency, counting the hits of every path."""
+
+    def do_GET(self):
+        self.server.hits[self.path] += 1
+        time.sleep(LATENCY)
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+            return
+        body = json.dumps({'path': self.path, 'strikes': [90., 100., 110.]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.hits = Counter()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return f'http://127.0.0.1:{server.server_address[1]}{path}'
+
+
+def fetch_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+def test_requests_run_concurrently(server):
+    paths = [f'/concurrent/{i}' for i in range(8)]
+    with Fetcher(max_workers=8) as fetcher:
+        tic = time.perf_counter()
+        results = fetcher.gather({path: (fetch_json, (url(server, path),)) for path in paths})
+        elapsed = time.perf_counter() - tic
+    assert [results[path]['path'] for path in paths] == paths
+    assert elapsed < 4 * LATENCY
+
+
+def test_in_flight_requests_are_deduplicated(server):
+    with Fetcher(max_workers=4) as fetcher:
+        futures = [fetcher.submit('same', fetch_json, url(server, '/dedupe')) for _ in range(5)]
+        assert len({id(future) for future in futures}) == 1
+        assert futures[0].result()['path'] == '/dedupe'
+        assert (fetcher.requests, fetcher.deduplicated) == (1, 4)
+        assert server.hits['/dedupe'] == 1
+        # Finished requests are not cached.
+        fetcher.submit('same', fetch_json, url(server, '/dedupe')).result()
+    assert server.hits['/dedupe'] == 2
+
+
+def test_rate_limiter(server):
+    limiter = RateLimiter(4, period=0.4)
+    with Fetcher(max_workers=8, limiter=limiter) as fetcher:
+        tic = time.perf_counter()
+        fetcher.gather({i: (fetch_json, (url(server, f'/limited/{i}'),)) for i in range(8)})
+        elapsed = time.perf_counter() - tic
+    # A burst of 4, then 4 more at 0.1 s intervals.
+    assert elapsed >= 0.35
+
+
+def test_errors_are_raised(server):
+    with Fetcher() as fetcher:
+        with pytest.raises(urllib.error.HTTPError):
+            fetcher.gather({'ok': (fetch_json, (url(server, '/ok'),)), 'missing': (fetch_json, (url(server, '/missing'),))})
+
+
+def test_yahoo_client(server):
+
+    class StubTicker:
+        def __init__(self, symbol):
+            self.symbol = symbol
+            self.options = ('2024-03-15', '2024-06-21')
+
+        def option_chain(self, expiration):
+            return fetch_json(url(server, f'/chain/{self.symbol}/{expiration}'))
+
+        def history(self, period):
+            return fetch_json(url(server, f'/history/{self.symbol}/{period}'))
+
+    client = YahooClient()
+    client._tickers = {symbol: StubTicker(symbol) for symbol in ('AAPL', 'MSFT')}
+    expirations = client.options(['AAPL', 'MSFT'])
+    assert expirations['MSFT'] == ('2024-03-15', '2024-06-21')
+
+    tic = time.perf_counter()
+    chains = client.option_chains(expirations)
+    elapsed = time.perf_counter() - tic
+    assert chains['AAPL']['2024-06-21']['path'] == '/chain/AAPL/2024-06-21'
+    assert elapsed < 3 * LATENCY
+    # Every chain is fetched once.
+    assert all(server.hits[f'/chain/{symbol}/{expiration}'] == 1 for symbol in expirations for expiration in expirations[symbol])
+    assert client.histories(['AAPL'])['AAPL']['path'] == '/history/AAPL/1y'
+    client.fetcher.close()
+
+
+def test_yahoo_client_cache(server):
+
+    class StubTicker:
+        options = ('2024-03-15',)
+
+        def option_chain(self, expiration):
+            return fetch_json(url(server, f'/cached/{expiration}'))
+
+    client = YahooClient(cache=TTLCache(ttl=60.))
+    client._tickers = {'AAPL': StubTicker()}
+    for _ in range(3):
+        chains = client.option_chains({'AAPL': ['2024-03-15']})
+    assert chains['AAPL']['2024-03-15']['path'] == '/cached/2024-03-15'
+    assert server.hits['/cached/2024-03-15'] == 1
+    assert client.cache.stats().hits == 2
+    client.cache.invalidate(lambda key: key[1] == 'AAPL')
+    client.option_chains({'AAPL': ['2024-03-15']})
+    assert server.hits['/cached/2024-03-15'] == 2
+    client.fetcher.close()
+
+
+class FakeTicker:
+    """Answers from memory, counting the requests of every expiration."""
+
+    def __init__(self, symbol, calls):
+        self.symbol = symbol
+        self.calls = calls
+        self.options = ('2024-03-15', '2024-06-21')
+
+    def option_chain(self, expiration):
+        self.calls[self.symbol, expiration] += 1
+        if expiration == 'bad':
+            raise ValueError(f'No chain for {self.symbol} on {expiration}.')
+        return {'symbol': self.symbol, 'expiration': expiration}
+
+
+def fake_client(cache=None):
+    calls = Counter()
+    client = YahooClient(cache=cache)
+    client._tickers = {symbol: FakeTicker(symbol, calls) for symbol in ('AAPL', 'MSFT')}
+    return client, calls
+
+
+def test_gather_with_cache():
+    client, calls = fake_client(TTLCache(ttl=60.))
+    client.cache.set(('chain', 'AAPL', '2024-03-15'), 'cached')
+    requests = {('chain', 'AAPL', expiration): (client._option_chain, ('AAPL', expiration)) for expiration in ('2024-03-15', '2024-06-21')}
+    results = client._gather(requests)
+    # Only the missing key is fetched, then cached.
+    assert results[('chain', 'AAPL', '2024-03-15')] == 'cached'
+    assert results[('chain', 'AAPL', '2024-06-21')] == {'symbol': 'AAPL', 'expiration': '2024-06-21'}
+    assert calls == Counter({('AAPL', '2024-06-21'): 1})
+    assert client.cache.get(('chain', 'AAPL', '2024-06-21')) == results[('chain', 'AAPL', '2024-06-21')]
+    assert client._gather(requests) == results
+    assert calls[('AAPL', '2024-06-21')] == 1
+    assert client.fetcher.requests == 1
+    client.fetcher.close()
+
+
+def test_gather_failure_is_not_cached():
+    client, calls = fake_client(TTLCache(ttl=60.))
+    with pytest.raises(ValueError):
+        client.option_chains({'AAPL': ['2024-03-15', 'bad']})
+    assert client.cache.get(('chain', 'AAPL', 'bad')) is None
+    # The request that succeeded is cached all the same.
+    assert client.cache.get(('chain', 'AAPL', '2024-03-15')) == {'symbol': 'AAPL', 'expiration': '2024-03-15'}
+    assert client.option_chains({'AAPL': ['2024-03-15']}) == {'AAPL': {'2024-03-15': {'symbol': 'AAPL', 'expiration': '2024-03-15'}}}
+    assert calls[('AAPL', '2024-03-15')] == 1
+    with pytest.raises(ValueError):
+        client.option_chains({'AAPL': ['bad']})
+    assert calls[('AAPL', 'bad')] == 2
+    client.fetcher.close()
+
+
+def test_option_chains_with_fake_ticker():
+    client, calls = fake_client()
+    chains = client.option_chains({'AAPL': ['2024-03-15', '2024-06-21'], 'MSFT': ['2024-06-21'], 'TSLA': []})
+    assert chains == {
+        'AAPL': {expiration: {'symbol': 'AAPL', 'expiration': expiration} for expiration in ('2024-03-15', '2024-06-21')},
+        'MSFT': {'2024-06-21': {'symbol': 'MSFT', 'expiration': '2024-06-21'}},
+        'TSLA': {},
+    }
+    assert set(calls.values()) == {1}
+    client.fetcher.close()
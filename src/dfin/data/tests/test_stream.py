@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dfin.data.stream import *
+from dfin.main import main_cli
+from dfin.options import bs_numpy
+
+
+@pytest.fixture
+def vendor_frame():
+    # Columns spelled as in a typical end-of-day vendor file.
+    size = 250
+    rng = np.random.default_rng(0)
+    kind = np.where(np.arange(size) % 2 == 0, 'C', 'P')
+    strike = rng.uniform(80, 120, size).round(1)
+    t = rng.uniform(0.1, 2, size)
+    sigma = rng.uniform(0.1, 0.5, size)
+    call, put = bs_numpy.call_put_price(100., strike, 0.05, t, sigma)
+    mid = np.where(kind == 'C', call, put)
+    quote_date = pd.Timestamp('2023-01-03')
+    frame = pd.DataFrame({
+        'quote_date': quote_date,
+        'expiry': quote_date + pd.to_timedelta(t * 365 * 24 * 3600, unit='s'),
+        'option_type': kind,
+        'underlying_price': 100.,
+        'strike_price': strike,
+        'bid_price': mid - 0.01,
+        'ask_price': mid + 0.01,
+        'last': mid,
+        'open_interest': 10,
+        'vendor_only': 'ignored',
+    })
+    return frame, sigma
+
+
+def test_normalize(vendor_frame):
+    frame, sigma = vendor_frame
+    normalized = normalize(frame)
+    assert set(normalized.columns) == {'quoteDate', 'expiration', 'kind', 'underlyingPrice', 'strike', 'bid', 'ask', 'lastPrice', 'openInterest', 't', 'inTheMoney'}
+    assert set(normalized['kind']) == {'call', 'put'}
+    assert normalized['t'].between(0.1, 2).all()
+
+
+def test_normalize_yfinance():
+    # The `calls` of a yfinance chain, with no column telling calls and puts apart.
+    calls = pd.DataFrame({
+        'contractSymbol': ['X'], 'lastTradeDate': [pd.Timestamp('2023-01-03', tz='UTC')], 'strike': [100.], 'lastPrice': [5.],
+        'bid': [4.9], 'ask': [5.1], 'volume': [1], 'openInterest': [2], 'impliedVolatility': [0.2], 'inTheMoney': [False],
+    })
+    normalized = normalize(calls, kind='call')
+    assert normalized['kind'].tolist() == ['call']
+    assert normalized['quoteDate'].dt.tz is None
+
+
+def test_process_chunk(vendor_frame):
+    frame, sigma = vendor_frame
+    # Violates the no-arbitrage bounds.
+    frame.loc[3, ['bid_price', 'ask_price']] = 150.
+    result = process_chunk(normalize(frame))
+    assert list(result.columns) == list(COLUMNS)
+    assert np.isnan(result['impliedVolatility'][3])
+    assert not result['converged'][3]
+    valid = np.arange(len(frame)) != 3
+    np.testing.assert_allclose(result['impliedVolatility'][valid], sigma[valid], rtol=1e-6)
+    assert (result.loc[result['kind'] == 'call', 'delta'].dropna() > 0).all()
+    assert (result.loc[result['kind'] == 'put', 'delta'].dropna() < 0).all()
+    assert result['contractSymbol'].isna().all()
+
+
+def test_process_chunk_last_price(vendor_frame):
+    frame, sigma = vendor_frame
+    frame['bid_price'] = 0.
+    result = process_chunk(normalize(frame))
+    # No valid quotes, so every row falls back to the last price.
+    np.testing.assert_array_equal(result['price'], frame['last'])
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet'])
+def test_stream(tmp_path, vendor_frame, suffix):
+    frame, sigma = vendor_frame
+    paths = []
+    for i, part in enumerate((frame[:100], frame[100:])):
+        path = tmp_path / f'part{i}{suffix}'
+        if suffix == '.csv':
+            part.to_csv(path, index=False)
+        else:
+            part.to_parquet(path, index=False)
+        paths.append(path)
+
+    output = tmp_path / 'out.parquet'
+    chunks = list(stream(paths, output, chunksize=40))
+    # 100 rows make 3 chunks of at most 40, 150 rows make 4.
+    assert [len(chunk) for chunk in chunks] == [40, 40, 20, 40, 40, 40, 30]
+    result = pd.read_parquet(output)
+    assert len(result) == len(frame)
+    np.testing.assert_allclose(result['impliedVolatility'], sigma, rtol=1e-6)
+
+
+def test_cli(tmp_path, vendor_frame):
+    frame, sigma = vendor_frame
+    path = tmp_path / 'chain.csv'
+    frame.to_csv(path, index=False)
+    output = tmp_path / 'out.parquet'
+    assert main_cli(['stream', str(path), '--stream-output', str(output), '--chunksize', '64']) == 0
+    assert len(pd.read_parquet(output)) == len(frame)
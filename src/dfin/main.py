@@ -48,6 +48,112 @@ def parse_arguments(args:List[str]) -> argparse.Namespace:
         '--start',
         action='store_true'
     )
+
+    subparsers = parser.add_subparsers(dest='command')
+
+    bench = subparsers.add_parser(
+        'bench',
+        help='Benchmark the pricers and implied volatility solvers.'
+    )
+    bench.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=None,
+        help='Batch sizes to time. Default: `bench.DEFAULT_SIZES`, from 1 to 1000000.'
+    )
+    bench.add_argument(
+        '--dtypes',
+        type=str,
+        nargs='+',
+        choices=['float32', 'float64'],
+        default=None,
+        help='Floating point precisions to time. Default: `bench.DEFAULT_DTYPES`, float32 and float64.'
+    )
+    bench.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Timed runs per case, of which the best is reported. Default: 5.'
+    )
+    bench.add_argument(
+        '--max-loop-size',
+        type=int,
+        default=10000,
+        help='Largest batch the pure Python backends loop over. Default: 10000.'
+    )
+    bench.add_argument(
+        '--filter',
+        type=str,
+        default=None,
+        help='Only run cases whose name or backend contains this substring.'
+    )
+    bench.add_argument(
+        '--compiled',
+        action='store_true',
+        help='Also time the TorchScript and torch.compile kernels of `bs_compiled`. Compiling takes a while.'
+    )
+    bench.add_argument(
+        '--bench-output',
+        type=str,
+        default=None,
+        help='JSON file to write the results to. Default: "<output-path>/bench.json".'
+    )
+    bench.add_argument(
+        '--compare',
+        type=str,
+        default=None,
+        help='Baseline JSON file to check for regressions against. Exits with 1 if any are found.'
+    )
+    bench.add_argument(
+        '--threshold',
+        type=float,
+        default=1.2,
+        help='Slowdown ratio that counts as a regression. Default: 1.2.'
+    )
+
+    stream = subparsers.add_parser(
+        'stream',
+        help='Compute implied volatilities and Greeks of option chain files chunk by chunk.'
+    )
+    stream.add_argument(
+        'inputs',
+        type=str,
+        nargs='+',
+        help='CSV or Parquet files of option chains.'
+    )
+    stream.add_argument(
+        '--stream-output',
+        type=str,
+        default=None,
+        help='Parquet file to write the results to. Default: "<output-path>/stream.parquet".'
+    )
+    stream.add_argument(
+        '--chunksize',
+        type=int,
+        default=100000,
+        help='Rows per chunk, which bounds the memory used. Default: 100000.'
+    )
+    stream.add_argument(
+        '--kind',
+        type=str,
+        choices=['call', 'put'],
+        default=None,
+        help='Option kind of every row, for files without a column telling calls and puts apart.'
+    )
+    stream.add_argument(
+        '--rate',
+        type=float,
+        default=0.05,
+        help='Risk-free interest rate, unless the files have a rate column. Default: 0.05.'
+    )
+    stream.add_argument(
+        '--price',
+        type=str,
+        default='mid',
+        help='"mid" for the bid-ask midpoint, falling back to the last price, or the name of a price column. Default: "mid".'
+    )
+
     return parser.parse_args(args)
 
 
@@ -69,6 +175,16 @@ def main_cli(args:Optional[List[str]]=None):
         print('==============================')
         print('                              ')
 
+    exit_code = None
+
+    if args.command == 'bench':
+        from dfin import bench
+        exit_code = bench.main(args)
+
+    if args.command == 'stream':
+        from dfin.data import stream
+        exit_code = stream.main(args)
+
     if args.start:
         import streamlit.web.bootstrap
         app_path = pathlib.Path(__file__).parent / 'app' / '💰_dFin.py'
@@ -86,6 +202,8 @@ def main_cli(args:Optional[List[str]]=None):
         print('=====   End of program   =====')
         print('==============================')
 
+    return exit_code
+
 
 
 if __name__ == "__main__":
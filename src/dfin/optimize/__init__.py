@@ -1,13 +1,33 @@
-from dfin.optimize.gradient_descent import gradient_descent
+from dfin.optimize.batched import BatchedRootResult
+from dfin.optimize.gradient_descent import gradient_descent, batched_gradient_descent
 from dfin.optimize.lbfgs import lbfgs
-from dfin.optimize.secant import secant
-from dfin.optimize.newton import newton
-from dfin.optimize.halley import halley
+from dfin.optimize.secant import secant, batched_secant
+from dfin.optimize.newton import newton, batched_newton
+from dfin.optimize.halley import halley, batched_halley
+from dfin.optimize.bracketed_newton import bracketed_newton
+from dfin.optimize.least_squares import LeastSquaresResult, least_squares, pad
+from dfin.optimize.profiling import SolverReport, enable_profiling, disable_profiling, reset_profile, get_profile, profiling, label
 
 __all__ = [
+    'BatchedRootResult',
     'gradient_descent',
     'lbfgs',
     'secant',
     'newton',
     'halley',
+    'batched_gradient_descent',
+    'batched_secant',
+    'batched_newton',
+    'batched_halley',
+    'bracketed_newton',
+    'LeastSquaresResult',
+    'least_squares',
+    'pad',
+    'SolverReport',
+    'enable_profiling',
+    'disable_profiling',
+    'reset_profile',
+    'get_profile',
+    'profiling',
+    'label',
 ]
@@ -0,0 +1,52 @@
+"""Shared helpers for the batched (vectorized) root finders."""
+import torch
+from typing import Callable, NamedTuple
+
+
+class BatchedRootResult(NamedTuple):
+    """Result of a batched root-finding.
+
+    Attributes
+    ----------
+    x : torch.Tensor
+        Root of each element. Elements that did not converge hold their last iterate.
+    iterations : torch.Tensor
+        Number of update steps spent on each element.
+    converged : torch.Tensor
+        Whether each element reached the tolerance.
+    """
+    x: torch.Tensor
+    iterations: torch.Tensor
+    converged: torch.Tensor
+
+
+def initial_batch(func:Callable[[torch.Tensor],torch.Tensor], x0) -> torch.Tensor:
+    """
+    Prepares a detached copy of the initial guess with the same shape and dtype as the objective's output.
+
+    A scalar `x0` is broadcast against the objective, so one guess can seed a whole option chain.
+
+    Parameters
+    ----------
+    func : Callable
+        Objective function.
+    x0 : torch.Tensor
+        Initial guess for root.
+
+    Returns
+    -------
+    torch.Tensor
+        Initial guess of every element.
+    """
+
+    if torch.is_tensor(x0):
+        x = x0.clone().detach()
+    else:
+        x = torch.tensor(x0)
+    with torch.no_grad():
+        f = func(x)
+    if x.shape != f.shape:
+        x = x.expand(torch.broadcast_shapes(x.shape, f.shape)).clone()
+    if f.is_floating_point() and x.dtype != f.dtype:
+        x = x.to(f.dtype)
+    return x
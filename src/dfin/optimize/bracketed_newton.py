@@ -0,0 +1,118 @@
+"""Root-finding using Newton's method safeguarded by a bracket (bisection fallback)."""
+import time
+import torch
+
+from dfin.optimize.batched import BatchedRootResult, initial_batch
+from dfin.optimize.profiling import report
+
+
+def _broadcast_bound(bound, like:torch.Tensor) -> torch.Tensor:
+    """Detached copy of a bound with the shape, dtype and device of `like`."""
+
+    bound = torch.as_tensor(bound).detach().to(dtype=like.dtype, device=like.device)
+    return bound.expand(like.shape).clone()
+
+
+def bracketed_newton(func, x0, atol:float=1e-6, max_iter:int=100, lower=1e-6, upper=10.0, fprime=None, callback=None) -> BatchedRootResult:
+    """Newton's method on a batch of independent roots, safeguarded by a bracket around each root.
+
+    Every element keeps an interval in which its objective changes sign, shrunk at every evaluation.
+    Whenever the Newton step would leave the interval, or would not shrink it fast enough, a bisection step is taken instead
+    (as in `rtsafe` of Numerical Recipes). Convergence is therefore quadratic near the root, but never worse than bisection,
+    so the worst case over a whole option chain is bounded by roughly log2((upper - lower) / resolution) iterations.
+
+    The default bounds suit implied volatility: the Black-Scholes price is increasing in sigma,
+    from the intrinsic value as sigma goes to zero, to the underlying price as sigma grows.
+    Elements whose objective does not change sign between the bounds, e.g. prices that violate the no-arbitrage bounds,
+    have no root and come back as NaN without costing a single iteration.
+
+    Parameters
+    ----------
+    func : Callable
+        Element-wise objective function.
+    x0 : torch.Tensor
+        Initial guess for roots. A scalar is broadcast against the objective.
+        Guesses outside the bracket are replaced by its midpoint.
+    atol : float
+        The tolerance of the objective. Default: 1e-6.
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    lower : torch.Tensor or float
+        Lower end of the bracket, per element or shared. Default: 1e-6.
+    upper : torch.Tensor or float
+        Upper end of the bracket, per element or shared. Default: 10.
+    fprime : Callable, optional
+        Element-wise derivative of the objective. Autograd is used if not given.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
+
+    Returns
+    -------
+    BatchedRootResult
+        Roots, per-element iteration counts and converged flags.
+        An element also counts as converged once its bracket cannot be split any further in floating point.
+    """
+
+    start = time.perf_counter()
+    x = initial_batch(func, x0)
+    lower = _broadcast_bound(lower, x)
+    upper = _broadcast_bound(upper, x)
+    iterations = torch.zeros(x.shape, dtype=torch.long, device=x.device)
+    converged = torch.zeros(x.shape, dtype=torch.bool, device=x.device)
+
+    with torch.no_grad():
+        f_lower = func(lower)
+        f_upper = func(upper)
+        valid = ((f_lower <= 0) & (f_upper >= 0)) | ((f_lower >= 0) & (f_upper <= 0))
+        # Orient each bracket so that the objective is negative at `x_neg` and positive at `x_pos`.
+        negative_at_lower = f_lower <= 0
+        x_neg = torch.where(negative_at_lower, lower, upper)
+        x_pos = torch.where(negative_at_lower, upper, lower)
+        inside = (x - x_neg) * (x - x_pos) <= 0
+        x = torch.where(inside, x, x_neg + (x_pos - x_neg) / 2)
+        step = torch.abs(x_pos - x_neg)
+        step_old = step.clone()
+
+    for i in range(max_iter):
+
+        if fprime is None:
+            x.requires_grad_(True)
+            diff = func(x)
+            # Elements are independent, so the gradient of the sum is the element-wise derivative.
+            grad, = torch.autograd.grad(diff.sum(), x)
+            diff = diff.detach()
+            x = x.detach()
+        else:
+            with torch.no_grad():
+                diff = func(x)
+                grad = fprime(x)
+
+        with torch.no_grad():
+            x_neg = torch.where(diff < 0, x, x_neg)
+            x_pos = torch.where(diff > 0, x, x_pos)
+            mid = x_neg + (x_pos - x_neg) / 2
+            # The bracket is as tight as floating point allows.
+            resolved = (mid == x_neg) | (mid == x_pos)
+            converged |= valid & ((torch.abs(diff) < atol) | resolved)
+            active = valid & ~converged
+        if not torch.any(active):
+            break
+
+        with torch.no_grad():
+            newton = x - diff / grad
+            bisect = ~torch.isfinite(newton) | ((newton - x_neg) * (newton - x_pos) >= 0) | (torch.abs(2 * diff) > torch.abs(step_old * grad))
+            step_new = torch.where(bisect, x - mid, diff / grad)
+            step_old = torch.where(active, step, step_old)
+            step = torch.where(active, step_new, step)
+            x = torch.where(active, torch.where(bisect, mid, newton), x)
+            iterations += active.long()
+
+    else:
+        # The loop ends on an update, or never ran, so measure the residual where it left off.
+        with torch.no_grad():
+            diff = func(x)
+            converged |= valid & (torch.abs(diff) < atol)
+
+    x = torch.where(valid, x, torch.full_like(x, float('nan')))
+    report('bracketed_newton', callback, start, iterations, torch.where(valid, diff, torch.zeros_like(diff)), converged)
+    return BatchedRootResult(x, iterations, converged)
@@ -1,8 +1,12 @@
 """Root-finding using gradient descent (adam)."""
+import time
 import torch
 
+from dfin.optimize.batched import BatchedRootResult, initial_batch
+from dfin.optimize.profiling import is_profiling, report
 
-def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000):
+
+def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000, callback=None):
     """Gradient descent (adam). Linear-ish convergence.
 
     Parameters
@@ -11,6 +15,8 @@ def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000):
         Objective function.
     x0 : torch.Tensor
         Initial guess for root.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
 
     Returns
     -------
@@ -18,6 +24,9 @@ def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000):
         Root.
     """
 
+    start = time.perf_counter()
+    reason = 'max_iter'
+
     # print(f'x0 is on device {x0.device}')
     if torch.is_tensor(x0):
         # x0.requires_grad = True
@@ -29,6 +38,7 @@ def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000):
     scheduler = torch.optim.lr_scheduler.ExponentialLR(optimizer, gamma=0.95)
     # print(f'Starting `gradient_descent` optimization with x0={x0.item()}:')
     # print(f'x0 is on device {x0.device}')
+    iterations = 0
 
     for i in range(max_iter):
 
@@ -38,12 +48,14 @@ def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000):
         diff = func(x0)
         # print(f'Step {i: 3d}: diff={diff.item()}')
         if torch.abs(diff) < atol:
+            reason = 'converged'
             break
 
         # loss = torch.square(diff)
         loss = diff**2
         loss.backward()
         optimizer.step()
+        iterations = i + 1
         if i % 10 == 9:
             scheduler.step()
 
@@ -54,4 +66,72 @@ def gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000):
         #     break
 
     # print(f'`gradient_descent` final x0={x0.item()}')
+    if callback is not None or is_profiling():
+        if reason != 'converged':
+            # The loop ends on an update, so measure the residual where it left off.
+            with torch.no_grad():
+                diff = func(x0)
+            if reason == 'max_iter' and torch.abs(diff) < atol:
+                reason = 'converged'
+        report('gradient_descent', callback, start, iterations, diff, reason == 'converged', reason)
     return x0
+
+
+def batched_gradient_descent(func, x0, atol:float=1e-6, max_iter:int=1000, callback=None) -> BatchedRootResult:
+    """Gradient descent (adam) on a batch of independent roots. Linear-ish convergence.
+
+    Every element is tested against `atol` on its own and frozen once it converges,
+    so a whole option chain can be solved in one call.
+
+    Parameters
+    ----------
+    func : Callable
+        Element-wise objective function.
+    x0 : torch.Tensor
+        Initial guess for roots. A scalar is broadcast against the objective.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
+
+    Returns
+    -------
+    BatchedRootResult
+        Roots, per-element iteration counts and converged flags.
+    """
+
+    start = time.perf_counter()
+    x = initial_batch(func, x0).requires_grad_(True)
+    iterations = torch.zeros(x.shape, dtype=torch.long, device=x.device)
+    converged = torch.zeros(x.shape, dtype=torch.bool, device=x.device)
+    # Adam scales each element by its own moments, so summing the losses keeps the elements independent.
+    optimizer = torch.optim.Adam([x], lr=0.2)
+    scheduler = torch.optim.lr_scheduler.ExponentialLR(optimizer, gamma=0.95)
+
+    for i in range(max_iter):
+
+        optimizer.zero_grad()
+        diff = func(x)
+        with torch.no_grad():
+            converged |= torch.abs(diff) < atol
+            active = ~converged
+        if not torch.any(active):
+            break
+
+        loss = (diff**2).sum()
+        loss.backward()
+        x_prev = x.detach().clone()
+        optimizer.step()
+        with torch.no_grad():
+            # Momentum would keep moving converged elements, so pin them back.
+            x.copy_(torch.where(active, x, x_prev))
+        iterations += active.long()
+        if i % 10 == 9:
+            scheduler.step()
+
+    else:
+        # The loop ends on an update, or never ran, so measure the residual where it left off.
+        with torch.no_grad():
+            diff = func(x)
+            converged |= torch.abs(diff) < atol
+
+    report('batched_gradient_descent', callback, start, iterations, diff, converged)
+    return BatchedRootResult(x.detach(), iterations, converged)
@@ -1,9 +1,12 @@
 """Root-finding using LBFGS."""
 import math
+import time
 import torch
 
+from dfin.optimize.profiling import is_profiling, report
 
-def lbfgs(func, x0, atol:float=1e-6, max_iter:int=1000):
+
+def lbfgs(func, x0, atol:float=1e-6, max_iter:int=1000, callback=None):
     """LBFGS. Superlinear convergence.
 
     Parameters
@@ -12,6 +15,8 @@ def lbfgs(func, x0, atol:float=1e-6, max_iter:int=1000):
         Objective function.
     x0 : torch.Tensor
         Initial guess for root.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
 
     Returns
     -------
@@ -19,6 +24,8 @@ def lbfgs(func, x0, atol:float=1e-6, max_iter:int=1000):
         Root.
     """
 
+    start = time.perf_counter()
+
     if torch.is_tensor(x0):
         # x0.requires_grad = True
         x0 = x0.clone().detach().requires_grad_(True)
@@ -27,9 +34,10 @@ def lbfgs(func, x0, atol:float=1e-6, max_iter:int=1000):
     optimizer = torch.optim.LBFGS([x0], tolerance_grad=min(math.sqrt(atol)/1e-2,1e-5), tolerance_change=min(atol/1e-3,1e-10), max_iter=max_iter)
     # print(f'Starting `lbfgs` optimization with x0={x0.item()}:')
     i = 0
+    diff = None
 
     def closure():
-        nonlocal i
+        nonlocal i, diff
         i += 1
 
         optimizer.zero_grad()
@@ -44,4 +52,11 @@ def lbfgs(func, x0, atol:float=1e-6, max_iter:int=1000):
     optimizer.step(closure)
 
     # print(f'`lbfgs` final x0={x0.item()}')
+    if callback is not None or is_profiling():
+        # LBFGS stops on its own tolerances, after the last evaluation, so measure the final residual.
+        with torch.no_grad():
+            diff = func(x0)
+        converged = bool(torch.all(torch.abs(diff) < atol))
+        reason = 'converged' if converged else 'max_iter' if i >= max_iter else 'stalled'
+        report('lbfgs', callback, start, i, diff, converged, reason)
     return x0
@@ -0,0 +1,238 @@
+"""Batched nonlinear least squares, for fitting the parameters of many independent models at once."""
+import time
+import warnings
+from typing import Callable, NamedTuple, Optional, Sequence
+
+import numpy as np
+import torch
+
+from dfin.optimize.profiling import report
+
+
+METHODS = ('lm', 'lbfgs', 'adam')
+
+# Largest Levenberg-Marquardt step of any parameter in unbounded coordinates, where 4 spans most of a bounded range.
+MAX_STEP = 4.
+
+
+class LeastSquaresResult(NamedTuple):
+    """Result of a batched least squares fit.
+
+    Attributes
+    ----------
+    x : torch.Tensor
+        Fitted parameters of each problem, of shape (batch, parameters).
+    loss : torch.Tensor
+        Sum of squared residuals of each problem at `x`.
+    iterations : torch.Tensor
+        Number of update steps spent on each problem.
+    converged : torch.Tensor
+        Whether each problem reached the tolerance before `max_iter` or the time budget ran out.
+        Problems that stalled, with no step left that decreases their loss, do not count as converged.
+    """
+    x: torch.Tensor
+    loss: torch.Tensor
+    iterations: torch.Tensor
+    converged: torch.Tensor
+
+
+def pad(sequences:Sequence, fill:float=float('nan'), dtype:torch.dtype=torch.float64) -> torch.Tensor:
+    """
+    Stacks sequences of different lengths, e.g. the quotes of several symbols, into one batch padded with `fill`.
+
+    Parameters
+    ----------
+    sequences : Sequence[ArrayLike]
+        One 1-D sequence per problem.
+    fill : float
+        Value of the padding. Default: NaN, which `least_squares` ignores as a missing residual.
+    dtype : torch.dtype
+        Default: torch.float64.
+
+    Returns
+    -------
+    torch.Tensor
+        Tensor of shape (len(sequences), longest length).
+    """
+
+    arrays = [np.asarray(x, dtype=np.float64).ravel() for x in sequences]
+    out = torch.full((len(arrays), max((len(x) for x in arrays), default=0)), fill, dtype=dtype)
+    for row, array in zip(out, arrays):
+        row[:len(array)] = torch.from_numpy(array)
+    return out
+
+
+def _to_bounded(z:torch.Tensor, lower:torch.Tensor, upper:torch.Tensor) -> torch.Tensor:
+    return lower + (upper - lower) * torch.sigmoid(z)
+
+
+def _to_unbounded(x:torch.Tensor, lower:torch.Tensor, upper:torch.Tensor) -> torch.Tensor:
+    # Starting points on a bound would sit where the gradient vanishes, so they are nudged inside.
+    fraction = ((x - lower) / (upper - lower)).clamp(1e-4, 1 - 1e-4)
+    return torch.log(fraction / (1 - fraction))
+
+
+def _jacobian(residuals:Callable, z:torch.Tensor, lower:torch.Tensor, upper:torch.Tensor):
+    """Residuals and their Jacobian in z, by forward-mode autograd along every parameter at once, shared by the whole batch."""
+
+    func = lambda z: residuals(_to_bounded(z, lower, upper))
+    tangents = torch.eye(z.shape[-1], dtype=z.dtype, device=z.device).unsqueeze(1).expand(-1, *z.shape)
+    with warnings.catch_warnings():
+        # Loading the forward-mode decompositions goes through the deprecated TorchScript on recent versions.
+        warnings.filterwarnings('ignore', message='`torch.jit.script` is deprecated')
+        primal, columns = torch.func.vmap(lambda v: torch.func.jvp(func, (z,), (v,)), out_dims=(None, -1))(tangents)
+    return primal, columns
+
+
+def _masked(r:torch.Tensor) -> torch.Tensor:
+    """Missing residuals, e.g. padding, count as zero."""
+    return torch.where(torch.isfinite(r), r, torch.zeros_like(r))
+
+
+def least_squares(residuals:Callable[[torch.Tensor], torch.Tensor], x0, lower, upper, method:str='lm', ftol:float=1e-8, atol:float=0., max_iter:int=100, time_budget:Optional[float]=None, callback=None) -> LeastSquaresResult:
+    """Minimizes the sum of squared residuals of a batch of independent problems, within box bounds.
+
+    Parameters are mapped onto their bounds through a sigmoid, so every method works unconstrained.
+    With the default Levenberg-Marquardt method, every problem has its own damping, accepts or rejects its own steps,
+    and is frozen once it converges, or once its damping blows up without any step decreasing its loss. The Jacobian of all problems is taken at once by forward-mode autograd,
+    vectorized over the parameters, so the residuals must be computed with torch ops that `torch.func.vmap` supports.
+    The `lbfgs` and `adam` methods minimize the total loss of the problems that have not converged yet
+    with the torch optimizers instead, which is fine for independent problems, since the gradient of the total
+    is the gradient of each problem. Converged problems are frozen there too.
+
+    Parameters
+    ----------
+    residuals : Callable
+        Maps parameters of shape (batch, parameters) to residuals of shape (batch, residuals).
+        NaN residuals are ignored, so ragged problems can be padded, see `pad`.
+    x0 : torch.Tensor
+        Initial parameters of shape (batch, parameters), e.g. yesterday's fit as a warm start.
+    lower : torch.Tensor or float
+        Lower bounds, per parameter or per problem and parameter.
+    upper : torch.Tensor or float
+        Upper bounds, per parameter or per problem and parameter.
+    method : str
+        Either "lm" (Levenberg-Marquardt), "lbfgs" or "adam". Default: "lm".
+    ftol : float
+        Relative decrease of the loss under which a problem counts as converged. Default: 1e-8.
+    atol : float
+        Loss under which a problem counts as converged, e.g. when the residuals cannot pin down every parameter. Default: 0.
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    time_budget : float, optional
+        Wall time in seconds after which to stop and return the best parameters so far, e.g. to fit an overnight window.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes, with the root mean squared residual of each problem.
+        Its reason is "stalled" when some Levenberg-Marquardt problem could not be improved any further.
+
+    Returns
+    -------
+    LeastSquaresResult
+        Parameters, losses, per-problem iteration counts and converged flags.
+    """
+
+    if method not in METHODS:
+        raise ValueError(f'Unknown method "{method}". Expected "lm", "lbfgs" or "adam".')
+
+    start = time.perf_counter()
+    x0 = torch.as_tensor(x0).detach()
+    x0 = x0.to(torch.float64) if not x0.is_floating_point() else x0
+    lower, upper = (torch.as_tensor(b, dtype=x0.dtype, device=x0.device).expand_as(x0) for b in (lower, upper))
+    z = _to_unbounded(x0, lower, upper)
+    batch = z.shape[0]
+    iterations = torch.zeros(batch, dtype=torch.long, device=z.device)
+    converged = torch.zeros(batch, dtype=torch.bool, device=z.device)
+    reason = None
+
+    def out_of_time() -> bool:
+        nonlocal reason
+        if time_budget is not None and time.perf_counter() - start > time_budget:
+            reason = 'time_budget'
+        return reason is not None
+
+    def losses(z:torch.Tensor) -> torch.Tensor:
+        return (_masked(residuals(_to_bounded(z, lower, upper)))**2).sum(-1)
+
+    if method == 'lm':
+        damping = torch.full((batch,), 1e-3, dtype=z.dtype, device=z.device)
+        growth = torch.full((batch,), 2., dtype=z.dtype, device=z.device)
+        stalled = torch.zeros(batch, dtype=torch.bool, device=z.device)
+        with torch.no_grad():
+            for i in range(max_iter):
+                active = ~(converged | stalled)
+                if not torch.any(active) or out_of_time():
+                    break
+                r, J = _jacobian(residuals, z, lower, upper)
+                r, J = _masked(r), _masked(J)
+                loss = (r**2).sum(-1)
+                JtJ = J.transpose(-1, -2) @ J
+                gradient = (J.transpose(-1, -2) @ r.unsqueeze(-1)).squeeze(-1)
+                diagonal = torch.diagonal(JtJ, dim1=-2, dim2=-1)
+                # Marquardt's scaling, with a floor for parameters the residuals barely depend on.
+                scaling = torch.maximum(diagonal, 1e-12 * (1 + diagonal.amax(-1, keepdim=True)))
+                scaled = JtJ + torch.diag_embed(damping.unsqueeze(-1) * scaling)
+                step = torch.linalg.solve(scaled, -gradient)
+                # Near a bound the sigmoid is flat, and the linearized step would fling the parameter across to the other bound.
+                step = step * torch.clamp(MAX_STEP / step.abs().amax(-1, keepdim=True), max=1.)
+                trial = z + step
+                trial_loss = losses(trial)
+                predicted = -(2 * (step * gradient).sum(-1) + ((J @ step.unsqueeze(-1))**2).sum((-2, -1)))
+                gain = (loss - trial_loss) / predicted
+                accepted = active & torch.isfinite(trial_loss) & (trial_loss <= loss)
+                z = torch.where(accepted.unsqueeze(-1), trial, z)
+                converged |= accepted & (((loss - trial_loss) <= ftol * loss) | (trial_loss <= atol))
+                # Problems whose damping blew up cannot be improved any further from where they are, which is no convergence.
+                stalled |= active & ~converged & (damping > 1e10)
+                # Nielsen's update: the better the linear model predicted the decrease, the less damping.
+                relaxed = damping * torch.clamp(1 - (2 * torch.nan_to_num(gain) - 1)**3, min=1/3)
+                damping = torch.where(accepted, relaxed, torch.where(active, damping * growth, damping))
+                growth = torch.where(accepted, torch.full_like(growth, 2.), torch.where(active, growth * 2, growth))
+                iterations += active.long()
+            loss = losses(z)
+        if reason is None and torch.any(stalled):
+            reason = 'stalled'
+    else:
+        z = z.clone().requires_grad_(True)
+
+        def make_optimizer():
+            if method == 'lbfgs':
+                return torch.optim.LBFGS([z], max_iter=20, line_search_fn='strong_wolfe')
+            return torch.optim.Adam([z], lr=0.05)
+
+        def closure():
+            optimizer.zero_grad()
+            # Converged problems drop out of the total, so their gradient vanishes.
+            total = torch.where(converged, torch.zeros_like(converged, dtype=z.dtype), losses(z)).sum()
+            total.backward()
+            return total
+
+        optimizer = make_optimizer()
+        previous = None
+        for i in range(max_iter):
+            if torch.all(converged) or out_of_time():
+                break
+            fixed = z.detach().clone()
+            optimizer.step(closure)
+            with torch.no_grad():
+                # Adam's momentum would keep moving converged problems, so pin them back.
+                z.copy_(torch.where(converged.unsqueeze(-1), fixed, z))
+                loss = losses(z)
+                iterations += (~converged).long()
+                newly = loss <= atol
+                if previous is not None:
+                    newly |= (previous - loss).abs() <= ftol * previous
+                newly &= ~converged
+                converged |= newly
+                previous = loss
+            if method == 'lbfgs' and torch.any(newly):
+                # The curvature pairs of LBFGS mix every problem, so it starts afresh without the converged ones.
+                optimizer = make_optimizer()
+        z = z.detach()
+        with torch.no_grad():
+            loss = losses(z)
+
+    x = _to_bounded(z, lower, upper)
+    with torch.no_grad():
+        count = torch.isfinite(residuals(x)).sum(-1).clamp(min=1)
+    report(f'least_squares_{method}', callback, start, iterations, torch.sqrt(loss / count), converged, reason)
+    return LeastSquaresResult(x, loss, iterations, converged)
@@ -1,8 +1,13 @@
 """Root-finding using Newton's method."""
+import time
+import warnings
 import torch
 
+from dfin.optimize.batched import BatchedRootResult, initial_batch
+from dfin.optimize.profiling import is_profiling, report
 
-def newton(func, x0, atol:float=1e-6, max_iter:int=1000):
+
+def newton(func, x0, atol:float=1e-6, max_iter:int=1000, callback=None):
     """Newton's method. Quadratic convergence.
 
     Parameters
@@ -11,6 +16,8 @@ def newton(func, x0, atol:float=1e-6, max_iter:int=1000):
         Objective function.
     x0 : torch.Tensor
         Initial guess for root.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
 
     Returns
     -------
@@ -18,12 +25,15 @@ def newton(func, x0, atol:float=1e-6, max_iter:int=1000):
         Root.
     """
 
+    start = time.perf_counter()
+    reason = 'max_iter'
     if torch.is_tensor(x0):
         # x0.requires_grad = True
         x0 = x0.clone().detach().requires_grad_(True)
     else:
         x0 = torch.tensor(x0, requires_grad=True)
     # print(f'Starting `newton` optimization with x0={x0.item()}:')
+    iterations = 0
 
     for i in range(max_iter):
 
@@ -31,6 +41,7 @@ def newton(func, x0, atol:float=1e-6, max_iter:int=1000):
         diff = func(x0)
         # print(f'Step {i: 3d}: diff={diff.item()}')
         if torch.abs(diff) < atol:
+            reason = 'converged'
             break
 
         # Calculate the gradient of the objective function (difference in option price).
@@ -42,15 +53,83 @@ def newton(func, x0, atol:float=1e-6, max_iter:int=1000):
         x1 = x0 - diff / grad
         # print(f'Step {i: 3d}: x1={x1.item()}')
 
+        iterations = i + 1
+
         if torch.abs(x1 - x0) < atol:
             x0 = x1.clone().detach().requires_grad_(True)
             # break
         elif torch.isinf(x1):
-            print(f'`newton` diverged!!!')
+            warnings.warn('`newton` diverged!!!', RuntimeWarning)
             x0 = x1.clone().detach().requires_grad_(True)
+            reason = 'diverged'
             break
         else:
             x0 = x1.clone().detach().requires_grad_(True)
 
     # print(f'`newton` final x0={x0.item()}')
+    if callback is not None or is_profiling():
+        if reason != 'converged':
+            # The loop ends on an update, so measure the residual where it left off.
+            with torch.no_grad():
+                diff = func(x0)
+            if reason == 'max_iter' and torch.abs(diff) < atol:
+                reason = 'converged'
+        report('newton', callback, start, iterations, diff, reason == 'converged', reason)
     return x0
+
+
+def batched_newton(func, x0, atol:float=1e-6, max_iter:int=1000, callback=None) -> BatchedRootResult:
+    """Newton's method on a batch of independent roots. Quadratic convergence.
+
+    Every element is tested against `atol` on its own and frozen once it converges,
+    so a whole option chain can be solved in one call.
+
+    Parameters
+    ----------
+    func : Callable
+        Element-wise objective function.
+    x0 : torch.Tensor
+        Initial guess for roots. A scalar is broadcast against the objective.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
+
+    Returns
+    -------
+    BatchedRootResult
+        Roots, per-element iteration counts and converged flags.
+    """
+
+    start = time.perf_counter()
+    x = initial_batch(func, x0)
+    iterations = torch.zeros(x.shape, dtype=torch.long, device=x.device)
+    converged = torch.zeros(x.shape, dtype=torch.bool, device=x.device)
+    diverged = torch.zeros(x.shape, dtype=torch.bool, device=x.device)
+
+    for i in range(max_iter):
+
+        x.requires_grad_(True)
+        diff = func(x)
+        with torch.no_grad():
+            converged |= torch.abs(diff) < atol
+            active = ~(converged | diverged)
+        if not torch.any(active):
+            break
+
+        # Elements are independent, so the gradient of the sum is the element-wise derivative.
+        grad, = torch.autograd.grad(diff.sum(), x)
+
+        with torch.no_grad():
+            x1 = x - diff / grad
+            finite = torch.isfinite(x1)
+            diverged |= active & ~finite
+            x = torch.where(active & finite, x1, x)
+            iterations += active.long()
+
+    else:
+        # The loop ends on an update, or never ran, so measure the residual where it left off.
+        with torch.no_grad():
+            diff = func(x)
+            converged |= torch.abs(diff) < atol
+
+    report('batched_newton', callback, start, iterations, diff, converged, diverged=diverged)
+    return BatchedRootResult(x.detach(), iterations, converged)
@@ -0,0 +1,248 @@
+"""Instrumentation of the root finders.
+
+Every solver in `dfin.optimize` accepts a `callback` that receives a `SolverReport` when it finishes.
+On top of that, a global profiling switch aggregates the reports of all calls,
+and keeps the slowest ones together with the contracts they were solving.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, NamedTuple, Optional
+
+import torch
+
+
+class SolverReport(NamedTuple):
+    """Statistics of one solver call.
+
+    Attributes
+    ----------
+    solver : str
+        Name of the solver.
+    size : int
+        Number of elements solved.
+    iterations : int
+        Update steps used, the maximum over all elements for batched solvers.
+    residual : float
+        Final absolute value of the objective, the maximum over all elements for batched solvers.
+    converged : bool
+        Whether every element reached the tolerance.
+    reason : str
+        Why the solver stopped: "converged", "max_iter", "diverged",
+        "nan" when the secant step broke down, "stalled" when LBFGS hit its own tolerances first
+        or a `least_squares` problem could not be improved, or "time_budget" when `least_squares` ran out of time.
+    elapsed : float
+        Wall time in seconds.
+    time_per_iteration : float
+        Wall time in seconds per update step.
+    context : Dict
+        Labels attached with `label`, e.g. the contract being solved.
+    """
+    solver: str
+    size: int
+    iterations: int
+    residual: float
+    converged: bool
+    reason: str
+    elapsed: float
+    time_per_iteration: float
+    context: Dict
+
+
+class _Profile:
+    """Global aggregate of solver reports."""
+
+    def __init__(self):
+        self.enabled = False
+        self.keep_slowest = 20
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.counter = itertools.count()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.slowest = []
+
+
+_profile = _Profile()
+
+
+def enable_profiling(keep_slowest:int=20):
+    """
+    Turns on the global aggregation of solver reports.
+
+    Parameters
+    ----------
+    keep_slowest : int
+        Number of slowest calls to keep in full. Default: 20.
+    """
+
+    _profile.keep_slowest = keep_slowest
+    _profile.enabled = True
+
+
+def disable_profiling():
+    """Turns off the global aggregation of solver reports. Collected statistics are kept."""
+
+    _profile.enabled = False
+
+
+def reset_profile():
+    """Discards the collected statistics."""
+
+    _profile.reset()
+
+
+def is_profiling() -> bool:
+    """Whether the global aggregation is turned on."""
+
+    return _profile.enabled
+
+
+@contextmanager
+def profiling(keep_slowest:int=20):
+    """Context manager that profiles the solver calls within it from a clean slate."""
+
+    was_enabled = _profile.enabled
+    reset_profile()
+    enable_profiling(keep_slowest)
+    try:
+        yield _profile
+    finally:
+        _profile.enabled = was_enabled
+
+
+@contextmanager
+def label(**context):
+    """
+    Attaches labels, e.g. the contract inputs, to the reports of solver calls within it.
+
+    Labels are only recorded while a callback is given or profiling is on.
+    """
+
+    previous = getattr(_profile.local, 'context', {})
+    _profile.local.context = dict(previous, **context)
+    try:
+        yield
+    finally:
+        _profile.local.context = previous
+
+
+def get_profile() -> Dict:
+    """
+    Summarizes the solver calls since profiling was enabled or reset.
+
+    Returns
+    -------
+    Dict
+        Per solver under "solvers": number of calls and elements, total and maximum iterations,
+        total time, number of calls that did not converge, and a count of stop reasons.
+        Under "slowest": the reports of the slowest calls, slowest first.
+    """
+
+    with _profile.lock:
+        solvers = {name: dict(stats, reasons=dict(stats['reasons'])) for name, stats in _profile.stats.items()}
+        slowest = [report for _, _, report in sorted(_profile.slowest, reverse=True)]
+    return {'solvers': solvers, 'slowest': slowest}
+
+
+def _record(report:SolverReport):
+    """Adds a report to the global aggregate."""
+
+    with _profile.lock:
+        stats = _profile.stats.setdefault(report.solver, {
+            'calls': 0,
+            'elements': 0,
+            'iterations': 0,
+            'max_iterations': 0,
+            'elapsed': 0.0,
+            'not_converged': 0,
+            'reasons': {},
+        })
+        stats['calls'] += 1
+        stats['elements'] += report.size
+        stats['iterations'] += report.iterations
+        stats['max_iterations'] = max(stats['max_iterations'], report.iterations)
+        stats['elapsed'] += report.elapsed
+        stats['not_converged'] += not report.converged
+        stats['reasons'][report.reason] = stats['reasons'].get(report.reason, 0) + 1
+
+        entry = (report.elapsed, next(_profile.counter), report)
+        if len(_profile.slowest) < _profile.keep_slowest:
+            heapq.heappush(_profile.slowest, entry)
+        elif _profile.slowest and entry > _profile.slowest[0]:
+            heapq.heapreplace(_profile.slowest, entry)
+
+
+def report(solver:str, callback:Optional[Callable[[SolverReport],None]], start:float, iterations, residual, converged, reason:Optional[str]=None, diverged=None) -> Optional[SolverReport]:
+    """
+    Builds the report of a finished solver call, hands it to the callback and to the global profile.
+
+    Does nothing, and forces no device synchronization, unless a callback is given or profiling is on.
+
+    Parameters
+    ----------
+    solver : str
+        Name of the solver.
+    callback : Callable, optional
+        Receives the report.
+    start : float
+        `time.perf_counter()` at the start of the call.
+    iterations : int or torch.Tensor
+        Update steps used, per element for batched solvers.
+    residual : torch.Tensor
+        Final value of the objective.
+    converged : bool or torch.Tensor
+        Whether the tolerance was reached, per element for batched solvers.
+    reason : str, optional
+        Why the solver stopped. Derived from `converged` and `diverged` if not given.
+    diverged : torch.Tensor, optional
+        Per-element divergence flags of batched solvers.
+
+    Returns
+    -------
+    SolverReport
+        The report, or None if nobody listens.
+    """
+
+    if callback is None and not _profile.enabled:
+        return None
+
+    elapsed = time.perf_counter() - start
+    with torch.no_grad():
+        residual = torch.as_tensor(residual).detach()
+        size = residual.numel()
+        residual = residual.abs().max().item() if size else 0.0
+    if torch.is_tensor(iterations):
+        iterations = int(iterations.max().item()) if iterations.numel() else 0
+    iterations = int(iterations)
+    converged = bool(torch.all(torch.as_tensor(converged)).item())
+    if reason is None:
+        if converged:
+            reason = 'converged'
+        elif diverged is not None and bool(torch.any(diverged).item()):
+            reason = 'diverged'
+        else:
+            reason = 'max_iter'
+
+    result = SolverReport(
+        solver=solver,
+        size=size,
+        iterations=iterations,
+        residual=residual,
+        converged=converged,
+        reason=reason,
+        elapsed=elapsed,
+        time_per_iteration=elapsed / max(iterations, 1),
+        context=dict(getattr(_profile.local, 'context', {})),
+    )
+    if callback is not None:
+        callback(result)
+    if _profile.enabled:
+        _record(result)
+    return result
+
@@ -1,8 +1,13 @@
 """Root-finding using secant method."""
+import time
+import warnings
 import torch
 
+from dfin.optimize.batched import BatchedRootResult, initial_batch
+from dfin.optimize.profiling import is_profiling, report
 
-def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14):
+
+def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14, callback=None):
     """Secant's method. Quadratic convergence. Finite difference variation of Newton's method.
 
     Parameters
@@ -11,6 +16,8 @@ def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14):
         Objective function.
     x0 : torch.Tensor
         Initial guess for root.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
 
     Returns
     -------
@@ -18,6 +25,8 @@ def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14):
         Root.
     """
 
+    start = time.perf_counter()
+    reason = 'max_iter'
     if torch.is_tensor(x0):
         # x0.requires_grad = True
         x1 = x0.clone().detach().requires_grad_(True)
@@ -26,6 +35,7 @@ def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14):
     x0 = torch.zeros_like(x1, requires_grad=True)
     f0 = func(x0)
     # print(f'Starting `secant` optimization with x0={x0.item()}:')
+    iterations = 0
 
     for i in range(max_iter):
 
@@ -36,6 +46,7 @@ def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14):
         f1 = func(x1)
         # print(f'Step {i: 3d}: diff={f1.item()}')
         if torch.abs(f1) < atol:
+            reason = 'converged'
             break
 
         # Update value (implied volatility) using Secant method.
@@ -43,17 +54,88 @@ def secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14):
         x2 = x1 - f1 * (x1 - x0) / (f1 - f0 + eps) # 1.5473 ms
         # x2 = x1 - (x1 - x0) / (1 - f0 / f1)  # 1.5971 ms
         x0, x1, f0 = x1, x2, f1
+        iterations = i + 1
 
         if torch.abs(x1 - x0) < atol:
             # break
             pass
         elif torch.isinf(x1):
-            print(f'`secant` diverged!!!')
+            warnings.warn('`secant` diverged!!!', RuntimeWarning)
+            reason = 'diverged'
             break
         else:
             pass
 
     # print(f'`secant` final x1={x1.item()}')
     if torch.any(torch.isnan(x1)):
+        # Falls back to the previous point, where the objective was `f0`.
+        report('secant', callback, start, iterations, f0, False, 'nan')
         return x0
+    if callback is not None or is_profiling():
+        if reason != 'converged':
+            # The loop ends on an update, so measure the residual where it left off.
+            with torch.no_grad():
+                f1 = func(x1)
+            if reason == 'max_iter' and torch.abs(f1) < atol:
+                reason = 'converged'
+        report('secant', callback, start, iterations, f1, reason == 'converged', reason)
     return x1
+
+
+def batched_secant(func, x0, atol:float=1e-6, max_iter:int=1000, eps=1e-14, callback=None) -> BatchedRootResult:
+    """Secant's method on a batch of independent roots. Finite difference variation of Newton's method.
+
+    Every element is tested against `atol` on its own and frozen once it converges,
+    so a whole option chain can be solved in one call. No gradient is needed, so no graph is built.
+
+    Parameters
+    ----------
+    func : Callable
+        Element-wise objective function.
+    x0 : torch.Tensor
+        Initial guess for roots. A scalar is broadcast against the objective.
+    callback : Callable, optional
+        Receives a `SolverReport` when the solver finishes.
+
+    Returns
+    -------
+    BatchedRootResult
+        Roots, per-element iteration counts and converged flags.
+    """
+
+    start = time.perf_counter()
+    x1 = initial_batch(func, x0)
+    # Starting the second point at zero (as `secant` does) overshoots for in-the-money contracts.
+    x0 = x1 * 0.9
+    iterations = torch.zeros(x1.shape, dtype=torch.long, device=x1.device)
+    converged = torch.zeros(x1.shape, dtype=torch.bool, device=x1.device)
+    diverged = torch.zeros(x1.shape, dtype=torch.bool, device=x1.device)
+
+    with torch.no_grad():
+
+        f0 = func(x0)
+
+        for i in range(max_iter):
+
+            f1 = func(x1)
+            converged |= torch.abs(f1) < atol
+            active = ~(converged | diverged)
+            if not torch.any(active):
+                break
+
+            x2 = x1 - f1 * (x1 - x0) / (f1 - f0 + eps)
+            finite = torch.isfinite(x2)
+            diverged |= active & ~finite
+            update = active & finite
+            x0 = torch.where(update, x1, x0)
+            f0 = torch.where(update, f1, f0)
+            x1 = torch.where(update, x2, x1)
+            iterations += active.long()
+
+        else:
+            # The loop ends on an update, or never ran, so measure the residual where it left off.
+            f1 = func(x1)
+            converged |= torch.abs(f1) < atol
+
+    report('batched_secant', callback, start, iterations, f1, converged, diverged=diverged)
+    return BatchedRootResult(x1, iterations, converged)
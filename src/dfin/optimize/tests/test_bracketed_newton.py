@@ -0,0 +1,91 @@
+import math
+
+import pytest
+import torch
+
+from dfin.optimize import batched_newton, bracketed_newton
+from dfin.options.bs_torch import call_price, put_price
+from dfin.options.iv_torch import call_implied_volatility, put_implied_volatility
+
+
+@pytest.fixture
+def wide_chain():
+    # Deep in and out of the money, short and long dated, where plain Newton overshoots.
+    size = 500
+    generator = torch.Generator().manual_seed(0)
+    S = torch.full((size,), 100., dtype=torch.float64)
+    K = torch.rand(size, generator=generator, dtype=torch.float64) * 150 + 50
+    r = torch.full((size,), 0.05, dtype=torch.float64)
+    t = torch.rand(size, generator=generator, dtype=torch.float64) * 3 + 0.02
+    sigma = torch.rand(size, generator=generator, dtype=torch.float64) * 1.5 + 0.05
+    return S, K, r, t, sigma
+
+
+def test_scalar_root():
+
+    result = bracketed_newton(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64), atol=1e-12, lower=0., upper=2.)
+    assert result.converged.item()
+    assert result.x.item() == pytest.approx(math.sqrt(2), abs=1e-12)
+
+
+def test_fprime_matches_autograd():
+
+    func = lambda x: torch.exp(x) - 3
+    autograd = bracketed_newton(func, torch.tensor(0.), atol=1e-6, lower=-5., upper=5.)
+    analytic = bracketed_newton(func, torch.tensor(0.), atol=1e-6, lower=-5., upper=5., fprime=torch.exp)
+    assert torch.equal(autograd.x, analytic.x)
+    assert torch.equal(autograd.iterations, analytic.iterations)
+
+
+def test_newton_leaving_bracket_bisects():
+
+    # Newton from the flat tail of arctan jumps far out of the bracket and diverges.
+    func = lambda x: torch.atan(x)
+    x0 = torch.tensor([5., -8., 0.5], dtype=torch.float64)
+    plain = batched_newton(func, x0, atol=1e-10, max_iter=50)
+    assert not torch.all(plain.converged)
+    result = bracketed_newton(func, x0, atol=1e-10, lower=-10., upper=10.)
+    assert torch.all(result.converged)
+    assert torch.allclose(result.x, torch.zeros(3, dtype=torch.float64), atol=1e-10)
+
+
+def test_wide_chain(wide_chain):
+
+    S, K, r, t, sigma = wide_chain
+    sigma0 = torch.tensor(0.5, dtype=torch.float64)
+    for pricer, solver in ((call_price, call_implied_volatility), (put_price, put_implied_volatility)):
+        price = pricer(S, K, r, t, sigma)
+        # Prices below the tolerance carry no information about sigma, nor do prices at intrinsic value.
+        informative = (price > 1e-6) & (torch.abs(price - pricer(S, K, r, t, torch.full_like(sigma, 1e-6))) > 1e-6)
+        result = solver(S, K, r, t, price, sigma0, bracketed_newton, atol=1e-10)
+        assert torch.all(result.converged[informative])
+        assert torch.allclose(result.x[informative], sigma[informative], rtol=1e-4, atol=1e-5)
+        # Never worse than bisection over [1e-6, 10] in float64.
+        assert result.iterations.max() <= 60
+
+
+def test_no_arbitrage_violations_are_nan():
+
+    S = torch.full((4,), 100., dtype=torch.float64)
+    K = torch.full((4,), 100., dtype=torch.float64)
+    r = torch.full((4,), 0.05, dtype=torch.float64)
+    t = torch.ones(4, dtype=torch.float64)
+    # Above the underlying, below the intrinsic value, and two fine contracts.
+    price = torch.tensor([120., 1., 10., 15.], dtype=torch.float64)
+    result = call_implied_volatility(S, K, r, t, price, torch.tensor(0.5), bracketed_newton, atol=1e-10)
+    assert torch.all(torch.isnan(result.x[:2]))
+    assert not torch.any(result.converged[:2])
+    assert torch.all(result.iterations[:2] == 0)
+    assert torch.all(result.converged[2:])
+    assert torch.allclose(call_price(S[2:], K[2:], r[2:], t[2:], result.x[2:]), price[2:], atol=1e-10)
+
+
+def test_float32_terminates(wide_chain):
+
+    S, K, r, t, sigma = (x.float() for x in wide_chain)
+    price = call_price(S, K, r, t, sigma)
+    # The tolerance is unreachable in float32, so elements stop once their bracket cannot be split.
+    result = call_implied_volatility(S, K, r, t, price, torch.tensor(0.5), bracketed_newton, atol=1e-12, max_iter=100)
+    finite = ~torch.isnan(result.x)
+    assert torch.all(result.converged[finite])
+    assert result.iterations.max() < 100
@@ -0,0 +1,151 @@
+import pytest
+import torch
+
+from dfin.optimize import least_squares, pad
+
+
+TRUE = torch.tensor([[2., 3.], [0.5, -1.], [1., 0.2]], dtype=torch.float64)
+LOWER, UPPER = [0., -5.], [10., 5.]
+
+
+def exponentials(x, data):
+    """Residuals of a * exp(b x) against data, one problem per row."""
+    return lambda params: params[:, :1] * torch.exp(params[:, 1:] * x) - data
+
+
+@pytest.fixture
+def problems():
+    x = torch.linspace(0, 1, 50, dtype=torch.float64)
+    return x, TRUE[:, :1] * torch.exp(TRUE[:, 1:] * x)
+
+
+@pytest.mark.parametrize('method', ['lm', 'lbfgs'])
+def test_batch_of_independent_problems(problems, method):
+    x, data = problems
+    result = least_squares(exponentials(x, data), torch.ones(3, 2, dtype=torch.float64), LOWER, UPPER, method=method, max_iter=200)
+    assert result.converged.all()
+    assert torch.allclose(result.x, TRUE, atol=1e-6)
+    assert (result.loss < 1e-10).all()
+    # Each problem stops on its own.
+    if method == 'lm':
+        assert len(set(result.iterations.tolist())) > 1
+
+
+def test_adam_decreases_the_loss(problems):
+    x, data = problems
+    residuals = exponentials(x, data)
+    x0 = torch.ones(3, 2, dtype=torch.float64)
+    result = least_squares(residuals, x0, LOWER, UPPER, method='adam', max_iter=100)
+    assert (result.loss < (residuals(x0)**2).sum(-1)).all()
+
+
+def test_bounds(problems):
+    x, data = problems
+    result = least_squares(exponentials(x, data), torch.ones(3, 2, dtype=torch.float64), LOWER, [10., 1.])
+    assert (result.x[:, 1] <= 1.).all()
+    # The first problem wants b = 3 and ends up on the bound, the others are unaffected.
+    assert result.x[0, 1].item() == pytest.approx(1., abs=1e-3)
+    assert torch.allclose(result.x[1:], TRUE[1:], atol=1e-6)
+
+
+def test_padding_is_ignored():
+    x = pad([torch.linspace(0, 1, n).tolist() for n in (10, 30, 50)])
+    data = TRUE[:, :1] * torch.exp(TRUE[:, 1:] * x)
+    assert torch.isnan(data[0, 10:]).all()
+    result = least_squares(exponentials(x, data), torch.ones(3, 2, dtype=torch.float64), LOWER, UPPER)
+    assert torch.allclose(result.x, TRUE, atol=1e-6)
+
+
+def test_warm_start(problems):
+    x, data = problems
+    residuals = exponentials(x, data)
+    cold = least_squares(residuals, torch.ones(3, 2, dtype=torch.float64), LOWER, UPPER)
+    warm = least_squares(residuals, TRUE * 1.01, LOWER, UPPER)
+    assert torch.allclose(warm.x, TRUE, atol=1e-6)
+    assert (warm.iterations < cold.iterations).all()
+
+
+def test_time_budget(problems):
+    x, data = problems
+    reports = []
+    x0 = torch.ones(3, 2, dtype=torch.float64)
+    result = least_squares(exponentials(x, data), x0, LOWER, UPPER, time_budget=0., callback=reports.append)
+    assert (result.iterations == 0).all()
+    assert not result.converged.any()
+    assert torch.allclose(result.x, x0)
+    assert reports[0].reason == 'time_budget'
+
+
+def test_stalled_is_not_converged(problems):
+    x, data = problems
+    solvable = exponentials(x, data)
+
+    def residuals(params):
+        # The first problem's derivative has the wrong sign, so no Levenberg-Marquardt step ever decreases its loss.
+        r = solvable(params)
+        misleading = 2 * params[:1, :1].detach() - params[:1, :1]
+        return torch.cat([misleading.expand(1, r.shape[-1]), r[1:]])
+
+    reports = []
+    result = least_squares(residuals, torch.ones(3, 2, dtype=torch.float64), LOWER, UPPER, callback=reports.append)
+    assert result.converged.tolist() == [False, True, True]
+    assert result.iterations[0] < 100
+    assert reports[0].reason == 'stalled'
+
+
+@pytest.mark.parametrize('method', ['lbfgs', 'adam'])
+def test_converged_problems_are_frozen(problems, method):
+    x, data = problems
+    # Noise keeps the last two problems away from `atol`, so they carry on after the first one converges.
+    noise = 0.05 * torch.randn(data.shape, generator=torch.Generator().manual_seed(0), dtype=torch.float64)
+    noise[0] = 0.
+    solvable = exponentials(x, data + noise)
+    seen = []
+
+    def residuals(params):
+        seen.append(params.detach().clone())
+        return solvable(params)
+
+    x0 = torch.ones(3, 2, dtype=torch.float64)
+    x0[0] = TRUE[0] * 1.001
+    result = least_squares(residuals, x0, LOWER, UPPER, method=method, ftol=1e-12, atol=1e-4, max_iter=200)
+    assert result.converged[0] and (result.iterations[0] < result.iterations[1:]).all()
+    # Once converged, a problem no longer moves while the others carry on.
+    assert all(torch.equal(params[0], result.x[0]) for params in seen[-10:])
+    assert not all(torch.equal(params[2], result.x[2]) for params in seen[-10:])
+
+
+def test_invalid_method(problems):
+    x, data = problems
+    with pytest.raises(ValueError):
+        least_squares(exponentials(x, data), torch.ones(3, 2, dtype=torch.float64), LOWER, UPPER, method='dogleg')
+
+
+def speed_comparison():
+
+    import timeit
+    import numpy as np
+    from scipy.optimize import least_squares as scipy_least_squares
+
+    size = 200
+    generator = torch.Generator().manual_seed(0)
+    true = torch.stack([torch.rand(size, generator=generator, dtype=torch.float64) * 3 + 0.5, torch.rand(size, generator=generator, dtype=torch.float64) * 4 - 2], dim=-1)
+    x = torch.linspace(0, 1, 100, dtype=torch.float64)
+    data = true[:, :1] * torch.exp(true[:, 1:] * x)
+    x_np, data_np = x.numpy(), data.numpy()
+
+    def one_by_one():
+        return [scipy_least_squares(lambda p: p[0] * np.exp(p[1] * x_np) - row, [1., 0.], bounds=(LOWER, UPPER)).x for row in data_np]
+
+    time_taken = min(timeit.Timer(one_by_one).repeat(repeat=3, number=1))
+    print(f'scipy, one problem at a time, {size} problems: {time_taken*1000:10.2f} ms.')
+    least_squares(exponentials(x, data), torch.ones(size, 2, dtype=torch.float64), LOWER, UPPER)
+    for method in ['lm', 'lbfgs']:
+        time_taken = min(timeit.Timer(lambda: least_squares(exponentials(x, data), torch.ones(size, 2, dtype=torch.float64), LOWER, UPPER, method=method)).repeat(repeat=3, number=1))
+        print(f'Batched {method:<5s}, {size} problems: {time_taken*1000:10.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
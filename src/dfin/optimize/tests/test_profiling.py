@@ -0,0 +1,179 @@
+import math
+
+import pytest
+import torch
+
+from dfin.optimize import gradient_descent, lbfgs, secant, newton, halley
+from dfin.optimize import batched_gradient_descent, batched_secant, batched_newton, batched_halley, bracketed_newton
+from dfin.optimize import SolverReport, get_profile, profiling, label
+from dfin.options.bs_torch import call_price
+from dfin.options.iv_torch import call_implied_volatility
+
+
+@pytest.fixture
+def chain_data():
+    torch.manual_seed(0)
+    S = torch.full((20,), 100., dtype=torch.float64)
+    K = torch.linspace(80, 120, 20, dtype=torch.float64)
+    r = torch.full((20,), 0.05, dtype=torch.float64)
+    t = torch.full((20,), 1., dtype=torch.float64)
+    sigma = 0.1 + 0.3 * torch.rand(20, dtype=torch.float64)
+    price = call_price(S, K, r, t, sigma)
+    return S, K, r, t, price, sigma
+
+
+@pytest.mark.parametrize('optim', [gradient_descent, secant, newton, halley])
+def test_scalar_callback(optim):
+
+    reports = []
+    x = optim(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64, requires_grad=True), callback=reports.append)
+    assert abs(x.item() - math.sqrt(2)) < 1e-3
+    assert len(reports) == 1
+    report = reports[0]
+    assert isinstance(report, SolverReport)
+    assert report.solver == optim.__name__
+    assert report.converged and report.reason == 'converged'
+    assert report.residual < 1e-6
+    assert 0 < report.iterations
+    assert 0 < report.elapsed
+    assert report.time_per_iteration == pytest.approx(report.elapsed / report.iterations)
+
+
+def test_lbfgs_callback():
+
+    reports = []
+    lbfgs(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64, requires_grad=True), callback=reports.append)
+    report, = reports
+    # LBFGS stops on its own tolerances, which need not meet `atol`.
+    assert report.reason == ('converged' if report.converged else 'stalled')
+    assert report.residual < 1e-5
+    assert 0 < report.iterations
+
+
+def test_scalar_max_iter():
+
+    reports = []
+    # Newton only converges linearly on a triple root.
+    x = newton(lambda x: x**3, torch.tensor(1.0, dtype=torch.float64, requires_grad=True), max_iter=5, callback=reports.append)
+    report, = reports
+    assert not report.converged
+    assert report.reason == 'max_iter'
+    assert report.iterations == 5
+    # The residual is measured at the returned point, not at the one before the last step.
+    assert report.residual == pytest.approx(x.item()**3)
+
+
+@pytest.mark.parametrize('optim', [gradient_descent, secant, newton, halley])
+def test_scalar_zero_max_iter(optim):
+
+    reports = []
+    x = optim(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64), max_iter=0, callback=reports.append)
+    report, = reports
+    assert x.item() == 1.
+    assert report.iterations == 0
+    assert report.residual == pytest.approx(1.)
+    assert not report.converged and report.reason == 'max_iter'
+
+
+@pytest.mark.parametrize('optim', [gradient_descent, secant, newton, halley])
+def test_scalar_residual_only_when_reported(optim):
+
+    def counted(callback=None, max_iter=2):
+        calls = []
+        def func(x):
+            calls.append(x)
+            return x**2 - 2
+        optim(func, torch.tensor(1.0, dtype=torch.float64, requires_grad=True), max_iter=max_iter, callback=callback)
+        return len(calls)
+
+    # Measuring the residual after the last step costs an evaluation, which only a report needs.
+    assert counted(callback=lambda report: None) == counted() + 1
+    assert counted(max_iter=0) == counted(callback=lambda report: None, max_iter=0) - 1
+
+
+@pytest.mark.parametrize('optim', [batched_gradient_descent, batched_secant, batched_newton, batched_halley, bracketed_newton])
+def test_batched_zero_max_iter(optim):
+
+    reports = []
+    kwargs = {'lower': 0., 'upper': 2.} if optim is bracketed_newton else {}
+    result = optim(lambda x: x**2 - 2, torch.tensor([1.0, 2**0.5], dtype=torch.float64), max_iter=0, callback=reports.append, **kwargs)
+    report, = reports
+    assert (result.iterations == 0).all()
+    assert result.converged.tolist() == [False, True]
+    assert report.residual == pytest.approx(1.)
+
+
+def test_newton_divergence_reported():
+
+    reports = []
+    # The derivative vanishes at the initial guess, so the first step is infinite.
+    with pytest.warns(RuntimeWarning):
+        newton(lambda x: x**2 + 1, torch.tensor(0.0, dtype=torch.float64, requires_grad=True), callback=reports.append)
+    report, = reports
+    assert not report.converged
+    assert report.reason == 'diverged'
+
+
+@pytest.mark.parametrize('optim', [batched_secant, batched_newton, batched_halley])
+def test_batched_callback(chain_data, optim):
+
+    S, K, r, t, price, sigma = chain_data
+    reports = []
+    result = call_implied_volatility(S, K, r, t, price, torch.tensor(0.5, dtype=torch.float64), optim, atol=1e-10, callback=reports.append)
+    report, = reports
+    assert report.solver == optim.__name__
+    assert report.size == 20
+    assert report.converged
+    assert report.iterations == result.iterations.max().item()
+    assert report.residual < 1e-10
+    assert torch.equal(report.context['K'], K)
+    assert report.context['kind'] == 'call'
+
+
+def test_batched_max_iter(chain_data):
+
+    S, K, r, t, price, sigma = chain_data
+    reports = []
+    call_implied_volatility(S, K, r, t, price, torch.tensor(0.5, dtype=torch.float64), batched_newton, atol=1e-10, max_iter=1, callback=reports.append)
+    report, = reports
+    assert not report.converged
+    assert report.reason == 'max_iter'
+    assert report.iterations == 1
+
+
+def test_global_profile(chain_data):
+
+    S, K, r, t, price, sigma = chain_data
+    sigma0 = torch.tensor(0.5, dtype=torch.float64)
+    with profiling(keep_slowest=3):
+        for i in range(5):
+            call_implied_volatility(S[i:i+1], K[i:i+1], r[i:i+1], t[i:i+1], price[i:i+1], sigma0.clone().requires_grad_(True), newton)
+        call_implied_volatility(S, K, r, t, price, sigma0, batched_secant)
+        with label(source='unit test'):
+            secant(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64))
+    # Leaving the context stops collecting, but keeps the statistics.
+    newton(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64, requires_grad=True))
+
+    profile = get_profile()
+    stats = profile['solvers']
+    assert set(stats) == {'newton', 'batched_secant', 'secant'}
+    assert stats['newton']['calls'] == 5
+    assert stats['newton']['elements'] == 5
+    assert stats['newton']['reasons'] == {'converged': 5}
+    assert stats['batched_secant']['elements'] == 20
+    assert stats['secant']['calls'] == 1
+
+    slowest = profile['slowest']
+    assert len(slowest) == 3
+    assert all(a.elapsed >= b.elapsed for a, b in zip(slowest, slowest[1:]))
+    contexts = [report.context for report in slowest]
+    assert all('source' in context or 'K' in context for context in contexts)
+
+
+def test_no_report_without_listener():
+
+    # Nothing is collected, nor any context attached, unless somebody listens.
+    with profiling():
+        pass
+    newton(lambda x: x**2 - 2, torch.tensor(1.0, dtype=torch.float64, requires_grad=True))
+    assert get_profile()['solvers'] == {}
@@ -0,0 +1,32 @@
+"""Helpers shared by the solvers that hand an objective to one of the `dfin.optimize` optimizers."""
+import contextlib
+from typing import Callable, Optional
+
+import torch
+
+from dfin.optimize.profiling import is_profiling, label
+from dfin.options.iv_guess import resolve
+
+
+def contract_label(kind:str, S, K, r, t, price, callback:Optional[Callable]):
+    """Labels solver reports with the contract being solved, if anybody listens."""
+
+    if callback is None and not is_profiling():
+        return contextlib.nullcontext()
+    return label(kind=kind, S=S, K=K, r=r, t=t, price=price)
+
+
+def callback_kwargs(callback:Optional[Callable]) -> dict:
+    """Only passes the callback on when given, so custom optimizers need not accept one."""
+
+    return {} if callback is None else {'callback': callback}
+
+
+def resolve_guess(sigma0, kind:str, S, K, r, t, price):
+    """Evaluates a guess provider of `dfin.options.iv_guess` on the contract inputs, or passes `sigma0` through."""
+
+    if not callable(sigma0):
+        return sigma0
+    inputs = [x.detach().cpu().numpy() if torch.is_tensor(x) else x for x in (S, K, r, t, price)]
+    like = price if torch.is_tensor(price) else torch.as_tensor(price, dtype=torch.float64)
+    return torch.as_tensor(resolve(sigma0, *inputs, kind), dtype=like.dtype, device=like.device)
@@ -0,0 +1,200 @@
+"""Zero-copy bridge between pandas/NumPy option chains and the torch pricers.
+
+Input columns are wrapped with `torch.from_numpy`, which shares memory instead of copying,
+and results are attached to the DataFrame as columns backed by the very same memory the pricers wrote into.
+A copy only happens where it cannot be avoided, i.e. to convert the dtype or to make a strided column contiguous.
+"""
+
+import warnings
+from typing import Tuple, Union
+
+import numpy as np
+import pandas as pd
+import torch
+
+from dfin.options import bs_torch, iv_torch
+
+
+ColumnOrValue = Union[str, float, np.ndarray, pd.Series, torch.Tensor]
+
+_NUMPY_DTYPES = {torch.float32: np.float32, torch.float64: np.float64}
+
+
+def to_tensor(values, dtype:torch.dtype=torch.float64) -> torch.Tensor:
+    """
+    Wraps a column, array or scalar as a tensor, sharing its memory where possible.
+
+    The tensor must not be written to: pandas hands out read-only views of its columns.
+
+    Parameters
+    ----------
+    values : ArrayLike
+        pandas Series, NumPy array, tensor or scalar.
+    dtype : torch.dtype
+        Either torch.float32 or torch.float64. Default: torch.float64.
+
+    Returns
+    -------
+    torch.Tensor
+        A view of `values` if it already has the right dtype and is contiguous, a converted copy otherwise.
+    """
+
+    if torch.is_tensor(values):
+        return values.to(dtype)
+    if isinstance(values, pd.Series):
+        values = values.to_numpy(dtype=_NUMPY_DTYPES[dtype])
+    array = np.asarray(values, dtype=_NUMPY_DTYPES[dtype])
+    if array.ndim == 0:
+        return torch.tensor(array.item(), dtype=dtype)
+    array = np.ascontiguousarray(array)
+    with warnings.catch_warnings():
+        # Read-only arrays are fine, as nothing ever writes to the inputs.
+        warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+        return torch.from_numpy(array)
+
+
+def _input(frame:pd.DataFrame, values:ColumnOrValue, dtype:torch.dtype) -> torch.Tensor:
+    """Resolves a column name, or passes a value through."""
+
+    return to_tensor(frame[values] if isinstance(values, str) else values, dtype)
+
+
+def to_column(frame:pd.DataFrame, name:str, values:torch.Tensor) -> pd.DataFrame:
+    """
+    Attaches a result tensor to a DataFrame as a column, without copying it.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        DataFrame to modify in place.
+    name : str
+        Name of the column.
+    values : torch.Tensor
+        One value per row, or a scalar broadcast to every row.
+
+    Returns
+    -------
+    pd.DataFrame
+        The same DataFrame, for chaining.
+    """
+
+    values = values.detach().cpu()
+    if values.dim() != 1 or len(values) != len(frame):
+        values = values.expand(len(frame))
+    # `Tensor.numpy` shares memory, and so does the Series with `copy=False`.
+    frame[name] = pd.Series(values.contiguous().numpy(), index=frame.index, copy=False)
+    return frame
+
+
+def price_frame(frame:pd.DataFrame, S:ColumnOrValue, r:ColumnOrValue, t:ColumnOrValue, sigma:ColumnOrValue='impliedVolatility', K:ColumnOrValue='strike', columns:Tuple[str,str]=('callPrice', 'putPrice'), dtype:torch.dtype=torch.float64) -> pd.DataFrame:
+    """
+    Prices the calls and puts of every row of a chain, writing straight into preallocated columns.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Option chain to modify in place.
+    S, r, t, sigma, K : str or ArrayLike
+        Column name, array or scalar of each Black-Scholes input. Default: "impliedVolatility" and "strike" for sigma and K.
+    columns : Tuple[str,str]
+        Names of the call and put price columns. Default: ("callPrice", "putPrice").
+    dtype : torch.dtype
+        Floating point precision of the computation. Default: torch.float64.
+
+    Returns
+    -------
+    pd.DataFrame
+        The same DataFrame, for chaining.
+    """
+
+    S, r, t, sigma, K = (_input(frame, x, dtype) for x in (S, r, t, sigma, K))
+    shape = torch.broadcast_shapes(S.shape, K.shape, r.shape, t.shape, sigma.shape, (len(frame),))
+    C, P = (torch.from_numpy(np.empty(shape, dtype=_NUMPY_DTYPES[dtype])) for _ in columns)
+    with torch.no_grad():
+        bs_torch.call_put_price(S, K, r, t, sigma, out=(C, P))
+    for name, values in zip(columns, (C, P)):
+        to_column(frame, name, values)
+    return frame
+
+
+def greeks_frame(frame:pd.DataFrame, S:ColumnOrValue, r:ColumnOrValue, t:ColumnOrValue, sigma:ColumnOrValue='impliedVolatility', K:ColumnOrValue='strike', kind:str='call', prefix:str='', dtype:torch.dtype=torch.float64) -> pd.DataFrame:
+    """
+    Computes the price and Greeks of every row of a chain, and attaches them as columns.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Option chain to modify in place, e.g. the `calls` or `puts` of a yfinance chain.
+    S, r, t, sigma, K : str or ArrayLike
+        Column name, array or scalar of each Black-Scholes input. Default: "impliedVolatility" and "strike" for sigma and K.
+    kind : str
+        Either "call" or "put". Default: "call".
+    prefix : str
+        Prefix of the new columns "price", "delta", "gamma", "vega", "theta" and "rho". Default: none.
+    dtype : torch.dtype
+        Floating point precision of the computation. Default: torch.float64.
+
+    Returns
+    -------
+    pd.DataFrame
+        The same DataFrame, for chaining.
+    """
+
+    S, r, t, sigma, K = (_input(frame, x, dtype) for x in (S, r, t, sigma, K))
+    greeks = bs_torch.greeks(S, K, r, t, sigma, kind=kind)
+    for name, values in greeks._asdict().items():
+        to_column(frame, prefix + name, values)
+    return frame
+
+
+def implied_volatility_frame(frame:pd.DataFrame, S:ColumnOrValue, r:ColumnOrValue, t:ColumnOrValue, price:ColumnOrValue='lastPrice', K:ColumnOrValue='strike', kind:str='call', column:str='impliedVolatility', sigma0=0.5, method:str='halley', atol:float=1e-8, max_iter:int=100, dtype:torch.dtype=torch.float64) -> pd.DataFrame:
+    """
+    Solves the implied volatility of every row of a chain with `iv_torch`'s analytic solvers, and attaches it as a column.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Option chain to modify in place, e.g. the `calls` or `puts` of a yfinance chain.
+    S, r, t, price, K : str or ArrayLike
+        Column name, array or scalar of each input. Default: "lastPrice" and "strike" for price and K.
+    kind : str
+        Either "call" or "put". Default: "call".
+    column : str
+        Name of the result column. Default: "impliedVolatility", overwriting the one of yfinance.
+    sigma0 : str, ArrayLike or GuessProvider
+        Initial guess for volatility: a column name, array or scalar, or a provider from `dfin.options.iv_guess`. Default: 0.5.
+    method : str
+        Either "newton" or "halley". Default: "halley".
+    atol : float
+        The tolerance of the solver on the price. Default: 1e-8.
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    dtype : torch.dtype
+        Floating point precision of the computation. Default: torch.float64.
+
+    Returns
+    -------
+    pd.DataFrame
+        The same DataFrame, for chaining. NaN where the solver did not converge.
+    """
+
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+
+    S, r, t, price, K = (_input(frame, x, dtype) for x in (S, r, t, price, K))
+    if not callable(sigma0):
+        sigma0 = _input(frame, sigma0, dtype)
+    solver = iv_torch.call_implied_volatility_analytic if kind == 'call' else iv_torch.put_implied_volatility_analytic
+    result = solver(S, K, r, t, price, sigma0, method=method, atol=atol, max_iter=max_iter)
+    # The solution is a fresh tensor already, so mask it in place.
+    sigma = result.x.masked_fill_(~result.converged, float('nan'))
+    return to_column(frame, column, sigma)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    chain = pd.DataFrame({'strike': np.linspace(80, 120, 5), 'impliedVolatility': 0.2})
+    price_frame(chain, S=100., r=0.05, t=1.)
+    implied_volatility_frame(chain, S=100., r=0.05, t=1., price='callPrice', column='solvedVolatility')
+    print(chain)
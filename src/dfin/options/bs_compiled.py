@@ -0,0 +1,354 @@
+"""Compiled Black-Scholes pricing and Implied Volatility kernels with PyTorch.
+
+The eager `bs_torch` functions launch one kernel, and allocate one temporary, per elementary op.
+Here each pricer and each Newton step is a single function handed to `torch.compile` (or TorchScript),
+which fuses the whole chain of ops into one loop over the inputs.
+
+Compiling takes seconds, so compiled kernels are cached per (kernel, backend, dtype, device, shape bucket).
+Inputs are padded up to the next power of two, so a new batch size only triggers a compile
+the first time its bucket is seen. Call `warmup` ahead of latency-sensitive calls to pay that cost up front.
+"""
+import functools
+import types
+import warnings
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import torch
+
+from dfin.optimize.batched import BatchedRootResult
+
+
+BACKENDS = ('eager', 'script', 'compile')
+
+# TorchScript cannot close over global floats, so the kernels spell out 1/sqrt(2 pi) = 0.3989422804014327.
+
+
+def _call_price_kernel(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor) -> torch.Tensor:
+
+    sigma_sqrt_t = sigma * torch.sqrt(t)
+    d1 = (torch.log(S / K) + (r + sigma * sigma / 2) * t) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+    return S * torch.special.ndtr(d1) - K * torch.exp(-r * t) * torch.special.ndtr(d2)
+
+
+def _put_price_kernel(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor) -> torch.Tensor:
+
+    sigma_sqrt_t = sigma * torch.sqrt(t)
+    d1 = (torch.log(S / K) + (r + sigma * sigma / 2) * t) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+    return K * torch.exp(-r * t) * torch.special.ndtr(-d2) - S * torch.special.ndtr(-d1)
+
+
+def _newton_step(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma:torch.Tensor, atol:float, call:bool) -> Tuple[torch.Tensor,torch.Tensor,torch.Tensor]:
+    """One Newton step with analytic vega. Returns the new sigma, the converged flags at the old sigma, and the still active flags."""
+
+    sqrt_t = torch.sqrt(t)
+    sigma_sqrt_t = sigma * sqrt_t
+    d1 = (torch.log(S / K) + (r + sigma * sigma / 2) * t) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+    if call:
+        model = S * torch.special.ndtr(d1) - K * torch.exp(-r * t) * torch.special.ndtr(d2)
+    else:
+        model = K * torch.exp(-r * t) * torch.special.ndtr(-d2) - S * torch.special.ndtr(-d1)
+    diff = model - price
+    vega = S * torch.exp(-d1 * d1 / 2) * 0.3989422804014327 * sqrt_t
+    updated = sigma - diff / vega
+    # Newton can overshoot below zero on the convex part of the price curve, so halve instead.
+    updated = torch.where(updated > 0, updated, sigma / 2)
+    converged = torch.abs(diff) < atol
+    active = ~converged & torch.isfinite(updated)
+    return torch.where(active, updated, sigma), converged, active
+
+
+def _call_newton_step(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma:torch.Tensor, atol:float) -> Tuple[torch.Tensor,torch.Tensor,torch.Tensor]:
+    return _newton_step(S, K, r, t, price, sigma, atol, True)
+
+
+def _put_newton_step(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma:torch.Tensor, atol:float) -> Tuple[torch.Tensor,torch.Tensor,torch.Tensor]:
+    return _newton_step(S, K, r, t, price, sigma, atol, False)
+
+
+_KERNELS = {
+    'call_price': _call_price_kernel,
+    'put_price': _put_price_kernel,
+    'call_newton_step': _call_newton_step,
+    'put_newton_step': _put_newton_step,
+}
+
+_cache:Dict[tuple, Callable] = {}
+_scripted:Dict[str, Callable] = {}
+
+
+def bucket(size:int) -> int:
+    """Smallest power of two holding `size` elements. Inputs are padded to it, so that compiled kernels can be reused."""
+
+    return 1 << max(size - 1, 0).bit_length()
+
+
+def _copy(func:Callable) -> Callable:
+    """A copy of a function with its own code object.
+
+    `torch.compile` keeps its compiled graphs on the code object, and caps how many it keeps per code object
+    (`torch._dynamo.config.recompile_limit`) before falling back to eager mode, so every bucket compiles its own copy.
+    """
+
+    return types.FunctionType(func.__code__.replace(), func.__globals__, func.__name__, func.__defaults__, func.__closure__)
+
+
+def _kernel(name:str, backend:str, dtype:torch.dtype, device:torch.device, size:int) -> Callable:
+    """Looks up a compiled kernel, compiling it on a miss."""
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend "{backend}". Expected one of {BACKENDS}.')
+
+    key = (name, backend, dtype, device, size)
+    kernel = _cache.get(key)
+    if kernel is None:
+        if backend == 'eager':
+            kernel = _KERNELS[name]
+        elif backend == 'script':
+            # TorchScript specializes on dtype and shape internally, so one scripted function serves every bucket.
+            if name not in _scripted:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', FutureWarning)
+                    _scripted[name] = torch.jit.script(_KERNELS[name])
+            kernel = _scripted[name]
+        else:
+            kernel = torch.compile(_copy(_KERNELS[name]), dynamic=False)
+        _cache[key] = kernel
+    return kernel
+
+
+def _prepare(*args, dtype:Optional[torch.dtype]) -> Tuple[Tuple[torch.Tensor,...], torch.Size, int]:
+    """Broadcasts, flattens and pads the inputs to their bucket. Padding repeats the first element, so it stays well-behaved."""
+
+    tensors = [x.detach() if torch.is_tensor(x) else torch.as_tensor(x) for x in args]
+    if dtype is None:
+        dtype = functools.reduce(torch.promote_types, [x.dtype for x in tensors if x.is_floating_point()], torch.get_default_dtype())
+    tensors = torch.broadcast_tensors(*(x.to(dtype) for x in tensors))
+    shape = tensors[0].shape
+    size = tensors[0].numel()
+    padded = bucket(size)
+    flat = []
+    for x in tensors:
+        x = x.reshape(-1)
+        if padded > size and size > 0:
+            x = torch.cat([x, x[:1].expand(padded - size)])
+        flat.append(x.contiguous())
+    return tuple(flat), shape, size
+
+
+def _price(name:str, S, K, r, t, sigma, backend:str, dtype:Optional[torch.dtype]) -> torch.Tensor:
+
+    (S, K, r, t, sigma), shape, size = _prepare(S, K, r, t, sigma, dtype=dtype)
+    if size == 0:
+        return S.reshape(shape)
+    with torch.no_grad():
+        price = _kernel(name, backend, S.dtype, S.device, len(S))(S, K, r, t, sigma)
+    return price[:size].reshape(shape)
+
+
+def call_price(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, backend:str='compile', dtype:Optional[torch.dtype]=None) -> torch.Tensor:
+    """
+    Computes the theoretical price of European call options with a compiled Black-Scholes kernel.
+
+    Inputs broadcast against each other. No autograd graph is recorded, use `bs_torch.call_price` for gradients.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    sigma : torch.Tensor
+        Volatility of the underlying asset
+    backend : str
+        One of "compile" (`torch.compile`), "script" (TorchScript) or "eager". Default: "compile".
+    dtype : torch.dtype, optional
+        Floating point precision of the computation. Promoted from the inputs if not given.
+
+    Returns
+    -------
+    torch.Tensor
+        Theoretical price of the call options
+    """
+
+    return _price('call_price', S, K, r, t, sigma, backend, dtype)
+
+
+def put_price(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, backend:str='compile', dtype:Optional[torch.dtype]=None) -> torch.Tensor:
+    """
+    Computes the theoretical price of European put options with a compiled Black-Scholes kernel.
+
+    Inputs broadcast against each other. No autograd graph is recorded, use `bs_torch.put_price` for gradients.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    sigma : torch.Tensor
+        Volatility of the underlying asset
+    backend : str
+        One of "compile" (`torch.compile`), "script" (TorchScript) or "eager". Default: "compile".
+    dtype : torch.dtype, optional
+        Floating point precision of the computation. Promoted from the inputs if not given.
+
+    Returns
+    -------
+    torch.Tensor
+        Theoretical price of the put options
+    """
+
+    return _price('put_price', S, K, r, t, sigma, backend, dtype)
+
+
+def _implied_volatility(name:str, S, K, r, t, price, sigma0, atol:float, max_iter:int, backend:str, dtype:Optional[torch.dtype]) -> BatchedRootResult:
+
+    (S, K, r, t, price, sigma), shape, size = _prepare(S, K, r, t, price, sigma0, dtype=dtype)
+    iterations = torch.zeros(sigma.shape, dtype=torch.long, device=sigma.device)
+    converged = torch.zeros(sigma.shape, dtype=torch.bool, device=sigma.device)
+    if size > 0:
+        step = _kernel(name, backend, sigma.dtype, sigma.device, len(sigma))
+        with torch.no_grad():
+            for i in range(max_iter):
+                sigma, converged, active = step(S, K, r, t, price, sigma, atol)
+                iterations += active.long()
+                if not torch.any(active):
+                    break
+            else:
+                # The step reports convergence at the sigma it started from, so check the one it returns.
+                model = _kernel(name.replace('newton_step', 'price'), backend, sigma.dtype, sigma.device, len(sigma))(S, K, r, t, sigma)
+                converged |= torch.abs(model - price) < atol
+    return BatchedRootResult(sigma[:size].reshape(shape), iterations[:size].reshape(shape), converged[:size].reshape(shape))
+
+
+def call_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0=0.5, atol:float=1e-6, max_iter:int=100, backend:str='compile', dtype:Optional[torch.dtype]=None) -> BatchedRootResult:
+    """
+    Calculates the implied volatility of European call options with a compiled Newton step.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    price : torch.Tensor
+        Observed price of the call options
+    sigma0 : torch.Tensor
+        Initial guess for volatility. Default: 0.5.
+    atol : float
+        The tolerance of the optimization target. Default: 1e-6.
+    max_iter : int
+        The maximum number of Newton steps. Default: 100.
+    backend : str
+        One of "compile" (`torch.compile`), "script" (TorchScript) or "eager". Default: "compile".
+    dtype : torch.dtype, optional
+        Floating point precision of the computation. Promoted from the inputs if not given.
+
+    Returns
+    -------
+    BatchedRootResult
+        Implied volatilities, per-element iteration counts and converged flags.
+    """
+
+    return _implied_volatility('call_newton_step', S, K, r, t, price, sigma0, atol, max_iter, backend, dtype)
+
+
+def put_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0=0.5, atol:float=1e-6, max_iter:int=100, backend:str='compile', dtype:Optional[torch.dtype]=None) -> BatchedRootResult:
+    """
+    Calculates the implied volatility of European put options with a compiled Newton step.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    price : torch.Tensor
+        Observed price of the put options
+    sigma0 : torch.Tensor
+        Initial guess for volatility. Default: 0.5.
+    atol : float
+        The tolerance of the optimization target. Default: 1e-6.
+    max_iter : int
+        The maximum number of Newton steps. Default: 100.
+    backend : str
+        One of "compile" (`torch.compile`), "script" (TorchScript) or "eager". Default: "compile".
+    dtype : torch.dtype, optional
+        Floating point precision of the computation. Promoted from the inputs if not given.
+
+    Returns
+    -------
+    BatchedRootResult
+        Implied volatilities, per-element iteration counts and converged flags.
+    """
+
+    return _implied_volatility('put_newton_step', S, K, r, t, price, sigma0, atol, max_iter, backend, dtype)
+
+
+def warmup(sizes:Iterable[int], dtypes:Iterable[torch.dtype]=(torch.float64,), backend:str='compile', device:Optional[torch.device]=None):
+    """
+    Compiles every kernel for the buckets of the given batch sizes ahead of time.
+
+    Parameters
+    ----------
+    sizes : Iterable[int]
+        Batch sizes expected later on.
+    dtypes : Iterable[torch.dtype]
+        Floating point precisions expected later on. Default: float64.
+    backend : str
+        One of "compile", "script" or "eager". Default: "compile".
+    device : torch.device, optional
+        Device of the inputs. Default: the default device.
+    """
+
+    for dtype in dtypes:
+        for size in sorted({bucket(size) for size in sizes}):
+            ones = torch.ones(size, dtype=dtype, device=device)
+            call_price(ones * 100, ones * 100, ones * 0.05, ones, ones * 0.2, backend=backend)
+            put_price(ones * 100, ones * 100, ones * 0.05, ones, ones * 0.2, backend=backend)
+            call_implied_volatility(ones * 100, ones * 100, ones * 0.05, ones, ones * 10, max_iter=1, backend=backend)
+            put_implied_volatility(ones * 100, ones * 100, ones * 0.05, ones, ones * 5, max_iter=1, backend=backend)
+
+
+def cache_info() -> Dict[str, int]:
+    """Number of cached kernels per backend."""
+
+    info = {backend: 0 for backend in BACKENDS}
+    for key in _cache:
+        info[key[1]] += 1
+    return info
+
+
+def clear_cache():
+    """Forgets every cached kernel. `torch.compile` keeps its own on-disk cache, which makes recompiling cheaper."""
+
+    _cache.clear()
+    _scripted.clear()
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    K = torch.linspace(80, 120, 5, dtype=torch.float64)
+    C = call_price(torch.tensor(100.), K, torch.tensor(0.05), torch.tensor(1.), torch.tensor(0.2), backend='script')
+    for strike, call in zip(K, C):
+        print(f"Strike {strike:.0f}: call ${call:.4f}")
@@ -0,0 +1,283 @@
+"""Implementation of Black-Scholes option pricing formula and Implied Volatility with NumPy."""
+
+import math
+import numpy as np
+from numpy.typing import ArrayLike, DTypeLike
+from scipy.special import ndtr
+from typing import Optional, Tuple
+
+from dfin.options.iv_guess import resolve
+
+
+def normal_cdf(x:np.ndarray) -> np.ndarray:
+    """
+    Computes the cumulative distribution function of the standard normal distribution.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Cumulative probability that the random variable X takes on a value less than or equal to x (i.e. $F(x) = P(X<=x)$)
+
+    Returns
+    -------
+    np.ndarray
+        The value of the CDF at x
+    """
+
+    return ndtr(x)
+
+
+def _d1_d2(S:np.ndarray, K:np.ndarray, r:np.ndarray, t:np.ndarray, sigma:np.ndarray) -> Tuple[np.ndarray,np.ndarray,np.ndarray]:
+    """Computes d1, d2 and the discounted strike, which all prices share."""
+
+    sigma_sqrt_t = sigma * np.sqrt(t)
+    d1 = (np.log(S / K) + (r + sigma**2 / 2) * t) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+    return d1, d2, K * np.exp(-r*t)
+
+
+def call_price(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, sigma:ArrayLike, out:Optional[np.ndarray]=None, dtype:DTypeLike=np.float64) -> np.ndarray:
+    """
+    Computes the theoretical price of European call options using the Black-Scholes formula.
+
+    Inputs broadcast against each other.
+
+    Parameters
+    ----------
+    S : ArrayLike
+        Current underlying price
+    K : ArrayLike
+        Option strike price
+    r : ArrayLike
+        Risk-free interest rate
+    t : ArrayLike
+        Time to expiry
+    sigma : ArrayLike
+        Volatility of the underlying asset
+    out : np.ndarray, optional
+        Preallocated array of the broadcast shape to write the result into.
+    dtype : DTypeLike
+        Floating point precision of the computation. Default: np.float64.
+
+    Returns
+    -------
+    np.ndarray
+        Theoretical price of the call options
+    """
+
+    S, K, r, t, sigma = (np.asarray(x, dtype=dtype) for x in (S, K, r, t, sigma))
+    d1, d2, K_discount = _d1_d2(S, K, r, t, sigma)
+
+    C = np.multiply(S, ndtr(d1), out=out)
+    C -= K_discount * ndtr(d2)
+
+    return C
+
+
+def put_price(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, sigma:ArrayLike, out:Optional[np.ndarray]=None, dtype:DTypeLike=np.float64) -> np.ndarray:
+    """
+    Computes the theoretical price of European put options using the Black-Scholes formula.
+
+    Inputs broadcast against each other.
+
+    Parameters
+    ----------
+    S : ArrayLike
+        Current underlying price
+    K : ArrayLike
+        Option strike price
+    r : ArrayLike
+        Risk-free interest rate
+    t : ArrayLike
+        Time to expiry
+    sigma : ArrayLike
+        Volatility of the underlying asset
+    out : np.ndarray, optional
+        Preallocated array of the broadcast shape to write the result into.
+    dtype : DTypeLike
+        Floating point precision of the computation. Default: np.float64.
+
+    Returns
+    -------
+    np.ndarray
+        Theoretical price of the put options
+    """
+
+    S, K, r, t, sigma = (np.asarray(x, dtype=dtype) for x in (S, K, r, t, sigma))
+    d1, d2, K_discount = _d1_d2(S, K, r, t, sigma)
+
+    P = np.multiply(K_discount, ndtr(-d2), out=out)
+    P -= S * ndtr(-d1)
+
+    return P
+
+
+def call_put_price(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, sigma:ArrayLike, out:Optional[Tuple[np.ndarray,np.ndarray]]=None, dtype:DTypeLike=np.float64) -> Tuple[np.ndarray,np.ndarray]:
+    """
+    Computes the theoretical price of both European call and put options using the Black-Scholes formula.
+
+    Inputs broadcast against each other. The put is obtained via put-call parity.
+
+    Parameters
+    ----------
+    S : ArrayLike
+        Current underlying price
+    K : ArrayLike
+        Option strike price
+    r : ArrayLike
+        Risk-free interest rate
+    t : ArrayLike
+        Time to expiry
+    sigma : ArrayLike
+        Volatility of the underlying asset
+    out : Tuple[np.ndarray,np.ndarray], optional
+        Preallocated call and put arrays of the broadcast shape to write the results into.
+    dtype : DTypeLike
+        Floating point precision of the computation. Default: np.float64.
+
+    Returns
+    -------
+    Tuple[np.ndarray,np.ndarray]
+        Theoretical price of the call and put options, respectively
+    """
+
+    S, K, r, t, sigma = (np.asarray(x, dtype=dtype) for x in (S, K, r, t, sigma))
+    d1, d2, K_discount = _d1_d2(S, K, r, t, sigma)
+    C_out, P_out = out if out is not None else (None, None)
+
+    C = np.multiply(S, ndtr(d1), out=C_out)
+    C -= K_discount * ndtr(d2)
+    P = np.add(C, K_discount, out=P_out)
+    P -= S
+
+    return (C, P)
+
+
+def _implied_volatility(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, price:ArrayLike, call:bool, sigma0:ArrayLike, tol:Optional[float], max_iter:int, dtype:DTypeLike) -> np.ndarray:
+    """Vectorized Newton's method with analytic vega, safeguarded by bisection and freezing each element once it converges."""
+
+    sigma0 = resolve(sigma0, S, K, r, t, price, 'call' if call else 'put')
+    S, K, r, t, price, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=dtype) for x in (S, K, r, t, price, sigma0)))
+    sigma = sigma.copy()
+    if tol is None:
+        tol = 100 * np.finfo(sigma.dtype).eps
+
+    # No-arbitrage bounds: intrinsic value < price < underlying (call) or discounted strike (put).
+    K_discount = K * np.exp(-r*t)
+    intrinsic = np.maximum(S - K_discount if call else K_discount - S, 0)
+    # An array even for scalar inputs, so that the flags can be updated through `ravel`.
+    valid = np.asarray((intrinsic < price) & (price < (S if call else K_discount)))
+    active = valid.copy()
+    sqrt_t = np.sqrt(t)
+    pricer = call_price if call else put_price
+    # Bracket of the root, which the price being increasing in sigma narrows at every step.
+    lower = np.zeros(sigma.shape, dtype=sigma.dtype)
+    upper = np.full(sigma.shape, np.inf, dtype=sigma.dtype)
+
+    for i in range(max_iter):
+
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        s, k, rr, tt, st, sg, lo, hi = (x.ravel()[idx] for x in (S, K, r, t, sqrt_t, sigma, lower, upper))
+
+        diff = pricer(s, k, rr, tt, sg, dtype=dtype) - price.ravel()[idx]
+        lo = np.where(diff < 0, sg, lo)
+        hi = np.where(diff > 0, sg, hi)
+        d1 = (np.log(s / k) + (rr + sg**2 / 2) * tt) / (sg * st)
+        vega = s * np.exp(-d1**2 / 2) / math.sqrt(2 * math.pi) * st
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = np.where(diff == 0, sg, sg - diff / vega)
+
+        # On the flat parts of the price curve vega vanishes and Newton overshoots out of the bracket,
+        # so bisect instead, or at most double sigma while there is no upper end yet.
+        ceiling = np.where(np.isfinite(hi), hi, 2 * sg)
+        inside = np.isfinite(newton) & (lo < newton) & (newton < ceiling) | (diff == 0)
+        updated = np.where(inside, newton, np.where(np.isfinite(hi), (lo + hi) / 2, ceiling))
+        sigma.ravel()[idx] = updated
+        lower.ravel()[idx] = lo
+        upper.ravel()[idx] = hi
+        active.ravel()[idx] = ~(np.abs(updated - sg) <= tol * np.maximum(updated, 1)) & np.isfinite(updated)
+
+    # Elements whose steps never met the tolerance are no solution.
+    sigma[~valid | active] = np.nan
+    return sigma
+
+
+def call_implied_volatility(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, price:ArrayLike, sigma0:ArrayLike=0.5, tol:Optional[float]=None, max_iter:int=100, dtype:DTypeLike=np.float64) -> np.ndarray:
+    """
+    Calculates the implied volatility of European call options using the Black-Scholes model.
+
+    Parameters
+    ----------
+    S : ArrayLike
+        Current underlying price
+    K : ArrayLike
+        Option strike price
+    r : ArrayLike
+        Risk-free interest rate
+    t : ArrayLike
+        Time to expiry
+    price : ArrayLike
+        Observed price of the call options
+    sigma0 : ArrayLike or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`. Default: 0.5.
+    tol : float, optional
+        Relative step size below which an element counts as converged. Default: 100 machine epsilons of `dtype`.
+    max_iter : int
+        The maximum number of Newton steps. Default: 100.
+    dtype : DTypeLike
+        Floating point precision of the computation. Default: np.float64.
+
+    Returns
+    -------
+    np.ndarray
+        Implied volatility of the underlying asset.
+        NaN where the price violates the no-arbitrage bounds, or where `max_iter` ran out before the tolerance was met.
+    """
+
+    return _implied_volatility(S, K, r, t, price, True, sigma0, tol, max_iter, dtype)
+
+
+def put_implied_volatility(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, price:ArrayLike, sigma0:ArrayLike=0.5, tol:Optional[float]=None, max_iter:int=100, dtype:DTypeLike=np.float64) -> np.ndarray:
+    """
+    Calculates the implied volatility of European put options using the Black-Scholes model.
+
+    Parameters
+    ----------
+    S : ArrayLike
+        Current underlying price
+    K : ArrayLike
+        Option strike price
+    r : ArrayLike
+        Risk-free interest rate
+    t : ArrayLike
+        Time to expiry
+    price : ArrayLike
+        Observed price of the put options
+    sigma0 : ArrayLike or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`. Default: 0.5.
+    tol : float, optional
+        Relative step size below which an element counts as converged. Default: 100 machine epsilons of `dtype`.
+    max_iter : int
+        The maximum number of Newton steps. Default: 100.
+    dtype : DTypeLike
+        Floating point precision of the computation. Default: np.float64.
+
+    Returns
+    -------
+    np.ndarray
+        Implied volatility of the underlying asset.
+        NaN where the price violates the no-arbitrage bounds, or where `max_iter` ran out before the tolerance was met.
+    """
+
+    return _implied_volatility(S, K, r, t, price, False, sigma0, tol, max_iter, dtype)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    K = np.linspace(80, 120, 5)
+    C, P = call_put_price(100, K, 0.05, 1, 0.2)
+    for strike, call, put in zip(K, C, P):
+        print(f"Strike {strike:.0f}: call ${call:.4f}, put ${put:.4f}")
@@ -1,12 +1,23 @@
 """Implementation of Black-Scholes option pricing formula with PyTorch."""
 
+import math
 import torch
+from typing import NamedTuple, Optional, Tuple
+
+
+# Plain Python floats are folded into the kernels as scalars,
+# so they follow the dtype and device of the input without allocating anything per call.
+SQRT_2 = math.sqrt(2.0)
+INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+_ndtr = getattr(getattr(torch, 'special', None), 'ndtr', None)
 
 
 def normal_cdf(x:torch.Tensor) -> torch.Tensor:
     """
     Computes the cumulative distribution function of the standard normal distribution.
 
+    Uses `torch.special.ndtr` where available, and falls back to the error function otherwise.
+
     Parameters
     ----------
     x : torch.Tensor
@@ -18,7 +29,27 @@ def normal_cdf(x:torch.Tensor) -> torch.Tensor:
         The value of the CDF at x
     """
 
-    return (1.0 + torch.erf(x / torch.sqrt(torch.tensor([2.0])))) / 2.0
+    if _ndtr is not None:
+        return _ndtr(x)
+    return (1.0 + torch.erf(x / SQRT_2)) / 2.0
+
+
+def normal_pdf(x:torch.Tensor) -> torch.Tensor:
+    """
+    Computes the probability density function of the standard normal distribution.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Value of the random variable
+
+    Returns
+    -------
+    torch.Tensor
+        The value of the PDF at x
+    """
+
+    return torch.exp(-x**2 / 2) * INV_SQRT_2PI
 
 
 def call_price(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor) -> torch.Tensor:
@@ -89,8 +120,57 @@ def put_price(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, si
     return P
 
 
-# def call_put_price(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor) -> Tuple[torch.Tensor,torch.Tensor]:
-# Not implemented, because the inputs need to be separate variables for each of call and put output tensors.
+def call_put_price(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, out:Optional[Tuple[torch.Tensor,torch.Tensor]]=None) -> Tuple[torch.Tensor,torch.Tensor]:
+    """
+    Computes the theoretical price of both European call and put options using the Black-Scholes formula.
+
+    The shared terms are computed once and the put is obtained via put-call parity.
+    Both outputs depend on the same inputs, so autograd Greeks of one leg cannot be read off the leaf tensors;
+    use `greeks` for those instead.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    sigma : torch.Tensor
+        Volatility of the underlying asset
+    out : Tuple[torch.Tensor,torch.Tensor], optional
+        Preallocated call and put tensors of the broadcast shape to write the results into.
+        Meant for hot loops without autograd.
+
+    Returns
+    -------
+    Tuple[torch.Tensor,torch.Tensor]
+        Theoretical price of the call and put options, respectively
+    """
+
+    sigma_sqrt_t = sigma * torch.sqrt(t)
+    d1 = (torch.log(S / K) + (r + sigma**2 / 2) * t) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+
+    N_d1 = normal_cdf(d1)
+    N_d2 = normal_cdf(d2)
+    K_discount = K * torch.exp(-r*t)
+
+    if out is None:
+        C = S * N_d1 - K_discount * N_d2
+        P = C + K_discount - S
+        return (C, P)
+
+    C, P = out
+    torch.mul(S, N_d1, out=C)
+    torch.mul(K_discount, N_d2, out=P)
+    C.sub_(P)
+    torch.add(C, K_discount, out=P)
+    P.sub_(S)
+
+    return (C, P)
 
 
 def get_delta(S:torch.Tensor) -> torch.Tensor:
@@ -182,6 +262,98 @@ def get_vega(sigma:torch.Tensor) -> torch.Tensor:
     return sigma.grad
 
 
+class Greeks(NamedTuple):
+    """Theoretical price and Greeks of a batch of European options."""
+    price: torch.Tensor
+    delta: torch.Tensor
+    gamma: torch.Tensor
+    vega: torch.Tensor
+    theta: torch.Tensor
+    rho: torch.Tensor
+
+
+def greeks(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, kind:str='call', method:str='analytic') -> Greeks:
+    """
+    Computes the theoretical price and Greeks of European options in one vectorized pass.
+
+    The analytic method evaluates the closed forms without building any autograd graph,
+    sharing d1, d2, N(d1) and the discount factor between all outputs.
+    The autograd method differentiates `call_price` / `put_price` instead, and is kept for cross-checking.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    sigma : torch.Tensor
+        Volatility of the underlying asset
+    kind : str
+        Either "call" or "put". Default: "call".
+    method : str
+        Either "analytic" or "autograd". Default: "analytic".
+
+    Returns
+    -------
+    Greeks
+        Price, delta, gamma, vega, theta and rho of the options.
+        Theta follows `get_theta`, i.e. the decay per year of calendar time.
+    """
+
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+    if method == 'autograd':
+        return _autograd_greeks(S, K, r, t, sigma, kind)
+    elif method != 'analytic':
+        raise ValueError(f'Unknown method "{method}". Expected "analytic" or "autograd".')
+
+    with torch.no_grad():
+
+        sqrt_t = torch.sqrt(t)
+        sigma_sqrt_t = sigma * sqrt_t
+        d1 = (torch.log(S / K) + (r + sigma**2 / 2) * t) / sigma_sqrt_t
+        d2 = d1 - sigma_sqrt_t
+
+        N_d1 = normal_cdf(d1)
+        N_d2 = normal_cdf(d2)
+        n_d1 = normal_pdf(d1)
+        K_discount = K * torch.exp(-r*t)
+
+        C = S * N_d1 - K_discount * N_d2
+        gamma = n_d1 / (S * sigma_sqrt_t)
+        vega = S * n_d1 * sqrt_t
+        decay = -S * n_d1 * sigma / (2 * sqrt_t)
+
+        if kind == 'call':
+            price = C
+            delta = N_d1
+            theta = decay - r * K_discount * N_d2
+            rho = t * K_discount * N_d2
+        else:
+            price = C + K_discount - S
+            delta = N_d1 - 1
+            theta = decay + r * K_discount * (1 - N_d2)
+            rho = -t * K_discount * (1 - N_d2)
+
+    return Greeks(price, delta, gamma, vega, theta, rho)
+
+
+def _autograd_greeks(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, kind:str) -> Greeks:
+    """Reference implementation of `greeks` through autograd."""
+
+    # Broadcast first, so the gradient of the summed prices is the gradient of each option.
+    S, K, r, t, sigma = (x.detach().clone().requires_grad_(True) for x in torch.broadcast_tensors(S, K, r, t, sigma))
+    pricer = call_price if kind == 'call' else put_price
+    price = pricer(S, K, r, t, sigma)
+    delta, rho, dt, vega = torch.autograd.grad(price.sum(), (S, r, t, sigma), create_graph=True)
+    gamma, = torch.autograd.grad(delta.sum(), S)
+    return Greeks(price.detach(), delta.detach(), gamma.detach(), vega.detach(), -dt.detach(), rho.detach())
+
+
 if __name__ == "__main__":
 
     # Sample use case
@@ -0,0 +1,424 @@
+"""Batched calibration of smile models to whole option chains.
+
+Each symbol, or each expiry of a symbol, is one least squares problem, and all of them are solved at once
+by `dfin.optimize.least_squares`, with their quotes padded to the same number of expiries and strikes:
+
+* `fit_svi` fits the raw SVI parametrization of total implied variance to every expiry slice independently;
+* `fit_heston` fits the five parameters of Heston's model to all expiries of a symbol at once,
+  with price errors weighted by the inverse of their Black-Scholes vega, i.e. in units of implied volatility;
+* `calibrate` does either for a whole universe of `OptionChain`, warm-started from the previous fit,
+  e.g. yesterday's, within a time budget.
+"""
+
+import time
+from typing import Callable, Hashable, Mapping, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import torch
+
+from dfin.optimize import LeastSquaresResult, least_squares
+from dfin.options import heston_torch, iv_torch
+from dfin.options.bs_torch import normal_pdf
+from dfin.options.chain import OptionChain
+
+
+MODELS = ('heston', 'svi')
+
+HESTON_PARAMETERS = ('v0', 'kappa', 'theta', 'xi', 'rho')
+HESTON_LOWER = (1e-4, 1e-2, 1e-4, 1e-2, -0.99)
+HESTON_UPPER = (1., 10., 1., 2., 0.99)
+HESTON_GUESS = (0.04, 1.5, 0.04, 0.5, -0.5)
+
+SVI_PARAMETERS = ('a', 'b', 'rho', 'm', 'sigma')
+SVI_LOWER = (-1., 1e-4, -0.999, -2., 1e-3)
+SVI_UPPER = (1., 5., 0.999, 2., 2.)
+
+
+def svi_total_variance(k:torch.Tensor, params:torch.Tensor) -> torch.Tensor:
+    """
+    Computes the total implied variance of the raw SVI parametrization,
+
+        w(k) = a + b (rho (k - m) + sqrt((k - m)^2 + sigma^2)).
+
+    Parameters
+    ----------
+    k : torch.Tensor
+        Log-moneyness ln(K / F), of shape (slices, strikes).
+    params : torch.Tensor
+        Parameters a, b, rho, m and sigma of every slice, of shape (slices, 5).
+
+    Returns
+    -------
+    torch.Tensor
+        Total implied variance sigma_BS^2 t, of the shape of `k`.
+    """
+
+    a, b, rho, m, sigma = (x.unsqueeze(-1) for x in params.unbind(-1))
+    return a + b * (rho * (k - m) + torch.sqrt((k - m)**2 + sigma**2))
+
+
+def svi_implied_volatility(k:torch.Tensor, t:torch.Tensor, params:torch.Tensor) -> torch.Tensor:
+    """
+    Computes the implied volatility of the raw SVI parametrization. See `svi_total_variance`.
+
+    Parameters
+    ----------
+    k : torch.Tensor
+        Log-moneyness ln(K / F), of shape (slices, strikes).
+    t : torch.Tensor
+        Time to expiry, of shape (slices, 1) or (slices, strikes).
+    params : torch.Tensor
+        Parameters a, b, rho, m and sigma of every slice, of shape (slices, 5).
+
+    Returns
+    -------
+    torch.Tensor
+        Implied volatility, zero where the parameters give a negative total variance.
+    """
+
+    return torch.sqrt(torch.clamp(svi_total_variance(k, params), min=1e-12) / t)
+
+
+def _svi_guess(k:torch.Tensor, w:torch.Tensor) -> torch.Tensor:
+    """A smile centered on the lowest quoted total variance, with a moderate skew."""
+
+    finite = torch.isfinite(k) & torch.isfinite(w)
+    lowest = torch.where(finite, w, torch.full_like(w, float('inf'))).argmin(-1, keepdim=True)
+    w_min = torch.gather(w, -1, lowest).squeeze(-1)
+    m = torch.gather(k, -1, lowest).squeeze(-1).clamp(-1, 1)
+    sigma = torch.full_like(m, 0.1)
+    b = torch.full_like(m, 0.1)
+    a = torch.clamp(w_min - b * sigma, min=0.)
+    # Slices without any quote start anywhere, their loss is zero regardless.
+    return torch.nan_to_num(torch.stack([a, b, torch.full_like(m, -0.3), m, sigma], dim=-1))
+
+
+def fit_svi(k:torch.Tensor, t:torch.Tensor, iv:torch.Tensor, weights:Optional[torch.Tensor]=None, x0:Optional[torch.Tensor]=None, method:str='lm', max_iter:int=200, ftol:float=1e-8, atol:float=1e-14, time_budget:Optional[float]=None, callback:Optional[Callable]=None) -> LeastSquaresResult:
+    """
+    Fits the raw SVI parametrization to a batch of expiry slices, each slice an independent problem.
+
+    The residuals are errors in implied volatility, so every quote weighs as its price error divided by its vega.
+
+    Parameters
+    ----------
+    k : torch.Tensor
+        Log-moneyness ln(K / F) of every quote, of shape (slices, strikes), padded with NaN (see `dfin.optimize.pad`).
+    t : torch.Tensor
+        Time to expiry of every slice, of shape (slices, 1), or of every quote.
+    iv : torch.Tensor
+        Market implied volatility of every quote. NaN quotes are ignored.
+    weights : torch.Tensor, optional
+        Weight of every quote's residual, e.g. its vega to fit price errors instead. Default: equal weights.
+    x0 : torch.Tensor, optional
+        Initial parameters of shape (slices, 5), e.g. the previous day's fit. Default: a heuristic guess.
+    method : str
+        Least squares method, see `dfin.optimize.least_squares`. Default: "lm".
+    max_iter : int
+        The maximum number of iterations. Default: 200.
+    ftol : float
+        Relative decrease of the loss under which a slice counts as converged. Default: 1e-8.
+    atol : float
+        Sum of squared residuals under which a slice counts as converged. Default: 1e-14.
+    time_budget : float, optional
+        Wall time in seconds after which to return the best fit so far.
+    callback : Callable, optional
+        Receives the `SolverReport` of the solver.
+
+    Returns
+    -------
+    LeastSquaresResult
+        Parameters a, b, rho, m and sigma of every slice, with the loss, iteration count and converged flag of each.
+    """
+
+    k, t, iv = (torch.as_tensor(x, dtype=torch.float64) for x in (k, t, iv))
+    weights = torch.ones_like(iv) if weights is None else torch.as_tensor(weights, dtype=iv.dtype)
+    x0 = _svi_guess(k, iv**2 * t) if x0 is None else torch.as_tensor(x0, dtype=iv.dtype)
+
+    # Padding is evaluated at the money and masked afterwards, so that no NaN reaches the gradients.
+    valid = torch.isfinite(k) & torch.isfinite(t) & torch.isfinite(iv) & torch.isfinite(weights)
+    k, iv, weights = (torch.where(valid, x, torch.zeros_like(x)) for x in torch.broadcast_tensors(k, iv, weights))
+    t = torch.where(torch.isfinite(t), t, torch.ones_like(t))
+
+    def residuals(params:torch.Tensor) -> torch.Tensor:
+        r = weights * (svi_implied_volatility(k, t, params) - iv)
+        return torch.where(valid, r, torch.full_like(r, float('nan')))
+
+    return least_squares(residuals, x0, SVI_LOWER, SVI_UPPER, method=method, ftol=ftol, atol=atol, max_iter=max_iter, time_budget=time_budget, callback=callback)
+
+
+def _implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, is_call:torch.Tensor) -> torch.Tensor:
+    """Black-Scholes implied volatility of every quote, NaN where the price admits none."""
+
+    sigma0 = torch.full_like(price, 0.3)
+    call = iv_torch.call_implied_volatility_analytic(S, K, r, t, price, sigma0, atol=1e-10)
+    put = iv_torch.put_implied_volatility_analytic(S, K, r, t, price, sigma0, atol=1e-10)
+    sigma = torch.where(is_call, call.x, put.x)
+    solved = torch.where(is_call, call.converged, put.converged) & torch.isfinite(price)
+    return torch.where(solved, sigma, torch.full_like(sigma, float('nan')))
+
+
+def _vega(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, floor:torch.Tensor) -> torch.Tensor:
+    """Black-Scholes vega, floored, and NaN where the volatility is."""
+
+    d1 = (torch.log(S / K) + (r + sigma**2 / 2) * t) / (sigma * torch.sqrt(t))
+    return torch.clamp(S * normal_pdf(d1) * torch.sqrt(t), min=floor)
+
+
+def _heston_guess(sigma:torch.Tensor) -> torch.Tensor:
+    """`HESTON_GUESS`, with v0 and theta at the mean implied variance of each symbol's quotes."""
+
+    x0 = torch.tensor(HESTON_GUESS, dtype=sigma.dtype).repeat(sigma.shape[0], 1)
+    solved = torch.isfinite(sigma)
+    count = solved.sum(-1)
+    variance = torch.where(solved, sigma**2, torch.zeros_like(sigma)).sum(-1) / count.clamp(min=1)
+    level = torch.where(count > 0, variance, x0[:, 0]).clamp(HESTON_LOWER[0], HESTON_UPPER[0])
+    x0[:, 0] = x0[:, 2] = level
+    return x0
+
+
+def fit_heston(S:torch.Tensor, K:torch.Tensor, t:torch.Tensor, price:torch.Tensor, is_call:torch.Tensor, r:torch.Tensor, q:Union[float, torch.Tensor]=0., weights:Union[str, torch.Tensor, None]='vega', sigma:Optional[torch.Tensor]=None, x0:Optional[torch.Tensor]=None, nodes:int=128, method:str='lm', max_iter:int=100, ftol:float=1e-8, atol:float=1e-14, time_budget:Optional[float]=None, callback:Optional[Callable]=None) -> LeastSquaresResult:
+    """
+    Fits Heston's model to a batch of symbols, each an independent problem spanning all its strikes and expiries.
+
+    Quotes are laid out as (symbols, expiries, strikes), so that the characteristic function of every expiry is shared by its strikes.
+    Model prices come from `heston_torch.price` with Gauss-Laguerre quadrature, and their Jacobian from forward-mode autograd.
+    The Feller condition is not enforced, as fitted parameters of equity smiles routinely violate it.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price of every symbol, of shape (symbols, 1, 1).
+    K : torch.Tensor
+        Strike of every quote, of shape (symbols, expiries, strikes), padded with NaN.
+    t : torch.Tensor
+        Time to expiry of every expiry, of shape (symbols, expiries, 1).
+    price : torch.Tensor
+        Market price of every quote. NaN quotes are ignored.
+    is_call : torch.Tensor
+        Whether every quote is a call, else a put.
+    r : torch.Tensor
+        Risk-free interest rate, per symbol or per expiry.
+    q : float or torch.Tensor
+        Continuous dividend yield, per symbol or per expiry. Default: 0.
+    weights : str or torch.Tensor, optional
+        "vega" to divide price errors by the Black-Scholes vega at the market implied volatility, which makes them
+        errors in implied volatility, with the vega floored at 1e-3 S to keep far wings in check.
+        Quotes without an implied volatility are then ignored. Alternatively a weight for every quote,
+        or None for plain price errors. Default: "vega".
+    sigma : torch.Tensor, optional
+        Market implied volatility of every quote, NaN where the price admits none, e.g. when the caller already solved for it.
+        Default: solved from the prices.
+    x0 : torch.Tensor, optional
+        Initial v0, kappa, theta, xi and rho of every symbol, of shape (symbols, 5), e.g. the previous day's fit.
+        Default: `HESTON_GUESS`, with v0 and theta at the mean variance implied by the quotes.
+    nodes : int
+        Number of Gauss-Laguerre nodes, at most `heston_torch.MAX_NODES`. Default: 128.
+    method : str
+        Least squares method, see `dfin.optimize.least_squares`. Default: "lm".
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    ftol : float
+        Relative decrease of the loss under which a symbol counts as converged. Default: 1e-8.
+    atol : float
+        Sum of squared residuals under which a symbol counts as converged. Default: 1e-14.
+    time_budget : float, optional
+        Wall time in seconds after which to return the best fit so far.
+    callback : Callable, optional
+        Receives the `SolverReport` of the solver.
+
+    Returns
+    -------
+    LeastSquaresResult
+        Parameters v0, kappa, theta, xi and rho of every symbol, with the loss, iteration count and converged flag of each.
+    """
+
+    S, K, t, price, r, q = (torch.as_tensor(x, dtype=torch.float64) for x in (S, K, t, price, r, q))
+    is_call = torch.as_tensor(is_call, dtype=torch.bool)
+    # Dividends only shift the forward, so Black-Scholes on the discounted spot covers them.
+    forward, discount = S * torch.exp(-q * t), torch.exp(-r * t)
+    quotes = torch.broadcast_tensors(forward, K, r, t, price, is_call)
+    sigma = _implied_volatility(*quotes) if sigma is None else torch.as_tensor(sigma, dtype=price.dtype).expand_as(quotes[4])
+
+    if isinstance(weights, str):
+        if weights != 'vega':
+            raise ValueError(f'Unknown weights "{weights}". Expected "vega", a tensor or None.')
+        weights = 1 / _vega(*quotes[:4], sigma, 1e-3 * S)
+    elif weights is None:
+        weights = torch.ones_like(quotes[4])
+    else:
+        weights = torch.as_tensor(weights, dtype=price.dtype).expand_as(quotes[4])
+    x0 = _heston_guess(sigma.flatten(1)) if x0 is None else torch.as_tensor(x0, dtype=price.dtype)
+
+    # Padding is priced at the money and masked afterwards, so that no NaN reaches the gradients.
+    valid = torch.isfinite(quotes[1]) & torch.isfinite(quotes[4]) & torch.isfinite(weights)
+    K = torch.where(valid, quotes[1], S.expand_as(valid))
+    t = torch.where(torch.isfinite(t), t, torch.ones_like(t))
+    weights, price = (torch.where(valid, x, torch.zeros_like(x)) for x in (weights, quotes[4]))
+    shape = (-1,) + (1,) * (K.dim() - 1)
+
+    def residuals(params:torch.Tensor) -> torch.Tensor:
+        v0, kappa, theta, xi, rho = (x.reshape(shape) for x in params.unbind(-1))
+        call = heston_torch.price(S, K, r, t, v0, kappa, theta, xi, rho, 'call', q, nodes=nodes)
+        model = torch.where(is_call, call, call - forward + K * discount)
+        return torch.where(valid, weights * (model - price), torch.full_like(model, float('nan'))).flatten(1)
+
+    return least_squares(residuals, x0, HESTON_LOWER, HESTON_UPPER, method=method, ftol=ftol, atol=atol, max_iter=max_iter, time_budget=time_budget, callback=callback)
+
+
+def chain_quotes(chain:OptionChain, lower:float=0.7, upper:float=1.3, min_t:float=7/365) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Selects the out-of-the-money quotes of a chain, the liquid side of every strike, to calibrate to.
+
+    Parameters
+    ----------
+    chain : OptionChain
+        Chain of one symbol, with any number of expiries.
+    lower, upper : float
+        Inclusive bounds on moneyness K / S. Default: 0.7 and 1.3.
+    min_t : float
+        Shortest time to expiry to keep, in years. Default: one week.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        Strike, time to expiry, mid price and whether each quote is a call. Puts below the underlying price, calls above.
+    """
+
+    chain = chain.between(lower, upper)
+    is_call = chain.strike >= chain.S
+    price = np.where(is_call, chain.call.mid, chain.put.mid)
+    listed = np.where(is_call, chain.call.listed, chain.put.listed)
+    t = chain.t
+    keep = listed & np.isfinite(price) & (price > 0) & (t >= min_t)
+    return chain.strike[keep], t[keep], price[keep], is_call[keep]
+
+
+def _previous_parameters(previous, key:Hashable, names:Tuple[str, ...]) -> Optional[np.ndarray]:
+    """Parameters of a key in a previous fit, as returned by `calibrate` or any mapping to sequences."""
+
+    if previous is None:
+        return None
+    if isinstance(previous, pd.DataFrame):
+        if key not in previous.index:
+            return None
+        values = previous.loc[key, list(names)].to_numpy(dtype=np.float64, copy=True)
+    else:
+        if key not in previous:
+            return None
+        values = np.array(previous[key], dtype=np.float64)
+    return values if np.isfinite(values).all() else None
+
+
+def calibrate(chains:Mapping[Hashable, OptionChain], model:str='heston', previous=None, q:Union[float, Mapping[Hashable, float]]=0., lower:float=0.7, upper:float=1.3, min_t:float=7/365, time_budget:Optional[float]=None, **kwargs) -> pd.DataFrame:
+    """
+    Calibrates a model to the chains of a universe of symbols, solved together as one batch of independent problems.
+
+    Parameters
+    ----------
+    chains : Mapping[Hashable, OptionChain]
+        Chain of every symbol.
+    model : str
+        Either "heston", one fit per symbol over all its expiries, or "svi", one fit per symbol and expiry. Default: "heston".
+    previous : pd.DataFrame or Mapping, optional
+        A previous fit to warm-start from, e.g. yesterday's output of `calibrate`, or parameters by symbol
+        (by (symbol, expiry label) for SVI). Symbols or expiries without one start from the default guess.
+    q : float or Mapping[Hashable, float]
+        Continuous dividend yield, overall or by symbol. Default: 0.
+    lower, upper : float
+        Inclusive bounds on moneyness K / S of the quotes. Default: 0.7 and 1.3.
+    min_t : float
+        Shortest time to expiry to keep, in years. Default: one week.
+    time_budget : float, optional
+        Wall time in seconds for the whole universe, after which the best fits so far are returned.
+    kwargs
+        Passed on to `fit_heston` or `fit_svi`, e.g. `method` or `max_iter`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The parameters of every fit, indexed by symbol (by symbol and expiry label for SVI),
+        with the root mean squared residual, the number of quotes with an implied volatility, the iteration count and the converged flag.
+        Symbols without any quote are left out.
+    """
+
+    if model not in MODELS:
+        raise ValueError(f'Unknown model "{model}". Expected "heston" or "svi".')
+
+    start = time.perf_counter()
+    names = HESTON_PARAMETERS if model == 'heston' else SVI_PARAMETERS
+    columns = list(names) + ['rmse', 'quotes', 'iterations', 'converged']
+    dividend = lambda symbol: float(q[symbol]) if isinstance(q, Mapping) else float(q)
+
+    # One row of quotes per expiry of every symbol.
+    symbols, labels, S, r, dividends, rows = [], [], [], [], [], []
+    for symbol, chain in chains.items():
+        K, t, price, is_call = chain_quotes(chain, lower, upper, min_t)
+        expiries = [(label, t == expiry) for label, expiry in zip(chain.labels, chain.expiries) if np.any(t == expiry)]
+        if expiries:
+            symbols.append(symbol)
+            labels.append([label for label, _ in expiries])
+            S.append(chain.S)
+            r.append(chain.r)
+            dividends.append(dividend(symbol))
+            rows.append([(K[i], t[i][:1], price[i], is_call[i]) for _, i in expiries])
+
+    if not symbols:
+        index = pd.MultiIndex.from_tuples([], names=['symbol', 'expiry']) if model == 'svi' else pd.Index([], name='symbol')
+        return pd.DataFrame(columns=columns, index=index)
+
+    # Padded to (symbols, expiries, strikes).
+    expiries, strikes = max(len(x) for x in rows), max(len(row[0]) for x in rows for row in x)
+    K, t, price, is_call = (torch.full((len(symbols), expiries, size), float('nan'), dtype=torch.float64) for size in (strikes, 1, strikes, strikes))
+    for i, symbol_rows in enumerate(rows):
+        for j, row in enumerate(symbol_rows):
+            for out, values in zip((K, t, price, is_call), row):
+                out[i, j, :len(values)] = torch.from_numpy(values.astype(np.float64))
+    is_call = is_call == 1
+    S, r, q = (torch.tensor(x, dtype=torch.float64).reshape(-1, 1, 1) for x in (S, r, dividends))
+    sigma = _implied_volatility(*torch.broadcast_tensors(S * torch.exp(-q * t), K, r, t, price, is_call))
+    remaining = None if time_budget is None else max(time_budget - (time.perf_counter() - start), 0.)
+
+    if model == 'heston':
+        keys = symbols
+        index = pd.Index(keys, name='symbol')
+        count = torch.isfinite(sigma).flatten(1).sum(-1)
+        guess = _heston_guess(sigma.flatten(1))
+    else:
+        # Every expiry of every symbol is a slice of its own.
+        listed = torch.isfinite(price).any(-1).flatten()
+        keys = [(symbol, label) for symbol, symbol_labels in zip(symbols, labels) for label in symbol_labels]
+        index = pd.MultiIndex.from_tuples(keys, names=['symbol', 'expiry'])
+        k = torch.log(K / (S * torch.exp((r - q) * t))).flatten(0, 1)[listed]
+        t, sigma = t.flatten(0, 1)[listed], sigma.flatten(0, 1)[listed]
+        count = torch.isfinite(sigma).sum(-1)
+        guess = _svi_guess(k, sigma**2 * t)
+
+    warm = [_previous_parameters(previous, key, names) for key in keys]
+    x0 = torch.stack([torch.as_tensor(x, dtype=torch.float64) if x is not None else g for x, g in zip(warm, guess)])
+    if model == 'heston':
+        result = fit_heston(S, K, t, price, is_call, r, q, sigma=sigma, x0=x0, time_budget=remaining, **kwargs)
+    else:
+        result = fit_svi(k, t, sigma, x0=x0, time_budget=remaining, **kwargs)
+
+    frame = pd.DataFrame(result.x.numpy(), index=index, columns=list(names))
+    frame['rmse'] = torch.sqrt(result.loss / count.clamp(min=1)).numpy()
+    frame['quotes'] = count.numpy()
+    frame['iterations'] = result.iterations.numpy()
+    frame['converged'] = result.converged.numpy()
+    return frame
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    true = torch.tensor([[0.04, 2., 0.05, 0.5, -0.7], [0.09, 1., 0.06, 0.8, -0.4]], dtype=torch.float64)
+    S = torch.full((2, 1, 1), 100., dtype=torch.float64)
+    K = torch.linspace(80, 120, 9, dtype=torch.float64).expand(2, 3, 9)
+    t = torch.tensor([0.25, 0.5, 1.], dtype=torch.float64).reshape(1, 3, 1).expand(2, 3, 1)
+    v0, kappa, theta, xi, rho = (x.reshape(-1, 1, 1) for x in true.unbind(-1))
+    quotes = heston_torch.put_price(S, K, 0.05, t, v0, kappa, theta, xi, rho)
+    fit = fit_heston(S, K, t, quotes, torch.zeros(K.shape, dtype=torch.bool), 0.05)
+    print(f'True parameters   : {true}')
+    print(f'Fitted parameters : {fit.x}')
+    print(f'Iterations        : {fit.iterations}')
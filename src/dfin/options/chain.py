@@ -0,0 +1,395 @@
+"""Columnar option chain.
+
+`OptionChain` holds the calls and puts of one or more expirations in contiguous arrays, with the rows of every expiry
+sorted by strike and the call and put legs of a strike on the same row. It replaces the outer merge of the
+`calls` and `puts` DataFrames of yfinance: strikes are sorted once, lookups are binary searches,
+and the arrays go straight into the vectorized pricers.
+"""
+
+import warnings
+from typing import Dict, Hashable, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+from dfin.options import bs_numpy
+from dfin.options.iv_guess import corrado_miller
+
+
+# Leg attribute, yfinance column, dtype and fill value of missing contracts.
+LEG_FIELDS = (
+    ('contract', 'contractSymbol', object, None),
+    ('last_trade', 'lastTradeDate', 'datetime64[ns]', np.datetime64('NaT')),
+    ('last', 'lastPrice', np.float64, np.nan),
+    ('bid', 'bid', np.float64, np.nan),
+    ('ask', 'ask', np.float64, np.nan),
+    ('volume', 'volume', np.float64, np.nan),
+    ('open_interest', 'openInterest', np.float64, np.nan),
+    ('implied_volatility', 'impliedVolatility', np.float64, np.nan),
+    ('in_the_money', 'inTheMoney', np.bool_, False),
+)
+
+YEAR = pd.Timedelta(days=365)
+# Timezone of the listed expiry dates, which carry none.
+EXCHANGE_TZ = 'America/New_York'
+
+
+def _utc(timestamp:pd.Timestamp) -> pd.Timestamp:
+    """Timezone-naive UTC time of a timestamp. Naive timestamps are taken to be in UTC already."""
+
+    return timestamp if timestamp.tzinfo is None else timestamp.tz_convert('UTC').tz_localize(None)
+
+
+def _unique_strikes(frame:pd.DataFrame, label:Hashable) -> pd.DataFrame:
+    """Keeps one contract per strike, the most recently traded one, e.g. of a standard and an adjusted contract after a split."""
+
+    if not frame['strike'].duplicated().any():
+        return frame
+    warnings.warn(f'Duplicate strikes in expiry "{label}", keeping the most recently traded contract of each.', RuntimeWarning)
+    if 'lastTradeDate' in frame:
+        traded = pd.to_datetime(frame['lastTradeDate'], utc=True, cache=False).reset_index(drop=True)
+        # Stable, so that ties keep their order, with missing trade dates first.
+        frame = frame.iloc[traded.sort_values(kind='stable', na_position='first').index]
+    return frame.drop_duplicates('strike', keep='last')
+
+
+class OptionLeg:
+    """
+    Quotes of the calls or the puts of a chain, one entry per row of the chain.
+
+    Attributes
+    ----------
+    listed : np.ndarray
+        Whether a contract is listed on the row at all. The other fields are NaN, NaT, None or False where it is not.
+    contract, last_trade, last, bid, ask, volume, open_interest, implied_volatility, in_the_money : np.ndarray
+        The yfinance columns of the same name, in snake case.
+    """
+
+    __slots__ = ('listed',) + tuple(name for name, *_ in LEG_FIELDS)
+
+    def __init__(self, listed:np.ndarray, **fields:np.ndarray):
+
+        self.listed = listed
+        for name, _, dtype, fill in LEG_FIELDS:
+            setattr(self, name, fields[name] if name in fields else np.full(len(listed), fill, dtype=dtype))
+
+    @classmethod
+    def from_frame(cls, frame:Optional[pd.DataFrame], rows:np.ndarray, size:int) -> 'OptionLeg':
+        """Scatters the yfinance `calls` or `puts` of one expiry onto the given rows of `size` rows."""
+
+        listed = np.zeros(size, dtype=np.bool_)
+        listed[rows] = True
+        fields = {}
+        for name, column, dtype, fill in LEG_FIELDS:
+            values = np.full(size, fill, dtype=dtype)
+            if frame is not None and column in frame:
+                source = frame[column]
+                if dtype == 'datetime64[ns]':
+                    if not isinstance(source.dtype, pd.DatetimeTZDtype):
+                        source = pd.to_datetime(source, utc=True, cache=False)
+                    source = source.dt.tz_convert(None)
+                values[rows] = source.to_numpy(dtype=dtype, na_value=fill)
+            fields[name] = values
+        return cls(listed, **fields)
+
+    def take(self, index:Union[slice, np.ndarray]) -> 'OptionLeg':
+        """Rows selected by a slice (views) or an index array (copies)."""
+
+        return OptionLeg(self.listed[index], **{name: getattr(self, name)[index] for name, *_ in LEG_FIELDS})
+
+    @property
+    def mid(self) -> np.ndarray:
+        """Midpoint of bid and ask, falling back to the last price where either is missing or zero."""
+
+        valid = (self.bid > 0) & (self.ask > 0)
+        return np.where(valid, (self.bid + self.ask) / 2, self.last)
+
+    def __len__(self) -> int:
+        return len(self.listed)
+
+
+class OptionChain:
+    """
+    Calls and puts of one or more expirations, in contiguous arrays.
+
+    Rows are grouped by expiry, in order of time to expiry, and sorted by strike within each expiry.
+    Row `i` holds the call and the put of `strike[i]`, either of which may be missing (see `OptionLeg.listed`).
+
+    Attributes
+    ----------
+    S : float
+        Current underlying price. NaN if unknown.
+    r : float
+        Risk-free interest rate.
+    labels : list
+        Expiry labels, e.g. the expiration date strings of yfinance.
+    expiries : np.ndarray
+        Time to expiry of every expiry in years, ascending.
+    offsets : np.ndarray
+        Rows of expiry `i` are `offsets[i]:offsets[i+1]`.
+    strike : np.ndarray
+        Strike of every row.
+    call, put : OptionLeg
+        Quotes of the calls and the puts of every row.
+    """
+
+    __slots__ = ('S', 'r', 'labels', 'expiries', 'offsets', 'strike', 'call', 'put')
+
+    def __init__(self, S:float, r:float, labels:list, expiries:np.ndarray, offsets:np.ndarray, strike:np.ndarray, call:OptionLeg, put:OptionLeg):
+
+        self.S = S
+        self.r = r
+        self.labels = labels
+        self.expiries = expiries
+        self.offsets = offsets
+        self.strike = strike
+        self.call = call
+        self.put = put
+
+    @classmethod
+    def from_frames(cls, frames:Mapping[Hashable, Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]], S:float=np.nan, r:float=0.05, now:Optional[pd.Timestamp]=None, t:Optional[Mapping[Hashable, float]]=None) -> 'OptionChain':
+        """
+        Builds a chain from the yfinance `calls` and `puts` DataFrames of every expiry.
+
+        Parameters
+        ----------
+        frames : Mapping[Hashable, Tuple[pd.DataFrame, pd.DataFrame]]
+            Calls and puts by expiry label, e.g. `{expiration: ticker.option_chain(expiration)}`. Either leg may be None.
+        S : float
+            Current underlying price. Default: NaN.
+        r : float
+            Risk-free interest rate. Default: 0.05.
+        now : pd.Timestamp, optional
+            Time the times to expiry are measured from, for labels that parse as dates. Naive times are in UTC,
+            while naive labels are dates in `EXCHANGE_TZ`. Default: now.
+        t : Mapping[Hashable, float], optional
+            Time to expiry in years by label, instead of parsing the labels.
+
+        Returns
+        -------
+        OptionChain
+            The chain, with rows sorted by time to expiry and strike.
+            Where a leg lists a strike more than once, the most recently traded contract is kept, with a warning.
+        """
+
+        now = _utc(pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now))
+        expiries = {}
+        for label in frames:
+            if t is not None:
+                expiries[label] = float(t[label])
+            else:
+                # Options expire at the close, 16:00 on the exchange, in the timezone of the label if it has one.
+                expiry = pd.Timestamp(label)
+                if expiry.tzinfo is None:
+                    expiry = expiry.tz_localize(EXCHANGE_TZ)
+                expiries[label] = (_utc(expiry + pd.Timedelta(hours=16)) - now) / YEAR
+        labels = sorted(frames, key=expiries.get)
+
+        strikes, calls, puts, offsets = [], [], [], [0]
+        for label in labels:
+            # yfinance chains carry the underlying as a third field.
+            call, put = tuple(frames[label])[:2]
+            legs = [_unique_strikes(frame, label) if frame is not None and len(frame) else None for frame in (call, put)]
+            strike = np.unique(np.concatenate([frame['strike'].to_numpy(dtype=np.float64) for frame in legs if frame is not None] + [np.empty(0)]))
+            size = len(strike)
+            for frame, parts in zip(legs, (calls, puts)):
+                rows = np.searchsorted(strike, frame['strike'].to_numpy(dtype=np.float64)) if frame is not None else np.empty(0, dtype=np.int64)
+                parts.append(OptionLeg.from_frame(frame, rows, size))
+            strikes.append(strike)
+            offsets.append(offsets[-1] + size)
+
+        def concatenate(legs):
+            if not legs:
+                return OptionLeg(np.empty(0, dtype=np.bool_))
+            return OptionLeg(np.concatenate([leg.listed for leg in legs]), **{name: np.concatenate([getattr(leg, name) for leg in legs]) for name, *_ in LEG_FIELDS})
+
+        return cls(
+            float(S), float(r), labels,
+            np.array([expiries[label] for label in labels], dtype=np.float64),
+            np.array(offsets, dtype=np.int64),
+            np.concatenate(strikes) if strikes else np.empty(0),
+            concatenate(calls), concatenate(puts),
+        )
+
+    def __len__(self) -> int:
+        return len(self.strike)
+
+    def __repr__(self) -> str:
+        return f'OptionChain({len(self.labels)} expiries, {len(self)} strikes, S={self.S}, r={self.r})'
+
+    @property
+    def t(self) -> np.ndarray:
+        """Time to expiry of every row."""
+        return np.repeat(self.expiries, np.diff(self.offsets))
+
+    def _expiry_index(self, expiry:Union[Hashable, int]) -> int:
+        """Position of an expiry, by label or by position."""
+
+        if expiry in self.labels:
+            return self.labels.index(expiry)
+        if isinstance(expiry, (int, np.integer)) and -len(self.labels) <= expiry < len(self.labels):
+            return int(expiry) % len(self.labels)
+        raise KeyError(f'Unknown expiry "{expiry}". Expected one of {self.labels}.')
+
+    def expiry(self, expiry:Union[Hashable, int]) -> 'OptionChain':
+        """
+        The chain of a single expiry, as views of the arrays of this one.
+
+        Parameters
+        ----------
+        expiry : Hashable or int
+            Label, or position in order of time to expiry.
+
+        Returns
+        -------
+        OptionChain
+            A chain with one expiry.
+        """
+
+        i = self._expiry_index(expiry)
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        return OptionChain(self.S, self.r, [self.labels[i]], self.expiries[i:i+1], np.array([0, rows.stop - rows.start]), self.strike[rows], self.call.take(rows), self.put.take(rows))
+
+    def find(self, strike:ArrayLike, expiry:Union[Hashable, int]=0) -> np.ndarray:
+        """
+        Rows of the given strikes of one expiry, by binary search.
+
+        Parameters
+        ----------
+        strike : ArrayLike
+            Strikes to look up.
+        expiry : Hashable or int
+            Label, or position in order of time to expiry. Default: the nearest expiry.
+
+        Returns
+        -------
+        np.ndarray
+            Row of every strike in this chain, or -1 where the strike is not listed.
+        """
+
+        i = self._expiry_index(expiry)
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        strike = np.asarray(strike, dtype=np.float64)
+        rows = start + np.searchsorted(self.strike[start:stop], strike)
+        found = (rows < stop) & (self.strike[np.minimum(rows, len(self) - 1)] == strike) if len(self) else np.zeros(strike.shape, dtype=bool)
+        return np.where(found, rows, -1)
+
+    def between(self, lower:float, upper:float, moneyness:bool=True) -> 'OptionChain':
+        """
+        The rows whose strike lies within a range, in every expiry.
+
+        Parameters
+        ----------
+        lower, upper : float
+            Inclusive bounds, on K / S if `moneyness`, else on the strike itself.
+        moneyness : bool
+            Whether the bounds are relative to the underlying price. Default: True.
+
+        Returns
+        -------
+        OptionChain
+            The selected rows. Views if the chain has a single expiry, copies otherwise.
+        """
+
+        if moneyness:
+            lower, upper = lower * self.S, upper * self.S
+        starts, stops = [], []
+        for i in range(len(self.labels)):
+            strike = self.strike[self.offsets[i]:self.offsets[i + 1]]
+            starts.append(self.offsets[i] + np.searchsorted(strike, lower, side='left'))
+            stops.append(self.offsets[i] + np.searchsorted(strike, upper, side='right'))
+        sizes = np.maximum(np.array(stops, dtype=np.int64) - np.array(starts, dtype=np.int64), 0)
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        if len(self.labels) == 1:
+            rows = slice(starts[0], starts[0] + sizes[0])
+        else:
+            rows = np.concatenate([np.arange(a, a + n) for a, n in zip(starts, sizes)] + [np.empty(0, dtype=np.int64)])
+        return OptionChain(self.S, self.r, list(self.labels), self.expiries.copy(), offsets, self.strike[rows], self.call.take(rows), self.put.take(rows))
+
+    def price(self, sigma:Optional[ArrayLike]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Black-Scholes prices of the calls and puts of every row, with `bs_numpy`.
+
+        Parameters
+        ----------
+        sigma : ArrayLike, optional
+            Volatility of every row. Default: the implied volatility of the calls, or of the puts where there is no call.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            Theoretical prices of the calls and the puts.
+        """
+
+        if sigma is None:
+            sigma = np.where(self.call.listed, self.call.implied_volatility, self.put.implied_volatility)
+        return bs_numpy.call_put_price(self.S, self.strike, self.r, self.t, sigma)
+
+    def implied_volatility(self, kind:str='call', price:Optional[ArrayLike]=None, sigma0=corrado_miller) -> np.ndarray:
+        """
+        Solves the implied volatility of one leg of every row, with `bs_numpy`.
+
+        Parameters
+        ----------
+        kind : str
+            Either "call" or "put". Default: "call".
+        price : ArrayLike, optional
+            Option price of every row. Default: the midpoint of bid and ask, or the last price.
+        sigma0 : ArrayLike or GuessProvider
+            Initial guess. Default: `iv_guess.corrado_miller`.
+
+        Returns
+        -------
+        np.ndarray
+            Implied volatility of every row. NaN where the contract is not listed or violates the no-arbitrage bounds.
+        """
+
+        if kind not in ('call', 'put'):
+            raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+        leg = getattr(self, kind)
+        price = leg.mid if price is None else price
+        solver = bs_numpy.call_implied_volatility if kind == 'call' else bs_numpy.put_implied_volatility
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sigma = solver(self.S, self.strike, self.r, self.t, price, sigma0=sigma0)
+        return np.where(leg.listed, sigma, np.nan)
+
+    def to_frame(self, columns:Optional[Sequence[str]]=None) -> pd.DataFrame:
+        """
+        Converts the chain to the wide layout of the app: "expiration", "strike", then the yfinance columns of the calls
+        suffixed with "Call" and of the puts suffixed with "Put".
+
+        Parameters
+        ----------
+        columns : Sequence[str], optional
+            yfinance columns to include, e.g. ["impliedVolatility"]. Default: all.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per row of the chain.
+        """
+
+        data: Dict[str, np.ndarray] = {'expiration': np.repeat(np.array(self.labels, dtype=object), np.diff(self.offsets)), 'strike': self.strike}
+        for suffix, leg in (('Call', self.call), ('Put', self.put)):
+            for name, column, *_ in LEG_FIELDS:
+                if columns is None or column in columns:
+                    values = getattr(leg, name)
+                    if values.dtype.kind == 'f' or values.dtype == object:
+                        data[column + suffix] = values
+                    else:
+                        # Keep the gaps of missing contracts visible, as the outer merge did.
+                        data[column + suffix] = pd.Series(values).where(leg.listed)
+        return pd.DataFrame(data)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    calls = pd.DataFrame({'strike': [90., 100., 110.], 'lastPrice': [12.5, 5.6, 1.8], 'impliedVolatility': [0.22, 0.2, 0.19]})
+    puts = pd.DataFrame({'strike': [95., 100.], 'lastPrice': [2.1, 4.2], 'impliedVolatility': [0.21, 0.2]})
+    chain = OptionChain.from_frames({'2024-12-20': (calls, puts)}, S=100., r=0.05, t={'2024-12-20': 0.5})
+    print(chain)
+    print(chain.to_frame(['lastPrice', 'impliedVolatility']))
+    print(f'Row of strike 100: {chain.find(100.)}')
+    print(f'Implied volatility of the calls: {chain.implied_volatility("call")}')
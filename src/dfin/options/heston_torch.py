@@ -0,0 +1,270 @@
+"""Heston stochastic volatility pricing of European options with PyTorch.
+
+Under Heston's model the variance v follows a mean-reverting square-root process correlated with the underlying,
+
+    dS = (r - q) S dt + sqrt(v) S dW_1,    dv = kappa (theta - v) dt + xi sqrt(v) dW_2,    dW_1 dW_2 = rho dt,
+
+which produces a smile, and whose characteristic function is known in closed form.
+Prices follow from Fourier inversion, vectorized over whole strike grids instead of one adaptive quadrature per strike:
+
+* `fft_grid` prices a whole grid of log-strikes per expiry with a single FFT (Carr and Madan), in O(N log N);
+* `price` with `method='quadrature'` evaluates the inversion integrals with a fixed Gauss-Laguerre rule,
+  sharing the characteristic function between all strikes of an expiry.
+
+Everything is differentiable, so sensitivities to the model parameters come from autograd as in `bs_torch`.
+"""
+
+import functools
+import math
+from typing import NamedTuple, Tuple, Union
+
+import numpy as np
+import torch
+
+
+TensorLike = Union[float, torch.Tensor]
+
+_COMPLEX = {torch.float32: torch.complex64, torch.float64: torch.complex128}
+
+# NumPy's Gauss-Laguerre weights overflow to NaN past 185 nodes, and 64 already price to about 1e-9.
+MAX_NODES = 180
+
+
+@functools.lru_cache(maxsize=None)
+def _laguerre(nodes:int) -> Tuple[np.ndarray, np.ndarray]:
+    """Gauss-Laguerre nodes and weights, the latter times exp(node) to integrate f rather than exp(-u) f."""
+
+    u, w = np.polynomial.laguerre.laggauss(nodes)
+    with np.errstate(under='ignore', over='ignore'):
+        return u, w * np.exp(u)
+
+
+def _tensors(*values:TensorLike) -> Tuple[torch.Tensor, ...]:
+    """Broadcasts the inputs against each other, keeping their autograd graph. Plain floats follow the dtype of the tensors."""
+
+    dtype = next((x.dtype for x in values if torch.is_tensor(x) and x.is_floating_point()), torch.float64)
+    return torch.broadcast_tensors(*(x.to(dtype) if torch.is_tensor(x) else torch.tensor(x, dtype=dtype) for x in values))
+
+
+def characteristic_function(u:torch.Tensor, S:torch.Tensor, r:torch.Tensor, t:torch.Tensor, v0:torch.Tensor, kappa:torch.Tensor, theta:torch.Tensor, xi:torch.Tensor, rho:torch.Tensor, q:TensorLike=0.) -> torch.Tensor:
+    """
+    Computes the characteristic function E[exp(iu ln S_t)] of the log price under Heston's model.
+
+    Uses the formulation of Albrecher et al. ("The little Heston trap"), whose complex logarithm stays on its principal branch,
+    so it is continuous in u and t without any branch tracking.
+
+    Parameters
+    ----------
+    u : torch.Tensor
+        Real or complex arguments, broadcast against the other inputs.
+    S : torch.Tensor
+        Current underlying price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    v0 : torch.Tensor
+        Current variance
+    kappa : torch.Tensor
+        Speed of mean reversion of the variance
+    theta : torch.Tensor
+        Long-run variance
+    xi : torch.Tensor
+        Volatility of the variance
+    rho : torch.Tensor
+        Correlation between the underlying and its variance
+    q : float or torch.Tensor
+        Continuous dividend yield. Default: 0.
+
+    Returns
+    -------
+    torch.Tensor
+        Complex values of the characteristic function.
+    """
+
+    iu = 1j * u
+    beta = kappa - rho * xi * iu
+    d = torch.sqrt(beta**2 + xi**2 * (iu + u**2))
+    g = (beta - d) / (beta + d)
+    decay = torch.exp(-d * t)
+    C = (r - q) * iu * t + kappa * theta / xi**2 * ((beta - d) * t - 2 * torch.log((1 - g * decay) / (1 - g)))
+    D = (beta - d) / xi**2 * (1 - decay) / (1 - g * decay)
+    return torch.exp(C + D * v0 + iu * torch.log(S))
+
+
+class FFTGrid(NamedTuple):
+    """Call prices on a uniform grid of log-strikes, centred on the log of the current underlying price."""
+    log_strike: torch.Tensor
+    call: torch.Tensor
+
+
+def fft_grid(S:TensorLike, r:TensorLike, t:TensorLike, v0:TensorLike, kappa:TensorLike, theta:TensorLike, xi:TensorLike, rho:TensorLike, q:TensorLike=0., size:int=4096, eta:float=0.25, alpha:float=1.5) -> FFTGrid:
+    """
+    Prices calls on a whole grid of strikes per expiry with a single FFT, by Carr and Madan's method.
+
+    The damped call price exp(alpha k) C(k) is integrable in the log-strike k, and its Fourier transform
+    is a closed form of the characteristic function. The transform is sampled at `size` frequencies spaced by `eta`,
+    weighted by Simpson's rule, and inverted by FFT onto log-strikes spaced by 2 pi / (size eta).
+
+    Parameters
+    ----------
+    S, r, t, v0, kappa, theta, xi, rho, q : float or torch.Tensor
+        Inputs of `characteristic_function`, broadcast to a batch of grids, e.g. one per expiry.
+    size : int
+        Number of frequencies and strikes, a power of two. Default: 4096.
+    eta : float
+        Spacing of the frequencies. Default: 0.25, i.e. log-strikes spaced by about 0.006.
+    alpha : float
+        Damping exponent of the call price. Default: 1.5.
+
+    Returns
+    -------
+    FFTGrid
+        Log-strikes and call prices, both of shape (*batch, size).
+    """
+
+    S, r, t, v0, kappa, theta, xi, rho, q = (x.unsqueeze(-1) for x in _tensors(S, r, t, v0, kappa, theta, xi, rho, q))
+    dtype = S.dtype
+    spacing = 2 * math.pi / (size * eta)
+    j = torch.arange(size, dtype=dtype)
+    v = eta * j
+    log_strike = torch.log(S) + spacing * (j - size / 2)
+
+    phi = characteristic_function(v - (alpha + 1) * 1j, S, r, t, v0, kappa, theta, xi, rho, q)
+    psi = torch.exp(-r * t) * phi / (alpha**2 + alpha - v**2 + 1j * (2 * alpha + 1) * v)
+    simpson = (3 + (-1)**(j + 1)) / 3
+    simpson[0] = 1 / 3
+    # Shifts the strikes so that the grid is centred on ln(S) rather than on ln(1).
+    shift = torch.exp(-1j * v * log_strike[..., :1])
+    transform = torch.fft.fft(shift * psi * eta * simpson.to(_COMPLEX[dtype]), dim=-1)
+    call = torch.exp(-alpha * log_strike) / math.pi * transform.real
+    return FFTGrid(log_strike, call)
+
+
+def _interpolate(grid:FFTGrid, K:torch.Tensor) -> torch.Tensor:
+    """Cubic interpolation of the grid at the strikes, in log-strike. NaN outside the grid."""
+
+    log_strike, call = grid
+    k = torch.log(K)
+    k, _ = torch.broadcast_tensors(k, log_strike[..., 0])
+    shape = k.shape
+    size = log_strike.shape[-1]
+    spacing = log_strike[..., 1] - log_strike[..., 0]
+    position = (k - log_strike[..., 0].expand(shape)) / spacing.expand(shape)
+    index = torch.floor(position).clamp(1, size - 3).long()
+    s = position - index
+    points = [torch.gather(call.expand(*shape, size), -1, (index + offset).unsqueeze(-1)).squeeze(-1) for offset in (-1, 0, 1, 2)]
+    # Lagrange polynomial through the four nodes around each strike.
+    value = (-s * (s - 1) * (s - 2) / 6 * points[0] + (s + 1) * (s - 1) * (s - 2) / 2 * points[1]
+             - (s + 1) * s * (s - 2) / 2 * points[2] + (s + 1) * s * (s - 1) / 6 * points[3])
+    outside = (position < 1) | (position > size - 2)
+    return torch.where(outside, torch.full_like(value, float('nan')), value)
+
+
+def _quadrature(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, v0:torch.Tensor, kappa:torch.Tensor, theta:torch.Tensor, xi:torch.Tensor, rho:torch.Tensor, q:torch.Tensor, nodes:int) -> torch.Tensor:
+    """
+    Call prices S exp(-qt) P1 - K exp(-rt) P2, with both probabilities integrated by one Gauss-Laguerre rule.
+
+    The model inputs are broadcast against each other but not against K, so that the characteristic function
+    is evaluated once per set of model inputs and shared by all the strikes broadcast against it.
+    """
+
+    dtype = S.dtype
+    u, w = (torch.as_tensor(x, dtype=dtype) for x in _laguerre(nodes))
+    params = [x.unsqueeze(-1) for x in (S, r, t, v0, kappa, theta, xi, rho, q)]
+    phi = characteristic_function(u, *params)
+    phi_shifted = characteristic_function(u - 1j, *params) / (S * torch.exp((r - q) * t)).unsqueeze(-1)
+    kernel = torch.exp(-1j * u * torch.log(K).unsqueeze(-1)) / (1j * u)
+    P1 = 0.5 + (kernel * phi_shifted).real @ w / math.pi
+    P2 = 0.5 + (kernel * phi).real @ w / math.pi
+    return S * torch.exp(-q * t) * P1 - K * torch.exp(-r * t) * P2
+
+
+def price(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, v0:TensorLike, kappa:TensorLike, theta:TensorLike, xi:TensorLike, rho:TensorLike, kind:str='call', q:TensorLike=0., method:str='quadrature', nodes:int=128, size:int=4096) -> torch.Tensor:
+    """
+    Computes the price of European options under Heston's model.
+
+    Parameters
+    ----------
+    S : float or torch.Tensor
+        Current underlying price
+    K : float or torch.Tensor
+        Option strike price
+    r : float or torch.Tensor
+        Risk-free interest rate
+    t : float or torch.Tensor
+        Time to expiry
+    v0 : float or torch.Tensor
+        Current variance
+    kappa : float or torch.Tensor
+        Speed of mean reversion of the variance
+    theta : float or torch.Tensor
+        Long-run variance
+    xi : float or torch.Tensor
+        Volatility of the variance
+    rho : float or torch.Tensor
+        Correlation between the underlying and its variance
+    kind : str
+        Either "call" or "put". Default: "call".
+    q : float or torch.Tensor
+        Continuous dividend yield. Default: 0.
+    method : str
+        Either "quadrature" (Gauss-Laguerre) or "fft" (Carr-Madan). Default: "quadrature".
+        Both methods evaluate the characteristic function once per set of model inputs, e.g. of shape (expiries,),
+        and share it between the strikes broadcast against them, e.g. of shape (strikes, expiries).
+    nodes : int
+        Number of Gauss-Laguerre nodes, at most `MAX_NODES`. Default: 128.
+    size : int
+        Number of FFT points. Default: 4096.
+
+    Returns
+    -------
+    torch.Tensor
+        Theoretical price of the options, differentiable in every input.
+    """
+
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+
+    if method not in ('quadrature', 'fft'):
+        raise ValueError(f'Unknown method "{method}". Expected "quadrature" or "fft".')
+
+    if method == 'quadrature' and not 1 <= nodes <= MAX_NODES:
+        raise ValueError(f'Expected between 1 and {MAX_NODES} Gauss-Laguerre nodes, got {nodes}.')
+
+    # The model inputs are shared by all the strikes broadcast against them, e.g. one set per expiry.
+    S, r, t, v0, kappa, theta, xi, rho, q = _tensors(S, r, t, v0, kappa, theta, xi, rho, q)
+    K = K.to(S.dtype) if torch.is_tensor(K) else torch.tensor(K, dtype=S.dtype)
+    if method == 'fft':
+        call = _interpolate(fft_grid(S, r, t, v0, kappa, theta, xi, rho, q, size), K)
+    else:
+        call = _quadrature(S, K, r, t, v0, kappa, theta, xi, rho, q, nodes)
+
+    if kind == 'call':
+        return call
+    # Put-call parity.
+    return call - S * torch.exp(-q * t) + K * torch.exp(-r * t)
+
+
+def call_price(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, v0:TensorLike, kappa:TensorLike, theta:TensorLike, xi:TensorLike, rho:TensorLike, q:TensorLike=0., method:str='quadrature', nodes:int=128, size:int=4096) -> torch.Tensor:
+    """Computes the price of European call options under Heston's model. See `price`."""
+    return price(S, K, r, t, v0, kappa, theta, xi, rho, 'call', q, method, nodes, size)
+
+
+def put_price(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, v0:TensorLike, kappa:TensorLike, theta:TensorLike, xi:TensorLike, rho:TensorLike, q:TensorLike=0., method:str='quadrature', nodes:int=128, size:int=4096) -> torch.Tensor:
+    """Computes the price of European put options under Heston's model. See `price`."""
+    return price(S, K, r, t, v0, kappa, theta, xi, rho, 'put', q, method, nodes, size)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    K = torch.linspace(80, 120, 5, dtype=torch.float64)
+    v0 = torch.tensor(0.04, dtype=torch.float64, requires_grad=True)
+    rho = torch.tensor(-0.7, dtype=torch.float64, requires_grad=True)
+    C = call_price(100., K, 0.05, 1., v0, 2., 0.04, 0.5, rho)
+    C.sum().backward()
+    print(f'Heston calls (quadrature) : {C.detach()}')
+    print(f'Heston calls (FFT)        : {call_price(100., K, 0.05, 1., 0.04, 2., 0.04, 0.5, -0.7, method="fft")}')
+    print(f'dC/dv0, summed over strikes  : {v0.grad.item():+.4f}')
+    print(f'dC/drho, summed over strikes : {rho.grad.item():+.4f}')
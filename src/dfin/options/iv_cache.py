@@ -0,0 +1,207 @@
+"""Cache of implied volatilities keyed by quantized contract inputs.
+
+Sits in front of any of the IV backends (`iv_scipy`, `iv_rational`, `iv_torch`, `bs_numpy`),
+with an in-memory LRU tier and an optional SQLite tier that survives restarts.
+"""
+import math
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+KeyType = Tuple[str, str, str, str, str, str]
+
+
+class IVCache:
+    """
+    Two-tier implied volatility cache.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries kept in memory. The least recently used entry is evicted first. Default: 100000.
+    path : str, optional
+        SQLite database file backing the persistent tier. Memory only if not given.
+    digits : int
+        Significant digits the inputs are quantized to before lookup. Default: 10.
+    """
+
+    def __init__(self, maxsize:int=100000, path:Optional[str]=None, digits:int=10):
+
+        self.maxsize = maxsize
+        self.digits = digits
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            # Streamlit reruns scripts on different threads, hence the lock instead of thread affinity.
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS iv (key TEXT PRIMARY KEY, sigma REAL)')
+            self._db.commit()
+
+    def key(self, kind:str, S:float, K:float, r:float, t:float, price:float) -> KeyType:
+        """Quantizes the contract inputs into a cache key."""
+
+        return (kind,) + tuple(f'{float(x):.{self.digits}g}' for x in (S, K, r, t, price))
+
+    def get(self, key:KeyType) -> Optional[float]:
+        """Looks up a key in memory, then on disk. Returns None on a miss."""
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute('SELECT sigma FROM iv WHERE key = ?', ('|'.join(key),)).fetchone()
+                if row is not None:
+                    sigma = math.nan if row[0] is None else row[0]
+                    self._remember(key, sigma)
+                    self.disk_hits += 1
+                    return sigma
+            self.misses += 1
+            return None
+
+    def put(self, key:KeyType, sigma:float, commit:bool=True):
+        """Stores a solved implied volatility in both tiers."""
+
+        sigma = float(sigma)
+        with self._lock:
+            self._remember(key, sigma)
+            if self._db is not None:
+                # SQLite stores NaN as NULL.
+                self._db.execute('INSERT OR REPLACE INTO iv VALUES (?, ?)', ('|'.join(key), None if math.isnan(sigma) else sigma))
+                if commit:
+                    self._db.commit()
+
+    def _remember(self, key:KeyType, sigma:float):
+        """Inserts into the LRU tier, evicting the oldest entries beyond `maxsize`."""
+
+        self._memory[key] = sigma
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def wrap(self, solver:Callable, kind:str, *args, **kwargs) -> Callable:
+        """
+        Wraps a single-contract solver, so that repeated contracts skip the solve.
+
+        Entries are keyed on the contract alone, so the solver settings are fixed here rather than per call,
+        and a cache should be shared only by wrappers that agree on their settings.
+
+        Parameters
+        ----------
+        solver : Callable
+            Solver with the `call_implied_volatility(S, K, r, t, price, ...)` signature of the IV backends.
+            Tensor inputs must hold a single element.
+        kind : str
+            Either "call" or "put".
+        *args, **kwargs
+            Settings passed to every solve after the contract inputs, e.g. `sigma0` and `optim` of `iv_torch`.
+
+        Returns
+        -------
+        Callable
+            Solver taking the contract inputs `(S, K, r, t, price)` only. Returns a float, or a tensor shaped like `price`,
+            whether or not the contract was cached. Solves that did not converge are cached and returned as NaN.
+        """
+
+        def cached_solver(S, K, r, t, price):
+            key = self.key(kind, S, K, r, t, price)
+            sigma = self.get(key)
+            if sigma is None:
+                result = solver(S, K, r, t, price, *args, **kwargs)
+                # Batched torch solvers return a `BatchedRootResult`, which keeps the last iterate where it did not converge.
+                value = getattr(result, 'x', result)
+                sigma = float(value.detach() if hasattr(value, 'detach') else value)
+                if not bool(getattr(result, 'converged', True)):
+                    sigma = math.nan
+                self.put(key, sigma)
+            if hasattr(price, 'new_full'):
+                return price.new_full(price.shape, sigma)
+            return sigma
+
+        cached_solver.__doc__ = solver.__doc__
+        return cached_solver
+
+    def solve_many(self, kind:str, S, K, r, t, price, solver:Callable) -> np.ndarray:
+        """
+        Looks up a whole chain at once and solves only the misses, in a single vectorized call.
+
+        Parameters
+        ----------
+        kind : str
+            Either "call" or "put".
+        S, K, r, t, price : ArrayLike
+            Contract inputs, broadcast against each other.
+        solver : Callable
+            Vectorized solver taking NumPy arrays, e.g. `bs_numpy.call_implied_volatility`.
+
+        Returns
+        -------
+        np.ndarray
+            Implied volatility of every contract.
+        """
+
+        S, K, r, t, price = (a.ravel() for a in np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (S, K, r, t, price))))
+        sigma = np.empty(len(price))
+        keys = [self.key(kind, *row) for row in zip(S.tolist(), K.tolist(), r.tolist(), t.tolist(), price.tolist())]
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                sigma[i] = value
+
+        if missing:
+            solved = np.asarray(solver(S[missing], K[missing], r[missing], t[missing], price[missing]), dtype=np.float64)
+            sigma[missing] = solved
+            for i, value in zip(missing, solved.tolist()):
+                self.put(keys[i], value, commit=False)
+            self.flush()
+
+        return sigma
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters, plus the number of entries held in memory."""
+
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'size': len(self._memory)}
+
+    def clear(self):
+        """Empties both tiers and resets the counters."""
+
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.disk_hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM iv')
+                self._db.commit()
+
+    def flush(self):
+        """Commits pending writes to the persistent tier."""
+
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+
+    def close(self):
+        """Commits and closes the persistent tier."""
+
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
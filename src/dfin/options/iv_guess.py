@@ -0,0 +1,203 @@
+"""Initial guesses for the implied volatility solvers.
+
+A guess provider is any callable `provider(S, K, r, t, price, kind) -> np.ndarray` returning one initial volatility per contract,
+NaN where it has no opinion. The solvers of `bs_numpy`, `iv_scipy` and `iv_torch` accept a provider in place of `sigma0`,
+and fill whatever it leaves NaN with `DEFAULT`.
+
+Providers can be chained through their `fallback`, e.g. the previous snapshot where a contract was solved before,
+then the smile of the neighbouring strikes, then a closed-form approximation:
+
+    guess = previous(last_sigma, fallback=strikes(K_solved, t_solved, sigma_solved))
+"""
+
+import math
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+
+GuessProvider = Callable[..., np.ndarray]
+
+DEFAULT = 0.5
+# Guesses are clipped to where the Black-Scholes price is still sensitive to volatility.
+MIN_SIGMA = 1e-3
+MAX_SIGMA = 5.
+
+
+def _call_price(S:np.ndarray, X:np.ndarray, price:np.ndarray, kind:str) -> np.ndarray:
+    """Price of the call with the same strike and expiry, by put-call parity C = P + S - X where a put price was given, X being the discounted strike."""
+
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+    return price if kind == 'call' else price + S - X
+
+
+def brenner_subrahmanyam(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, price:ArrayLike, kind:str='call') -> np.ndarray:
+    """
+    Approximates implied volatility by Brenner and Subrahmanyam's at-the-money formula, sigma = sqrt(2 pi / t) C / S.
+
+    The formula is applied to the time value around the discounted strike X, i.e. C - (S - X) / 2 over (S + X) / 2,
+    which is exact to first order at the money forward.
+
+    Parameters
+    ----------
+    S, K, r, t, price : ArrayLike
+        Contract inputs, broadcast against each other.
+    kind : str
+        Either "call" or "put". Default: "call".
+
+    Returns
+    -------
+    np.ndarray
+        Approximate implied volatility. Only accurate near the money, and too high in the wings.
+    """
+
+    S, K, r, t, price = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (S, K, r, t, price)))
+    X = K * np.exp(-r*t)
+    C = _call_price(S, X, price, kind)
+    return math.sqrt(2 * math.pi) * (C - (S - X) / 2) / ((S + X) / 2) / np.sqrt(t)
+
+
+def corrado_miller(S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, price:ArrayLike, kind:str='call') -> np.ndarray:
+    """
+    Approximates implied volatility by Corrado and Miller's quadratic formula, vectorized.
+
+    Parameters
+    ----------
+    S, K, r, t, price : ArrayLike
+        Contract inputs, broadcast against each other.
+    kind : str
+        Either "call" or "put". Default: "call".
+
+    Returns
+    -------
+    np.ndarray
+        Approximate implied volatility. Accurate near the money, NaN far in the wings where the discriminant is negative.
+    """
+
+    S, K, r, t, price = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (S, K, r, t, price)))
+    X = K * np.exp(-r*t)
+    C = _call_price(S, X, price, kind)
+    half_intrinsic = (S - X) / 2
+    with np.errstate(invalid='ignore'):
+        discriminant = (C - half_intrinsic)**2 - (S - X)**2 / math.pi
+        sigma = math.sqrt(2 * math.pi) / (S + X) * (C - half_intrinsic + np.sqrt(discriminant)) / np.sqrt(t)
+    return np.where(discriminant >= 0, sigma, np.nan)
+
+
+def constant(sigma0:float=DEFAULT) -> GuessProvider:
+    """Provider of the same guess for every contract, i.e. the behaviour of a scalar `sigma0`."""
+
+    def provider(S, K, r, t, price, kind='call'):
+        return np.full(np.broadcast_shapes(*(np.shape(x) for x in (S, K, r, t, price))), sigma0, dtype=np.float64)
+
+    return provider
+
+
+def previous(sigma:ArrayLike, fallback:Optional[GuessProvider]=corrado_miller) -> GuessProvider:
+    """
+    Provider seeded from the last solution of the same contracts, e.g. the previous snapshot of a chain.
+
+    Parameters
+    ----------
+    sigma : ArrayLike
+        Previous implied volatility of every contract, in the order they are solved. NaN where there is none.
+    fallback : GuessProvider, optional
+        Provider of the contracts without a finite previous solution. Default: `corrado_miller`.
+
+    Returns
+    -------
+    GuessProvider
+        Provider for contracts broadcast to the shape of `sigma`.
+    """
+
+    sigma = np.asarray(sigma, dtype=np.float64)
+
+    def provider(S, K, r, t, price, kind='call'):
+        guess = np.broadcast_to(sigma, np.broadcast_shapes(sigma.shape, *(np.shape(x) for x in (S, K, r, t, price))))
+        if fallback is None or np.isfinite(guess).all():
+            return guess.copy()
+        return np.where(np.isfinite(guess), guess, fallback(S, K, r, t, price, kind))
+
+    return provider
+
+
+def strikes(K:ArrayLike, t:ArrayLike, sigma:ArrayLike, fallback:Optional[GuessProvider]=corrado_miller) -> GuessProvider:
+    """
+    Provider interpolating the smile of already solved strikes of the same expiry, linearly and flat beyond the ends.
+
+    Parameters
+    ----------
+    K : ArrayLike
+        Strikes of the solved contracts.
+    t : ArrayLike
+        Times to expiry of the solved contracts. Contracts are matched to an expiry by exact equality.
+    sigma : ArrayLike
+        Implied volatilities of the solved contracts. NaN entries are ignored.
+    fallback : GuessProvider, optional
+        Provider of the contracts of expiries without any solved strike. Default: `corrado_miller`.
+
+    Returns
+    -------
+    GuessProvider
+        Provider for contracts of any strike.
+    """
+
+    K, t, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64).ravel() for x in (K, t, sigma)))
+    known = np.isfinite(sigma) & np.isfinite(K)
+    smiles = {}
+    for expiry in np.unique(t[known]):
+        mask = known & (t == expiry)
+        order = np.argsort(K[mask])
+        smiles[float(expiry)] = (K[mask][order], sigma[mask][order])
+
+    def provider(S, K, r, t, price, kind='call'):
+        S, K, r, t, price = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (S, K, r, t, price)))
+        guess = np.full(K.shape, np.nan)
+        for expiry, (xp, fp) in smiles.items():
+            mask = t == expiry
+            if mask.any():
+                guess[mask] = np.interp(K[mask], xp, fp)
+        if fallback is None or np.isfinite(guess).all():
+            return guess
+        return np.where(np.isfinite(guess), guess, fallback(S, K, r, t, price, kind))
+
+    return provider
+
+
+def resolve(sigma0, S:ArrayLike, K:ArrayLike, r:ArrayLike, t:ArrayLike, price:ArrayLike, kind:str='call') -> ArrayLike:
+    """
+    Evaluates a guess provider, clipping its guesses to a sane range and filling the gaps with `DEFAULT`.
+
+    Parameters
+    ----------
+    sigma0 : float, ArrayLike or GuessProvider
+        Initial guess, passed through unchanged unless it is a provider.
+    S, K, r, t, price : ArrayLike
+        Contract inputs.
+    kind : str
+        Either "call" or "put". Default: "call".
+
+    Returns
+    -------
+    ArrayLike
+        One initial volatility per contract, or `sigma0` itself.
+    """
+
+    if not callable(sigma0):
+        return sigma0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        guess = np.asarray(sigma0(S, K, r, t, price, kind), dtype=np.float64)
+    return np.where(np.isfinite(guess), np.clip(guess, MIN_SIGMA, MAX_SIGMA), DEFAULT)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    from dfin.options import bs_numpy
+
+    K = np.linspace(80, 120, 9)
+    price = bs_numpy.call_price(100., K, 0.05, 0.5, 0.2 + (K - 100)**2 / 4000)
+    print(f'Corrado-Miller: {resolve(corrado_miller, 100., K, 0.05, 0.5, price)}')
+    print(f'Neighbours:     {resolve(strikes(K[::2], 0.5, bs_numpy.call_implied_volatility(100., K[::2], 0.05, 0.5, price[::2])), 100., K, 0.05, 0.5, price)}')
@@ -0,0 +1,246 @@
+"""Implementation of Implied Volatility under Black-Scholes with an analytic initial guess and Householder steps.
+
+Inspired by Jäckel's "Let's Be Rational": the out-of-the-money leg is inverted on a log-price scale,
+starting from the Corrado-Miller approximation, so a couple of third-order Householder steps reach machine precision.
+Plain Python floats only, so a single contract takes microseconds.
+"""
+import math
+
+
+_SQRT_2 = math.sqrt(2)
+_SQRT_2PI = math.sqrt(2 * math.pi)
+
+# Relative repricing error of the out-of-the-money leg above which the solver gives up and returns NaN.
+RESIDUAL_TOL = 1e-9
+
+
+def _lower_tail(z:float) -> float:
+    """Standard normal CDF through erfc, which keeps full relative precision deep in the lower tail."""
+    return math.erfc(-z / _SQRT_2) / 2
+
+
+def _mills_ratio(a:float) -> float:
+    """Mills ratio N(-a) / n(a) for a > 0, by its asymptotic series where erfc underflows."""
+
+    if a < 37:
+        return math.erfc(a / _SQRT_2) / 2 * _SQRT_2PI * math.exp(a**2 / 2)
+    # 1/a (1 - 1/a^2 + 3/a^4 - 15/a^6 + ...), whose terms are below machine precision after a handful here.
+    term, total = 1 / a, 1 / a
+    for k in range(1, 8):
+        term *= -(2 * k - 1) / a**2
+        total += term
+    return total
+
+
+def _otm_price(S:float, X:float, sigma_sqrt_t:float) -> float:
+    """Black-Scholes price of the out-of-the-money leg, given the discounted strike `X`.
+
+    In the wings both terms of the Black-Scholes formula are tiny and nearly equal. Since S n(d1) = X n(d2),
+    the price is S n(d1) times a difference of Mills ratios there, which stays accurate relative to the price itself.
+    """
+
+    d1 = math.log(S / X) / sigma_sqrt_t + sigma_sqrt_t / 2
+    d2 = d1 - sigma_sqrt_t
+    # The out-of-the-money leg is the call below the forward and the put above it, flip the put onto the call's signs.
+    a1, a2 = (-d1, -d2) if S < X else (d2, d1)
+    if a1 > 0 and a2 > 0:
+        return S * math.exp(-d1**2 / 2) / _SQRT_2PI * abs(_mills_ratio(a1) - _mills_ratio(a2))
+    if S < X:
+        return S * _lower_tail(d1) - X * _lower_tail(d2)
+    return X * _lower_tail(-d2) - S * _lower_tail(-d1)
+
+
+def initial_guess(S:float, K:float, r:float, t:float, price:float) -> float:
+    """
+    Approximates the implied volatility of a European call option in closed form.
+
+    Candidates are the Corrado-Miller formula, which is accurate near the money,
+    the leading term of the small-volatility asymptotic expansion, which is accurate in the wings,
+    the Manaster-Koehler point of maximum vega, and an interpolation between those bracketing the price.
+    The candidate that reprices the out-of-the-money leg closest to the target wins.
+
+    Parameters
+    ----------
+    S : float
+        Current underlying price
+    K : float
+        Option strike price
+    r : float
+        Risk-free interest rate
+    t : float
+        Time to expiry
+    price : float
+        Observed price of the call option
+
+    Returns
+    -------
+    float
+        Approximate implied volatility
+    """
+
+    X = K * math.exp(-r*t)
+    # Put-call parity.
+    target = price - S + X if S > X else price
+    return _initial_guess(S, X, target) / math.sqrt(t)
+
+
+def _initial_guess(S:float, X:float, target:float) -> float:
+    """Approximates s = sigma * sqrt(t) from the price of the out-of-the-money leg."""
+
+    x = math.log(S / X)
+
+    def log_error(s):
+        p = _otm_price(S, X, s)
+        return math.log(p / target) if 0 < p else -math.inf
+
+    # Corrado-Miller, which is usually all we need near the money.
+    half_gap = (S - X) / 2
+    a = (target + S - X if S > X else target) - half_gap
+    discriminant = a**2 - 4 * half_gap**2 / math.pi
+    if discriminant > 0 and a + math.sqrt(discriminant) > 0:
+        s = math.sqrt(2 * math.pi) / (S + X) * (a + math.sqrt(discriminant))
+        e = log_error(s)
+        if abs(e) < 1e-2:
+            return s
+        guesses = [(e, s)]
+    else:
+        guesses = []
+
+    # Small-volatility asymptotics: ln(b) ~ -x^2/(2s^2) + ln(s^3/x^2) - ln(sqrt(2 pi)), with b the normalized price.
+    log_b = math.log(target / math.sqrt(S * X))
+    if x != 0 and log_b < 0:
+        s = abs(x) / math.sqrt(-2 * log_b)
+        for i in range(2):
+            exponent = -2 * (log_b - math.log(s**3 / x**2) + math.log(math.sqrt(2 * math.pi)))
+            if exponent <= 0:
+                break
+            s = abs(x) / math.sqrt(exponent)
+        guesses.append((log_error(s), s))
+
+    # Manaster-Koehler point of maximum vega.
+    s = max(math.sqrt(2 * abs(x)), 1e-2)
+    guesses.append((log_error(s), s))
+
+    # The log-price is close to linear in 1/s^2, so interpolate within the tightest bracket.
+    below = [(e, s) for e, s in guesses if -math.inf < e < 0]
+    above = [(e, s) for e, s in guesses if e > 0]
+    if below and above:
+        e_lo, s_lo = max(below)
+        e_hi, s_hi = min(above)
+        s = (s_lo**-2 + e_lo / (e_lo - e_hi) * (s_hi**-2 - s_lo**-2))**-0.5
+        guesses.append((log_error(s), s))
+
+    return min(guesses, key=lambda guess: abs(guess[0]))[1]
+
+
+def _implied_volatility(S:float, K:float, r:float, t:float, price:float, call:bool, tol:float, max_iter:int) -> float:
+    """Inverts the Black-Scholes price for sigma."""
+
+    X = K * math.exp(-r*t)
+    # No-arbitrage bounds: intrinsic value < price < underlying (call) or discounted strike (put).
+    intrinsic = S - X if call else X - S
+    if not (max(intrinsic, 0.0) < price < (S if call else X)):
+        return math.nan
+
+    # The out-of-the-money leg has no intrinsic value to cancel out, so it keeps full relative precision.
+    target = price - intrinsic if intrinsic > 0 else price
+    log_target = math.log(target)
+    x = math.log(S / X)
+
+    sigma_sqrt_t = _initial_guess(S, X, target)
+    for i in range(max_iter):
+
+        price = _otm_price(S, X, sigma_sqrt_t)
+        if price <= 0:
+            # Guess too far in the wing to even register a price, so move towards the point of maximum vega.
+            sigma_sqrt_t = max(sigma_sqrt_t * 2, math.sqrt(2 * abs(x)))
+            continue
+
+        # Derivatives of the price with respect to s = sigma * sqrt(t): vega, volga and ultima.
+        d1 = x / sigma_sqrt_t + sigma_sqrt_t / 2
+        d2 = d1 - sigma_sqrt_t
+        vega = S * math.exp(-d1**2 / 2) / math.sqrt(2 * math.pi)
+        volga = vega * d1 * d2 / sigma_sqrt_t
+        ultima = vega / sigma_sqrt_t**2 * ((d1 * d2)**2 - d1 * d2 - d1**2 - d2**2)
+
+        # Householder's method of order 3 on g(s) = ln(price(s)) - ln(target).
+        g = math.log(price) - log_target
+        g1 = vega / price
+        g2 = volga / price - g1**2
+        g3 = ultima / price - 3 * g1 * volga / price + 2 * g1**3
+        h = g / g1
+        step = h * (1 - g2 / g1 * h / 2) / (1 - g2 / g1 * h + g3 / g1 * h**2 / 6)
+        if not math.isfinite(step):
+            break
+        sigma_sqrt_t = max(sigma_sqrt_t - step, sigma_sqrt_t / 2)
+
+        if abs(step) <= tol * sigma_sqrt_t:
+            break
+
+    # Report failure rather than a volatility that does not reprice the option.
+    price = _otm_price(S, X, sigma_sqrt_t)
+    if not (price > 0 and abs(math.log(price) - log_target) <= RESIDUAL_TOL):
+        return math.nan
+    return sigma_sqrt_t / math.sqrt(t)
+
+
+def call_implied_volatility(S:float, K:float, r:float, t:float, price:float, tol:float=1e-15, max_iter:int=3) -> float:
+    """
+    Calculates the implied volatility of a European call option using the Black-Scholes model.
+
+    Parameters
+    ----------
+    S : float
+        Current underlying price
+    K : float
+        Option strike price
+    r : float
+        Risk-free interest rate
+    t : float
+        Time to expiry
+    price : float
+        Observed price of the call option
+    tol : float
+        Relative step size at which to stop early. Default: 1e-15.
+    max_iter : int
+        The maximum number of Householder steps. Default: 3.
+
+    Returns
+    -------
+    float
+        Implied volatility of the underlying asset.
+        NaN if the price violates the no-arbitrage bounds, or if `max_iter` steps do not reprice it within `RESIDUAL_TOL`.
+    """
+
+    return _implied_volatility(S, K, r, t, price, True, tol, max_iter)
+
+
+def put_implied_volatility(S:float, K:float, r:float, t:float, price:float, tol:float=1e-15, max_iter:int=3) -> float:
+    """
+    Calculates the implied volatility of a European put option using the Black-Scholes model.
+
+    Parameters
+    ----------
+    S : float
+        Current underlying price
+    K : float
+        Option strike price
+    r : float
+        Risk-free interest rate
+    t : float
+        Time to expiry
+    price : float
+        Observed price of the put option
+    tol : float
+        Relative step size at which to stop early. Default: 1e-15.
+    max_iter : int
+        The maximum number of Householder steps. Default: 3.
+
+    Returns
+    -------
+    float
+        Implied volatility of the underlying asset.
+        NaN if the price violates the no-arbitrage bounds, or if `max_iter` steps do not reprice it within `RESIDUAL_TOL`.
+    """
+
+    return _implied_volatility(S, K, r, t, price, False, tol, max_iter)
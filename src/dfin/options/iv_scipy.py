@@ -2,9 +2,10 @@
 from scipy.optimize import newton
 
 from dfin.options.bs_vanilla import call_price, put_price
+from dfin.options.iv_guess import resolve
 
 
-def call_implied_volatility(S:float, K:float, r:float, t:float, price:float) -> float:
+def call_implied_volatility(S:float, K:float, r:float, t:float, price:float, sigma0:float=0.5) -> float:
     """
     Calculates the implied volatility of a European call option using the Black-Scholes model.
 
@@ -20,6 +21,8 @@ def call_implied_volatility(S:float, K:float, r:float, t:float, price:float) ->
         Time to expiry
     price : float
         Observed price of the call option
+    sigma0 : float or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`. Default: 0.5.
 
     Returns
     -------
@@ -33,12 +36,12 @@ def call_implied_volatility(S:float, K:float, r:float, t:float, price:float) ->
         return call_price(S, K, r, t, sigma) - price
 
     # Use the Newton-Raphson method to find the root (i.e. implied volatility) of the objective function
-    implied_vol = newton(bs_objective, 0.5)
+    implied_vol = newton(bs_objective, float(resolve(sigma0, S, K, r, t, price, 'call')))
 
     return implied_vol
 
 
-def put_implied_volatility(S:float, K:float, r:float, t:float, price:float) -> float:
+def put_implied_volatility(S:float, K:float, r:float, t:float, price:float, sigma0:float=0.5) -> float:
     """
     Calculates the implied volatility of a European put option using the Black-Scholes model.
 
@@ -54,6 +57,8 @@ def put_implied_volatility(S:float, K:float, r:float, t:float, price:float) -> f
         Time to expiry
     price : float
         Observed price of the put option
+    sigma0 : float or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`. Default: 0.5.
 
     Returns
     -------
@@ -67,6 +72,6 @@ def put_implied_volatility(S:float, K:float, r:float, t:float, price:float) -> f
         return put_price(S, K, r, t, sigma) - price
 
     # Use the Newton-Raphson method to find the root (i.e. implied volatility) of the objective function
-    implied_vol = newton(bs_objective, 0.5)
+    implied_vol = newton(bs_objective, float(resolve(sigma0, S, K, r, t, price, 'put')))
 
     return implied_vol
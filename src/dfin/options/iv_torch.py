@@ -1,15 +1,19 @@
 """Implementation of Implied Volatility optimization under Black-Scholes with PyTorch."""
+import time
 import torch
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
-from dfin.options.bs_torch import call_price, put_price
+from dfin.optimize.batched import BatchedRootResult
+from dfin.optimize.profiling import report
+from dfin.options._solver_utils import callback_kwargs, contract_label, resolve_guess
+from dfin.options.bs_torch import call_price, put_price, normal_cdf, normal_pdf
 
 
 ObjectiveType = Callable[[torch.Tensor],torch.Tensor]
 OptimizationType = Callable[[ObjectiveType, torch.Tensor], torch.Tensor]
 
 
-def call_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, optim:OptimizationType, atol:float=1e-6, max_iter:int=1000) -> torch.Tensor:
+def call_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, optim:OptimizationType, atol:float=1e-6, max_iter:int=1000, callback:Optional[Callable]=None) -> torch.Tensor:
     """
     Calculates the implied volatility of a European call option using the Black-Scholes model.
 
@@ -25,22 +29,25 @@ def call_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:to
         Time to expiry
     price : torch.Tensor
         Observed price of the call option
-    sigma0 : torch.Tensor
-        Initial guess for volatility.
+    sigma0 : torch.Tensor or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`.
     optim : Callable
         Optimization method that takes an objective function and an initial guess as inputs.
-        Imported from `dfin.optimize`.
+        Imported from `dfin.optimize`. The `batched_*` variants solve every element of the inputs at once.
     atol : float
         The tolerance of the optimization target. Default: 1e-6.
         Does not apply to LBFGS directly.
     max_iter : int
         The maximum number of iterations to perform backpropagation. Default: 1000.
         Does not apply to LBFGS directly.
+    callback : Callable, optional
+        Receives the `SolverReport` of the optimizer, labelled with the contract inputs.
 
     Returns
     -------
     torch.Tensor
-        Implied volatility of the underlying asset
+        Implied volatility of the underlying asset.
+        A `BatchedRootResult` when a batched optimizer is used.
     """
     def bs_objective(sigma:torch.Tensor) -> torch.Tensor:
         """
@@ -49,12 +56,13 @@ def call_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:to
         return call_price(S, K, r, t, sigma) - price
 
     # Use the Newton-Raphson method to find the root (i.e. implied volatility) of the objective function
-    implied_vol = optim(bs_objective, sigma0, atol, max_iter)
+    with contract_label('call', S, K, r, t, price, callback):
+        implied_vol = optim(bs_objective, resolve_guess(sigma0, 'call', S, K, r, t, price), atol, max_iter, **callback_kwargs(callback))
 
     return implied_vol
 
 
-def put_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, optim:OptimizationType, atol:float=1e-6, max_iter:int=1000) -> torch.Tensor:
+def put_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, optim:OptimizationType, atol:float=1e-6, max_iter:int=1000, callback:Optional[Callable]=None) -> torch.Tensor:
     """
     Calculates the implied volatility of a European put option using the Black-Scholes model.
 
@@ -70,22 +78,25 @@ def put_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:tor
         Time to expiry
     price : torch.Tensor
         Observed price of the put option
-    sigma0 : torch.Tensor
-        Initial guess for volatility.
+    sigma0 : torch.Tensor or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`.
     optim : Callable
         Optimization method that takes an objective function and an initial guess as inputs.
-        Imported from `dfin.optimize`.
+        Imported from `dfin.optimize`. The `batched_*` variants solve every element of the inputs at once.
     atol : float
         The tolerance of the optimization target. Default: 1e-6.
         Does not apply to LBFGS directly.
     max_iter : int
         The maximum number of iterations to perform backpropagation. Default: 1000.
         Does not apply to LBFGS directly.
+    callback : Callable, optional
+        Receives the `SolverReport` of the optimizer, labelled with the contract inputs.
 
     Returns
     -------
     torch.Tensor
-        Implied volatility of the underlying asset
+        Implied volatility of the underlying asset.
+        A `BatchedRootResult` when a batched optimizer is used.
     """
     def bs_objective(sigma:torch.Tensor) -> torch.Tensor:
         """
@@ -94,6 +105,147 @@ def put_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:tor
         return put_price(S, K, r, t, sigma) - price
 
     # Use the Newton-Raphson method to find the root (i.e. implied volatility) of the objective function
-    implied_vol = optim(bs_objective, sigma0, atol, max_iter)
+    with contract_label('put', S, K, r, t, price, callback):
+        implied_vol = optim(bs_objective, resolve_guess(sigma0, 'put', S, K, r, t, price), atol, max_iter, **callback_kwargs(callback))
 
     return implied_vol
+
+
+def _analytic_implied_volatility(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, call:bool, method:str, atol:float, max_iter:int, callback:Optional[Callable]) -> BatchedRootResult:
+    """Batched Newton's or Halley's method with closed-form vega and vomma, freezing each element once it converges."""
+
+    if method not in ('newton', 'halley'):
+        raise ValueError(f'Unknown method "{method}". Expected "newton" or "halley".')
+
+    start = time.perf_counter()
+    sigma0 = resolve_guess(sigma0, 'call' if call else 'put', S, K, r, t, price)
+    with torch.no_grad(), contract_label('call' if call else 'put', S, K, r, t, price, callback):
+
+        S, K, r, t, price, sigma = (x.detach() if torch.is_tensor(x) else torch.as_tensor(x) for x in (S, K, r, t, price, sigma0))
+        S, K, r, t, price, sigma = torch.broadcast_tensors(S, K, r, t, price, sigma.to(price.dtype))
+        sigma = sigma.clone()
+        iterations = torch.zeros(sigma.shape, dtype=torch.long, device=sigma.device)
+        converged = torch.zeros(sigma.shape, dtype=torch.bool, device=sigma.device)
+        diverged = torch.zeros(sigma.shape, dtype=torch.bool, device=sigma.device)
+
+        # Everything that does not depend on sigma is computed once.
+        log_moneyness = torch.log(S / K)
+        sqrt_t = torch.sqrt(t)
+        K_discount = K * torch.exp(-r*t)
+
+        def residual(sigma:torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+            sigma_sqrt_t = sigma * sqrt_t
+            d1 = (log_moneyness + (r + sigma**2 / 2) * t) / sigma_sqrt_t
+            d2 = d1 - sigma_sqrt_t
+            if call:
+                return S * normal_cdf(d1) - K_discount * normal_cdf(d2) - price, d1, d2
+            return K_discount * normal_cdf(-d2) - S * normal_cdf(-d1) - price, d1, d2
+
+        for i in range(max_iter):
+
+            diff, d1, d2 = residual(sigma)
+            converged |= torch.abs(diff) < atol
+            active = ~(converged | diverged)
+            if not torch.any(active):
+                break
+
+            vega = S * normal_pdf(d1) * sqrt_t
+            step = diff / vega
+            if method == 'halley':
+                vomma = vega * d1 * d2 / sigma
+                denominator = 1 - step * vomma / (2 * vega)
+                # Far from the root the curvature term can flip the step, so fall back to Newton there.
+                step = torch.where(denominator > 0.5, step / denominator, step)
+
+            # Newton can overshoot below zero on the convex part of the price curve, so halve instead.
+            sigma1 = torch.where(sigma - step > 0, sigma - step, sigma / 2)
+            finite = torch.isfinite(sigma1)
+            diverged |= active & ~finite
+            sigma = torch.where(active & finite, sigma1, sigma)
+            iterations += active.long()
+        else:
+            # The loop ends on an update, or never ran, so measure the residual where it left off.
+            diff = residual(sigma)[0]
+            converged |= torch.abs(diff) < atol
+
+        report(f'analytic_{method}', callback, start, iterations, diff, converged, diverged=diverged)
+
+    return BatchedRootResult(sigma, iterations, converged)
+
+
+def call_implied_volatility_analytic(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, method:str='halley', atol:float=1e-6, max_iter:int=100, callback:Optional[Callable]=None) -> BatchedRootResult:
+    """
+    Calculates the implied volatility of European call options using closed-form derivatives of the Black-Scholes price.
+
+    Runs entirely under `torch.no_grad()`, without building any graph, and solves every element of the inputs at once.
+    Use `call_implied_volatility` with an optimizer from `dfin.optimize` for objectives without closed-form derivatives.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    price : torch.Tensor
+        Observed price of the call options
+    sigma0 : torch.Tensor or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`.
+    method : str
+        Either "newton" (vega only) or "halley" (vega and vomma). Default: "halley".
+    atol : float
+        The tolerance of the optimization target. Default: 1e-6.
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    callback : Callable, optional
+        Receives the `SolverReport` of the solver, labelled with the contract inputs.
+
+    Returns
+    -------
+    BatchedRootResult
+        Implied volatilities, per-element iteration counts and converged flags.
+    """
+
+    return _analytic_implied_volatility(S, K, r, t, price, sigma0, True, method, atol, max_iter, callback)
+
+
+def put_implied_volatility_analytic(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, price:torch.Tensor, sigma0:torch.Tensor, method:str='halley', atol:float=1e-6, max_iter:int=100, callback:Optional[Callable]=None) -> BatchedRootResult:
+    """
+    Calculates the implied volatility of European put options using closed-form derivatives of the Black-Scholes price.
+
+    Runs entirely under `torch.no_grad()`, without building any graph, and solves every element of the inputs at once.
+    Use `put_implied_volatility` with an optimizer from `dfin.optimize` for objectives without closed-form derivatives.
+
+    Parameters
+    ----------
+    S : torch.Tensor
+        Current underlying price
+    K : torch.Tensor
+        Option strike price
+    r : torch.Tensor
+        Risk-free interest rate
+    t : torch.Tensor
+        Time to expiry
+    price : torch.Tensor
+        Observed price of the put options
+    sigma0 : torch.Tensor or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`.
+    method : str
+        Either "newton" (vega only) or "halley" (vega and vomma). Default: "halley".
+    atol : float
+        The tolerance of the optimization target. Default: 1e-6.
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    callback : Callable, optional
+        Receives the `SolverReport` of the solver, labelled with the contract inputs.
+
+    Returns
+    -------
+    BatchedRootResult
+        Implied volatilities, per-element iteration counts and converged flags.
+    """
+
+    return _analytic_implied_volatility(S, K, r, t, price, sigma0, False, method, atol, max_iter, callback)
@@ -0,0 +1,317 @@
+"""Monte Carlo pricing of path-dependent options under Black-Scholes dynamics with PyTorch.
+
+Paths of geometric Brownian motion are simulated for a whole batch of options at once, as tensors of shape
+(options, paths, steps), in chunks of a fixed number of paths so memory stays bounded however many paths are asked for.
+Antithetic variates and scrambled Sobol sequences cut the number of paths needed for a given accuracy.
+
+Greeks are pathwise derivatives obtained through autograd, in the spirit of `bs_torch.get_delta` and `bs_torch.get_vega`:
+the discounted payoff of every chunk is differentiated with respect to S, sigma, r and t, and the gradients are averaged.
+They are unbiased for payoffs that are continuous in the path, e.g. European and Asian options,
+but miss the sensitivity of the knock event of barrier options, whose indicator has a zero derivative almost everywhere.
+"""
+
+import math
+from typing import Callable, Iterator, NamedTuple, Optional, Union
+
+import torch
+
+from dfin.options.bs_torch import call_price
+
+
+# A payoff maps simulated prices of shape (options, paths, steps) and strikes of shape (options, 1)
+# to undiscounted payoffs of shape (options, paths).
+Payoff = Callable[[torch.Tensor, torch.Tensor], torch.Tensor]
+TensorLike = Union[float, torch.Tensor]
+
+# Dimension limit of `torch.quasirandom.SobolEngine`.
+MAX_SOBOL_STEPS = 21201
+
+
+def _check_kind(kind:str):
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+
+
+def _vanilla(kind:str, underlying:torch.Tensor, K:torch.Tensor) -> torch.Tensor:
+    if kind == 'call':
+        return torch.clamp(underlying - K, min=0)
+    return torch.clamp(K - underlying, min=0)
+
+
+def european(kind:str='call') -> Payoff:
+    """
+    Payoff of a European option, exercised at expiry only.
+
+    Parameters
+    ----------
+    kind : str
+        Either "call" or "put". Default: "call".
+
+    Returns
+    -------
+    Payoff
+        Payoff on the last simulated price.
+    """
+
+    _check_kind(kind)
+
+    def payoff(paths:torch.Tensor, K:torch.Tensor) -> torch.Tensor:
+        return _vanilla(kind, paths[..., -1], K)
+
+    return payoff
+
+
+def asian(kind:str='call', average:str='arithmetic') -> Payoff:
+    """
+    Payoff of an Asian option on the average price, sampled at every step.
+
+    Parameters
+    ----------
+    kind : str
+        Either "call" or "put". Default: "call".
+    average : str
+        Either "arithmetic" or "geometric". Default: "arithmetic".
+
+    Returns
+    -------
+    Payoff
+        Payoff on the average of the simulated prices, excluding the current price.
+    """
+
+    _check_kind(kind)
+    if average not in ('arithmetic', 'geometric'):
+        raise ValueError(f'Unknown average "{average}". Expected "arithmetic" or "geometric".')
+
+    def payoff(paths:torch.Tensor, K:torch.Tensor) -> torch.Tensor:
+        if average == 'arithmetic':
+            mean = paths.mean(-1)
+        else:
+            mean = torch.exp(torch.log(paths).mean(-1))
+        return _vanilla(kind, mean, K)
+
+    return payoff
+
+
+def barrier(level:TensorLike, kind:str='call', direction:str='up', knock:str='out') -> Payoff:
+    """
+    Payoff of a European barrier option, monitored at every step.
+
+    Monitoring is discrete, so prices converge to those of a continuously monitored barrier only as the number of steps grows.
+
+    Parameters
+    ----------
+    level : float or torch.Tensor
+        Barrier level, a scalar or one per option.
+    kind : str
+        Either "call" or "put". Default: "call".
+    direction : str
+        Either "up" or "down", i.e. whether the barrier is hit from below or from above. Default: "up".
+    knock : str
+        Either "out" or "in", i.e. whether hitting the barrier cancels or activates the option. Default: "out".
+
+    Returns
+    -------
+    Payoff
+        Payoff on the last simulated price, zeroed depending on whether the barrier was hit.
+    """
+
+    _check_kind(kind)
+    if direction not in ('up', 'down'):
+        raise ValueError(f'Unknown direction "{direction}". Expected "up" or "down".')
+    if knock not in ('out', 'in'):
+        raise ValueError(f'Unknown knock "{knock}". Expected "out" or "in".')
+
+    def payoff(paths:torch.Tensor, K:torch.Tensor) -> torch.Tensor:
+        B = torch.as_tensor(level, dtype=paths.dtype, device=paths.device).reshape(-1, 1)
+        if direction == 'up':
+            hit = paths.amax(-1) >= B
+        else:
+            hit = paths.amin(-1) <= B
+        alive = ~hit if knock == 'out' else hit
+        return _vanilla(kind, paths[..., -1], K) * alive
+
+    return payoff
+
+
+def normals(paths:int, steps:int, chunk_size:int=2**14, antithetic:bool=True, sobol:bool=False, seed:int=0, dtype:torch.dtype=torch.float64) -> Iterator[torch.Tensor]:
+    """
+    Generates standard normal variates in chunks.
+
+    Parameters
+    ----------
+    paths : int
+        Total number of paths. Rounded up to an even number with antithetic variates.
+    steps : int
+        Number of time steps, i.e. variates per path.
+    chunk_size : int
+        Maximum number of paths per chunk. Default: 16384.
+    antithetic : bool
+        Whether the second half of every chunk mirrors the first one. Default: True.
+    sobol : bool
+        Whether to map a scrambled Sobol sequence through the inverse normal CDF instead of drawing pseudo-random variates.
+        Powers of two of paths per chunk keep the sequence balanced. Default: False.
+    seed : int
+        Seed of the generator or of the scrambling. Default: 0.
+    dtype : torch.dtype
+        Either torch.float32 or torch.float64. Default: torch.float64.
+
+    Yields
+    ------
+    torch.Tensor
+        Variates of shape (paths in chunk, steps).
+    """
+
+    if paths < 1 or steps < 1:
+        raise ValueError(f'Expected at least one path and one step, got {paths} paths and {steps} steps.')
+    if sobol and steps > MAX_SOBOL_STEPS:
+        raise ValueError(f'Sobol sequences support at most {MAX_SOBOL_STEPS} steps, got {steps}.')
+
+    draws = math.ceil(paths / 2) if antithetic else paths
+    chunk_draws = max(1, chunk_size // 2 if antithetic else chunk_size)
+    if sobol:
+        engine = torch.quasirandom.SobolEngine(dimension=steps, scramble=True, seed=seed)
+        # Keep the uniforms away from 0 and 1, where the inverse CDF is infinite.
+        eps = torch.finfo(dtype).eps
+    else:
+        generator = torch.Generator().manual_seed(seed)
+
+    while draws > 0:
+        size = min(chunk_draws, draws)
+        draws -= size
+        if sobol:
+            Z = torch.special.ndtri(engine.draw(size, dtype=torch.float64).clamp_(eps, 1 - eps)).to(dtype)
+        else:
+            Z = torch.randn(size, steps, generator=generator, dtype=dtype)
+        yield torch.cat([Z, -Z]) if antithetic else Z
+
+
+def simulate(S:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, Z:torch.Tensor) -> torch.Tensor:
+    """
+    Simulates geometric Brownian motion on a uniform time grid, exactly in log space.
+
+    Parameters
+    ----------
+    S, r, t, sigma : torch.Tensor
+        Current underlying price, risk-free interest rate, time to expiry and volatility, of shape (options,).
+    Z : torch.Tensor
+        Standard normal variates of shape (paths, steps).
+
+    Returns
+    -------
+    torch.Tensor
+        Prices at the end of every step, of shape (options, paths, steps).
+    """
+
+    steps = Z.shape[-1]
+    S, r, t, sigma = (x.reshape(-1, 1, 1) for x in (S, r, t, sigma))
+    dt = t / steps
+    increments = (r - sigma**2 / 2) * dt + sigma * torch.sqrt(dt) * Z
+    return S * torch.exp(torch.cumsum(increments, dim=-1))
+
+
+class MCResult(NamedTuple):
+    """Monte Carlo price of a batch of options, with its standard error and pathwise Greeks if requested."""
+    price: torch.Tensor
+    stderr: torch.Tensor
+    delta: Optional[torch.Tensor] = None
+    vega: Optional[torch.Tensor] = None
+    theta: Optional[torch.Tensor] = None
+    rho: Optional[torch.Tensor] = None
+
+
+def price(payoff:Payoff, S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, sigma:TensorLike, paths:int=2**16, steps:int=1, chunk_size:int=2**14, antithetic:bool=True, sobol:bool=False, seed:int=0, greeks:bool=False, dtype:torch.dtype=torch.float64) -> MCResult:
+    """
+    Prices a batch of options by Monte Carlo simulation of geometric Brownian motion.
+
+    All options share the same variates, and peak memory is proportional to options x `chunk_size` x `steps`,
+    about twice as much with `greeks` since the graph of a chunk is kept until it is differentiated.
+
+    Parameters
+    ----------
+    payoff : Payoff
+        Payoff of the options, e.g. `european('call')`, `asian('put')` or `barrier(120., knock='out')`.
+    S : float or torch.Tensor
+        Current underlying price
+    K : float or torch.Tensor
+        Option strike price
+    r : float or torch.Tensor
+        Risk-free interest rate
+    t : float or torch.Tensor
+        Time to expiry
+    sigma : float or torch.Tensor
+        Volatility of the underlying asset
+    paths : int
+        Number of simulated paths. Default: 65536.
+    steps : int
+        Number of time steps per path, e.g. monitoring dates of an Asian or barrier option. Default: 1.
+    chunk_size : int
+        Maximum number of paths simulated at once. Default: 16384.
+    antithetic : bool
+        Whether to pair every path with its mirror image. Default: True.
+    sobol : bool
+        Whether to use a scrambled Sobol sequence instead of pseudo-random variates. Default: False.
+    seed : int
+        Seed of the variates. Default: 0.
+    greeks : bool
+        Whether to compute pathwise delta, vega, theta and rho through autograd. Default: False.
+    dtype : torch.dtype
+        Either torch.float32 or torch.float64. Default: torch.float64.
+
+    Returns
+    -------
+    MCResult
+        Price, standard error and, if requested, Greeks of the options, in the broadcast shape of the inputs.
+        The standard error is over independent paths, or antithetic pairs; it overstates the error of Sobol sequences.
+        Theta follows `bs_torch.get_theta`, i.e. the decay per year of calendar time.
+    """
+
+    # Plain floats follow the device of the tensors.
+    device = next((x.device for x in (S, K, r, t, sigma) if torch.is_tensor(x)), None)
+    inputs = torch.broadcast_tensors(*(torch.as_tensor(x, dtype=dtype, device=device) for x in (S, K, r, t, sigma)))
+    shape = inputs[0].shape
+    S, K, r, t, sigma = (x.detach().reshape(-1) for x in inputs)
+    if greeks:
+        S, r, t, sigma = (x.clone().requires_grad_(True) for x in (S, r, t, sigma))
+    K = K.reshape(-1, 1)
+
+    total = torch.zeros_like(K.reshape(-1))
+    squares = torch.zeros_like(total)
+    gradients = [torch.zeros_like(total) for _ in range(4)]
+    samples = 0
+
+    with torch.set_grad_enabled(greeks):
+        for Z in normals(paths, steps, chunk_size, antithetic, sobol, seed, dtype):
+            # The variates are drawn on the CPU, so that a seed gives the same paths on every device.
+            Z = Z.to(K.device)
+            discounted = torch.exp(-r*t).reshape(-1, 1) * payoff(simulate(S, r, t, sigma, Z), K)
+            if greeks:
+                for gradient, grad in zip(gradients, torch.autograd.grad(discounted.sum(), (S, sigma, t, r))):
+                    gradient += grad
+            discounted = discounted.detach()
+            if antithetic:
+                half = discounted.shape[-1] // 2
+                discounted = (discounted[:, :half] + discounted[:, half:]) / 2
+            total += discounted.sum(-1)
+            squares += (discounted**2).sum(-1)
+            samples += discounted.shape[-1]
+
+    mean = total / samples
+    variance = torch.clamp(squares / samples - mean**2, min=0) * samples / max(samples - 1, 1)
+    stderr = torch.sqrt(variance / samples)
+    if not greeks:
+        return MCResult(mean.reshape(shape), stderr.reshape(shape))
+    # Gradients summed over every path, and antithetic pairs count twice.
+    delta, vega, dt, rho = (g.reshape(shape) / (samples * (2 if antithetic else 1)) for g in gradients)
+    return MCResult(mean.reshape(shape), stderr.reshape(shape), delta, vega, -dt, rho)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    S, K, r, t, sigma = 100., torch.tensor([90., 100., 110.]), 0.05, 1., 0.2
+    vanilla = price(european('call'), S, K, r, t, sigma, paths=2**18, greeks=True)
+    print(f'Monte Carlo call : {vanilla.price} +/- {vanilla.stderr}')
+    print(f'Black-Scholes    : {call_price(torch.tensor(S), K, torch.tensor(r), torch.tensor(t), torch.tensor(sigma))}')
+    print(f'Pathwise delta   : {vanilla.delta}, vega: {vanilla.vega}')
+    print(f'Asian call       : {price(asian("call"), S, K, r, t, sigma, steps=252, sobol=True).price}')
+    print(f'Up-and-out call  : {price(barrier(130., "call", "up", "out"), S, K, r, t, sigma, steps=252).price}')
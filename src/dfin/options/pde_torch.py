@@ -0,0 +1,370 @@
+"""Crank-Nicolson finite differences for the Black-Scholes PDE with PyTorch.
+
+The PDE is solved for a unit strike on a uniform grid of log-moneyness x = ln(S/K), where its coefficients are constant.
+Since prices are homogeneous in (S, K), i.e. V(S, K) = K v(ln(S/K)), one solve prices every strike on the grid:
+a whole smile of strikes sharing the same volatility, rate and expiry costs a single grid, whose Greeks come for free.
+
+Grids of different volatilities, rates and expiries are stepped together as one batch, and every time step is a batched
+tridiagonal solve, factorized once since the matrix does not change over time. The Thomas algorithm needs a Python loop
+iteration per node, so parallel cyclic reduction, a handful of whole-tensor passes, is the default instead.
+American options are handled by projecting the values onto the exercise value after every step.
+"""
+
+from typing import List, NamedTuple, Tuple, Union
+
+import torch
+
+
+TensorLike = Union[float, torch.Tensor]
+
+
+def _check(kind:str):
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+
+
+def _factorize(lower:List[torch.Tensor], diag:List[torch.Tensor], upper:List[torch.Tensor]) -> Tuple[List[torch.Tensor], List[torch.Tensor], List[torch.Tensor]]:
+    """
+    LU factorization of a batch of tridiagonal matrices, i.e. the part of the forward sweep of the Thomas algorithm
+    that does not depend on the right-hand side. Takes and returns one tensor of shape (batch,) per row.
+    """
+
+    inv_pivot = [1 / diag[0]]
+    upper_prime = [upper[0] * inv_pivot[0]]
+    for i in range(1, len(diag)):
+        inv_pivot.append(1 / (diag[i] - lower[i] * upper_prime[-1]))
+        upper_prime.append(upper[i] * inv_pivot[-1])
+    return lower, upper_prime, inv_pivot
+
+
+def _substitute(factors:Tuple[List[torch.Tensor], List[torch.Tensor], List[torch.Tensor]], rhs:torch.Tensor) -> torch.Tensor:
+    """Solves a factorized batch of tridiagonal systems by forward and back substitution."""
+
+    lower, upper_prime, inv_pivot = factors
+    columns = rhs.unbind(-1)
+    forward = [columns[0] * inv_pivot[0]]
+    for i in range(1, len(columns)):
+        forward.append((columns[i] - lower[i] * forward[-1]) * inv_pivot[i])
+    solution = [forward[-1]]
+    for i in range(len(columns) - 2, -1, -1):
+        solution.append(forward[i] - upper_prime[i] * solution[-1])
+    return torch.stack(solution[::-1], dim=-1)
+
+
+def thomas(lower:torch.Tensor, diag:torch.Tensor, upper:torch.Tensor, rhs:torch.Tensor) -> torch.Tensor:
+    """
+    Solves a batch of tridiagonal systems with the Thomas algorithm, in O(n) per system.
+
+    No pivoting is done, which is stable for diagonally dominant matrices, e.g. those of implicit finite difference schemes.
+
+    Parameters
+    ----------
+    lower, diag, upper : torch.Tensor
+        Sub-, main and super-diagonal of every matrix, of shape (batch,) if constant along the diagonal,
+        or (batch, n) otherwise, the first entry of `lower` and the last of `upper` being ignored.
+    rhs : torch.Tensor
+        Right-hand sides of shape (batch, n).
+
+    Returns
+    -------
+    torch.Tensor
+        Solutions of shape (batch, n).
+    """
+
+    diagonals = (torch.broadcast_to(x if x.dim() == rhs.dim() else x.unsqueeze(-1), rhs.shape).unbind(-1) for x in (lower, diag, upper))
+    return _substitute(_factorize(*diagonals), rhs)
+
+
+def _reduce(lower:torch.Tensor, diag:torch.Tensor, upper:torch.Tensor) -> Tuple[List[Tuple[int, torch.Tensor, torch.Tensor]], torch.Tensor]:
+    """
+    Coefficients of parallel cyclic reduction of a batch of tridiagonal matrices of shape (batch, n),
+    i.e. every part of the elimination that does not depend on the right-hand side.
+    """
+
+    lower, diag, upper = lower.clone(), diag.clone(), upper.clone()
+    lower[..., 0] = 0
+    upper[..., -1] = 0
+    size = diag.shape[-1]
+    levels = []
+    stride = 1
+    while stride < size:
+        # Rows beyond either end are the identity, with nothing to eliminate.
+        pad = lambda x, value: (torch.cat([torch.full_like(x[..., :stride], value), x[..., :-stride]], -1), torch.cat([x[..., stride:], torch.full_like(x[..., :stride], value)], -1))
+        (lower_before, lower_after), (diag_before, diag_after), (upper_before, upper_after) = pad(lower, 0.), pad(diag, 1.), pad(upper, 0.)
+        alpha, gamma = -lower / diag_before, -upper / diag_after
+        lower, diag, upper = alpha * lower_before, diag + alpha * upper_before + gamma * lower_after, gamma * upper_after
+        levels.append((stride, alpha, gamma))
+        stride *= 2
+    return levels, 1 / diag
+
+
+def _eliminate(factors:Tuple[List[Tuple[int, torch.Tensor, torch.Tensor]], torch.Tensor], rhs:torch.Tensor) -> torch.Tensor:
+    """Solves a reduced batch of tridiagonal systems, in log2(n) vectorized passes over the right-hand sides."""
+
+    levels, inv_diag = factors
+    for stride, alpha, gamma in levels:
+        zero = torch.zeros_like(rhs[..., :stride])
+        rhs = rhs + alpha * torch.cat([zero, rhs[..., :-stride]], -1) + gamma * torch.cat([rhs[..., stride:], zero], -1)
+    return rhs * inv_diag
+
+
+def cyclic_reduction(lower:torch.Tensor, diag:torch.Tensor, upper:torch.Tensor, rhs:torch.Tensor) -> torch.Tensor:
+    """
+    Solves a batch of tridiagonal systems by parallel cyclic reduction.
+
+    Every pass decouples each equation from its neighbours at twice the distance of the previous pass,
+    so log2(n) passes of whole-tensor ops replace the n sequential steps of the Thomas algorithm,
+    at the cost of O(n log n) operations instead of O(n). Stable for diagonally dominant matrices.
+
+    Parameters
+    ----------
+    lower, diag, upper : torch.Tensor
+        Sub-, main and super-diagonal of every matrix, of shape (batch,) if constant along the diagonal,
+        or (batch, n) otherwise, the first entry of `lower` and the last of `upper` being ignored.
+    rhs : torch.Tensor
+        Right-hand sides of shape (batch, n).
+
+    Returns
+    -------
+    torch.Tensor
+        Solutions of shape (batch, n).
+    """
+
+    diagonals = (torch.broadcast_to(x if x.dim() == rhs.dim() else x.unsqueeze(-1), rhs.shape) for x in (lower, diag, upper))
+    return _eliminate(_reduce(*diagonals), rhs)
+
+
+TRIDIAGONAL = {
+    'thomas': (lambda lower, diag, upper: _factorize(*(x.unbind(-1) for x in (lower, diag, upper))), _substitute),
+    'cyclic': (_reduce, _eliminate),
+}
+
+
+class PDEGreeks(NamedTuple):
+    """Theoretical price and grid Greeks of a batch of options."""
+    price: torch.Tensor
+    delta: torch.Tensor
+    gamma: torch.Tensor
+    theta: torch.Tensor
+
+
+class PDESolution:
+    """
+    Option values of a batch of solved grids, for a unit strike, on a uniform grid of log-moneyness.
+
+    Attributes
+    ----------
+    x : torch.Tensor
+        Log-moneyness ln(S/K) of every node, of shape (*batch, nodes).
+    values : torch.Tensor
+        Values of a unit strike option at every node, of shape (*batch, nodes).
+    previous : torch.Tensor
+        Values one time step `dt` earlier in time to expiry, for theta.
+    dt : torch.Tensor
+        Time step of every grid, of shape batch.
+    """
+
+    __slots__ = ('x', 'values', 'previous', 'dt')
+
+    def __init__(self, x:torch.Tensor, values:torch.Tensor, previous:torch.Tensor, dt:torch.Tensor):
+        self.x = x
+        self.values = values
+        self.previous = previous
+        self.dt = dt
+
+    def _interpolate(self, S:TensorLike, K:TensorLike, derivatives:bool):
+        """Quadratic interpolation through the three nodes nearest to ln(S/K), with its first two derivatives in x."""
+
+        S, K = (torch.as_tensor(v, dtype=self.values.dtype) for v in (S, K))
+        x = torch.log(S / K)
+        x, _ = torch.broadcast_tensors(x, self.dt)
+        shape = x.shape
+        nodes = self.values.shape[-1]
+        x_min, dx = self.x[..., 0].expand(shape), (self.x[..., 1] - self.x[..., 0]).expand(shape)
+        position = (x - x_min) / dx
+        index = torch.round(position).clamp(1, nodes - 2).long().unsqueeze(-1)
+        s = position - index.squeeze(-1)
+        outside = (position < 0) | (position > nodes - 1)
+
+        def at(values:torch.Tensor):
+            values = values.expand(*shape, nodes)
+            left, middle, right = (torch.gather(values, -1, index + offset).squeeze(-1) for offset in (-1, 0, 1))
+            slope = (right - left) / 2
+            curvature = right - 2 * middle + left
+            return middle + s * slope + s**2 / 2 * curvature, (slope + s * curvature) / dx, curvature / dx**2
+
+        value, first, second = at(self.values)
+        nan = torch.full_like(value, float('nan'))
+        value = torch.where(outside, nan, K * value)
+        if not derivatives:
+            return value
+        earlier, _, _ = at(self.previous)
+        delta = torch.where(outside, nan, K * first / S)
+        gamma = torch.where(outside, nan, K * (second - first) / S**2)
+        theta = torch.where(outside, nan, -(value - K * earlier) / self.dt)
+        return PDEGreeks(value, delta, gamma, theta)
+
+    def price(self, S:TensorLike, K:TensorLike) -> torch.Tensor:
+        """
+        Prices options of any strike off the grids.
+
+        Parameters
+        ----------
+        S : float or torch.Tensor
+            Current underlying price
+        K : float or torch.Tensor
+            Option strike price, broadcast against S and the batch of grids, e.g. of shape (strikes, 1) for (expiries,) grids.
+
+        Returns
+        -------
+        torch.Tensor
+            Theoretical price of the options. NaN where ln(S/K) falls outside the grid.
+        """
+        return self._interpolate(S, K, False)
+
+    def greeks(self, S:TensorLike, K:TensorLike) -> PDEGreeks:
+        """
+        Prices options of any strike off the grids, with their delta and gamma from the grid and theta from the last time step.
+
+        Theta follows `bs_torch.get_theta`, i.e. the decay per year of calendar time. See `price` for the parameters.
+        """
+        return self._interpolate(S, K, True)
+
+
+def solve(r:TensorLike, t:TensorLike, sigma:TensorLike, kind:str='put', american:bool=True, q:TensorLike=0., nodes:int=401, steps:int=200, width:float=6., center:TensorLike=0., rannacher:int=2, tridiagonal:str='cyclic') -> PDESolution:
+    """
+    Solves the Black-Scholes PDE for a unit strike on a batch of log-moneyness grids with the Crank-Nicolson scheme.
+
+    The first `rannacher` steps are fully implicit half steps, which damp the oscillations that the kink of the payoff
+    would otherwise cause in the Crank-Nicolson solution and its Greeks (Rannacher's time stepping).
+
+    Parameters
+    ----------
+    r : float or torch.Tensor
+        Risk-free interest rate
+    t : float or torch.Tensor
+        Time to expiry
+    sigma : float or torch.Tensor
+        Volatility of the underlying asset
+    kind : str
+        Either "call" or "put". Default: "put".
+    american : bool
+        Whether the option can be exercised at every step. Default: True.
+    q : float or torch.Tensor
+        Continuous dividend yield. Default: 0.
+    nodes : int
+        Number of nodes of every grid. Default: 401.
+    steps : int
+        Number of time steps. Default: 200.
+    width : float
+        Half width of every grid, in standard deviations sigma sqrt(t) of ln(S). Default: 6.
+    center : float or torch.Tensor
+        Log-moneyness at the middle of every grid. Default: 0, i.e. at the money.
+    rannacher : int
+        Number of implicit half steps replacing the first Crank-Nicolson steps. Default: 2.
+    tridiagonal : str
+        Either "cyclic" for `cyclic_reduction`, or "thomas" for the sequential `thomas` sweeps,
+        which spend a Python loop iteration per node and are only faster for tiny grids. Default: "cyclic".
+
+    Returns
+    -------
+    PDESolution
+        Grids in the broadcast shape of the inputs, to price and compute Greeks of any strike from.
+    """
+
+    _check(kind)
+    if tridiagonal not in TRIDIAGONAL:
+        raise ValueError(f'Unknown tridiagonal solver "{tridiagonal}". Expected "cyclic" or "thomas".')
+    if nodes < 5 or steps < 1:
+        raise ValueError(f'Expected at least 5 nodes and 1 step, got {nodes} nodes and {steps} steps.')
+
+    dtype = next((v.dtype for v in (r, t, sigma, q, center) if torch.is_tensor(v) and v.is_floating_point()), torch.float64)
+    r, t, sigma, q, center = torch.broadcast_tensors(*(v.detach().to(dtype) if torch.is_tensor(v) else torch.tensor(v, dtype=dtype) for v in (r, t, sigma, q, center)))
+    shape = r.shape
+    r, t, sigma, q, center = (v.reshape(-1) for v in (r, t, sigma, q, center))
+
+    half_width = width * sigma * torch.sqrt(t)
+    x = center.unsqueeze(-1) + torch.linspace(-1, 1, nodes, dtype=dtype) * half_width.unsqueeze(-1)
+    dx = 2 * half_width / (nodes - 1)
+    sign = 1 if kind == 'call' else -1
+    exercise = torch.clamp(sign * (torch.exp(x) - 1), min=0)
+
+    # Interior operator L v_i = alpha v_{i-1} + beta v_i + gamma v_{i+1}.
+    diffusion = sigma**2 / 2 / dx**2
+    drift = (r - q - sigma**2 / 2) / (2 * dx)
+    alpha, beta, gamma = diffusion - drift, -2 * diffusion - r, diffusion + drift
+
+    def boundaries(tau:torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Values at both ends of the grids, deep in and deep out of the money."""
+        forward = torch.exp(x[:, -1] - q * tau) - torch.exp(-r * tau) if kind == 'call' else torch.exp(-r * tau) - torch.exp(x[:, 0] - q * tau)
+        if american:
+            forward = torch.maximum(forward, exercise[:, -1] if kind == 'call' else exercise[:, 0])
+        zero = torch.zeros_like(forward)
+        return (zero, forward) if kind == 'call' else (forward, zero)
+
+    factorize, substitute = TRIDIAGONAL[tridiagonal]
+
+    def scheme(dt:torch.Tensor, theta:float):
+        # The matrix does not change over time, so every scheme is factorized once.
+        diagonals = (-theta * dt * alpha, 1 - theta * dt * beta, -theta * dt * gamma)
+        factors = factorize(*(x.unsqueeze(-1).expand(-1, nodes - 2) for x in diagonals))
+        return factors, theta * dt, (1 - theta) * dt
+
+    full_dt = t / steps
+    schedule = [(full_dt / 2, 1.)] * (2 * min(rannacher, steps)) + [(full_dt, 0.5)] * (steps - min(rannacher, steps))
+    schemes = {}
+    values = exercise
+    tau = torch.zeros_like(t)
+    previous = values
+
+    with torch.no_grad():
+        for dt, theta in schedule:
+            if theta not in schemes:
+                schemes[theta] = scheme(dt, theta)
+            factors, implicit, explicit = schemes[theta]
+            lower_end, upper_end = boundaries(tau + dt)
+            inner = values[:, 1:-1]
+            rhs = inner + (explicit * alpha).unsqueeze(-1) * values[:, :-2] + (explicit * beta).unsqueeze(-1) * inner + (explicit * gamma).unsqueeze(-1) * values[:, 2:]
+            rhs[:, 0] += implicit * alpha * lower_end
+            rhs[:, -1] += implicit * gamma * upper_end
+            previous = values
+            values = torch.cat([lower_end.unsqueeze(-1), substitute(factors, rhs), upper_end.unsqueeze(-1)], dim=-1)
+            if american:
+                values = torch.maximum(values, exercise)
+            tau = tau + dt
+
+    last_dt = schedule[-1][0]
+    return PDESolution(x.reshape(*shape, nodes), values.reshape(*shape, nodes), previous.reshape(*shape, nodes), last_dt.reshape(shape))
+
+
+def price(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, sigma:TensorLike, kind:str='put', american:bool=True, q:TensorLike=0., nodes:int=401, steps:int=200, width:float=6.) -> torch.Tensor:
+    """
+    Computes the price of options on the Black-Scholes PDE, with one grid per contract centred on its moneyness.
+
+    Contracts sharing the same volatility, rate and expiry are cheaper to price off a single grid of `solve`.
+    See `solve` for the parameters.
+
+    Returns
+    -------
+    torch.Tensor
+        Theoretical price of the options, in the broadcast shape of the inputs.
+    """
+
+    S, K = (torch.as_tensor(v, dtype=torch.float64) if not torch.is_tensor(v) else v for v in (S, K))
+    S, K, r, t, sigma, q = torch.broadcast_tensors(*(torch.as_tensor(v, dtype=S.dtype) for v in (S, K, r, t, sigma, q)))
+    solution = solve(r, t, sigma, kind, american, q, nodes, steps, width, center=torch.log(S / K))
+    return solution.price(S, K)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    from dfin.options import bs_torch, tree_torch
+
+    K = torch.linspace(80, 120, 5, dtype=torch.float64)
+    grid = solve(0.05, 1., 0.2, 'put')
+    print(f'American put (PDE)  : {grid.price(100., K)}')
+    print(f'American put (tree) : {tree_torch.put_price(100., K, 0.05, 1., 0.2, steps=1000)}')
+    european = solve(0.05, 1., 0.2, 'call', american=False).greeks(100., K)
+    print(f'European call delta : {european.delta}')
+    print(f'Black-Scholes delta : {bs_torch.greeks(torch.tensor(100., dtype=torch.float64), K, torch.tensor(0.05, dtype=torch.float64), torch.tensor(1., dtype=torch.float64), torch.tensor(0.2, dtype=torch.float64)).delta}')
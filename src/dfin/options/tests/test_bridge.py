@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from dfin.options import bs_numpy, bs_torch
+from dfin.options.bridge import *
+
+
+@pytest.fixture
+def chain():
+    rng = np.random.default_rng(0)
+    size = 100
+    return pd.DataFrame({
+        'strike': rng.uniform(80, 120, size),
+        't': rng.uniform(0.25, 2, size),
+        'impliedVolatility': rng.uniform(0.1, 0.5, size),
+        'volume': rng.integers(0, 100, size),
+    })
+
+
+def test_to_tensor_shares_memory(chain):
+    column = chain['strike']
+    tensor = to_tensor(column)
+    assert tensor.dtype == torch.float64
+    assert np.shares_memory(tensor.numpy(), column.to_numpy())
+    # Conversions cannot be avoided.
+    assert to_tensor(chain['volume']).dtype == torch.float64
+    assert to_tensor(column, torch.float32).dtype == torch.float32
+    assert to_tensor(chain[['strike', 't']].to_numpy()[:, 0]).is_contiguous()
+    assert to_tensor(100.).dim() == 0
+
+
+def test_to_column_shares_memory(chain):
+    values = torch.arange(len(chain), dtype=torch.float64)
+    to_column(chain, 'result', values)
+    assert np.shares_memory(chain['result'].to_numpy(), values.numpy())
+    to_column(chain, 'constant', torch.tensor(1.))
+    assert (chain['constant'] == 1).all()
+
+
+def test_price_frame(chain):
+    price_frame(chain, S=100., r=0.05, t='t')
+    C, P = bs_numpy.call_put_price(100., chain['strike'], 0.05, chain['t'], chain['impliedVolatility'])
+    np.testing.assert_allclose(chain['callPrice'], C, rtol=1e-12)
+    np.testing.assert_allclose(chain['putPrice'], P, rtol=1e-12, atol=1e-12)
+
+
+def test_greeks_frame(chain):
+    greeks_frame(chain, S=100., r=0.05, t='t', kind='put', prefix='put_')
+    expected = bs_torch.greeks(torch.tensor(100., dtype=torch.float64), torch.tensor(chain['strike'].to_numpy()), torch.tensor(0.05, dtype=torch.float64), torch.tensor(chain['t'].to_numpy()), torch.tensor(chain['impliedVolatility'].to_numpy()), kind='put')
+    for name in expected._fields:
+        np.testing.assert_allclose(chain[f'put_{name}'], getattr(expected, name).numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize('kind', ['call', 'put'])
+def test_implied_volatility_frame(chain, kind):
+    price_frame(chain, S=100., r=0.05, t='t')
+    chain.loc[0, f'{kind}Price'] = 1000.
+    implied_volatility_frame(chain, S=100., r=0.05, t='t', price=f'{kind}Price', kind=kind, column='solved', atol=1e-10)
+    assert np.isnan(chain['solved'][0])
+    np.testing.assert_allclose(chain['solved'][1:], chain['impliedVolatility'][1:], rtol=1e-6)
+
+
+def speed_comparison():
+
+    import timeit
+
+    size = 1000000
+    rng = np.random.default_rng(0)
+    chain = pd.DataFrame({'strike': rng.uniform(80, 120, size), 't': rng.uniform(0.25, 2, size), 'impliedVolatility': rng.uniform(0.1, 0.5, size)})
+
+    def with_copies():
+        S, K, r, t, sigma = (torch.tensor(x) for x in (100., chain['strike'].to_numpy(), 0.05, chain['t'].to_numpy(), chain['impliedVolatility'].to_numpy()))
+        with torch.no_grad():
+            C, P = bs_torch.call_put_price(S, K, r, t, sigma)
+        chain['callPrice'] = C.numpy().copy()
+        chain['putPrice'] = P.numpy().copy()
+
+    time_taken = min(timeit.Timer(with_copies).repeat(repeat=5, number=1))
+    print(f'torch.tensor copies take {time_taken*1000:.2f} ms.')
+    time_taken = min(timeit.Timer(lambda: price_frame(chain, S=100., r=0.05, t='t')).repeat(repeat=5, number=1))
+    print(f'price_frame takes {time_taken*1000:.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
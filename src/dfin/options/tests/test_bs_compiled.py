@@ -0,0 +1,134 @@
+import pytest
+import torch
+
+from dfin.options import bs_compiled, bs_torch
+
+
+@pytest.fixture
+def chain_data():
+    # Deliberately not a power of two, so the inputs get padded.
+    size = 37
+    generator = torch.Generator().manual_seed(0)
+    S = torch.full((size,), 100., dtype=torch.float64)
+    K = torch.linspace(80., 120., size, dtype=torch.float64)
+    r = torch.full((size,), 0.05, dtype=torch.float64)
+    t = torch.rand(size, generator=generator, dtype=torch.float64) * 2 + 0.25
+    sigma = torch.rand(size, generator=generator, dtype=torch.float64) * 0.3 + 0.1
+    return S, K, r, t, sigma
+
+
+def test_bucket():
+    assert [bs_compiled.bucket(n) for n in (0, 1, 2, 3, 37, 64, 65)] == [1, 1, 2, 4, 64, 64, 128]
+
+
+@pytest.mark.parametrize('backend', ['eager', 'script'])
+def test_prices(chain_data, backend):
+    S, K, r, t, sigma = chain_data
+    C = bs_compiled.call_price(S, K, r, t, sigma, backend=backend)
+    P = bs_compiled.put_price(S, K, r, t, sigma, backend=backend)
+    assert C.shape == S.shape and C.dtype == torch.float64
+    assert torch.allclose(C, bs_torch.call_price(S, K, r, t, sigma), rtol=1e-12, atol=1e-12)
+    assert torch.allclose(P, bs_torch.put_price(S, K, r, t, sigma), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('backend', ['eager', 'script'])
+def test_implied_volatility(chain_data, backend):
+    S, K, r, t, sigma = chain_data
+    for pricer, solver in ((bs_torch.call_price, bs_compiled.call_implied_volatility), (bs_torch.put_price, bs_compiled.put_implied_volatility)):
+        result = solver(S, K, r, t, pricer(S, K, r, t, sigma), atol=1e-10, backend=backend)
+        assert result.x.shape == sigma.shape
+        assert torch.all(result.converged)
+        assert torch.allclose(result.x, sigma, rtol=1e-6, atol=1e-8)
+
+
+@pytest.mark.parametrize('backend', ['eager', 'script'])
+def test_implied_volatility_converged_on_last_step(chain_data, backend):
+    S, K, r, t, sigma = chain_data
+    price = bs_torch.call_price(S, K, r, t, sigma)
+    full = bs_compiled.call_implied_volatility(S, K, r, t, price, atol=1e-10, backend=backend)
+    # Out of steps right after the last update, which is checked at the point it returns.
+    capped = bs_compiled.call_implied_volatility(S, K, r, t, price, atol=1e-10, max_iter=int(full.iterations.max()), backend=backend)
+    assert torch.all(capped.converged)
+    assert torch.equal(capped.x, full.x)
+
+
+def test_broadcasting_and_dtype():
+    K = torch.linspace(80., 120., 6).reshape(2, 3)
+    C = bs_compiled.call_price(100., K, 0.05, 1., 0.2, backend='eager')
+    assert C.shape == (2, 3) and C.dtype == torch.float32
+    C = bs_compiled.call_price(100., K, 0.05, 1., 0.2, backend='eager', dtype=torch.float64)
+    assert C.dtype == torch.float64
+    assert torch.allclose(C, bs_torch.call_price(torch.tensor(100.), K, torch.tensor(0.05), torch.tensor(1.), torch.tensor(0.2)).double(), rtol=1e-6)
+
+
+def test_kernel_cache():
+    bs_compiled.clear_cache()
+    ones = torch.ones(5, dtype=torch.float64)
+    bs_compiled.call_price(ones * 100, ones * 100, ones * 0.05, ones, ones * 0.2, backend='script')
+    assert bs_compiled.cache_info()['script'] == 1
+    # Same bucket, same kernel.
+    ones = torch.ones(7, dtype=torch.float64)
+    bs_compiled.call_price(ones * 100, ones * 100, ones * 0.05, ones, ones * 0.2, backend='script')
+    assert bs_compiled.cache_info()['script'] == 1
+    bs_compiled.warmup([5, 100], backend='script')
+    # Two buckets, four kernels each.
+    assert bs_compiled.cache_info()['script'] == 8
+
+
+def test_invalid_backend(chain_data):
+    with pytest.raises(ValueError):
+        bs_compiled.call_price(*chain_data, backend='numba')
+
+
+def test_compile(chain_data):
+    S, K, r, t, sigma = (x[:8] for x in chain_data)
+    C = bs_compiled.call_price(S, K, r, t, sigma, backend='compile')
+    assert torch.allclose(C, bs_torch.call_price(S, K, r, t, sigma), rtol=1e-12, atol=1e-12)
+
+
+def test_compile_many_buckets(monkeypatch):
+    from torch._dynamo.utils import counters
+    # A lower limit than the default of 8 keeps the number of buckets, hence of slow compiles, small.
+    monkeypatch.setattr(torch._dynamo.config, 'recompile_limit', 2)
+    bs_compiled.clear_cache()
+    graphs = counters['stats']['unique_graphs']
+    for size in (1, 2, 4, 8):
+        ones = torch.ones(size, dtype=torch.float64)
+        C = bs_compiled.call_price(ones * 100, ones * 100, ones * 0.05, ones, ones * 0.2, backend='compile')
+        assert torch.allclose(C, bs_torch.call_price(ones * 100, ones * 100, ones * 0.05, ones, ones * 0.2), rtol=1e-12)
+    # Every bucket was compiled, rather than falling back to eager mode past the limit.
+    assert counters['stats']['unique_graphs'] - graphs == 4
+
+
+def speed_comparison():
+
+    import timeit
+
+    for size in (100, 10000, 1000000):
+        generator = torch.Generator().manual_seed(0)
+        S = torch.full((size,), 100., dtype=torch.float64)
+        K = torch.rand(size, generator=generator, dtype=torch.float64) * 40 + 80
+        r = torch.full((size,), 0.05, dtype=torch.float64)
+        t = torch.rand(size, generator=generator, dtype=torch.float64) * 2 + 0.25
+        sigma = torch.rand(size, generator=generator, dtype=torch.float64) * 0.3 + 0.1
+        price = bs_torch.call_price(S, K, r, t, sigma)
+        number = max(1, 100000 // size)
+
+        def eager_price():
+            with torch.no_grad():
+                bs_torch.call_price(S, K, r, t, sigma)
+
+        time_taken = min(timeit.Timer(eager_price).repeat(repeat=5, number=number)) / number
+        print(f'size={size:<8d} bs_torch.call_price takes {time_taken*1000:.4f} ms.')
+        for backend in bs_compiled.BACKENDS:
+            bs_compiled.warmup([size], backend=backend)
+            time_taken = min(timeit.Timer(lambda: bs_compiled.call_price(S, K, r, t, sigma, backend=backend)).repeat(repeat=5, number=number)) / number
+            print(f'size={size:<8d} bs_compiled.call_price ({backend}) takes {time_taken*1000:.4f} ms.')
+            time_taken = min(timeit.Timer(lambda: bs_compiled.call_implied_volatility(S, K, r, t, price, backend=backend)).repeat(repeat=5, number=number)) / number
+            print(f'size={size:<8d} bs_compiled.call_implied_volatility ({backend}) takes {time_taken*1000:.4f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -0,0 +1,116 @@
+import pytest
+import math
+import numpy as np
+
+from dfin.options import bs_vanilla
+from dfin.options.bs_numpy import *
+
+
+@pytest.fixture
+def option_data():
+    S = 100
+    K = 110
+    r = 0.05
+    t = 1
+    sigma = 0.2
+    return S, K, r, t, sigma
+
+
+@pytest.fixture
+def chain_data():
+    size = 1000
+    rng = np.random.default_rng(0)
+    S = rng.random(size) * 60 + 70          # Stock price [70,130)
+    K = rng.random(size) * 100 + 50         # Strike price [50,150)
+    r = rng.random(size) * 0.1              # Interest rate [0, 0.1)
+    t = rng.random(size) * 5 + 0.1          # Time to maturity [0.1, 5.1)
+    sigma = rng.random(size) * 0.4 + 0.05   # Volatility [0.05, 0.45)
+    return S, K, r, t, sigma
+
+
+def test_call_price(option_data):
+    C = call_price(*option_data)
+    assert math.isclose(C, 6.04, rel_tol=1e-3)
+
+
+def test_put_price(option_data):
+    P = put_price(*option_data)
+    assert math.isclose(P, 10.68, rel_tol=1e-3)
+
+
+def test_call_put_price(option_data):
+    C, P = call_put_price(*option_data)
+    assert math.isclose(C, 6.04, rel_tol=1e-3)
+    assert math.isclose(P, 10.68, rel_tol=1e-3)
+
+
+def test_matches_bs_vanilla(chain_data):
+    C, P = call_put_price(*chain_data)
+    for i in range(0, len(C), 100):
+        args = [float(x[i]) for x in chain_data]
+        assert math.isclose(C[i], bs_vanilla.call_price(*args), rel_tol=1e-9, abs_tol=1e-9)
+        assert math.isclose(P[i], bs_vanilla.put_price(*args), rel_tol=1e-9, abs_tol=1e-9)
+    assert np.allclose(C, call_price(*chain_data))
+    assert np.allclose(P, put_price(*chain_data))
+
+
+def test_broadcasting():
+    K = np.linspace(80, 120, 5)
+    t = np.array([[0.5], [1.0]])
+    C, P = call_put_price(100, K, 0.05, t, 0.2)
+    assert C.shape == (2, 5)
+    assert math.isclose(C[1, 2], bs_vanilla.call_price(100, 100, 0.05, 1, 0.2), rel_tol=1e-9)
+
+
+def test_out(chain_data):
+    size = len(chain_data[0])
+    out = (np.empty(size), np.empty(size))
+    C, P = call_put_price(*chain_data, out=out)
+    assert C is out[0] and P is out[1]
+    out = np.empty(size)
+    assert call_price(*chain_data, out=out) is out
+
+
+def test_float32(chain_data):
+    C = call_price(*chain_data, dtype=np.float32)
+    assert C.dtype == np.float32
+    assert np.allclose(C, call_price(*chain_data), rtol=1e-4, atol=1e-3)
+    sigma = call_implied_volatility(*chain_data[:4], C, dtype=np.float32)
+    assert sigma.dtype == np.float32
+
+
+def test_implied_volatility(chain_data):
+    S, K, r, t, sigma = chain_data
+    C = call_price(S, K, r, t, sigma)
+    P = put_price(S, K, r, t, sigma)
+    # In-the-money prices carry too little time value to pin sigma down, so invert the out-of-the-money leg.
+    otm_call = (S < K * np.exp(-r*t)) & (C > 1e-6)
+    otm_put = (S > K * np.exp(-r*t)) & (P > 1e-6)
+    sigma_call = call_implied_volatility(S, K, r, t, C)
+    sigma_put = put_implied_volatility(S, K, r, t, P)
+    assert np.allclose(sigma_call[otm_call], sigma[otm_call], rtol=1e-8)
+    assert np.allclose(sigma_put[otm_put], sigma[otm_put], rtol=1e-8)
+
+
+def test_implied_volatility_short_dated_high_vol():
+    # Far from the money, close to expiry and at high volatility, vega is tiny at the initial guess.
+    assert put_implied_volatility(100, 70.36, 0.0125, 0.053, put_price(100, 70.36, 0.0125, 0.053, 1.)) == pytest.approx(1., rel=1e-10)
+    rng = np.random.default_rng(1)
+    size = 20000
+    K = 100 * np.exp(rng.uniform(-0.6, 0.6, size))
+    r = rng.uniform(0, 0.05, size)
+    t = rng.uniform(0.01, 0.1, size)
+    sigma = rng.uniform(0.5, 2., size)
+    otm = K < 100
+    price = np.where(otm, put_price(100, K, r, t, sigma), call_price(100, K, r, t, sigma))
+    solved = np.where(otm, put_implied_volatility(100, K, r, t, price), call_implied_volatility(100, K, r, t, price))
+    quoted = price > 1e-8
+    assert np.allclose(solved[quoted], sigma[quoted], rtol=1e-8)
+    # Out of iterations is no solution.
+    assert np.isnan(put_implied_volatility(100, 70.36, 0.0125, 0.053, 0.517, max_iter=2))
+
+
+def test_implied_volatility_arbitrage_violation():
+    sigma = call_implied_volatility(100, [110, 110, 50], 0.05, 1, [6.040088129724, 101, 1])
+    assert math.isclose(sigma[0], 0.2, rel_tol=1e-12)
+    assert np.all(np.isnan(sigma[1:]))
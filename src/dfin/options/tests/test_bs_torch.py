@@ -48,6 +48,32 @@ def test_put_call_parity_randomized():
     assert torch.all(torch.isclose((C + K * torch.exp(-r*t)), (P + S)))
 
 
+def test_call_put_price(option_data):
+    C, P = call_put_price(*option_data)
+    assert math.isclose(C.item(), 6.04, rel_tol=1e-3)
+    assert math.isclose(P.item(), 10.68, rel_tol=1e-3)
+
+
+def test_call_put_price_randomized():
+    size = 10
+    S = torch.rand(size) * 60 + 70   # Stock price [70,130)
+    K = torch.rand(size) * 100 + 50  # Strike price[50,120)
+    r = torch.rand(size) * 0.1       # Interest rate [0, 0.1)
+    t = torch.rand(size) * 5 + 0.1   # Time to maturity [0.1, 5.1)
+    sigma = torch.rand(size) * 0.4 + 0.05  # Volatility [0.05, 0.45)
+
+    C, P = call_put_price(S, K, r, t, sigma)
+    assert torch.allclose(C, call_price(S, K, r, t, sigma), rtol=1e-4, atol=1e-4)
+    assert torch.allclose(P, put_price(S, K, r, t, sigma), rtol=1e-4, atol=1e-4)
+
+    # Results land in the preallocated buffers.
+    out = (torch.empty(size), torch.empty(size))
+    C2, P2 = call_put_price(S, K, r, t, sigma, out=out)
+    assert C2 is out[0] and P2 is out[1]
+    assert torch.allclose(C2, C)
+    assert torch.allclose(P2, P)
+
+
 def test_call_greeks(option_data):
     S, K, r, t, sigma = option_data
     C = call_price(*option_data)
@@ -83,3 +109,78 @@ def test_delta_sum_one(option_data):
     assert math.isclose(get_delta(CS).item(),     0.450, rel_tol=1e-3)
     assert math.isclose(get_delta(PS).item(),    -0.550, rel_tol=1e-3)
     assert math.isclose(get_delta(CS).item() - get_delta(PS).item(), 1, rel_tol=1e-3)
+
+
+def test_analytic_greeks(option_data):
+    call = greeks(*option_data, kind='call')
+    assert math.isclose(call.price.item(),   6.040, rel_tol=1e-3)
+    assert math.isclose(call.delta.item(),   0.450, rel_tol=1e-3)
+    assert math.isclose(call.gamma.item(),   0.020, rel_tol=1e-1)
+    assert math.isclose(call.rho.item(),    38.925, rel_tol=1e-3)
+    assert math.isclose(call.theta.item(),  -5.904, rel_tol=1e-3)
+    assert math.isclose(call.vega.item(),   39.576, rel_tol=1e-3)
+    put = greeks(*option_data, kind='put')
+    assert math.isclose(put.price.item(),   10.675, rel_tol=1e-3)
+    assert math.isclose(put.delta.item(),   -0.550, rel_tol=1e-3)
+    assert math.isclose(put.gamma.item(),    0.020, rel_tol=1e-1)
+    assert math.isclose(put.rho.item(),    -65.711, rel_tol=1e-3)
+    assert math.isclose(put.theta.item(),   -0.672, rel_tol=1e-3)
+    assert math.isclose(put.vega.item(),    39.576, rel_tol=1e-3)
+    assert not call.price.requires_grad
+
+
+@pytest.mark.parametrize('kind', ['call', 'put'])
+def test_analytic_greeks_match_autograd(kind):
+    size = 10
+    S = torch.rand(size, dtype=torch.float64) * 60 + 70   # Stock price [70,130)
+    K = torch.rand(size, dtype=torch.float64) * 100 + 50  # Strike price[50,150)
+    r = torch.rand(size, dtype=torch.float64) * 0.1       # Interest rate [0, 0.1)
+    t = torch.rand(size, dtype=torch.float64) * 5 + 0.1   # Time to maturity [0.1, 5.1)
+    sigma = torch.rand(size, dtype=torch.float64) * 0.4 + 0.05  # Volatility [0.05, 0.45)
+
+    analytic = greeks(S, K, r, t, sigma, kind=kind)
+    autograd = greeks(S, K, r, t, sigma, kind=kind, method='autograd')
+    for a, b in zip(analytic, autograd):
+        assert torch.allclose(a, b, rtol=1e-8, atol=1e-10)
+
+
+def test_greeks_invalid_kind(option_data):
+    with pytest.raises(ValueError):
+        greeks(*option_data, kind='straddle')
+
+
+@pytest.mark.parametrize('dtype', [torch.float32, torch.float64])
+def test_normal_cdf_pdf(dtype):
+    x = torch.linspace(-5, 5, 101, dtype=dtype)
+    cdf = normal_cdf(x)
+    pdf = normal_pdf(x)
+    assert cdf.dtype == dtype and pdf.dtype == dtype
+    assert torch.allclose(cdf, (1.0 + torch.erf(x / math.sqrt(2.0))) / 2.0, atol=1e-6 if dtype == torch.float32 else 1e-15)
+    assert torch.allclose(pdf, torch.exp(torch.distributions.Normal(0., 1.).log_prob(x.double())).to(dtype))
+    # The PDF is the derivative of the CDF.
+    x = x.clone().requires_grad_(True)
+    grad, = torch.autograd.grad(normal_cdf(x).sum(), x)
+    assert torch.allclose(grad, pdf)
+
+
+def speed_comparison():
+
+    import timeit
+    from functools import partial
+
+    def legacy_normal_cdf(x):
+        return (1.0 + torch.erf(x / torch.sqrt(torch.tensor([2.0])))) / 2.0
+
+    for size in [1, 1000, 100000]:
+        number = 10000 if size <= 1000 else 100
+        for dtype in [torch.float32, torch.float64]:
+            x = torch.randn(size, dtype=dtype)
+            legacy = min(timeit.Timer(partial(legacy_normal_cdf, x)).repeat(repeat=5, number=number)) / number
+            current = min(timeit.Timer(partial(normal_cdf, x)).repeat(repeat=5, number=number)) / number
+            print(f'normal_cdf of {size:>6d} {str(dtype):<13s}: {legacy*1e6:8.2f} us before, {current*1e6:8.2f} us after.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from dfin.options import calibration, heston_torch
+from dfin.options.calibration import *
+from dfin.options.chain import OptionChain
+
+
+TRUE = {
+    'AAA': (0.04, 2., 0.05, 0.5, -0.7),
+    'BBB': (0.09, 1., 0.06, 0.8, -0.4),
+}
+EXPIRIES = {'2025-01-17': 0.1, '2025-03-21': 0.35, '2025-06-20': 0.6, '2025-12-19': 1.1}
+
+
+def heston_chain(S, params, r=0.05, strikes=np.arange(75., 130., 5.)):
+    """A chain quoted one cent either side of Heston's prices."""
+    frames = {}
+    for label, t in EXPIRIES.items():
+        legs = []
+        for kind in ('call', 'put'):
+            price = heston_torch.price(S, torch.tensor(strikes), r, t, *params, kind=kind).numpy()
+            legs.append(pd.DataFrame({'contractSymbol': [f'{kind}{k:g}' for k in strikes], 'strike': strikes, 'lastPrice': price, 'bid': price - 0.01, 'ask': price + 0.01}))
+        frames[label] = tuple(legs)
+    return OptionChain.from_frames(frames, S=S, r=r, t=EXPIRIES)
+
+
+@pytest.fixture(scope='module')
+def chains():
+    return {symbol: heston_chain(100., params) for symbol, params in TRUE.items()}
+
+
+def test_svi_round_trip():
+    true = torch.tensor([[0.01, 0.1, -0.5, 0.05, 0.1], [0.04, 0.3, 0.2, -0.1, 0.3], [0.02, 0.05, -0.9, 0.2, 0.05]], dtype=torch.float64)
+    k = torch.linspace(-0.5, 0.3, 25, dtype=torch.float64).expand(3, -1).clone()
+    k[2, 15:] = float('nan')
+    t = torch.tensor([[0.1], [0.5], [2.]], dtype=torch.float64)
+    iv = svi_implied_volatility(k, t, true)
+    result = fit_svi(k, t, iv)
+    assert result.converged.all()
+    assert torch.allclose(svi_implied_volatility(k, t, result.x)[:, :15], iv[:, :15], atol=1e-6)
+    assert torch.allclose(result.x[:2], true[:2], atol=1e-4)
+
+
+def test_heston_round_trip():
+    true = torch.tensor(list(TRUE.values()), dtype=torch.float64)
+    S = torch.tensor([100., 50.], dtype=torch.float64).reshape(-1, 1, 1)
+    K = S * torch.linspace(0.8, 1.2, 9, dtype=torch.float64)
+    t = torch.tensor([0.25, 0.5, 1.], dtype=torch.float64).reshape(1, -1, 1)
+    v0, kappa, theta, xi, rho = (x.reshape(-1, 1, 1) for x in true.unbind(-1))
+    is_call = K.expand(2, 3, 9) >= S
+    price = torch.where(is_call, *(heston_torch.price(S, K, 0.03, t, v0, kappa, theta, xi, rho, kind, q=0.01) for kind in ('call', 'put')))
+    # The second symbol lists fewer strikes.
+    price[1, :, 7:] = float('nan')
+    result = fit_heston(S, K, t, price, is_call, 0.03, q=0.01)
+    assert result.converged.all()
+    assert torch.allclose(result.x, true, rtol=1e-3, atol=1e-4)
+
+
+def test_calibrate_heston(chains):
+    fit = calibrate(chains)
+    assert list(fit.index) == list(TRUE)
+    assert list(fit.columns) == list(HESTON_PARAMETERS) + ['rmse', 'quotes', 'iterations', 'converged']
+    assert fit['converged'].all()
+    # Mid prices are exact, so the fit recovers the model.
+    assert np.allclose(fit[list(HESTON_PARAMETERS)].to_numpy(), np.array(list(TRUE.values())), rtol=1e-2, atol=1e-3)
+    assert (fit['rmse'] < 1e-4).all()
+
+
+def test_calibrate_solves_implied_volatility_once(chains, monkeypatch):
+    calls = []
+    solve = calibration._implied_volatility
+    monkeypatch.setattr(calibration, '_implied_volatility', lambda *args: calls.append(args) or solve(*args))
+    calibrate(chains, max_iter=1)
+    # The vega weights of `fit_heston` reuse the volatilities `calibrate` solved for its initial guess.
+    assert len(calls) == 1
+
+
+def test_calibrate_warm_start(chains):
+    cold = calibrate(chains)
+    # The next day, from the previous fit, and a symbol that was not there yesterday.
+    warm = calibrate({**chains, 'CCC': heston_chain(20., TRUE['AAA'], strikes=np.arange(15., 26., 1.))}, previous=cold)
+    assert (warm.loc[list(TRUE), 'iterations'] < cold['iterations']).all()
+    assert np.allclose(warm.loc['CCC', list(HESTON_PARAMETERS)].to_numpy(dtype=np.float64), TRUE['AAA'], rtol=1e-2, atol=1e-3)
+    # Any mapping of parameters works too.
+    previous = {symbol: row for symbol, row in cold[list(HESTON_PARAMETERS)].iterrows()}
+    assert (calibrate(chains, previous=previous)['iterations'] < cold['iterations']).all()
+
+
+def test_calibrate_svi(chains):
+    fit = calibrate(chains, model='svi')
+    assert list(fit.index) == [(symbol, label) for symbol in TRUE for label in EXPIRIES]
+    assert list(fit.columns) == list(SVI_PARAMETERS) + ['rmse', 'quotes', 'iterations', 'converged']
+    # SVI is not Heston, but close enough within 30% of the money.
+    assert (fit['rmse'] < 2e-3).all()
+    assert (calibrate(chains, model='svi', previous=fit)['iterations'] <= fit['iterations']).all()
+
+
+def test_calibrate_time_budget(chains):
+    fit = calibrate(chains, time_budget=0.)
+    assert (fit['iterations'] == 0).all()
+    assert not fit['converged'].any()
+
+
+def test_chain_quotes(chains):
+    K, t, price, is_call = chain_quotes(chains['AAA'], lower=0.8, upper=1.2, min_t=0.2)
+    assert (is_call == (K >= 100.)).all()
+    assert set(t) == {0.35, 0.6, 1.1}
+    assert ((K >= 80) & (K <= 120)).all()
+
+
+def test_invalid_arguments(chains):
+    with pytest.raises(ValueError):
+        calibrate(chains, model='sabr')
+    with pytest.raises(ValueError):
+        fit_heston(100., torch.tensor([[[100.]]]), torch.tensor([[[1.]]]), torch.tensor([[[10.]]]), True, 0.05, weights='gamma')
+    assert calibrate({}).empty
+
+
+def speed_comparison():
+
+    import timeit
+
+    generator = np.random.default_rng(0)
+    universe = {f'S{i:03d}': heston_chain(100., (generator.uniform(0.02, 0.1), generator.uniform(0.5, 3.), generator.uniform(0.02, 0.1), generator.uniform(0.2, 1.), generator.uniform(-0.9, -0.2))) for i in range(20)}
+    calibrate(dict(list(universe.items())[:1]))
+    for model in MODELS:
+        time_taken = min(timeit.Timer(lambda: calibrate(universe, model=model)).repeat(repeat=1, number=1))
+        print(f'{model.capitalize():<6s}, {len(universe)} symbols, cold start: {time_taken*1000:10.2f} ms.')
+        fit = calibrate(universe, model=model)
+        time_taken = min(timeit.Timer(lambda: calibrate(universe, model=model, previous=fit)).repeat(repeat=1, number=1))
+        print(f'{model.capitalize():<6s}, {len(universe)} symbols, warm start: {time_taken*1000:10.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dfin.options import bs_numpy
+from dfin.options.chain import *
+
+
+def legs(strikes, t, kind, sigma=0.2):
+    strikes = np.asarray(strikes, dtype=np.float64)
+    pricer = bs_numpy.call_price if kind == 'call' else bs_numpy.put_price
+    price = pricer(100., strikes, 0.05, t, sigma)
+    return pd.DataFrame({
+        'contractSymbol': [f'X{kind[0].upper()}{k:g}' for k in strikes],
+        'lastTradeDate': pd.Timestamp('2024-01-02 15:00', tz='UTC'),
+        'strike': strikes,
+        'lastPrice': price,
+        'bid': price - 0.01,
+        'ask': price + 0.01,
+        'volume': 10.,
+        'openInterest': 100,
+        'impliedVolatility': sigma,
+        'inTheMoney': strikes < 100 if kind == 'call' else strikes > 100,
+    })
+
+
+@pytest.fixture
+def chain():
+    frames = {
+        '2024-12-20': (legs([110, 90, 100], 1., 'call'), legs([95, 100], 1., 'put')),
+        '2024-03-15': (legs([100, 105], 0.25, 'call'), None),
+    }
+    return OptionChain.from_frames(frames, S=100., r=0.05, t={'2024-12-20': 1., '2024-03-15': 0.25})
+
+
+def test_from_frames(chain):
+    assert chain.labels == ['2024-03-15', '2024-12-20']
+    np.testing.assert_array_equal(chain.expiries, [0.25, 1.])
+    np.testing.assert_array_equal(chain.offsets, [0, 2, 6])
+    np.testing.assert_array_equal(chain.strike, [100, 105, 90, 95, 100, 110])
+    np.testing.assert_array_equal(chain.t, [0.25, 0.25, 1., 1., 1., 1.])
+    np.testing.assert_array_equal(chain.call.listed, [True, True, True, False, True, True])
+    np.testing.assert_array_equal(chain.put.listed, [False, False, False, True, True, False])
+    assert chain.call.contract[2] == 'XC90' and chain.call.contract[3] is None
+    assert np.isnan(chain.put.last[0])
+    assert chain.call.last_trade.dtype == np.dtype('datetime64[ns]')
+    assert chain.strike.flags.c_contiguous
+    with pytest.raises(AttributeError):
+        chain.spot = 100.
+
+
+def test_times_from_labels():
+    # Naive labels are dates in New York, where 16:00 is 21:00 UTC in winter and 20:00 UTC in summer.
+    chain = OptionChain.from_frames({'2024-12-20': (legs([100], 1., 'call'), None)}, now=pd.Timestamp('2024-12-19 21:00'))
+    assert chain.expiries[0] == pytest.approx(1 / 365)
+    chain = OptionChain.from_frames({'2024-06-21': (legs([100], 1., 'call'), None)}, now=pd.Timestamp('2024-06-20 20:00'))
+    assert chain.expiries[0] == pytest.approx(1 / 365)
+
+
+def test_times_from_tz_aware_labels():
+    # 16:00 in New York is 21:00 UTC in winter.
+    label = pd.Timestamp('2024-12-20', tz='America/New_York')
+    chain = OptionChain.from_frames({label: (legs([100], 1., 'call'), None)}, now=pd.Timestamp('2024-12-19 21:00'))
+    assert chain.labels == [label]
+    assert chain.expiries[0] == pytest.approx(1 / 365)
+    chain = OptionChain.from_frames({label: (legs([100], 1., 'call'), None)}, now=pd.Timestamp('2024-12-19 16:00', tz='America/New_York'))
+    assert chain.expiries[0] == pytest.approx(1 / 365)
+    # Naive labels and aware times mix too.
+    chain = OptionChain.from_frames({'2024-12-20': (legs([100], 1., 'call'), None)}, now=pd.Timestamp('2024-12-19 21:00', tz='UTC'))
+    assert chain.expiries[0] == pytest.approx(1 / 365)
+
+
+def test_duplicate_strikes():
+    call = legs([90, 100, 100, 110], 1., 'call')
+    call.loc[1, 'contractSymbol'] = 'XC100-old'
+    call.loc[1, 'lastTradeDate'] = pd.Timestamp('2024-01-03 15:00', tz='UTC')
+    call.loc[2, 'lastTradeDate'] = pd.Timestamp('2023-06-01 15:00', tz='UTC')
+    put = legs([100, 100], 1., 'put')
+    with pytest.warns(RuntimeWarning):
+        chain = OptionChain.from_frames({'2024-12-20': (call, put)}, S=100., t={'2024-12-20': 1.})
+    np.testing.assert_array_equal(chain.strike, [90, 100, 110])
+    # The most recently traded contract wins, wherever it is listed.
+    assert chain.call.contract[1] == 'XC100-old'
+    assert chain.call.last_trade[1] == np.datetime64('2024-01-03T15:00')
+    assert chain.put.listed.tolist() == [False, True, False]
+
+
+def test_find_and_slices(chain):
+    np.testing.assert_array_equal(chain.find([90, 97.5, 110, 120], '2024-12-20'), [2, -1, 5, -1])
+    np.testing.assert_array_equal(chain.find(105), [1])
+    with pytest.raises(KeyError):
+        chain.find(100, '2025-01-17')
+
+    december = chain.expiry('2024-12-20')
+    assert december.labels == ['2024-12-20']
+    np.testing.assert_array_equal(december.strike, [90, 95, 100, 110])
+    assert np.shares_memory(december.strike, chain.strike)
+    assert np.shares_memory(december.call.bid, chain.call.bid)
+
+    near = chain.between(0.95, 1.)
+    np.testing.assert_array_equal(near.strike, [100, 95, 100])
+    np.testing.assert_array_equal(near.offsets, [0, 1, 3])
+    np.testing.assert_array_equal(december.between(92, 105, moneyness=False).strike, [95, 100])
+
+
+def test_pricing(chain):
+    C, P = chain.price()
+    np.testing.assert_allclose(C[chain.call.listed], chain.call.last[chain.call.listed], rtol=1e-12)
+    np.testing.assert_allclose(P[chain.put.listed], chain.put.last[chain.put.listed], rtol=1e-12)
+    for kind in ('call', 'put'):
+        leg = getattr(chain, kind)
+        sigma = chain.implied_volatility(kind, price=leg.last)
+        np.testing.assert_allclose(sigma[leg.listed], 0.2, rtol=1e-8)
+        assert np.isnan(sigma[~leg.listed]).all()
+    np.testing.assert_allclose(chain.call.mid, chain.call.last)
+
+
+def test_to_frame(chain):
+    frame = chain.to_frame()
+    assert len(frame) == len(chain)
+    assert {'expiration', 'strike', 'impliedVolatilityCall', 'inTheMoneyPut', 'contractSymbolPut'} <= set(frame.columns)
+    assert pd.isna(frame['inTheMoneyPut'][0])
+    frame = chain.expiry(1).to_frame(['impliedVolatility'])
+    assert list(frame.columns) == ['expiration', 'strike', 'impliedVolatilityCall', 'impliedVolatilityPut']
+
+
+def speed_comparison():
+
+    import timeit
+
+    size = 2000
+    strikes = np.arange(size) * 0.5 + 50
+    frames = {f'2024-{month:02d}-20': (legs(strikes, month / 12, 'call'), legs(strikes[::2], month / 12, 'put')) for month in range(1, 13)}
+
+    def with_merge():
+        for calls, puts in frames.values():
+            calls, puts = calls.add_suffix('Call'), puts.add_suffix('Put')
+            merged = pd.merge(calls, puts, left_on='strikeCall', right_on='strikePut', how='outer')
+            merged['strikeCall'] = merged['strikeCall'].fillna(merged['strikePut'])
+            merged.drop(['strikePut'], axis=1).rename(columns={'strikeCall': 'strike'}).sort_values(by=['strike']).reset_index(drop=True)
+
+    time_taken = min(timeit.Timer(with_merge).repeat(repeat=5, number=1))
+    print(f'Outer merge of {len(frames)} expirations takes {time_taken*1000:.2f} ms.')
+    time_taken = min(timeit.Timer(lambda: OptionChain.from_frames(frames, S=100.)).repeat(repeat=5, number=1))
+    print(f'OptionChain.from_frames takes {time_taken*1000:.2f} ms.')
+
+    chain = OptionChain.from_frames(frames, S=100.)
+    queries = np.random.default_rng(0).choice(strikes, 1000)
+    time_taken = min(timeit.Timer(lambda: chain.find(queries, 6)).repeat(repeat=5, number=1))
+    print(f'OptionChain.find of 1000 strikes takes {time_taken*1e6:.2f} us.')
+    merged = frames['2024-06-20'][0]
+    time_taken = min(timeit.Timer(lambda: [merged.index[merged['strike'] == k] for k in queries[:100]]).repeat(repeat=5, number=1))
+    print(f'Boolean DataFrame lookups of 100 strikes take {time_taken*1e6:.2f} us.')
+    time_taken = min(timeit.Timer(lambda: chain.between(0.9, 1.1)).repeat(repeat=5, number=1))
+    print(f'OptionChain.between takes {time_taken*1e6:.2f} us.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
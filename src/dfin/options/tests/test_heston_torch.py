@@ -0,0 +1,121 @@
+import math
+
+import numpy as np
+import pytest
+import torch
+from scipy.integrate import quad
+
+from dfin.options import bs_torch
+from dfin.options.heston_torch import *
+
+
+PARAMS = dict(v0=0.04, kappa=1.5, theta=0.06, xi=0.6, rho=-0.7)
+
+
+def reference_call(S, K, r, t, v0, kappa, theta, xi, rho):
+    """Adaptive quadrature of the inversion integrals, one strike at a time."""
+    inputs = [torch.tensor(x, dtype=torch.float64) for x in (S, r, t, v0, kappa, theta, xi, rho)]
+    phi = lambda u: characteristic_function(torch.tensor(u, dtype=torch.complex128), *inputs).item()
+    k, forward = math.log(K), S * math.exp(r * t)
+    P1 = 0.5 + quad(lambda u: (np.exp(-1j * u * k) * phi(u - 1j) / (1j * u * forward)).real, 1e-10, 500, limit=500)[0] / math.pi
+    P2 = 0.5 + quad(lambda u: (np.exp(-1j * u * k) * phi(u) / (1j * u)).real, 1e-10, 500, limit=500)[0] / math.pi
+    return S * P1 - K * math.exp(-r * t) * P2
+
+
+@pytest.mark.parametrize('t', [0.1, 1., 3.])
+def test_matches_adaptive_quadrature(t):
+    K = torch.linspace(70, 130, 5, dtype=torch.float64)
+    expected = torch.tensor([reference_call(100., k, 0.03, t, **PARAMS) for k in K.tolist()], dtype=torch.float64)
+    assert torch.allclose(call_price(100., K, 0.03, t, **PARAMS), expected, atol=1e-7)
+    assert torch.allclose(call_price(100., K, 0.03, t, **PARAMS, method='fft'), expected, atol=1e-4)
+
+
+@pytest.mark.parametrize('method', ['quadrature', 'fft'])
+def test_black_scholes_limit(method):
+    # Without volatility of variance, the variance stays at v0 = theta.
+    S, r, t, sigma = (torch.tensor(x, dtype=torch.float64) for x in (100., 0.05, 1., 0.2))
+    K = torch.linspace(70, 130, 7, dtype=torch.float64)
+    heston = price(S, K, r, t, 0.04, 1., 0.04, 1e-4, 0., 'put', method=method)
+    assert torch.allclose(heston, bs_torch.put_price(S, K, r, t, sigma), atol=1e-4)
+
+
+def test_put_call_parity_and_dividends():
+    K = torch.linspace(70, 130, 7, dtype=torch.float64)
+    call = call_price(100., K, 0.05, 1., **PARAMS, q=0.02)
+    put = put_price(100., K, 0.05, 1., **PARAMS, q=0.02)
+    assert torch.allclose(call - put, 100. * math.exp(-0.02) - K * math.exp(-0.05))
+    assert (call < call_price(100., K, 0.05, 1., **PARAMS)).all()
+
+
+def test_smile():
+    # Negative correlation skews the smile: low strikes are dearer than under Black-Scholes at the at-the-money volatility.
+    from dfin.options.iv_torch import call_implied_volatility_analytic
+    S, r, t = (torch.tensor(x, dtype=torch.float64) for x in (100., 0.05, 1.))
+    K = torch.linspace(70, 130, 7, dtype=torch.float64)
+    sigma = call_implied_volatility_analytic(S, K, r, t, call_price(S, K, r, t, **PARAMS), 0.2, atol=1e-10).x
+    assert (torch.diff(sigma) < 0).all()
+
+
+def test_fft_batch_of_expiries():
+    t = torch.tensor([0.25, 0.5, 1., 2.], dtype=torch.float64)
+    K = torch.linspace(80, 120, 9, dtype=torch.float64).reshape(-1, 1)
+    grid = fft_grid(100., 0.05, t, **PARAMS)
+    assert grid.log_strike.shape == grid.call.shape == (4, 4096)
+    fft = call_price(100., K, 0.05, t, **PARAMS, method='fft')
+    assert fft.shape == (9, 4)
+    assert torch.allclose(fft, call_price(100., K, 0.05, t, **PARAMS), atol=1e-4)
+    assert torch.isnan(call_price(100., 1e-9, 0.05, 1., **PARAMS, method='fft'))
+
+
+@pytest.mark.parametrize('method', ['quadrature', 'fft'])
+def test_autograd_sensitivities(method):
+    params = {name: torch.tensor(value, dtype=torch.float64, requires_grad=True) for name, value in PARAMS.items()}
+    K = torch.tensor([90., 100., 110.], dtype=torch.float64)
+    total = call_price(100., K, 0.05, 1., **params, method=method).sum()
+    grads = torch.autograd.grad(total, list(params.values()))
+    for (name, value), grad in zip(PARAMS.items(), grads):
+        bumped = {key: (x + 1e-6 if key == name else x) for key, x in PARAMS.items()}
+        lowered = {key: (x - 1e-6 if key == name else x) for key, x in PARAMS.items()}
+        expected = (call_price(100., K, 0.05, 1., **bumped, method=method).sum() - call_price(100., K, 0.05, 1., **lowered, method=method).sum()) / 2e-6
+        assert grad.item() == pytest.approx(expected.item(), rel=1e-4, abs=1e-6), name
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        price(100., 100., 0.05, 1., **PARAMS, kind='straddle')
+    with pytest.raises(ValueError):
+        price(100., 100., 0.05, 1., **PARAMS, method='monte-carlo')
+    # NumPy's weights are NaN past MAX_NODES.
+    for nodes in (0, MAX_NODES + 1, 256):
+        with pytest.raises(ValueError):
+            call_price(100., 100., 0.05, 1., **PARAMS, nodes=nodes)
+    assert torch.isfinite(call_price(100., 100., 0.05, 1., **PARAMS, nodes=MAX_NODES))
+
+
+def test_wrappers_forward_settings():
+    K = torch.linspace(80, 120, 5, dtype=torch.float64)
+    for kind, pricer in (('call', call_price), ('put', put_price)):
+        coarse = pricer(100., K, 0.05, 1., **PARAMS, nodes=16)
+        assert torch.equal(coarse, price(100., K, 0.05, 1., **PARAMS, kind=kind, nodes=16))
+        assert not torch.allclose(coarse, pricer(100., K, 0.05, 1., **PARAMS), rtol=0, atol=1e-8)
+        fft = pricer(100., K, 0.05, 1., **PARAMS, method='fft', size=1024)
+        assert torch.equal(fft, price(100., K, 0.05, 1., **PARAMS, kind=kind, method='fft', size=1024))
+
+
+def speed_comparison():
+
+    import timeit
+
+    K = torch.linspace(50, 150, 1001, dtype=torch.float64)
+    t = torch.tensor([0.1, 0.25, 0.5, 1., 2.], dtype=torch.float64)
+    time_taken = min(timeit.Timer(lambda: [reference_call(100., k, 0.05, 1., **PARAMS) for k in K[::100].tolist()]).repeat(repeat=3, number=1)) * len(K) * len(t) / len(K[::100])
+    print(f'Adaptive quadrature, {len(K)} strikes x {len(t)} expiries: {time_taken*1000:10.2f} ms (extrapolated).')
+    for method in ['quadrature', 'fft']:
+        time_taken = min(timeit.Timer(lambda: call_price(100., K.reshape(-1, 1), 0.05, t, **PARAMS, method=method)).repeat(repeat=5, number=1))
+        print(f'{method.capitalize():<10s}, {len(K)} strikes x {len(t)} expiries: {time_taken*1000:10.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
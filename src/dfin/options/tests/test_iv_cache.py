@@ -0,0 +1,115 @@
+import pytest
+import math
+import numpy as np
+import torch
+
+from dfin.optimize import newton
+from dfin.options import bs_numpy, iv_rational, iv_scipy, iv_torch
+from dfin.options.iv_cache import *
+
+
+@pytest.fixture
+def call_option_data():
+    S = 100
+    K = 110
+    r = 0.05
+    t = 1
+    price = 6.040088129724
+    return S, K, r, t, price
+
+
+def test_hit_and_miss(call_option_data):
+    cache = IVCache()
+    solver = cache.wrap(iv_scipy.call_implied_volatility, 'call')
+    sigma = solver(*call_option_data)
+    assert math.isclose(sigma, 0.2, rel_tol=1e-12)
+    assert cache.stats() == {'hits': 0, 'disk_hits': 0, 'misses': 1, 'size': 1}
+    # Noise below the quantization maps to the same key.
+    S, K, r, t, price = call_option_data
+    assert solver(S, K, r, t, price + 1e-13) == sigma
+    assert cache.stats()['hits'] == 1
+
+
+def test_call_and_put_kept_apart(call_option_data):
+    cache = IVCache()
+    call = cache.wrap(iv_rational.call_implied_volatility, 'call')
+    put = cache.wrap(iv_rational.put_implied_volatility, 'put')
+    assert not math.isclose(call(*call_option_data), put(*call_option_data))
+    assert cache.stats()['misses'] == 2
+
+
+def test_lru_eviction():
+    cache = IVCache(maxsize=2)
+    keys = [cache.key('call', 100, K, 0.05, 1, 5) for K in (100, 110, 120)]
+    cache.put(keys[0], 0.1)
+    cache.put(keys[1], 0.2)
+    assert cache.get(keys[0]) == 0.1  # Refreshes the first entry.
+    cache.put(keys[2], 0.3)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0.1
+    assert cache.get(keys[2]) == 0.3
+    assert cache.stats()['size'] == 2
+
+
+def test_persistent_tier(tmp_path, call_option_data):
+    path = str(tmp_path / 'iv.sqlite')
+    with IVCache(path=path) as cache:
+        sigma = cache.wrap(iv_rational.call_implied_volatility, 'call')(*call_option_data)
+        cache.put(cache.key('call', 100, 300, 0.05, 1, 200), math.nan)
+    with IVCache(path=path) as cache:
+        assert cache.get(cache.key('call', *call_option_data)) == sigma
+        assert math.isnan(cache.get(cache.key('call', 100, 300, 0.05, 1, 200)))
+        assert cache.stats()['disk_hits'] == 2
+        cache.clear()
+        assert cache.get(cache.key('call', *call_option_data)) is None
+
+
+def test_torch_solver(call_option_data):
+    cache = IVCache()
+    sigma0 = torch.tensor(0.5, dtype=torch.float64)
+    solver = cache.wrap(iv_torch.call_implied_volatility, 'call', sigma0, newton)
+    S, K, r, t, price = (torch.tensor([float(x)], dtype=torch.float64) for x in call_option_data)
+    first = solver(S, K, r, t, price)
+    second = solver(S, K, r, t, price)
+    assert torch.is_tensor(first) and first.shape == price.shape
+    assert torch.equal(first, second)
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('max_iter, converged', [(100, True), (1, False)])
+def test_same_type_on_hit_and_miss(call_option_data, max_iter, converged):
+    cache = IVCache()
+    solver = cache.wrap(iv_torch.call_implied_volatility_analytic, 'call', 0.5, max_iter=max_iter)
+    S, K, r, t, price = (torch.tensor([float(x)], dtype=torch.float64) for x in call_option_data)
+    miss = solver(S, K, r, t, price)
+    hit = solver(S, K, r, t, price)
+    assert cache.stats()['hits'] == 1
+    assert type(miss) is type(hit) is torch.Tensor
+    assert miss.dtype == hit.dtype and miss.shape == hit.shape == price.shape
+    # A solve that did not converge is cached as NaN rather than as its last iterate.
+    assert torch.isfinite(miss).item() == converged
+    assert torch.allclose(miss, hit, equal_nan=True)
+
+
+def test_settings_are_fixed(call_option_data):
+    solver = IVCache().wrap(iv_rational.call_implied_volatility, 'call')
+    with pytest.raises(TypeError):
+        solver(*call_option_data, 0.5)
+
+
+def test_solve_many():
+    cache = IVCache()
+    K = np.linspace(80, 120, 9)
+    sigma = np.linspace(0.1, 0.5, 9)
+    price = bs_numpy.call_price(100, K, 0.05, 1, sigma)
+    calls = []
+
+    def solver(*args):
+        calls.append(len(args[0]))
+        return bs_numpy.call_implied_volatility(*args)
+
+    assert np.allclose(cache.solve_many('call', 100, K[:5], 0.05, 1, price[:5], solver), sigma[:5])
+    assert np.allclose(cache.solve_many('call', 100, K, 0.05, 1, price, solver), sigma)
+    # The second call only solves the four new contracts.
+    assert calls == [5, 4]
+    assert cache.stats()['hits'] == 5
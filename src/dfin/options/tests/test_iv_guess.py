@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from dfin.options import bs_numpy, iv_scipy, iv_torch
+from dfin.options.bridge import implied_volatility_frame
+from dfin.options.iv_guess import *
+
+
+def smile(size=200, seed=0):
+    rng = np.random.default_rng(seed)
+    K = np.sort(rng.uniform(70, 130, size))
+    t = np.where(np.arange(size) % 2 == 0, 0.25, 1.)
+    sigma = 0.2 + (np.log(K / 100))**2 + rng.normal(0, 0.002, size)
+    return K, t, sigma, bs_numpy.call_price(100., K, 0.05, t, sigma), bs_numpy.put_price(100., K, 0.05, t, sigma)
+
+
+def test_closed_form_guesses():
+    K, t, sigma, call, put = smile()
+    atm = np.abs(K - 100) < 5
+    for guess, rtol in ((brenner_subrahmanyam, 0.2), (corrado_miller, 0.05)):
+        np.testing.assert_allclose(guess(100., K[atm], 0.05, t[atm], call[atm]), sigma[atm], rtol=rtol)
+    # Put-call parity.
+    np.testing.assert_allclose(corrado_miller(100., K, 0.05, t, put, 'put'), corrado_miller(100., K, 0.05, t, call), rtol=1e-6)
+    with pytest.raises(ValueError):
+        corrado_miller(100., K, 0.05, t, call, 'straddle')
+
+
+def test_previous_and_strikes():
+    K, t, sigma, call, put = smile()
+    last = sigma.copy()
+    last[::10] = np.nan
+    guess = previous(last, fallback=None)(100., K, 0.05, t, call)
+    assert np.isnan(guess[::10]).all()
+    guess = resolve(previous(last), 100., K, 0.05, t, call)
+    assert np.isfinite(guess).all()
+    np.testing.assert_array_equal(guess[1::10], sigma[1::10])
+
+    provider = strikes(K[::3], t[::3], sigma[::3], fallback=None)
+    guess = provider(100., K, 0.05, t, call)
+    np.testing.assert_allclose(guess, sigma, atol=0.02)
+    assert np.isnan(provider(100., 100., 0.05, 0.5, 10.))
+    assert resolve(provider, 100., 100., 0.05, 0.5, 10.) == DEFAULT
+    np.testing.assert_array_equal(resolve(constant(0.3), 100., K, 0.05, t, call), 0.3)
+    assert resolve(0.4, 100., K, 0.05, t, call) == 0.4
+
+
+def test_solvers_accept_providers():
+    K, t, sigma, call, put = smile()
+    atol = 1e-10
+
+    np.testing.assert_allclose(bs_numpy.put_implied_volatility(100., K, 0.05, t, put, sigma0=corrado_miller), sigma, rtol=1e-6)
+    assert iv_scipy.call_implied_volatility(100., K[50], 0.05, t[50], call[50], sigma0=corrado_miller) == pytest.approx(sigma[50], rel=1e-10)
+
+    inputs = [torch.tensor(x) for x in (K, t, call)]
+    baseline = iv_torch.call_implied_volatility_analytic(torch.tensor(100.), inputs[0], torch.tensor(0.05), inputs[1], inputs[2], torch.tensor(0.5), atol=atol)
+    warm = iv_torch.call_implied_volatility_analytic(torch.tensor(100.), inputs[0], torch.tensor(0.05), inputs[1], inputs[2], strikes(K[::3], t[::3], sigma[::3]), atol=atol)
+    assert warm.converged.all()
+    np.testing.assert_allclose(warm.x.numpy(), sigma, rtol=1e-6)
+    assert warm.iterations.float().mean() < baseline.iterations.float().mean()
+
+    chain = pd.DataFrame({'strike': K, 't': t, 'price': call, 'previous': sigma + 0.01})
+    implied_volatility_frame(chain, S=100., r=0.05, t='t', price='price', sigma0='previous', column='solved', atol=atol)
+    np.testing.assert_allclose(chain['solved'], sigma, rtol=1e-6)
+
+
+def speed_comparison():
+
+    size = 100000
+    K, t, sigma, call, put = smile(size)
+    S, r = torch.tensor(100.), torch.tensor(0.05)
+    K_, t_, price = (torch.tensor(x) for x in (K, t, call))
+    # The previous snapshot, before the market moved by a few vol points.
+    last = sigma + np.random.default_rng(1).normal(0, 0.01, size)
+    providers = {
+        'constant 0.5': constant(0.5),
+        'brenner_subrahmanyam': brenner_subrahmanyam,
+        'corrado_miller': corrado_miller,
+        'strikes (every 10th solved)': strikes(K[::10], t[::10], sigma[::10]),
+        'previous snapshot': previous(last),
+    }
+    for method in ('newton', 'halley'):
+        for name, provider in providers.items():
+            result = iv_torch.call_implied_volatility_analytic(S, K_, r, t_, price, provider, method=method, atol=1e-10)
+            iterations = result.iterations.float()
+            print(f'{method:6s} {name:28s}: {iterations.mean():.2f} iterations on average, {int(iterations.max())} at most, {int((~result.converged).sum())} not converged.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -0,0 +1,139 @@
+import pytest
+import math
+import random
+
+from scipy.special import ndtr
+
+from dfin.options.bs_vanilla import call_price, put_price
+from dfin.options.iv_rational import *
+
+
+@pytest.fixture
+def call_option_data():
+    S = 100
+    K = 110
+    r = 0.05
+    t = 1
+    price = 6.040088129724
+    return S, K, r, t, price
+
+
+@pytest.fixture
+def put_option_data():
+    S = 100
+    K = 110
+    r = 0.05
+    t = 1
+    price = 10.675324824803
+    return S, K, r, t, price
+
+
+def test_call_implied_volatility(call_option_data):
+    sigma = call_implied_volatility(*call_option_data)
+    assert math.isclose(sigma, 0.2, rel_tol=1e-12)
+
+
+def test_put_implied_volatility(put_option_data):
+    sigma = put_implied_volatility(*put_option_data)
+    assert math.isclose(sigma, 0.2, rel_tol=1e-12)
+
+
+def test_initial_guess(call_option_data):
+    sigma = initial_guess(*call_option_data)
+    assert math.isclose(sigma, 0.2, rel_tol=1e-2)
+
+
+def test_implied_volatility_randomized():
+    random.seed(0)
+    for i in range(1000):
+        S = 100
+        K = S * math.exp(random.uniform(-1, 1))  # Log-moneyness [-1, 1)
+        r = random.uniform(0, 0.1)                # Interest rate [0, 0.1)
+        t = random.choice([1/365, 7/365, 0.1, 0.5, 1, 3])
+        sigma = random.uniform(0.05, 1.5)         # Volatility [0.05, 1.5)
+
+        # Quote the out-of-the-money leg, as the market does.
+        if S > K * math.exp(-r*t):
+            price = put_price(S, K, r, t, sigma)
+            solver = put_implied_volatility
+        else:
+            price = call_price(S, K, r, t, sigma)
+            solver = call_implied_volatility
+        if price < 1e-6:
+            continue
+
+        # Three Householder steps is all it takes.
+        assert math.isclose(solver(S, K, r, t, price, max_iter=3), sigma, rel_tol=1e-8)
+
+
+def ndtr_price(S, K, r, t, sigma, call):
+    """Black-Scholes price with scipy's ndtr, accurate in the tails."""
+    d1 = (math.log(S / K) + (r + sigma**2 / 2) * t) / (sigma * math.sqrt(t))
+    d2 = d1 - sigma * math.sqrt(t)
+    if call:
+        return S * ndtr(d1) - K * math.exp(-r*t) * ndtr(d2)
+    return K * math.exp(-r*t) * ndtr(-d2) - S * ndtr(-d1)
+
+
+@pytest.mark.parametrize('K, r, t, sigma', [(228.46, 0.0662, 0.033, 0.5436), (240.08, 0.0662, 0.385, 0.168), (150, 0.05, 0.1, 0.2), (40, 0.01, 0.05, 0.3)])
+def test_wings(K, r, t, sigma):
+    call = K > 100
+    price = ndtr_price(100, K, r, t, sigma, call)
+    solver = call_implied_volatility if call else put_implied_volatility
+    assert math.isclose(solver(100, K, r, t, price), sigma, rel_tol=1e-8)
+    assert math.isclose(solver(100, K, r, t, price, max_iter=20), sigma, rel_tol=1e-8)
+
+
+def test_wings_randomized():
+    random.seed(1)
+    for i in range(1000):
+        K = 100 * math.exp(random.uniform(-1.5, 1.5))
+        r = random.uniform(0, 0.1)
+        t = random.choice([1/365, 7/365, 0.033, 0.1, 0.5])
+        sigma = random.uniform(0.05, 1.)
+        call = 100 < K * math.exp(-r*t)
+        price = ndtr_price(100, K, r, t, sigma, call)
+        # Far enough in the wing that erf-based CDFs lose every digit, but not below what ndtr itself resolves.
+        if not 1e-30 < price < 1e-4:
+            continue
+        solver = call_implied_volatility if call else put_implied_volatility
+        assert math.isclose(solver(100, K, r, t, price), sigma, rel_tol=1e-6), (K, r, t, sigma)
+
+
+def test_unconverged_is_nan(call_option_data):
+    # A single step from the analytic guess does not reprice the option to RESIDUAL_TOL.
+    S, K, r, t, _ = call_option_data
+    price = call_price(S, 300, r, t, 0.9)
+    assert math.isnan(call_implied_volatility(S, 300, r, t, price, max_iter=0))
+    assert math.isclose(call_implied_volatility(S, 300, r, t, price), 0.9, rel_tol=1e-10)
+
+
+def test_arbitrage_violation(call_option_data):
+    S, K, r, t, price = call_option_data
+    assert math.isnan(call_implied_volatility(S, K, r, t, S + 1))
+    assert math.isnan(call_implied_volatility(S, 50, r, t, 1))
+    assert math.isnan(put_implied_volatility(S, K, r, t, 0))
+
+
+def speed_comparison():
+
+    import timeit
+    from functools import partial
+
+    S = 100
+    K = 110
+    r = 0.05
+    t = 1
+    price = 6.040088129724
+
+    number = 5000
+
+    times = timeit.Timer(partial(call_implied_volatility, S, K, r, t, price)).repeat(repeat=10, number=number)
+    time_taken = min(times) / number
+    print(f'Householder takes {time_taken*1000:.4f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -2,7 +2,10 @@ import pytest
 import torch
 
 from dfin.optimize import gradient_descent, lbfgs, secant, newton, halley
+from dfin.optimize import batched_gradient_descent, batched_secant, batched_newton, batched_halley, bracketed_newton
+from dfin.options.bs_torch import call_price, put_price
 from dfin.options.iv_torch import call_implied_volatility, put_implied_volatility
+from dfin.options.iv_torch import call_implied_volatility_analytic, put_implied_volatility_analytic
 
 # torch.set_default_tensor_type('torch.DoubleTensor')
 # device = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -102,6 +105,122 @@ def test_put_implied_volatility(put_option_data):
     assert torch.isclose(sigma, torch.tensor([0.2]), rtol=1e-6, atol=atol)
 
 
+@pytest.fixture
+def chain_data():
+    size = 50
+    generator = torch.Generator().manual_seed(0)
+    S = torch.full((size,), 100., dtype=torch.float64)
+    K = torch.linspace(80., 120., size, dtype=torch.float64)
+    r = torch.full((size,), 0.05, dtype=torch.float64)
+    t = torch.rand(size, generator=generator, dtype=torch.float64) * 2 + 0.25  # Time to maturity [0.25, 2.25)
+    sigma = torch.rand(size, generator=generator, dtype=torch.float64) * 0.3 + 0.1  # Volatility [0.1, 0.4)
+    return S, K, r, t, sigma
+
+
+@pytest.mark.parametrize('optim', [batched_secant, batched_newton, batched_halley, bracketed_newton])
+def test_batched_call_implied_volatility(chain_data, optim):
+    S, K, r, t, sigma = chain_data
+    price = call_price(S, K, r, t, sigma)
+    result = call_implied_volatility(S, K, r, t, price, torch.tensor(0.5), optim=optim, atol=1e-8)
+    assert result.x.shape == sigma.shape
+    assert result.iterations.shape == sigma.shape
+    assert torch.all(result.converged)
+    assert torch.allclose(result.x, sigma, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('optim', [batched_secant, batched_newton, batched_halley, bracketed_newton])
+def test_batched_put_implied_volatility(chain_data, optim):
+    S, K, r, t, sigma = chain_data
+    price = put_price(S, K, r, t, sigma)
+    result = put_implied_volatility(S, K, r, t, price, torch.tensor(0.5), optim=optim, atol=1e-8)
+    assert torch.all(result.converged)
+    assert torch.allclose(result.x, sigma, rtol=1e-5, atol=1e-6)
+
+
+def test_batched_gradient_descent():
+    # Adam is too slow and too jumpy for deep in-the-money contracts, so keep to a few near-the-money ones.
+    S = torch.full((4,), 100., dtype=torch.float64)
+    K = torch.tensor([95., 100., 105., 110.], dtype=torch.float64)
+    r = torch.full((4,), 0.05, dtype=torch.float64)
+    t = torch.tensor([0.5, 1., 1.5, 2.], dtype=torch.float64)
+    sigma = torch.tensor([0.2, 0.25, 0.3, 0.35], dtype=torch.float64)
+    result = call_implied_volatility(S, K, r, t, call_price(S, K, r, t, sigma), torch.tensor(0.5), optim=batched_gradient_descent, atol=1e-8)
+    assert torch.all(result.converged)
+    assert torch.allclose(result.x, sigma, rtol=1e-5, atol=1e-6)
+    result = put_implied_volatility(S, K, r, t, put_price(S, K, r, t, sigma), torch.tensor(0.5), optim=batched_gradient_descent, atol=1e-8)
+    assert torch.all(result.converged)
+    assert torch.allclose(result.x, sigma, rtol=1e-5, atol=1e-6)
+
+
+def test_batched_elements_freeze(chain_data):
+    S, K, r, t, sigma = chain_data
+    price = call_price(S, K, r, t, sigma)
+    # Elements starting at their root converge immediately and must not be touched again.
+    sigma0 = sigma.clone()
+    sigma0[::2] = 0.5
+    result = call_implied_volatility(S, K, r, t, price, sigma0, optim=batched_newton, atol=1e-8)
+    assert torch.all(result.iterations[1::2] == 0)
+    assert torch.all(result.x[1::2] == sigma[1::2])
+    assert torch.all(result.iterations[::2] > 0)
+
+
+def test_batched_max_iter(chain_data):
+    S, K, r, t, sigma = chain_data
+    price = call_price(S, K, r, t, sigma)
+    result = call_implied_volatility(S, K, r, t, price, torch.tensor(0.5), optim=batched_newton, atol=1e-8, max_iter=1)
+    assert torch.all(result.iterations <= 1)
+    assert not torch.all(result.converged)
+
+
+@pytest.mark.parametrize('method', ['newton', 'halley'])
+def test_analytic_implied_volatility(chain_data, method):
+    S, K, r, t, sigma = chain_data
+    for price, solver in ((call_price(S, K, r, t, sigma), call_implied_volatility_analytic), (put_price(S, K, r, t, sigma), put_implied_volatility_analytic)):
+        result = solver(S, K, r, t, price, torch.tensor(0.5), method=method, atol=1e-10)
+        assert torch.all(result.converged)
+        assert torch.allclose(result.x, sigma, rtol=1e-6, atol=1e-8)
+        assert not result.x.requires_grad
+
+
+@pytest.mark.parametrize('method', ['newton', 'halley'])
+def test_analytic_matches_autograd(chain_data, method):
+    S, K, r, t, sigma = chain_data
+    price = call_price(S, K, r, t, sigma)
+    optim = batched_newton if method == 'newton' else batched_halley
+    autograd = call_implied_volatility(S, K, r, t, price, torch.tensor(0.5), optim=optim, atol=1e-10)
+    analytic = call_implied_volatility_analytic(S, K, r, t, price, torch.tensor(0.5), method=method, atol=1e-10)
+    assert torch.allclose(analytic.x, autograd.x, rtol=1e-8, atol=1e-10)
+    # Halley falls back to Newton far from the root, so only Newton follows the exact same path.
+    if method == 'newton':
+        assert torch.equal(analytic.iterations, autograd.iterations)
+
+
+@pytest.mark.parametrize('method', ['newton', 'halley'])
+def test_analytic_converged_on_last_iteration(chain_data, method):
+    S, K, r, t, sigma = chain_data
+    price = call_price(S, K, r, t, sigma)
+    full = call_implied_volatility_analytic(S, K, r, t, price, torch.tensor(0.5), method=method, atol=1e-10)
+    # Out of iterations right after the last update, which is checked at the point it returns.
+    capped = call_implied_volatility_analytic(S, K, r, t, price, torch.tensor(0.5), method=method, atol=1e-10, max_iter=int(full.iterations.max()))
+    assert torch.all(capped.converged)
+    assert torch.equal(capped.x, full.x)
+
+
+def test_analytic_ignores_grad_inputs(chain_data):
+    S, K, r, t, sigma = chain_data
+    price = call_price(S, K, r, t, sigma)
+    sigma0 = torch.tensor(0.5, dtype=torch.float64, requires_grad=True)
+    result = call_implied_volatility_analytic(S.requires_grad_(True), K, r, t, price.detach(), sigma0, atol=1e-10)
+    assert torch.all(result.converged)
+    assert result.x.grad_fn is None
+
+
+def test_analytic_invalid_method(chain_data):
+    S, K, r, t, sigma = chain_data
+    with pytest.raises(ValueError):
+        call_implied_volatility_analytic(S, K, r, t, call_price(S, K, r, t, sigma), torch.tensor(0.5), method='secant')
+
+
 def speed_comparison():
 
     import timeit
@@ -137,6 +256,14 @@ def speed_comparison():
     time_taken = min(times) / number
     print(f'Halley takes {time_taken*1000:.4f} ms.')
 
+    times = timeit.Timer(partial(call_implied_volatility_analytic, S, K, r, t, price, sigma0, 'newton')).repeat(repeat=10, number=number)
+    time_taken = min(times) / number
+    print(f'Analytic Newton takes {time_taken*1000:.4f} ms.')
+
+    times = timeit.Timer(partial(call_implied_volatility_analytic, S, K, r, t, price, sigma0, 'halley')).repeat(repeat=10, number=number)
+    time_taken = min(times) / number
+    print(f'Analytic Halley takes {time_taken*1000:.4f} ms.')
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+import math
+
+import pytest
+import torch
+
+from dfin.options import bs_torch
+from dfin.options.mc_torch import *
+
+
+def inputs():
+    S = torch.tensor(100., dtype=torch.float64)
+    K = torch.tensor([90., 100., 110.], dtype=torch.float64)
+    r = torch.tensor(0.05, dtype=torch.float64)
+    t = torch.tensor(1., dtype=torch.float64)
+    sigma = torch.tensor(0.2, dtype=torch.float64)
+    return S, K, r, t, sigma
+
+
+def geometric_asian_call(S, K, r, t, sigma, steps):
+    """Closed form of the discretely sampled geometric Asian call."""
+    mu = math.log(S) + (r - sigma**2 / 2) * t * (steps + 1) / (2 * steps)
+    variance = sigma**2 * t * (steps + 1) * (2 * steps + 1) / (6 * steps**2)
+    d2 = (mu - torch.log(K)) / math.sqrt(variance)
+    d1 = d2 + math.sqrt(variance)
+    return math.exp(-r * t) * (math.exp(mu + variance / 2) * bs_torch.normal_cdf(d1) - K * bs_torch.normal_cdf(d2))
+
+
+@pytest.mark.parametrize('kind', ['call', 'put'])
+@pytest.mark.parametrize('antithetic,sobol', [(False, False), (True, False), (False, True)])
+def test_european_matches_black_scholes(kind, antithetic, sobol):
+    S, K, r, t, sigma = inputs()
+    result = price(european(kind), S, K, r, t, sigma, paths=2**16, antithetic=antithetic, sobol=sobol)
+    expected = (bs_torch.call_price if kind == 'call' else bs_torch.put_price)(S, K, r, t, sigma)
+    assert result.price.shape == K.shape
+    assert (torch.abs(result.price - expected) < 4 * result.stderr).all()
+
+
+def test_variance_reduction():
+    S, K, r, t, sigma = inputs()
+    expected = bs_torch.call_price(S, K, r, t, sigma)
+    plain = price(european(), S, K, r, t, sigma, paths=2**14, antithetic=False)
+    mirrored = price(european(), S, K, r, t, sigma, paths=2**14, antithetic=True)
+    quasi = price(european(), S, K, r, t, sigma, paths=2**14, antithetic=False, sobol=True)
+    assert (mirrored.stderr < plain.stderr).all()
+    assert torch.abs(quasi.price - expected).max() < 0.02
+
+
+def test_chunks_do_not_change_the_result():
+    S, K, r, t, sigma = inputs()
+    whole = price(european(), S, K, r, t, sigma, paths=2**12, chunk_size=2**12, sobol=True)
+    chunked = price(european(), S, K, r, t, sigma, paths=2**12, chunk_size=2**9, sobol=True)
+    assert torch.allclose(whole.price, chunked.price, rtol=1e-12)
+    assert torch.allclose(whole.stderr, chunked.stderr, rtol=1e-10)
+
+
+def test_pathwise_greeks_match_black_scholes():
+    S, K, r, t, sigma = inputs()
+    result = price(european('call'), S, K, r, t, sigma, paths=2**16, sobol=True, greeks=True)
+    expected = bs_torch.greeks(S, K, r, t, sigma, kind='call')
+    assert torch.allclose(result.delta, expected.delta, rtol=5e-3)
+    assert torch.allclose(result.vega, expected.vega, rtol=5e-3)
+    assert torch.allclose(result.theta, expected.theta, rtol=5e-3)
+    assert torch.allclose(result.rho, expected.rho, rtol=5e-3)
+    assert not result.price.requires_grad and not result.delta.requires_grad
+
+
+@pytest.mark.parametrize('greeks', [False, True])
+def test_device_and_dtype_follow_the_inputs(greeks):
+    # Shapes and devices propagate through the meta device without computing anything, as they would on a GPU.
+    S, K, r, t, sigma = (x.to('meta') for x in inputs())
+    result = price(asian('call'), S, K, 0.05, t, sigma, paths=2**8, steps=4, greeks=greeks, dtype=torch.float32)
+    for value in result:
+        if value is not None:
+            assert value.device.type == 'meta' and value.dtype == torch.float32 and value.shape == K.shape
+
+
+def test_geometric_asian_matches_closed_form():
+    S, K, r, t, sigma = inputs()
+    steps = 12
+    result = price(asian('call', 'geometric'), S, K, r, t, sigma, paths=2**16, steps=steps)
+    expected = geometric_asian_call(S.item(), K, r.item(), t.item(), sigma.item(), steps)
+    assert (torch.abs(result.price - expected) < 4 * result.stderr).all()
+    arithmetic = price(asian('call'), S, K, r, t, sigma, paths=2**16, steps=steps)
+    assert (arithmetic.price > result.price).all()
+
+
+def test_barrier_in_out_parity():
+    S, K, r, t, sigma = inputs()
+    kwargs = dict(paths=2**14, steps=50)
+    knock_out = price(barrier(120., 'call', 'up', 'out'), S, K, r, t, sigma, **kwargs)
+    knock_in = price(barrier(120., 'call', 'up', 'in'), S, K, r, t, sigma, **kwargs)
+    vanilla = price(european('call'), S, K, r, t, sigma, **kwargs)
+    assert torch.allclose(knock_out.price + knock_in.price, vanilla.price)
+    assert (knock_out.price < vanilla.price).all()
+    down = price(barrier(torch.tensor([80., 70., 60.]), 'put', 'down', 'out'), S, K, r, t, sigma, **kwargs)
+    assert (down.price < price(european('put'), S, K, r, t, sigma, **kwargs).price).all()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        european('straddle')
+    with pytest.raises(ValueError):
+        asian(average='harmonic')
+    with pytest.raises(ValueError):
+        barrier(120., direction='sideways')
+    with pytest.raises(ValueError):
+        next(normals(0, 1))
+    with pytest.raises(ValueError):
+        next(normals(16, MAX_SOBOL_STEPS + 1, sobol=True))
+
+
+def speed_comparison():
+
+    import timeit
+
+    S, K, r, t, sigma = inputs()
+    K = torch.linspace(80, 120, 100, dtype=torch.float64)
+    for chunk_size in [2**10, 2**12, 2**14]:
+        time_taken = min(timeit.Timer(lambda: price(asian(), S, K, r, t, sigma, paths=2**14, steps=52, chunk_size=chunk_size)).repeat(repeat=3, number=1))
+        print(f'Asian calls on {len(K)} strikes, 2^14 paths x 52 steps, chunks of {chunk_size:>5d} paths: {time_taken*1000:8.2f} ms.')
+    time_taken = min(timeit.Timer(lambda: price(asian(), S, K, r, t, sigma, paths=2**14, steps=52, greeks=True)).repeat(repeat=3, number=1))
+    print(f'With pathwise Greeks: {time_taken*1000:8.2f} ms.')
+    for name, kwargs in [('plain', dict(antithetic=False)), ('antithetic', dict(antithetic=True)), ('Sobol', dict(antithetic=False, sobol=True))]:
+        error = (price(european(), S, K, r, t, sigma, paths=2**14, **kwargs).price - bs_torch.call_price(S, K, r, t, sigma)).abs().mean()
+        print(f'Mean absolute error of 2^14 {name:<10s} paths: {error:.4f}')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -0,0 +1,104 @@
+import pytest
+import torch
+
+from dfin.options import bs_torch, tree_torch
+from dfin.options.pde_torch import *
+
+
+def tensors(*values):
+    return (torch.tensor(v, dtype=torch.float64) for v in values)
+
+
+@pytest.mark.parametrize('solver', [thomas, cyclic_reduction])
+def test_tridiagonal_solvers(solver):
+    generator = torch.Generator().manual_seed(0)
+    size = 37
+    lower, upper = (-torch.rand(4, size, generator=generator, dtype=torch.float64) for _ in range(2))
+    diag = 2.5 + torch.rand(4, size, generator=generator, dtype=torch.float64)
+    rhs = torch.rand(4, size, generator=generator, dtype=torch.float64)
+    matrix = torch.diag_embed(diag) + torch.diag_embed(lower[:, 1:], -1) + torch.diag_embed(upper[:, :-1], 1)
+    assert torch.allclose(solver(lower, diag, upper, rhs), torch.linalg.solve(matrix, rhs), atol=1e-13)
+    # Constant diagonals.
+    matrix = torch.diag_embed(diag[:, :1].expand(-1, size)) + torch.diag_embed(lower[:, :1].expand(-1, size - 1), -1) + torch.diag_embed(upper[:, :1].expand(-1, size - 1), 1)
+    assert torch.allclose(solver(lower[:, 0], diag[:, 0], upper[:, 0], rhs), torch.linalg.solve(matrix, rhs), atol=1e-13)
+
+
+@pytest.mark.parametrize('kind', ['call', 'put'])
+def test_european_matches_black_scholes(kind):
+    S, r, t, sigma = tensors(100., 0.05, 1., 0.2)
+    K = torch.linspace(70, 130, 13, dtype=torch.float64)
+    grid = solve(r, t, sigma, kind, american=False)
+    expected = bs_torch.greeks(S, K, r, t, sigma, kind)
+    result = grid.greeks(S, K)
+    assert torch.allclose(result.price, expected.price, atol=2e-3)
+    assert torch.allclose(result.delta, expected.delta, atol=1e-4)
+    assert torch.allclose(result.gamma, expected.gamma, atol=3e-4)
+    assert torch.allclose(result.theta, expected.theta, atol=2e-2)
+    assert torch.allclose(grid.price(S, K), result.price)
+
+
+def test_thomas_and_cyclic_reduction_agree():
+    cyclic = solve(0.05, 1., torch.tensor([0.2, 0.3], dtype=torch.float64), nodes=101, steps=50)
+    sequential = solve(0.05, 1., torch.tensor([0.2, 0.3], dtype=torch.float64), nodes=101, steps=50, tridiagonal='thomas')
+    assert torch.allclose(cyclic.values, sequential.values, atol=1e-12)
+
+
+@pytest.mark.parametrize('kind', ['call', 'put'])
+def test_american_matches_tree(kind):
+    S, r, t, sigma, q = tensors(100., 0.05, 1., 0.2, 0.03)
+    K = torch.linspace(80, 120, 9, dtype=torch.float64)
+    pde = solve(r, t, sigma, kind, q=q).price(S, K)
+    tree = tree_torch.price(S, K, r, t, sigma, kind, steps=1000, q=q)
+    assert torch.allclose(pde, tree, atol=1e-2)
+    assert (pde >= (S - K if kind == 'call' else K - S) - 1e-12).all()
+
+
+def test_batch_of_grids():
+    r, S = tensors(0.05, 100.)
+    t = torch.tensor([0.25, 0.5, 1.], dtype=torch.float64)
+    sigma = torch.tensor([0.3, 0.25, 0.2], dtype=torch.float64)
+    K = torch.linspace(90, 110, 5, dtype=torch.float64).reshape(-1, 1)
+    grid = solve(r, t, sigma, 'put', american=False)
+    assert grid.values.shape == (3, 401)
+    prices = grid.price(S, K)
+    assert prices.shape == (5, 3)
+    assert torch.allclose(prices, bs_torch.put_price(S, K, r, t, sigma), atol=2e-3)
+
+
+def test_price_per_contract_and_outside_grid():
+    S = torch.tensor([80., 100., 120.], dtype=torch.float64)
+    K = torch.tensor([100., 100., 60.], dtype=torch.float64)
+    prices = price(S, K, 0.05, 0.5, 0.25, 'call', american=False)
+    assert torch.allclose(prices, bs_torch.call_price(S, K, *tensors(0.05, 0.5, 0.25)), atol=2e-3)
+    assert torch.isnan(solve(0.05, 0.1, 0.1, width=4.).price(100., 10.))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        solve(0.05, 1., 0.2, 'straddle')
+    with pytest.raises(ValueError):
+        solve(0.05, 1., 0.2, tridiagonal='dense')
+    with pytest.raises(ValueError):
+        solve(0.05, 1., 0.2, nodes=3)
+
+
+def speed_comparison():
+
+    import timeit
+
+    S, r, t, sigma = tensors(100., 0.05, 1., 0.2)
+    K = torch.linspace(50, 150, 1001, dtype=torch.float64)
+    time_taken = min(timeit.Timer(lambda: tree_torch.put_price(S, K, r, t, sigma, steps=200)).repeat(repeat=3, number=1))
+    print(f'Tree, {len(K)} American puts of 200 steps, one per strike  : {time_taken*1000:8.2f} ms.')
+    for tridiagonal in ['thomas', 'cyclic']:
+        time_taken = min(timeit.Timer(lambda: solve(r, t, sigma, 'put', tridiagonal=tridiagonal).greeks(S, K)).repeat(repeat=3, number=1))
+        print(f'PDE ({tridiagonal:<6s}), {len(K)} American puts off a single grid: {time_taken*1000:8.2f} ms.')
+    sigma = torch.linspace(0.1, 0.5, 100, dtype=torch.float64)
+    time_taken = min(timeit.Timer(lambda: solve(r, t, sigma, 'put')).repeat(repeat=3, number=1))
+    print(f'PDE (cyclic), a batch of {len(sigma)} grids: {time_taken*1000:8.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
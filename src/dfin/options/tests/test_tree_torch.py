@@ -0,0 +1,146 @@
+import pytest
+import torch
+
+from dfin.optimize import batched_newton
+from dfin.options import bs_torch
+from dfin.options.tree_torch import *
+
+
+def inputs(size=9):
+    S = torch.tensor(100., dtype=torch.float64)
+    K = torch.linspace(80, 120, size, dtype=torch.float64)
+    r = torch.tensor(0.05, dtype=torch.float64)
+    t = torch.tensor(0.75, dtype=torch.float64)
+    sigma = torch.tensor(0.25, dtype=torch.float64)
+    return S, K, r, t, sigma
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('kind', ['call', 'put'])
+def test_european_converges_to_black_scholes(method, kind):
+    S, K, r, t, sigma = inputs()
+    tree = price(S, K, r, t, sigma, kind, steps=400, method=method, american=False)
+    expected = (bs_torch.call_price if kind == 'call' else bs_torch.put_price)(S, K, r, t, sigma)
+    assert tree.shape == K.shape
+    assert torch.allclose(tree, expected, atol=2e-2)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_american_early_exercise_premium(method):
+    S, K, r, t, sigma = inputs()
+    put = put_price(S, K, r, t, sigma, steps=200, method=method)
+    european = price(S, K, r, t, sigma, 'put', steps=200, method=method, american=False)
+    assert (put > european).all()
+    assert (put >= torch.clamp(K - S, min=0)).all()
+    # Without dividends an American call is never exercised early.
+    assert torch.allclose(call_price(S, K, r, t, sigma, steps=200, method=method), price(S, K, r, t, sigma, 'call', steps=200, method=method, american=False))
+    # With dividends it is.
+    assert (call_price(S, K, r, t, sigma, steps=200, method=method, q=0.08) > price(S, K, r, t, sigma, 'call', steps=200, method=method, american=False, q=0.08)).all()
+
+
+def test_binomial_and_trinomial_agree():
+    S, K, r, t, sigma = inputs()
+    binomial = put_price(S, K, r, t, sigma, steps=500)
+    trinomial = put_price(S, K, r, t, sigma, steps=250, method='trinomial')
+    assert torch.allclose(binomial, trinomial, atol=1e-2)
+
+
+def test_batch_of_contracts():
+    S, K, r, t, sigma = inputs(5)
+    t = torch.tensor([0.1, 0.25, 0.5, 1., 2.], dtype=torch.float64)
+    batch = put_price(S, K.reshape(-1, 1), r, t, sigma, steps=100)
+    assert batch.shape == (5, 5)
+    for i in range(5):
+        for j in range(5):
+            assert batch[i, j] == pytest.approx(put_price(100., K[i].item(), 0.05, t[j].item(), 0.25, steps=100).item(), rel=1e-12)
+
+
+def test_autograd_greeks():
+    S, K, r, t, sigma = inputs()
+    S, sigma = S.expand(K.shape).clone().requires_grad_(True), sigma.expand(K.shape).clone().requires_grad_(True)
+    tree = price(S, K, r, t, sigma, 'call', steps=400, american=False)
+    delta, vega = torch.autograd.grad(tree.sum(), (S, sigma))
+    expected = bs_torch.greeks(S.detach(), K, r, t, sigma.detach())
+    # The nodes move with S and sigma, so lattice Greeks oscillate around the closed forms as strikes fall between nodes.
+    assert torch.allclose(delta, expected.delta, atol=2.5e-2)
+    assert torch.allclose(vega, expected.vega, rtol=3e-2)
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('kind', ['call', 'put'])
+def test_implied_volatility_round_trip(kind, method):
+    S, K, r, t, _ = inputs()
+    sigma = torch.linspace(0.15, 0.45, len(K), dtype=torch.float64)
+    quotes = price(S, K, r, t, sigma, kind, steps=100, method=method, q=0.02)
+    result = implied_volatility(S, K, r, t, quotes, kind, steps=100, method=method, q=0.02, atol=1e-10)
+    assert result.converged.all()
+    assert torch.allclose(result.x, sigma, atol=1e-6)
+    # Any batched solver takes the tree as its objective through autograd.
+    result = implied_volatility(S, K, r, t, quotes, kind, sigma0=0.3, optim=batched_newton, steps=100, method=method, q=0.02, atol=1e-10)
+    assert torch.allclose(result.x, sigma, atol=1e-6)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_implied_volatility_short_dated(method):
+    # The default lower bound of 1e-3 is below the stable volatility of a 200-step tree here.
+    K = torch.tensor([80., 90., 100.], dtype=torch.float64)
+    quotes = price(100., K, 0.05, 0.25, 0.2, 'call', method=method)
+    result = implied_volatility(100., K, 0.05, 0.25, quotes, 'call', method=method)
+    assert result.converged.all()
+    assert torch.allclose(result.x, torch.full_like(K, 0.2), atol=1e-6)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_volatility_below_drift(method):
+    # At 100 steps both trees have probabilities outside [0, 1] for a 1% volatility under a 20% rate.
+    with pytest.raises(ValueError, match='Increase the number of steps'):
+        price(100., 100., 0.2, 1., 0.01, 'call', steps=100, method=method, american=False)
+    tree = price(100., 100., 0.2, 1., 0.01, 'call', steps=2000, method=method, american=False)
+    assert tree.item() == pytest.approx(bs_torch.call_price(*(torch.tensor(x, dtype=torch.float64) for x in (100., 100., 0.2, 1., 0.01))).item(), abs=1e-2)
+
+
+def test_implied_volatility_below_exercise_value_is_nan():
+    result = implied_volatility(100., torch.tensor([120., 110.], dtype=torch.float64), 0.05, 1., torch.tensor([15., 12.], dtype=torch.float64), 'put', steps=50)
+    assert torch.isnan(result.x[0])
+    assert result.converged[1]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        price(100., 100., 0.05, 1., 0.2, 'straddle')
+    with pytest.raises(ValueError):
+        price(100., 100., 0.05, 1., 0.2, method='quadrinomial')
+    with pytest.raises(ValueError):
+        price(100., 100., 0.05, 1., 0.2, steps=0)
+
+
+def speed_comparison():
+
+    import math
+    import timeit
+
+    def nested_loops(S, K, r, t, sigma, steps):
+        dt = t / steps
+        u = math.exp(sigma * math.sqrt(dt))
+        p = (math.exp(r * dt) - 1 / u) / (u - 1 / u)
+        values = [max(K - S * u**(2 * j - steps), 0) for j in range(steps + 1)]
+        for i in range(steps - 1, -1, -1):
+            values = [max(math.exp(-r * dt) * (p * values[j + 1] + (1 - p) * values[j]), K - S * u**(2 * j - i)) for j in range(i + 1)]
+        return values[0]
+
+    S, K, r, t, sigma = inputs(1000)
+    steps = 200
+    time_taken = min(timeit.Timer(lambda: [nested_loops(100., k, 0.05, 0.75, 0.25, steps) for k in K[:10].tolist()]).repeat(repeat=3, number=1)) * len(K) / 10
+    print(f'Nested loops, {len(K)} American puts of {steps} steps: {time_taken*1000:10.2f} ms (extrapolated from 10).')
+    for method in METHODS:
+        time_taken = min(timeit.Timer(lambda: put_price(S, K, r, t, sigma, steps=steps, method=method)).repeat(repeat=3, number=1))
+        print(f'{method.capitalize():<12s} {len(K)} American puts of {steps} steps: {time_taken*1000:10.2f} ms.')
+    quotes = put_price(S, K, r, t, sigma, steps=steps)
+    time_taken = min(timeit.Timer(lambda: implied_volatility(S, K, r, t, quotes, 'put', steps=steps)).repeat(repeat=3, number=1))
+    print(f'Implied volatility of {len(K)} American puts of {steps} steps: {time_taken*1000:10.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
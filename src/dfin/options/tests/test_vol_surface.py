@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from dfin.options import bs_numpy
+from dfin.options.iv_guess import corrado_miller
+from dfin.options.vol_surface import *
+
+
+def quotes(size=50, seed=0):
+    rng = np.random.default_rng(seed)
+    strike = np.round(rng.uniform(80, 120, size), 1)
+    t = np.where(np.arange(size) % 2 == 0, 0.25, 1.)
+    expiry = ['2024-03-15' if x == 0.25 else '2024-12-20' for x in t]
+    kind = ['call' if i % 3 else 'put' for i in range(size)]
+    sigma = rng.uniform(0.1, 0.5, size)
+    call = bs_numpy.call_price(100., strike, 0.05, t, sigma)
+    put = bs_numpy.put_price(100., strike, 0.05, t, sigma)
+    price = np.where(np.array(kind) == 'call', call, put)
+    return expiry, strike, kind, price, t, sigma
+
+
+def test_update_solves_new_contracts():
+    expiry, strike, kind, price, t, sigma = quotes()
+    surface = VolSurface()
+    assert surface.update(expiry, strike, kind, price, 100., t) == len(surface) == len(strike)
+    np.testing.assert_allclose(surface.sigma, sigma, rtol=1e-6)
+    assert surface.converged.all()
+    assert surface.get(expiry[1], strike[1], kind[1]) == pytest.approx(sigma[1], rel=1e-6)
+    assert np.isnan(surface.get('1999-01-01', 100.))
+    assert surface.expiry == expiry
+    assert surface.kind.dtype == np.int8
+
+
+def test_guess_provider_for_new_contracts():
+    expiry, strike, kind, price, t, sigma = quotes()
+    cold, warm = VolSurface(), VolSurface(sigma0=corrado_miller)
+    for surface in (cold, warm):
+        surface.update(expiry, strike, kind, price, 100., t)
+    np.testing.assert_allclose(warm.sigma, sigma, rtol=1e-6)
+    assert warm.iterations.mean() < cold.iterations.mean()
+
+
+def test_update_only_resolves_changes():
+    expiry, strike, kind, price, t, sigma = quotes()
+    surface = VolSurface(price_tol=1e-4)
+    surface.update(expiry, strike, kind, price, 100., t)
+
+    # Nothing moved, or nothing beyond the tolerance.
+    assert surface.update(expiry, strike, kind, price + 1e-5, 100., t) == 0
+    assert surface.solved == len(strike)
+
+    # A single tick.
+    assert surface.update(expiry[3], strike[3], kind[3], price[3] + 0.1, 100., t[3]) == 1
+    assert surface.last_solved == 1
+    assert surface.iterations[3] <= 3
+    assert surface.sigma[3] > sigma[3]
+    np.testing.assert_allclose(np.delete(surface.sigma, 3), np.delete(sigma, 3), rtol=1e-6)
+
+    # The underlying moves every contract.
+    assert surface.update_spot(101.) == len(strike)
+    assert surface.update_spot(101.) == 0
+    assert (surface.S == 101.).all()
+
+
+def test_update_keeps_last_duplicate_quote():
+    surface = VolSurface()
+    price = bs_numpy.call_price(100., 100., 0.05, 1., np.array([0.2, 0.3]))
+    assert surface.update('2024-12-20', [100., 100.], 'call', price, 100., 1.) == 1
+    assert len(surface) == 1
+    assert surface.get('2024-12-20', 100.) == pytest.approx(0.3, rel=1e-6)
+
+
+def test_arbitrage_violation_is_nan():
+    surface = VolSurface()
+    surface.update('2024-12-20', [90., 100.], 'call', [1., 10.], 100., 1.)
+    assert np.isnan(surface.sigma[0])
+    assert not surface.converged[0]
+    assert surface.converged[1]
+
+
+def test_grid():
+    expiry, strike, kind, price, t, sigma = quotes()
+    surface = VolSurface()
+    surface.update(expiry, strike, kind, price, 100., t)
+    grid = surface.grid('put')
+    assert grid.expiries == ['2024-03-15', '2024-12-20']
+    np.testing.assert_array_equal(grid.t, [0.25, 1.])
+    assert (np.diff(grid.strikes) > 0).all()
+    assert grid.sigma.shape == (2, len(grid.strikes))
+    assert np.isfinite(grid.sigma).sum() == kind.count('put')
+    arrays = surface.to_arrays()
+    assert set(arrays) == {'expiry', 'strike', 'kind', 'S', 't', 'price', 'sigma', 'iterations', 'converged'}
+    with pytest.raises(ValueError):
+        surface.grid('straddle')
+
+
+def speed_comparison():
+
+    import timeit
+
+    size = 10000
+    expiry, strike, kind, price, t, sigma = quotes(size)
+    strike = strike + np.arange(size) * 1e-3
+    surface = VolSurface()
+    time_taken = min(timeit.Timer(lambda: VolSurface().update(expiry, strike, kind, price, 100., t)).repeat(repeat=5, number=1))
+    print(f'Solving {size} contracts from scratch takes {time_taken*1000:.2f} ms.')
+    surface.update(expiry, strike, kind, price, 100., t)
+    ticks = iter(np.linspace(0.01, 1, 1000))
+    time_taken = min(timeit.Timer(lambda: surface.update(expiry[0], strike[0], kind[0], price[0] + next(ticks), 100., t[0])).repeat(repeat=5, number=1))
+    print(f'Re-solving a single tick takes {time_taken*1000:.2f} ms.')
+    time_taken = min(timeit.Timer(lambda: surface.update(expiry, strike, kind, price, 100., t)).repeat(repeat=5, number=1))
+    print(f'Checking {size} unchanged quotes takes {time_taken*1000:.2f} ms.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()
@@ -0,0 +1,239 @@
+"""Binomial and trinomial tree pricing of American options with PyTorch.
+
+Backward induction runs over whole time layers at once, for a whole batch of contracts: every layer is one tensor of shape
+(contracts, nodes), so only two layers and the grid of underlying prices are ever held, i.e. O(N) memory in the number of steps.
+The underlying prices of every layer are slices of a single grid S u^m, m = -N..N, so nothing but the continuation values is
+recomputed per layer.
+
+The trees are differentiable in all their inputs, so they also serve as the objective of the `dfin.optimize` solvers
+to imply volatility from the American prices quoted for equity options, which the Black-Scholes inversions of `iv_torch` ignore.
+"""
+
+import functools
+from typing import Callable, Optional, Tuple, Union
+
+import torch
+
+from dfin.optimize import BatchedRootResult, bracketed_newton
+from dfin.options._solver_utils import callback_kwargs, contract_label, resolve_guess
+from dfin.options.iv_guess import corrado_miller
+
+
+TensorLike = Union[float, torch.Tensor]
+
+METHODS = ('binomial', 'trinomial')
+
+
+def _check(kind:str, method:str):
+    if kind not in ('call', 'put'):
+        raise ValueError(f'Unknown option kind "{kind}". Expected "call" or "put".')
+    if method not in METHODS:
+        raise ValueError(f'Unknown method "{method}". Expected "binomial" or "trinomial".')
+
+
+def _tensors(*values:TensorLike) -> Tuple[torch.Tensor, ...]:
+    """Broadcasts the inputs to one flat batch, keeping their autograd graph. Plain floats follow the dtype of the tensors."""
+
+    dtype = next((x.dtype for x in values if torch.is_tensor(x) and x.is_floating_point()), torch.float64)
+    return torch.broadcast_tensors(*(x.to(dtype) if torch.is_tensor(x) else torch.tensor(x, dtype=dtype) for x in values))
+
+
+def _stable_volatility(r:torch.Tensor, t:torch.Tensor, q:torch.Tensor, steps:int, method:str) -> torch.Tensor:
+    """Lowest volatility for which the branching probabilities of the tree stay in [0, 1], given the drift over a step."""
+
+    dt = t / steps
+    return torch.abs(r - q) * torch.sqrt(dt if method == 'binomial' else dt / 2)
+
+
+def price(S, K:TensorLike, r:TensorLike, t:TensorLike, sigma:TensorLike, kind:str='put', steps:int=200, method:str='binomial', american:bool=True, q:TensorLike=0.) -> torch.Tensor:
+    """
+    Computes the price of American (or European) options by backward induction on a recombining tree.
+
+    The binomial tree is Cox-Ross-Rubinstein's, with u = exp(sigma sqrt(dt)).
+    The trinomial tree is Boyle's, with u = exp(sigma sqrt(2 dt)), and converges more smoothly for the same number of steps.
+    Both trees need the volatility to outgrow the drift over a step, sigma >= |r - q| sqrt(dt) for the binomial tree
+    and sigma >= |r - q| sqrt(dt / 2) for the trinomial one, or their probabilities leave [0, 1].
+
+    Parameters
+    ----------
+    S : float or torch.Tensor
+        Current underlying price
+    K : float or torch.Tensor
+        Option strike price
+    r : float or torch.Tensor
+        Risk-free interest rate
+    t : float or torch.Tensor
+        Time to expiry
+    sigma : float or torch.Tensor
+        Volatility of the underlying asset
+    kind : str
+        Either "call" or "put". Default: "put".
+    steps : int
+        Number of time steps. Default: 200.
+    method : str
+        Either "binomial" or "trinomial". Default: "binomial".
+    american : bool
+        Whether the option can be exercised at every step. Default: True.
+    q : float or torch.Tensor
+        Continuous dividend yield, which makes early exercise of calls worthwhile. Default: 0.
+
+    Returns
+    -------
+    torch.Tensor
+        Theoretical price of the options, in the broadcast shape of the inputs.
+
+    Raises
+    ------
+    ValueError
+        If a volatility is too low for the tree to be arbitrage-free at this number of steps.
+    """
+
+    _check(kind, method)
+    if steps < 1:
+        raise ValueError(f'Expected at least one step, got {steps}.')
+    S, K, r, t, sigma, q = _tensors(S, K, r, t, sigma, q)
+    stable = _stable_volatility(r, t, q, steps, method)
+    if (sigma < stable).any():
+        raise ValueError(f'Volatility below {stable.max().item():.4g}, too low for the drift over a step of the {method} tree. Increase the number of steps.')
+    return _backward_induction(S, K, r, t, sigma, q, kind, steps, method, american)
+
+
+def _backward_induction(S:torch.Tensor, K:torch.Tensor, r:torch.Tensor, t:torch.Tensor, sigma:torch.Tensor, q:torch.Tensor, kind:str, steps:int, method:str, american:bool) -> torch.Tensor:
+    """
+    Rolls the payoff back through the tree, on inputs already broadcast against each other.
+
+    Volatilities below the stable level are raised to it, so that solvers probing low volatilities see a flat,
+    arbitrage-free price instead of probabilities outside [0, 1].
+    """
+
+    shape = S.shape
+    S, K, r, t, sigma, q = (x.reshape(-1, 1) for x in (S, K, r, t, sigma, q))
+    sigma = torch.maximum(sigma, _stable_volatility(r, t, q, steps, method))
+    dt = t / steps
+    discount = torch.exp(-r*dt)
+    growth = torch.exp((r - q) * dt)
+
+    if method == 'binomial':
+        log_u = sigma * torch.sqrt(dt)
+        u, d = torch.exp(log_u), torch.exp(-log_u)
+        # Clamped against rounding only, the volatility is at least the stable one.
+        p_up = torch.clamp((growth - d) / (u - d), 0, 1)
+        weights = (discount * (1 - p_up), discount * p_up)
+        stride = 2
+    else:
+        log_u = sigma * torch.sqrt(2 * dt)
+        half_u, half_d = torch.exp(log_u / 2), torch.exp(-log_u / 2)
+        p_up = ((torch.sqrt(growth) - half_d) / (half_u - half_d))**2
+        p_down = ((half_u - torch.sqrt(growth)) / (half_u - half_d))**2
+        weights = (discount * p_down, discount * (1 - p_up - p_down), discount * p_up)
+        stride = 1
+
+    # Underlying price S u^m of every node, m = -N..N. Layer i holds m = -i..i, every other m in the binomial tree.
+    exponents = torch.arange(-steps, steps + 1, dtype=S.dtype, device=S.device)
+    grid = S * torch.exp(exponents * log_u)
+    sign = 1 if kind == 'call' else -1
+
+    def layer(i:int) -> torch.Tensor:
+        return grid[:, steps - i:steps + i + 1:stride]
+
+    values = torch.clamp(sign * (layer(steps) - K), min=0)
+    for i in range(steps - 1, -1, -1):
+        if method == 'binomial':
+            values = weights[0] * values[:, :-1] + weights[1] * values[:, 1:]
+        else:
+            values = weights[0] * values[:, :-2] + weights[1] * values[:, 1:-1] + weights[2] * values[:, 2:]
+        if american:
+            values = torch.maximum(values, sign * (layer(i) - K))
+
+    return values.reshape(shape)
+
+
+def call_price(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, sigma:TensorLike, steps:int=200, method:str='binomial', q:TensorLike=0.) -> torch.Tensor:
+    """Computes the price of American call options. See `price`."""
+    return price(S, K, r, t, sigma, 'call', steps, method, True, q)
+
+
+def put_price(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, sigma:TensorLike, steps:int=200, method:str='binomial', q:TensorLike=0.) -> torch.Tensor:
+    """Computes the price of American put options. See `price`."""
+    return price(S, K, r, t, sigma, 'put', steps, method, True, q)
+
+
+def implied_volatility(S:TensorLike, K:TensorLike, r:TensorLike, t:TensorLike, price:TensorLike, kind:str='put', sigma0=corrado_miller, optim:Optional[Callable]=None, steps:int=200, method:str='binomial', q:TensorLike=0., atol:float=1e-6, max_iter:int=100, callback:Optional[Callable]=None) -> BatchedRootResult:
+    """
+    Calculates the implied volatility of American options, with the tree as the objective of a `dfin.optimize` solver.
+
+    By default, `bracketed_newton` solves every contract at once, with vega taken by central differences of the tree
+    under `torch.no_grad()`, so memory stays O(N) in the number of steps.
+    Any batched solver of `dfin.optimize` can be given instead, at the cost of the autograd graph of the whole tree, O(N^2).
+
+    Parameters
+    ----------
+    S : float or torch.Tensor
+        Current underlying price
+    K : float or torch.Tensor
+        Option strike price
+    r : float or torch.Tensor
+        Risk-free interest rate
+    t : float or torch.Tensor
+        Time to expiry
+    price : float or torch.Tensor
+        Observed price of the American options
+    kind : str
+        Either "call" or "put". Default: "put".
+    sigma0 : torch.Tensor or GuessProvider
+        Initial guess for volatility, or a provider from `dfin.options.iv_guess`.
+        The European guesses are close, as the early exercise premium is small. Default: `iv_guess.corrado_miller`.
+    optim : Callable, optional
+        Batched solver from `dfin.optimize`. Default: `bracketed_newton` on [1e-3, 5] with a finite-difference vega,
+        the lower bound raised to the lowest volatility the tree holds at this number of steps.
+    steps : int
+        Number of time steps of the tree. Default: 200.
+    method : str
+        Either "binomial" or "trinomial". Default: "binomial".
+    q : float or torch.Tensor
+        Continuous dividend yield. Default: 0.
+    atol : float
+        The tolerance of the optimization target. Default: 1e-6.
+    max_iter : int
+        The maximum number of iterations. Default: 100.
+    callback : Callable, optional
+        Receives the `SolverReport` of the optimizer, labelled with the contract inputs.
+
+    Returns
+    -------
+    BatchedRootResult
+        Implied volatilities, per-element iteration counts and converged flags.
+        Prices below the exercise value, or above what any volatility in the bracket explains, come back as NaN.
+    """
+
+    _check(kind, method)
+    S, K, r, t, target, q = (x.detach() for x in _tensors(S, K, r, t, price, q))
+
+    def objective(sigma:torch.Tensor) -> torch.Tensor:
+        return _backward_induction(*torch.broadcast_tensors(S, K, r, t, sigma, q), kind, steps, method, True) - target
+
+    if optim is None:
+
+        def vega(sigma:torch.Tensor) -> torch.Tensor:
+            bump = 1e-4 * torch.ones_like(sigma)
+            return (objective(sigma + bump) - objective(sigma - bump)) / (2 * bump)
+
+        lower = torch.clamp(_stable_volatility(r, t, q, steps, method), min=1e-3)
+        optim = functools.partial(bracketed_newton, lower=lower, upper=5., fprime=vega)
+
+    with contract_label(kind, S, K, r, t, target, callback):
+        return optim(objective, resolve_guess(sigma0, kind, S, K, r, t, target), atol, max_iter, **callback_kwargs(callback))
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    from dfin.options import bs_torch, iv_torch
+
+    S, K, r, t, sigma = torch.tensor(100., dtype=torch.float64), torch.linspace(80, 120, 5, dtype=torch.float64), torch.tensor(0.05, dtype=torch.float64), torch.tensor(1., dtype=torch.float64), torch.tensor(0.2, dtype=torch.float64)
+    american = put_price(S, K, r, t, sigma, steps=500)
+    print(f'American put : {american}')
+    print(f'European put : {bs_torch.put_price(S, K, r, t, sigma)}')
+    print(f'American IV  : {implied_volatility(S, K, r, t, american, "put", steps=500).x}')
+    # Inverting Black-Scholes attributes the early exercise premium to volatility instead.
+    print(f'European IV  : {iv_torch.put_implied_volatility_analytic(S, K, r, t, american, 0.5).x}')
@@ -0,0 +1,310 @@
+"""Incremental implied volatility surface.
+
+`VolSurface` keeps the solved implied volatility of every contract, keyed by (expiry, strike, side),
+in contiguous NumPy arrays. An update only re-solves the contracts whose price, underlying price or time to expiry
+moved beyond a tolerance, warm-started from their previous volatility, so a single tick costs a single solve.
+"""
+
+from typing import Dict, Hashable, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+from numpy.typing import ArrayLike
+
+from dfin.options import iv_torch
+from dfin.options.bridge import to_tensor
+from dfin.options.iv_guess import resolve
+
+
+KINDS = ('call', 'put')
+
+_FIELDS = {
+    'strike': np.float64,
+    'kind': np.int8,
+    'S': np.float64,
+    't': np.float64,
+    'price': np.float64,
+    'sigma': np.float64,
+    'iterations': np.int64,
+    'converged': np.bool_,
+}
+
+
+class SurfaceGrid(NamedTuple):
+    """Implied volatilities of one side of the surface on a dense (expiry, strike) grid.
+
+    Attributes
+    ----------
+    expiries : list
+        Expiry labels, sorted.
+    t : np.ndarray
+        Time to expiry of every row, i.e. of the most recent quote of that expiry.
+    strikes : np.ndarray
+        Strike prices of every column, sorted.
+    sigma : np.ndarray
+        Implied volatilities of shape (len(expiries), len(strikes)). NaN where there is no quote or no solution.
+    """
+    expiries: list
+    t: np.ndarray
+    strikes: np.ndarray
+    sigma: np.ndarray
+
+
+def _kind_codes(kind, size:int) -> np.ndarray:
+    """Encodes "call"/"put" labels as 0/1."""
+
+    if isinstance(kind, str):
+        kind = [kind]
+    codes = np.empty(len(kind), dtype=np.int8)
+    for i, label in enumerate(kind):
+        if label not in KINDS:
+            raise ValueError(f'Unknown option kind "{label}". Expected "call" or "put".')
+        codes[i] = KINDS.index(label)
+    return np.broadcast_to(codes, (size,))
+
+
+class VolSurface:
+    """
+    Stateful implied volatility surface, re-solving only the quotes that changed.
+
+    Parameters
+    ----------
+    r : float
+        Risk-free interest rate. Default: 0.05.
+    price_tol : float
+        Absolute change of the option price that triggers a re-solve. Default: 1e-4.
+    spot_tol : float
+        Relative change of the underlying price that triggers a re-solve. Default: 1e-6.
+    time_tol : float
+        Change of the time to expiry, in years, that triggers a re-solve. Default: 1e-6, about 30 seconds.
+    sigma0 : float or GuessProvider
+        Initial guess for contracts seen for the first time, or without a previous solution,
+        e.g. `iv_guess.corrado_miller`. Default: 0.5.
+    method : str
+        Either "newton" or "halley", see `iv_torch.call_implied_volatility_analytic`. Default: "halley".
+    atol : float
+        The tolerance of the solver on the price. Default: 1e-8.
+    max_iter : int
+        The maximum number of iterations of the solver. Default: 100.
+    """
+
+    def __init__(self, r:float=0.05, price_tol:float=1e-4, spot_tol:float=1e-6, time_tol:float=1e-6, sigma0=0.5, method:str='halley', atol:float=1e-8, max_iter:int=100):
+
+        self.r = r
+        self.price_tol = price_tol
+        self.spot_tol = spot_tol
+        self.time_tol = time_tol
+        self.sigma0 = sigma0
+        self.method = method
+        self.atol = atol
+        self.max_iter = max_iter
+        self.solved = 0
+        self.last_solved = 0
+        self._size = 0
+        self._rows: Dict[Tuple[Hashable, float, int], int] = {}
+        self._expiries = []
+        self._data = {name: np.empty(0, dtype=dtype) for name, dtype in _FIELDS.items()}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getattr__(self, name:str) -> np.ndarray:
+        # The columns are exposed as views trimmed to the contracts seen so far.
+        if name in _FIELDS and '_data' in self.__dict__:
+            return self._data[name][:self._size]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @property
+    def expiry(self) -> list:
+        """Expiry label of every contract, in the order they were first seen."""
+        return self._expiries
+
+    def _grow(self, size:int):
+        """Makes room for `size` contracts, doubling the capacity as needed."""
+
+        capacity = len(self._data['strike'])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for name, values in self._data.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._data[name] = grown
+
+    def _lookup(self, expiry, strike:np.ndarray, codes:np.ndarray) -> np.ndarray:
+        """Row of every quote, appending the contracts seen for the first time."""
+
+        rows = np.empty(len(strike), dtype=np.int64)
+        new = []
+        for i, key in enumerate(zip(expiry, strike.tolist(), codes.tolist())):
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = self._size + len(new)
+                new.append(i)
+            rows[i] = row
+        if new:
+            new = np.asarray(new)
+            self._grow(self._size + len(new))
+            stop = self._size + len(new)
+            self._data['strike'][self._size:stop] = strike[new]
+            self._data['kind'][self._size:stop] = codes[new]
+            for name in ('S', 't', 'price', 'sigma'):
+                self._data[name][self._size:stop] = np.nan
+            self._data['iterations'][self._size:stop] = 0
+            self._data['converged'][self._size:stop] = False
+            self._expiries.extend(expiry[i] for i in new.tolist())
+            self._size = stop
+        return rows
+
+    def update(self, expiry, strike:ArrayLike, kind, price:ArrayLike, S:ArrayLike, t:ArrayLike) -> int:
+        """
+        Applies a batch of quotes, re-solving the implied volatility of the contracts that changed.
+
+        Parameters
+        ----------
+        expiry : Hashable or Sequence[Hashable]
+            Expiry label of every quote, e.g. the expiration date string of yfinance.
+        strike : ArrayLike
+            Strike price of every quote.
+        kind : str or Sequence[str]
+            "call" or "put", per quote or shared.
+        price : ArrayLike
+            Option price of every quote.
+        S : ArrayLike
+            Underlying price, per quote or shared.
+        t : ArrayLike
+            Time to expiry in years, per quote or shared.
+
+        Returns
+        -------
+        int
+            Number of contracts re-solved.
+        """
+
+        strike, price, S, t = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (strike, price, S, t)))
+        size = len(strike)
+        if isinstance(expiry, (str, bytes)) or not hasattr(expiry, '__len__'):
+            expiry = [expiry] * size
+        expiry = list(expiry)
+        codes = _kind_codes(kind, size)
+        rows = self._lookup(expiry, strike, codes)
+
+        old_price, old_S, old_t = (self._data[name][rows] for name in ('price', 'S', 't'))
+        # NaN compares as false, so new contracts are caught by the negation.
+        unchanged = (np.abs(price - old_price) <= self.price_tol) & (np.abs(S - old_S) <= self.spot_tol * np.abs(old_S)) & (np.abs(t - old_t) <= self.time_tol)
+        changed = ~unchanged
+        # A contract quoted twice in one batch keeps its last quote.
+        rows, first = np.unique(rows[::-1], return_index=True)
+        last = size - 1 - first
+        changed = changed[last]
+        rows = rows[changed]
+        last = last[changed]
+
+        self._data['price'][rows] = price[last]
+        self._data['S'][rows] = S[last]
+        self._data['t'][rows] = t[last]
+        self._solve(rows)
+        self.last_solved = len(rows)
+        self.solved += len(rows)
+        return len(rows)
+
+    def update_spot(self, S:float, t:Optional[float]=None) -> int:
+        """
+        Moves the underlying price of every contract, and optionally the time to expiry of a single-expiry surface.
+
+        Parameters
+        ----------
+        S : float
+            New underlying price.
+        t : float, optional
+            New time to expiry. Unchanged if not given.
+
+        Returns
+        -------
+        int
+            Number of contracts re-solved.
+        """
+
+        if self._size == 0:
+            return 0
+        return self.update(self._expiries, self.strike, [KINDS[c] for c in self.kind.tolist()], self.price, S, self.t if t is None else t)
+
+    def _solve(self, rows:np.ndarray):
+        """Re-solves the given rows, warm-started from their previous volatility."""
+
+        data = self._data
+        for code, kind in enumerate(KINDS):
+            subset = rows[data['kind'][rows] == code]
+            if len(subset) == 0:
+                continue
+            previous = data['sigma'][subset]
+            sigma0 = previous
+            if not np.isfinite(previous).all():
+                inputs = [data[name][subset] for name in ('S', 'strike')] + [self.r] + [data[name][subset] for name in ('t', 'price')]
+                sigma0 = np.where(np.isfinite(previous), previous, resolve(self.sigma0, *inputs, kind))
+            solver = iv_torch.call_implied_volatility_analytic if kind == 'call' else iv_torch.put_implied_volatility_analytic
+            S, K, t, price = (to_tensor(data[name][subset]) for name in ('S', 'strike', 't', 'price'))
+            result = solver(S, K, torch.tensor(self.r, dtype=torch.float64), t, price, to_tensor(sigma0), method=self.method, atol=self.atol, max_iter=self.max_iter)
+            converged = result.converged.numpy()
+            data['sigma'][subset] = np.where(converged, result.x.numpy(), np.nan)
+            data['iterations'][subset] = result.iterations.numpy()
+            data['converged'][subset] = converged
+
+    def get(self, expiry:Hashable, strike:float, kind:str='call') -> float:
+        """Implied volatility of one contract. NaN if it was never quoted or has no solution."""
+
+        row = self._rows.get((expiry, float(strike), KINDS.index(kind)))
+        return float('nan') if row is None else float(self._data['sigma'][row])
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Exports every contract as flat columns.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Copies of the columns "strike", "kind" (0 for calls, 1 for puts), "S", "t", "price", "sigma",
+            "iterations" and "converged", plus "expiry" as an object array of labels.
+        """
+
+        arrays = {name: getattr(self, name).copy() for name in _FIELDS}
+        arrays['expiry'] = np.array(self._expiries, dtype=object)
+        return arrays
+
+    def grid(self, kind:str='call') -> SurfaceGrid:
+        """
+        Scatters one side of the surface onto a dense (expiry, strike) grid, e.g. to plot the smiles.
+
+        Parameters
+        ----------
+        kind : str
+            Either "call" or "put". Default: "call".
+
+        Returns
+        -------
+        SurfaceGrid
+            Sorted expiries and strikes, with a volatility matrix NaN where there is no quote.
+        """
+
+        mask = self.kind == _kind_codes(kind, 1)[0]
+        expiry = np.array(self._expiries, dtype=object)[mask]
+        expiries = sorted(set(expiry.tolist()))
+        strikes, columns = np.unique(self.strike[mask], return_inverse=True)
+        index = {label: i for i, label in enumerate(expiries)}
+        rows = np.fromiter((index[label] for label in expiry.tolist()), dtype=np.int64, count=len(expiry))
+        sigma = np.full((len(expiries), len(strikes)), np.nan)
+        sigma[rows, columns] = self.sigma[mask]
+        t = np.full(len(expiries), np.nan)
+        t[rows] = self.t[mask]
+        return SurfaceGrid(expiries, t, strikes, sigma)
+
+
+if __name__ == "__main__":
+
+    # Sample use case
+    strikes = np.linspace(80, 120, 9)
+    surface = VolSurface(r=0.05)
+    prices = np.maximum(100 - strikes, 0) + 5
+    print(f'Solved {surface.update("2024-06-21", strikes, "call", prices, S=100., t=0.5)} contracts.')
+    print(f'Solved {surface.update("2024-06-21", strikes[4], "call", prices[4] + 0.1, S=100., t=0.5)} contract after a tick.')
+    print(surface.grid('call'))
@@ -0,0 +1,59 @@
+import json
+
+from dfin.bench import *
+from dfin.main import main_cli
+
+
+def test_make_chain():
+    chain = make_chain(10)
+    assert set(chain) == {'S', 'K', 'r', 't', 'sigma', 'price'}
+    assert all(len(v) == 10 for v in chain.values())
+    assert (make_chain(10)['K'] == chain['K']).all()
+
+
+def test_run_benchmarks():
+    report = run_benchmarks(sizes=[1, 10], repeat=1)
+    json.dumps(report)
+    assert report['meta']['torch']
+    cases = {(r['name'], r['backend'], r['size'], r['dtype'], r['autograd']) for r in report['results']}
+    assert ('call_price', 'bs_vanilla', 10, 'float64', False) in cases
+    assert ('call_price', 'bs_torch', 10, 'float32', True) in cases
+    assert ('newton', 'iv_torch', 1, 'float64', True) in cases
+    assert ('newton', 'iv_torch', 10, 'float64', True) not in cases
+    assert ('batched_newton', 'iv_torch', 10, 'float64', True) in cases
+    assert all(r['seconds'] > 0 for r in report['results'])
+
+
+def test_filter():
+    report = run_benchmarks(sizes=[10], dtypes=['float64'], repeat=1, filter='bs_numpy')
+    assert {r['backend'] for r in report['results']} == {'bs_numpy'}
+
+
+def test_compiled():
+    report = run_benchmarks(sizes=[10], dtypes=['float64'], repeat=1, filter='bs_compiled:script', compiled=True)
+    assert {(r['name'], r['backend']) for r in report['results']} == {('call_price', 'bs_compiled:script'), ('call_implied_volatility', 'bs_compiled:script')}
+
+
+def test_compare():
+    baseline = {'results': [
+        {'name': 'call_price', 'backend': 'bs_torch', 'size': 1, 'dtype': 'float32', 'autograd': False, 'seconds': 1.0},
+        {'name': 'greeks', 'backend': 'bs_torch', 'size': 1, 'dtype': 'float32', 'autograd': False, 'seconds': 1.0},
+    ]}
+    current = {'results': [
+        {'name': 'call_price', 'backend': 'bs_torch', 'size': 1, 'dtype': 'float32', 'autograd': False, 'seconds': 1.1},
+        {'name': 'greeks', 'backend': 'bs_torch', 'size': 1, 'dtype': 'float32', 'autograd': False, 'seconds': 2.0},
+        {'name': 'greeks', 'backend': 'bs_torch', 'size': 10, 'dtype': 'float32', 'autograd': False, 'seconds': 2.0},
+    ]}
+    regressions = compare(baseline, current)
+    assert len(regressions) == 1
+    assert regressions[0]['name'] == 'greeks' and regressions[0]['ratio'] == 2.0
+
+
+def test_cli(tmp_path):
+    output = tmp_path / 'bench.json'
+    args = ['bench', '--sizes', '1', '--dtypes', 'float64', '--repeat', '1', '--filter', 'bs_', '--bench-output', str(output)]
+    assert main_cli(args) == 0
+    report = json.loads(output.read_text())
+    assert report['results']
+    # Comparing against itself finds nothing slower than 100x.
+    assert main_cli(args + ['--compare', str(output), '--threshold', '100']) == 0
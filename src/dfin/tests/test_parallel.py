@@ -0,0 +1,80 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+if sys.version_info < (3, 8):
+    pytest.skip('dfin.parallel needs multiprocessing.shared_memory', allow_module_level=True)
+
+from dfin.bench import make_chain
+from dfin.options import bs_numpy, iv_rational
+from dfin.parallel import *
+
+
+@pytest.fixture
+def chain():
+    chain = make_chain(203)
+    # One contract priced above the underlying, which has no implied volatility.
+    chain['price'][7] = 150.
+    return chain
+
+
+@pytest.mark.parametrize('backend', ['iv_rational', 'iv_scipy', 'bs_numpy', 'iv_torch'])
+def test_implied_volatility(chain, backend):
+    result = implied_volatility(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'], backend=backend, workers=2, shards=5)
+    assert result.sigma.shape == (203,)
+    assert np.isnan(result.sigma[7])
+    valid = np.arange(203) != 7
+    np.testing.assert_allclose(result.sigma[valid], chain['sigma'][valid], rtol=1e-6)
+    assert [(s.start, s.stop) for s in result.shards] == [(0, 41), (41, 81), (81, 122), (122, 162), (162, 203)]
+    assert all(s.seconds > 0 for s in result.shards)
+    assert result.seconds > 0
+
+
+def test_matches_serial(chain):
+    # Call prices read as puts are just another set of contracts, some of them outside the no-arbitrage bounds.
+    expected = [iv_rational.put_implied_volatility(*row) for row in zip(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'])]
+    for workers in (1, 3):
+        result = implied_volatility(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'], kind='put', workers=workers)
+        np.testing.assert_array_equal(result.sigma, expected)
+        assert len(result.shards) == 4 * workers
+
+
+def test_broadcasting():
+    K = np.linspace(80, 120, 12).reshape(3, 4)
+    price = bs_numpy.call_price(100, K, 0.05, 1, 0.2)
+    result = implied_volatility(100, K, 0.05, 1, price, backend='bs_numpy', workers=2)
+    assert result.sigma.shape == (3, 4)
+    np.testing.assert_allclose(result.sigma, 0.2, rtol=1e-10)
+
+
+def test_frame(chain):
+    frame = pd.DataFrame({'strike': chain['K'], 'lastPrice': chain['price'], 'expiry': chain['t']})
+    result = frame_implied_volatility(frame, S=100., r=0.05, t='expiry', workers=2)
+    direct = implied_volatility(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'], workers=1)
+    np.testing.assert_array_equal(result.sigma, direct.sigma)
+
+
+def test_invalid_arguments(chain):
+    with pytest.raises(ValueError):
+        implied_volatility(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'], kind='straddle')
+    with pytest.raises(ValueError):
+        implied_volatility(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'], backend='iv_quantum')
+
+
+def speed_comparison():
+
+    import os
+
+    chain = make_chain(200000)
+    for backend in ('iv_rational', 'bs_numpy', 'iv_torch'):
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            result = implied_volatility(chain['S'], chain['K'], chain['r'], chain['t'], chain['price'], backend=backend, workers=workers)
+            print(f'{backend:>11s} with {workers:2d} workers takes {result.seconds:.3f} s, slowest shard {max(s.seconds for s in result.shards):.3f} s.')
+
+
+
+if __name__ == "__main__":
+
+    speed_comparison()